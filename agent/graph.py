@@ -50,6 +50,9 @@ from llm_factory import LLMFactory
 
 import utils
 import config_manager
+import keyword_index
+import intent_classifier
+import prompt_section_cache
 import constants
 from constants import SUPERVISOR_MODEL
 import pytz
@@ -165,96 +168,26 @@ def _keyword_search_for_retrieval(
     時間帯別枠取り: 新2 + 古2 + 中間ランダム1 = 計5件
     """
     import random
-    from pathlib import Path
     
     if not keywords or not room_name:
         return []
     
-    base_path = Path(constants.ROOMS_DIR) / room_name
-    search_paths = [str(base_path / "log.txt")]
-    search_paths.extend(glob.glob(str(base_path / "log_archives" / "*.txt")))
-    search_paths.extend(glob.glob(str(base_path / "log_import_source" / "*.txt")))
-    
-    found_blocks = []
-    date_patterns = [
-        re.compile(r'(\d{4}-\d{2}-\d{2}) \(...\) \d{2}:\d{2}:\d{2}'),
-        re.compile(r'###\s*(\d{4}-\d{2}-\d{2})')
-    ]
-    
     search_keywords = [k.lower() for k in keywords]
     
-    for file_path_str in search_paths:
-        file_path = Path(file_path_str)
-        if not file_path.exists() or file_path.stat().st_size == 0:
-            continue
-        
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-        except Exception:
-            continue
-        
-        # USER/AGENT のヘッダーのみを対象（SYSTEMは除外）
-        header_indices = [
-            i for i, line in enumerate(lines)
-            if re.match(r"^(## (?:USER|AGENT):.*)$", line.strip())
-        ]
-        if not header_indices:
-            continue
-        
-        search_end_line = len(lines)
-        
-        # log.txt の場合、最新N件を除外（送信ログ除外）
-        if file_path.name == "log.txt" and exclude_recent_count > 0:
-            msg_count = len(header_indices)
-            if msg_count <= exclude_recent_count:
-                continue
-            else:
-                cutoff_header_index = header_indices[-exclude_recent_count]
-                search_end_line = cutoff_header_index
-        
-        processed_blocks_content = set()
-        
-        for i, line in enumerate(lines[:search_end_line]):
-            if any(k in line.lower() for k in search_keywords):
-                # ヘッダーを探す
-                start_index = 0
-                for h_idx in reversed(header_indices):
-                    if h_idx <= i:
-                        start_index = h_idx
-                        break
-                
-                # 次のヘッダーまでをブロックとする
-                end_index = len(lines)
-                for h_idx in header_indices:
-                    if h_idx > start_index:
-                        end_index = h_idx
-                        break
-                
-                block_content = "".join(lines[start_index:end_index]).strip()
-                
-                # 重複チェック
-                if block_content in processed_blocks_content:
-                    continue
-                processed_blocks_content.add(block_content)
-                
-                # 短すぎるブロックを除外
-                if len(block_content) < 30:
-                    continue
-                
-                # 日付を抽出
-                block_date = None
-                for pattern in date_patterns:
-                    matches = list(pattern.finditer(block_content))
-                    if matches:
-                        block_date = matches[-1].group(1)
-                        break
-                
-                found_blocks.append({
-                    "content": block_content,
-                    "date": block_date,
-                    "source": file_path.name
-                })
+    # ルームごとの転置インデックスで候補を絞り込む
+    # USER/AGENT のヘッダーのみを対象（SYSTEMは除外）、log.txt は最新N件を除外（送信ログ除外）
+    try:
+        candidate_blocks = keyword_index.KeywordIndex.for_room(room_name).search_blocks(
+            search_keywords,
+            exclude_recent_count=exclude_recent_count,
+            include_system_headers=False
+        )
+    except Exception as e:
+        print(f"  - [Keyword Search] 索引検索エラー: {e}")
+        return []
+    
+    # 短すぎるブロックを除外
+    found_blocks = [b for b in candidate_blocks if len(b["content"]) >= 30]
     
     if not found_blocks:
         return []
@@ -419,6 +352,14 @@ INTENT: [emotional/factual/technical/temporal/relational]
         # 後方互換: RAG:がない場合は全体をRAGクエリとして扱う
         if not rag_query and decision_response.upper() != "NONE":
             rag_query = decision_response
+
+        # LLMが明示した Intent はローカル意図分類器の学習データとして記録する（「RAG: NONE」は記録しない）
+        if rag_match and intent_match and intent_part in constants.INTENT_WEIGHTS \
+                and rag_query.upper() != "NONE":
+            try:
+                intent_classifier.IntentClassifier.for_room(room_name).record(rag_query, intent)
+            except Exception as e:
+                print(f"  - [Retrieval] Intent記録エラー: {e}")
         
         print(f"  - [Retrieval] RAGクエリ: '{rag_query}'")
         if keyword_query:
@@ -562,7 +503,9 @@ INTENT: [emotional/factual/technical/temporal/relational]
 
 def context_generator_node(state: AgentState):
     room_name = state['room_name']
-    
+    # ファイル由来のセクションは (パス, 更新時刻, サイズ) が変わったものだけを作り直す
+    section_stats = prompt_section_cache.SectionStats()
+
     # 状況プロンプト
     situation_prompt_parts = []
     send_time = state.get("send_current_time", False)
@@ -594,12 +537,11 @@ def context_generator_node(state: AgentState):
         soul_vessel_room = state['all_participants'][0] if state['all_participants'] else state['room_name']
         current_location_name = utils.get_current_location(soul_vessel_room)
         location_display_name = current_location_name or state.get("location_name", "（不明な場所）")
-        
+
         scenery_text = state.get("scenery_text", "（情景描写を取得できませんでした）")
-        space_def = "（場所の定義を取得できませんでした）"
-        current_location_name = utils.get_current_location(soul_vessel_room)
-        if current_location_name:
-            world_settings_path = get_world_settings_path(soul_vessel_room)
+
+        def _build_space_def():
+            space_def = "（場所の定義を取得できませんでした）"
             world_data = utils.parse_world_file(world_settings_path)
             if isinstance(world_data, dict):
                 for area, places in world_data.items():
@@ -607,8 +549,24 @@ def context_generator_node(state: AgentState):
                         space_def = places[current_location_name]
                         if isinstance(space_def, str) and len(space_def) > 2000: space_def = space_def[:2000] + "\n...（長すぎるため省略）"
                         break
-        available_locations = get_location_list(state['room_name'])
-        location_list_str = "\n".join([f"- {loc}" for loc in available_locations]) if available_locations else "（現在、定義されている移動先はありません）"
+            return space_def
+
+        space_def = "（場所の定義を取得できませんでした）"
+        if current_location_name:
+            world_settings_path = get_world_settings_path(soul_vessel_room)
+            space_def = prompt_section_cache.get_section(
+                soul_vessel_room, "space_def", [world_settings_path], _build_space_def,
+                stats=section_stats, extra_key=current_location_name
+            )
+
+        def _build_location_list():
+            available_locations = get_location_list(state['room_name'])
+            return "\n".join([f"- {loc}" for loc in available_locations]) if available_locations else "（現在、定義されている移動先はありません）"
+
+        location_list_str = prompt_section_cache.get_section(
+            state['room_name'], "locations", [get_world_settings_path(state['room_name'])], _build_location_list,
+            stats=section_stats
+        )
         situation_prompt_parts.extend([
             "【現在の状況】", f"- 現在時刻: {current_datetime_str}", f"- 季節: {season_ja}", f"- 時間帯: {time_of_day_ja}\n",
             "【現在の場所と情景】", f"- 場所: {location_display_name}", f"- 今の情景: {scenery_text}",
@@ -619,29 +577,38 @@ def context_generator_node(state: AgentState):
     char_prompt_path = os.path.join(constants.ROOMS_DIR, room_name, "SystemPrompt.txt")
     core_memory_path = os.path.join(constants.ROOMS_DIR, room_name, "core_memory.txt")
     character_prompt = ""; core_memory = ""; notepad_section = ""
-    if os.path.exists(char_prompt_path):
-        with open(char_prompt_path, 'r', encoding='utf-8') as f: character_prompt = f.read().strip()
+
+    def _read_stripped(path):
+        if not path or not os.path.exists(path): return ""
+        with open(path, 'r', encoding='utf-8') as f: return f.read().strip()
+
+    character_prompt = prompt_section_cache.get_section(
+        room_name, "character_prompt", [char_prompt_path], lambda: _read_stripped(char_prompt_path), stats=section_stats
+    )
     if state.get("send_core_memory", True):
-        if os.path.exists(core_memory_path):
-            with open(core_memory_path, 'r', encoding='utf-8') as f: core_memory = f.read().strip()
+        core_memory = prompt_section_cache.get_section(
+            room_name, "core_memory", [core_memory_path], lambda: _read_stripped(core_memory_path), stats=section_stats
+        )
+
+    _, _, _, _, notepad_path, research_notes_path = get_room_files_paths(room_name)
+
+    def _build_notepad_section():
+        if notepad_path and os.path.exists(notepad_path):
+            content = _read_stripped(notepad_path)
+            notepad_content = content if content else "（メモ帳は空です）"
+        else: notepad_content = "（メモ帳ファイルが見つかりません）"
+        return f"\n### 短期記憶（メモ帳）\n{notepad_content}\n"
+
     if state.get("send_notepad", True):
         try:
-            from room_manager import get_room_files_paths
-            _, _, _, _, notepad_path, _ = get_room_files_paths(room_name)
-            if notepad_path and os.path.exists(notepad_path):
-                with open(notepad_path, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
-                    notepad_content = content if content else "（メモ帳は空です）"
-            else: notepad_content = "（メモ帳ファイルが見つかりません）"
-            notepad_section = f"\n### 短期記憶（メモ帳）\n{notepad_content}\n"
+            notepad_section = prompt_section_cache.get_section(
+                room_name, "notepad", [notepad_path], _build_notepad_section, stats=section_stats
+            )
         except Exception as e:
             print(f"--- 警告: メモ帳の読み込み中にエラー: {e}")
             notepad_section = "\n### 短期記憶（メモ帳）\n（メモ帳の読み込み中にエラーが発生しました）\n"
 
-    research_notes_section = ""
-    try:
-        from room_manager import get_room_files_paths
-        _, _, _, _, _, research_notes_path = get_room_files_paths(room_name)
+    def _build_research_notes_section():
         if research_notes_path and os.path.exists(research_notes_path):
             with open(research_notes_path, 'r', encoding='utf-8') as f:
                 lines = f.readlines()
@@ -661,7 +628,13 @@ def context_generator_node(state: AgentState):
             else:
                 research_notes_content = "（研究ノートにトピックが定義されていません）"
         else: research_notes_content = "（研究ノートファイルが見つかりません）"
-        research_notes_section = f"\n### 研究・分析ノート（目次）\n{research_notes_content}\n"
+        return f"\n### 研究・分析ノート（目次）\n{research_notes_content}\n"
+
+    research_notes_section = ""
+    try:
+        research_notes_section = prompt_section_cache.get_section(
+            room_name, "research_notes", [research_notes_path], _build_research_notes_section, stats=section_stats
+        )
     except Exception as e:
         print(f"--- 警告: 研究ノートの読み込み中にエラー: {e}")
         research_notes_section = "\n### 研究・分析ノート\n（研究ノートの読み込み中にエラーが発生しました）\n"
@@ -670,17 +643,25 @@ def context_generator_node(state: AgentState):
     entity_list_section = ""
     try:
         em_manager = EntityMemoryManager(room_name)
-        entities = em_manager.list_entries()
-        if entities:
+
+        def _build_entity_list_section():
+            entities = em_manager.list_entries()
+            if not entities:
+                return ""
             entity_list_str = "\n".join([f"- {name}" for name in sorted(entities)])
-            entity_list_section = (
+            return (
                 f"\n### 記憶しているエンティティ一覧\n"
                 f"以下は記憶している人物・事物の名前です。詳細は `read_entity_memory(\"名前\")` で確認できます。\n\n"
                 f"{entity_list_str}\n"
             )
+
+        # 一覧はファイル名だけで決まるため、ディレクトリの更新時刻（追加・削除・改名で変わる）をキーにする
+        entity_list_section = prompt_section_cache.get_section(
+            room_name, "entity_list", [str(em_manager.entities_dir)], _build_entity_list_section, stats=section_stats
+        )
         
         # --- [Phase 2] ペンディングシステムメッセージ（影の僕からの提案）の注入 ---
-        from dreaming_manager import DreamingManager
+        # 読み出すとキューが消えるため、キャッシュせずに毎回取得する
         dm = DreamingManager(room_name, state.get("api_key", ""))
         pending_msg = dm.get_pending_system_messages()
         if pending_msg:
@@ -732,7 +713,10 @@ def context_generator_node(state: AgentState):
             # APIキーが必要だが、context_generator_nodeにはstate['api_key']がある
             dm = DreamingManager(room_name, state['api_key'])
             # 最新1件の「指針」のみを取得（コスト最適化）
-            recent_insights = dm.get_recent_insights_text(limit=1)
+            recent_insights = prompt_section_cache.get_section(
+                room_name, "dream_insights", [str(dm.insights_file)],
+                lambda: dm.get_recent_insights_text(limit=1), stats=section_stats
+            )
             
             if recent_insights:
                 dream_insights_text = (
@@ -747,7 +731,9 @@ def context_generator_node(state: AgentState):
         goals_text = ""
         try:
             gm = GoalManager(room_name)
-            goals_text = gm.get_goals_for_prompt()
+            goals_text = prompt_section_cache.get_section(
+                room_name, "goals", [str(gm.goals_file)], gm.get_goals_for_prompt, stats=section_stats
+            )
             if goals_text:
                 dream_insights_text += f"\n\n{goals_text}\n"
         except Exception as e:
@@ -806,7 +792,10 @@ def context_generator_node(state: AgentState):
     action_plan_context = ""
     try:
         plan_manager = ActionPlanManager(room_name)
-        action_plan_context = plan_manager.get_plan_context_for_prompt()
+        action_plan_context = prompt_section_cache.get_section(
+            room_name, "action_plan", [str(plan_manager.plan_file)],
+            plan_manager.get_plan_context_for_prompt, stats=section_stats
+        )
         if action_plan_context:
             # 計画がある場合、ユーザー発言（HumanMessage）があるかチェック
             # もしユーザー発言があれば、計画よりもユーザーを優先するよう注釈を加える
@@ -816,6 +805,8 @@ def context_generator_node(state: AgentState):
     except Exception as e:
         print(f"  - [Action Plan] 読み込みエラー: {e}")
 
+    print(f"  - [Prompt Cache] {section_stats.summary()}")
+
     image_gen_mode = config_manager.CONFIG_GLOBAL.get("image_generation_mode", "new")
     current_tools = all_tools
     image_generation_manual_text = ""
@@ -16,6 +16,8 @@ import gemini_api
 import utils
 import re
 import dreaming_manager
+import client_pool
+import sleep_consolidation
 from typing import Any
 
 import sys
@@ -108,8 +110,6 @@ def _summarize_watchlist_content(name: str, url: str, new_content: str, diff_sum
         return fallback
     
     try:
-        from google import genai
-        
         # APIキーを取得
         api_key_name = config_manager.get_latest_api_key_name_from_config()
         if not api_key_name:
@@ -122,7 +122,7 @@ def _summarize_watchlist_content(name: str, url: str, new_content: str, diff_sum
             return _create_fallback_content(new_content)
         
         # 軽量モデルを使用
-        client = genai.Client(api_key=api_key)
+        client = client_pool.get_genai_client(api_key)
         
         # コンテンツを制限（トークン節約）
         content_preview = new_content[:3000] if len(new_content) > 3000 else new_content
@@ -845,90 +845,20 @@ def check_autonomous_actions():
                             except ValueError:
                                 pass
                     
-                    if not has_dreamed_today:
-                        print(f"💤 {room_folder}: 深い眠りにつきました（夢想プロセス開始）...")
-                        # 自動レベル判定: 週次/月次省察が必要か自動判定
-                        result = dm.dream_with_auto_level()
-                        
-                        # --- 睡眠時記憶整理 ---
-                        sleep_consolidation = effective_settings.get("sleep_consolidation", {})
-                        
-                        if sleep_consolidation.get("update_episodic_memory", True):
-                            print(f"  🌙 {room_folder}: エピソード記憶を更新中...")
-                            try:
-                                from episodic_memory_manager import EpisodicMemoryManager
-                                em = EpisodicMemoryManager(room_folder)
-                                # 日次要約でエピソード記憶を生成
-                                em_result = em.update_memory(api_key_val)
-                                print(f"  ✅ {room_folder}: {em_result}")
-                                # 更新日時をroom_config.jsonに保存
-                                status_text = f"最終更新: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-                                room_manager.update_room_config(room_folder, {"last_episodic_update": status_text})
-                            except Exception as e:
-                                print(f"  ❌ {room_folder}: エピソード記憶更新エラー - {e}")
-                        
-                        if sleep_consolidation.get("update_memory_index", True):
-                            print(f"  🌙 {room_folder}: 記憶索引を更新中...")
-                            try:
-                                import rag_manager
-                                rm = rag_manager.RAGManager(room_folder, api_key_val)
-                                rm_result = rm.update_memory_index()
-                                print(f"  ✅ {room_folder}: {rm_result}")
-                            except Exception as e:
-                                print(f"  ❌ {room_folder}: 記憶索引更新エラー - {e}")
-                        
-                        if sleep_consolidation.get("update_current_log_index", False):
-                            print(f"  🌙 {room_folder}: 現行ログ索引を更新中...")
-                            try:
-                                import rag_manager
-                                from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
-                                
-                                def run_current_log_index_update():
-                                    rm = rag_manager.RAGManager(room_folder, api_key_val)
-                                    result = None
-                                    for batch_num, total_batches, status in rm.update_current_log_index_with_progress():
-                                        if batch_num == total_batches:
-                                            result = status
-                                    return result
-                                
-                                # タイムアウト付きで実行（最大10分）
-                                with ThreadPoolExecutor(max_workers=1) as executor:
-                                    future = executor.submit(run_current_log_index_update)
-                                    try:
-                                        result = future.result(timeout=600)  # 10分
-                                        if result:
-                                            print(f"  ✅ {room_folder}: {result}")
-                                    except FuturesTimeoutError:
-                                        print(f"  ⚠️ {room_folder}: 現行ログ索引更新がタイムアウトしました（10分経過）。次回に再試行します。")
-                            except Exception as e:
-                                print(f"  ❌ {room_folder}: 現行ログ索引更新エラー - {e}")
+                    if sleep_consolidation.is_busy(room_folder):
+                        # 記憶整理の待機中・実行中は、完了時に静かな活動が行われる
+                        continue
 
-                        
+                    if sleep_consolidation.needs_consolidation(room_folder, effective_settings, has_dreamed_today):
+                        # 記憶整理はワーカーで実行し、スケジューラスレッド（アラームのチェック）を止めない
+                        # 完了後に、静かに自律行動もトリガー（動機ログ付き）
+                        def on_complete(room_folder=room_folder, motivation_log=motivation_log):
+                            print(f"🌙 {room_folder}: 記憶整理後の静かな活動を開始...")
+                            trigger_autonomous_action(room_folder, current_api_key, quiet_mode=True, motivation_log=motivation_log)
 
-                        
-                        if sleep_consolidation.get("compress_old_episodes", False):
-                            print(f"  🌙 {room_folder}: 古いエピソード記憶を圧縮中...")
-                            try:
-                                from episodic_memory_manager import EpisodicMemoryManager
-                                emm = EpisodicMemoryManager(room_folder)
-                                # 週次圧縮
-                                compress_result = emm.compress_old_episodes(api_key_val)
-                                print(f"  ✅ {room_folder}: {compress_result}")
-                                # 月次圧縮
-                                monthly_result = emm.compress_weekly_to_monthly(api_key_val)
-                                print(f"  ✅ {room_folder}: {monthly_result}")
-                                # 圧縮結果をroom_config.jsonに保存
-                                room_manager.update_room_config(room_folder, {
-                                    "last_compression_result": f"{compress_result} / {monthly_result}"
-                                })
-                            except Exception as e:
-                                print(f"  ❌ {room_folder}: エピソード圧縮エラー - {e}")
-                        
-                        print(f"🛌 {room_folder}: 睡眠時記憶整理が完了しました。")
-                        
-                        # 【新規追加】記憶整理後、静かに自律行動もトリガー（動機ログ付き）
-                        print(f"🌙 {room_folder}: 記憶整理後の静かな活動を開始...")
-                        trigger_autonomous_action(room_folder, current_api_key, quiet_mode=True, motivation_log=motivation_log)
+                        sleep_consolidation.submit(sleep_consolidation.ConsolidationJob(
+                            room_folder, current_api_key, api_key_val, effective_settings, on_complete=on_complete
+                        ))
                     else:
                         # 既に夢を見ている日でも、自律行動はトリガー（通知なし、動機ログ付き）
                         trigger_autonomous_action(room_folder, current_api_key, quiet_mode=True, motivation_log=motivation_log)
@@ -955,7 +885,6 @@ def check_watchlist_scheduled():
     """
     try:
         from watchlist_manager import WatchlistManager
-        from tools.watchlist_tools import _fetch_url_content
         
         all_rooms = room_manager.get_room_list_for_ui()
         now = datetime.datetime.now()
@@ -971,20 +900,15 @@ def check_watchlist_scheduled():
                 print(f"📋 {room_folder}: {len(due_entries)}件のウォッチリストエントリをチェック中...")
                 
                 changes_found = []
-                for entry in due_entries:
+                # 取得と差分チェックは並行して行う（未更新のページは差分計算を省略）
+                for entry, success, has_changes, diff_summary, content in manager.check_entries(due_entries):
                     url = entry["url"]
                     name = entry.get("name", url)
                     
-                    # コンテンツ取得
-                    success, content = _fetch_url_content(url)
-                    
                     if not success:
                         print(f"  ❌ {name}: 取得失敗")
                         continue
                     
-                    # 差分チェック
-                    has_changes, diff_summary = manager.check_and_update(entry["id"], content)
-                    
                     if has_changes:
                         # 【修正】軽量モデルでコンテンツを要約し、詳細情報として保存
                         content_summary = _summarize_watchlist_content(name, url, content, diff_summary)
@@ -1,26 +1,192 @@
 # audio_manager.py の内容を、このコードで完全に置き換えてください
 
 import os
-import datetime
-from typing import Optional
-import google.genai as genai
+import re
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 from google.genai import types
 import traceback
 import wave
 from google.api_core import exceptions as google_exceptions
 import google.genai.errors
 import time
+import client_pool
+import constants
 
 # この変数はもう使わないのでコメントアウトまたは削除
 # AUDIO_CACHE_DIR = os.path.join("temp", "audio_cache")
 # os.makedirs(AUDIO_CACHE_DIR, exist_ok=True)
 MAX_TEXT_LENGTH = 8000
+TTS_MODEL_NAME = "models/gemini-2.5-flash-preview-tts"
+# TTS の出力形式（16bit モノラル 24kHz の PCM）
+SAMPLE_RATE = 24000
+SAMPLE_WIDTH = 2
+
+# 同じ音声を同時に生成しないためのロック。キーのハッシュで振り分ける固定数のロックなので、
+# 生成した音声の種類が増えてもロックは増えない（別の音声が同じロックを共有することはある）
+_KEY_LOCK_STRIPES = 64
+_key_locks = [threading.Lock() for _ in range(_KEY_LOCK_STRIPES)]
+_SENTENCE_END = re.compile(r'(?<=[。！？!?\n])')
+# キャッシュとして保存したファイル名（キーのハッシュ＋拡張子）。これ以外のファイルは削除対象にしない
+_CACHE_FILE_NAME = re.compile(r'^[0-9a-f]{64}\.(?:ogg|wav)$')
+
+
+def split_into_segments(text: str, max_chars: int = None) -> List[str]:
+    """
+    テキストを文単位で区切り、max_chars 文字以内のセグメントにまとめる。
+    1文が max_chars を超える場合はその文だけで1セグメントにする。
+    """
+    max_chars = max_chars or constants.TTS_SEGMENT_CHARS
+    segments = []
+    current = ""
+    for sentence in _SENTENCE_END.split(text):
+        if not sentence.strip():
+            current += sentence
+            continue
+        if current.strip() and len(current) + len(sentence) > max_chars:
+            segments.append(current.strip())
+            current = ""
+        current += sentence
+    if current.strip():
+        segments.append(current.strip())
+    return segments
+
+
+def cache_key(text: str, voice_id: str, style_prompt: Optional[str], model_name: str = TTS_MODEL_NAME) -> str:
+    """音声キャッシュのキー（テキスト・声・スタイル・モデルから決まる）"""
+    source = "\0".join([model_name, voice_id or "", (style_prompt or "").strip(), text])
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def _audio_format() -> str:
+    """保存形式。ffmpeg があれば Opus（OGG）で圧縮し、無ければ WAV のまま保存する"""
+    from pydub.utils import which
+    return "ogg" if which("ffmpeg") else "wav"
+
+
+def cache_dir_for(room_name: str) -> str:
+    """ルームごとの音声の保存先（従来どおり characters/<ルーム>/audio_cache）"""
+    return os.path.join(constants.ROOMS_DIR, room_name, constants.TTS_CACHE_DIR_NAME)
+
+
+def _find_cached(cache_dir: str, key: str) -> Optional[str]:
+    for ext in ("ogg", "wav"):
+        path = os.path.join(cache_dir, f"{key}.{ext}")
+        if os.path.exists(path):
+            try:
+                # 最終使用時刻として更新時刻を使う（LRU）
+                os.utime(path)
+            except OSError:
+                pass
+            return path
+    return None
+
+
+def _store_audio(cache_dir: str, key: str, pcm_data: bytes) -> str:
+    """PCM データを圧縮してキャッシュに保存し、そのパスを返す"""
+    os.makedirs(cache_dir, exist_ok=True)
+    ext = _audio_format()
+    filepath = os.path.join(cache_dir, f"{key}.{ext}")
+    temp_path = f"{filepath}.{threading.get_ident()}.tmp"
+    try:
+        if ext == "ogg":
+            from pydub import AudioSegment
+            segment = AudioSegment(data=pcm_data, sample_width=SAMPLE_WIDTH, frame_rate=SAMPLE_RATE, channels=1)
+            segment.export(temp_path, format="ogg", codec="libopus", bitrate="48k")
+        else:
+            with wave.open(temp_path, "wb") as wf:
+                wf.setnchannels(1)
+                wf.setsampwidth(SAMPLE_WIDTH)
+                wf.setframerate(SAMPLE_RATE)
+                wf.writeframes(pcm_data)
+        os.replace(temp_path, filepath)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    _evict_cache(cache_dir, keep=filepath)
+    return filepath
+
+
+def _evict_cache(cache_dir: str, keep: str = None):
+    """
+    キャッシュが上限サイズを超えていれば、最後に使われた時刻が古いものから削除する。
+    以前の形式で保存された音声など、キャッシュのファイル名でないものは数えず、削除もしない。
+    """
+    try:
+        entries = []
+        for entry in os.scandir(cache_dir):
+            if entry.is_file() and _CACHE_FILE_NAME.match(entry.name):
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+    except OSError:
+        return
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= constants.TTS_CACHE_MAX_BYTES:
+            break
+        if keep and os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def _key_lock(key: str) -> threading.Lock:
+    digest = hashlib.sha256(key.encode("utf-8")).digest()
+    return _key_locks[int.from_bytes(digest[:4], "big") % _KEY_LOCK_STRIPES]
+
+
+def _synthesize_segment(client, voice_id: str, prompt: str) -> Optional[bytes]:
+    """1セグメント分の音声（PCM）を生成する。音声が返らなかった場合は None"""
+    generation_config_object = types.GenerateContentConfig(
+        response_modalities=["AUDIO"],
+        speech_config=types.SpeechConfig(
+            voice_config=types.VoiceConfig(
+                prebuilt_voice_config=types.PrebuiltVoiceConfig(
+                    voice_name=voice_id
+                )
+            )
+        )
+    )
+
+    response = client.models.generate_content(
+        model=TTS_MODEL_NAME,
+        contents=[types.Content(parts=[types.Part(text=prompt)])],
+        config=generation_config_object
+    )
+
+    if (response and response.candidates and
+        response.candidates[0].content and
+        response.candidates[0].content.parts and
+        response.candidates[0].content.parts[0].inline_data):
+
+        audio_data = response.candidates[0].content.parts[0].inline_data.data
+        if not audio_data:
+            print("--- エラー: API応答のインラインデータが空です ---")
+            return None
+        return audio_data
+
+    print("--- エラー: API応答に予期した音声データが含まれていませんでした。セーフティフィルターによるブロックの可能性があります。 ---")
+    if response and response.candidates:
+        candidate = response.candidates[0]
+        finish_reason = candidate.finish_reason.name if hasattr(candidate, 'finish_reason') and hasattr(candidate.finish_reason, 'name') else '不明'
+        safety_ratings = candidate.safety_ratings if hasattr(candidate, 'safety_ratings') else '取得不能'
+        print(f"  - 終了理由: {finish_reason}")
+        print(f"  - 安全性評価: {safety_ratings}")
+    return None
+
 
 def generate_audio_from_text(text: str, api_key: str, voice_id: str, room_name: str, style_prompt: str = None) -> Optional[str]:
     """
     指定されたテキストと声ID、スタイルプロンプトを使って音声を生成し、
-    再生可能なWAVファイルとして保存して、そのファイルパスを返す。
-    【v4: ルーム別保存・ファイル名改善】
+    再生可能な音声ファイルとして保存して、そのファイルパスを返す。
+    【v5: キャッシュ・文単位の並行生成】
+    同じテキスト・声・スタイル・モデルの音声はキャッシュから返す。
+    長いテキストは文単位のセグメントに分け、並行して生成してから結合する。
     """
     if len(text) > MAX_TEXT_LENGTH:
         text_to_speak = text[:MAX_TEXT_LENGTH] + "..."
@@ -28,69 +194,34 @@ def generate_audio_from_text(text: str, api_key: str, voice_id: str, room_name:
     else:
         text_to_speak = text
 
-    final_prompt = f"{style_prompt.strip()}: {text_to_speak}" if style_prompt and style_prompt.strip() else text_to_speak
+    style = style_prompt.strip() if style_prompt and style_prompt.strip() else ""
+    key = cache_key(text_to_speak, voice_id, style)
+    cache_dir = cache_dir_for(room_name)
 
     try:
-        print(f"--- 音声生成開始 (Room: {room_name}, Voice: {voice_id}) ---")
-        print(f"  - 最終プロンプト: {final_prompt[:100]}...")
-
-        client = genai.Client(api_key=api_key)
-        model_name = "models/gemini-2.5-flash-preview-tts"
-
-        generation_config_object = types.GenerateContentConfig(
-            response_modalities=["AUDIO"],
-            speech_config=types.SpeechConfig(
-                voice_config=types.VoiceConfig(
-                    prebuilt_voice_config=types.PrebuiltVoiceConfig(
-                        voice_name=voice_id
-                    )
-                )
-            )
-        )
-
-        response = client.models.generate_content(
-            model=model_name,
-            contents=[types.Content(parts=[types.Part(text=final_prompt)])],
-            config=generation_config_object
-        )
+        with _key_lock(os.path.join(cache_dir, key)):
+            cached_path = _find_cached(cache_dir, key)
+            if cached_path:
+                print(f"--- 音声キャッシュを使用 (Room: {room_name}, Voice: {voice_id}): {cached_path} ---")
+                return cached_path
 
-        if (response and response.candidates and
-            response.candidates[0].content and
-            response.candidates[0].content.parts and
-            response.candidates[0].content.parts[0].inline_data):
-
-            audio_data = response.candidates[0].content.parts[0].inline_data.data
-            if not audio_data:
-                print("--- エラー: API応答のインラインデータが空です ---")
+            segments = split_into_segments(text_to_speak)
+            prompts = [f"{style}: {segment}" if style else segment for segment in segments]
+            if not prompts:
                 return None
-        else:
-            print("--- エラー: API応答に予期した音声データが含まれていませんでした。セーフティフィルターによるブロックの可能性があります。 ---")
-            if response and response.candidates:
-                candidate = response.candidates[0]
-                finish_reason = candidate.finish_reason.name if hasattr(candidate, 'finish_reason') and hasattr(candidate.finish_reason, 'name') else '不明'
-                safety_ratings = candidate.safety_ratings if hasattr(candidate, 'safety_ratings') else '取得不能'
-                print(f"  - 終了理由: {finish_reason}")
-                print(f"  - 安全性評価: {safety_ratings}")
-            return None
+            print(f"--- 音声生成開始 (Room: {room_name}, Voice: {voice_id}, {len(prompts)}セグメント) ---")
+            print(f"  - 最終プロンプト: {prompts[0][:100]}...")
 
-        # ▼▼▼ ここからが変更箇所 ▼▼▼
-        # 1. ルームごとの保存先ディレクトリを決定
-        save_dir = os.path.join("characters", room_name, "audio_cache")
-        os.makedirs(save_dir, exist_ok=True)
-
-        # 2. 新しいファイル名を生成
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{timestamp}_{voice_id}.wav"
-        filepath = os.path.join(save_dir, filename)
-        # ▲▲▲ 変更ここまで ▲▲▲
+            client = client_pool.get_genai_client(api_key)
+            workers = max(1, min(constants.TTS_SYNTH_CONCURRENCY, len(prompts)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                audio_parts = list(executor.map(lambda p: _synthesize_segment(client, voice_id, p), prompts))
+            if any(part is None for part in audio_parts):
+                return None
 
-        with wave.open(filepath, "wb") as wf:
-            wf.setnchannels(1)
-            wf.setsampwidth(2)
-            wf.setframerate(24000)
-            wf.writeframes(audio_data)
+            filepath = _store_audio(cache_dir, key, b"".join(audio_parts))
 
-        print(f"  - 音声ファイル(WAV)を生成しました: {filepath}")
+        print(f"  - 音声ファイルを生成しました: {filepath}")
         return filepath
 
     except google.genai.errors.ClientError as e:
@@ -0,0 +1,192 @@
+# chat_log_index.py
+"""
+会話ログ（log.txt）の増分パーサーとパース結果キャッシュ
+
+`## ROLE:NAME` ヘッダーのバイトオフセットを記録し、パース済みメッセージを
+ファイルの (inode, サイズ, mtime) をキーにしてメモリ上に保持する。
+ログが追記されただけの場合は、最後のヘッダー以降の新しい部分のみを再パースするため、
+1ターンに何度も呼ばれる utils.load_chat_log のコストがログ全体のサイズではなく
+追記されたバイト数に比例するようになる。
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+# キャッシュに保持するログの合計サイズ上限（バイト）。
+# 超過した場合は最も長く使われていないログから破棄する（直近の1件は常に保持）。
+CACHE_MAX_TOTAL_BYTES = 64 * 1024 * 1024
+
+# 追記判定用に保持する、前回読み込み時のファイル末尾のバイト数
+_TAIL_SAMPLE_BYTES = 64
+
+# utils.load_chat_log と同じヘッダー定義をバイト列に対して適用する
+_HEADER_PATTERN = re.compile(rb'^## (USER|AGENT|SYSTEM):(.+?)$', re.MULTILINE)
+
+
+@dataclass
+class ChatLogIndex:
+    """1つのログファイルに対するパース結果とヘッダーオフセット"""
+    path: str
+    file_key: Tuple[int, int, int, int]  # (st_dev, st_ino, st_size, st_mtime_ns)
+    size: int
+    offsets: List[int] = field(default_factory=list)  # 各ヘッダー行の先頭バイト位置
+    messages: List[Dict[str, str]] = field(default_factory=list)
+    tail_sample: bytes = b""
+
+
+_cache: "OrderedDict[str, ChatLogIndex]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _normalize_newlines(text: str) -> str:
+    # テキストモードの open() と同じく、改行コードを \n に統一する
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _parse_block(data: bytes, base_offset: int) -> Tuple[List[int], List[Dict[str, str]]]:
+    """
+    バイト列を走査し、(ヘッダーの絶対オフセット一覧, メッセージ一覧) を返す。
+    base_offset は data の先頭がファイル内のどこにあるかを表す。
+    """
+    offsets: List[int] = []
+    messages: List[Dict[str, str]] = []
+    matches = list(_HEADER_PATTERN.finditer(data))
+
+    for i, match in enumerate(matches):
+        role = match.group(1).decode("ascii").upper()
+        responder = _normalize_newlines(match.group(2).decode("utf-8")).strip()
+        if role == "USER":
+            responder = "user"
+
+        start_of_content = match.end()
+        end_of_content = matches[i + 1].start() if i + 1 < len(matches) else len(data)
+        message_content = _normalize_newlines(data[start_of_content:end_of_content].decode("utf-8")).strip()
+
+        offsets.append(base_offset + match.start())
+        messages.append({"role": role, "responder": responder, "content": message_content})
+
+    return offsets, messages
+
+
+def _file_key(st: os.stat_result) -> Tuple[int, int, int, int]:
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def _read_range(file_path: str, start: int, end: int) -> bytes:
+    with open(file_path, "rb") as f:
+        f.seek(start)
+        return f.read(end - start)
+
+
+def _tail_sample_of(file_path: str, size: int) -> bytes:
+    start = max(0, size - _TAIL_SAMPLE_BYTES)
+    return _read_range(file_path, start, size)
+
+
+def _build_full(file_path: str, st: os.stat_result) -> ChatLogIndex:
+    with open(file_path, "rb") as f:
+        data = f.read()
+    size = len(data)
+    offsets, messages = _parse_block(data, 0)
+    return ChatLogIndex(
+        path=file_path,
+        file_key=(st.st_dev, st.st_ino, size, st.st_mtime_ns),
+        size=size,
+        offsets=offsets,
+        messages=messages,
+        tail_sample=data[max(0, size - _TAIL_SAMPLE_BYTES):],
+    )
+
+
+def _is_append_of(prev: ChatLogIndex, file_path: str, st: os.stat_result) -> bool:
+    """ファイルが前回の内容に追記されただけかどうかを判定する"""
+    if (st.st_dev, st.st_ino) != prev.file_key[:2]:
+        return False
+    if st.st_size <= prev.size:
+        return False
+    if not prev.offsets:
+        return False
+    # 前回の末尾部分が同じ位置にそのまま残っていることを確認する
+    start = max(0, prev.size - len(prev.tail_sample))
+    return _read_range(file_path, start, prev.size) == prev.tail_sample
+
+
+def _extend(prev: ChatLogIndex, file_path: str, st: os.stat_result) -> ChatLogIndex:
+    """
+    最後のヘッダー以降を再パースして索引を更新する。
+    最後のメッセージは追記で本文が伸びている可能性があるため、作り直す。
+    """
+    resume_offset = prev.offsets[-1]
+    data = _read_range(file_path, resume_offset, st.st_size)
+    size = resume_offset + len(data)
+    new_offsets, new_messages = _parse_block(data, resume_offset)
+    return ChatLogIndex(
+        path=file_path,
+        file_key=(st.st_dev, st.st_ino, size, st.st_mtime_ns),
+        size=size,
+        offsets=prev.offsets[:-1] + new_offsets,
+        messages=prev.messages[:-1] + new_messages,
+        tail_sample=_tail_sample_of(file_path, size),
+    )
+
+
+def _evict_if_needed() -> None:
+    total = sum(entry.size for entry in _cache.values())
+    while total > CACHE_MAX_TOTAL_BYTES and len(_cache) > 1:
+        _, evicted = _cache.popitem(last=False)
+        total -= evicted.size
+
+
+def get_index(file_path: str) -> Optional[ChatLogIndex]:
+    """
+    ログファイルの最新の索引を返す。ファイルが存在しない場合は None。
+    返り値はキャッシュ内部のオブジェクトなので、呼び出し側で変更しないこと。
+    読み込み・デコードに失敗した場合は例外をそのまま送出する。
+    """
+    if not file_path:
+        return None
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+
+    cache_key = os.path.abspath(file_path)
+    with _cache_lock:
+        prev = _cache.get(cache_key)
+        if prev is not None and prev.file_key == _file_key(st):
+            _cache.move_to_end(cache_key)
+            return prev
+
+        if prev is not None and _is_append_of(prev, file_path, st):
+            entry = _extend(prev, file_path, st)
+        else:
+            entry = _build_full(file_path, st)
+
+        _cache[cache_key] = entry
+        _cache.move_to_end(cache_key)
+        _evict_if_needed()
+        return entry
+
+
+def load_messages(file_path: str) -> List[Dict[str, str]]:
+    """
+    ログファイルをパースしたメッセージ一覧を返す（utils.load_chat_log の実体）。
+    呼び出し側がメッセージ辞書を書き換えてもキャッシュが汚れないよう、浅いコピーを返す。
+    """
+    entry = get_index(file_path)
+    if entry is None:
+        return []
+    return [dict(msg) for msg in entry.messages]
+
+
+def invalidate(file_path: Optional[str] = None) -> None:
+    """指定したログ（省略時は全て）のキャッシュを破棄する。ログを上書きした後に呼ぶ。"""
+    with _cache_lock:
+        if file_path is None:
+            _cache.clear()
+        else:
+            _cache.pop(os.path.abspath(file_path), None)
@@ -0,0 +1,126 @@
+# client_pool.py
+"""
+チャットモデル・APIクライアントのプール
+
+LLMFactory.create_chat_model や genai.Client(...) は呼び出しのたびに新しいインスタンスを作っていたため、
+意図分類・情景描写・夢・要約などの内部処理ごとにクライアントの初期化と HTTP 接続の確立をやり直し、
+ローカルモデル（GGUF）は毎回ロードし直していた。
+
+(種類, APIキーの指紋, 生成パラメータ) をキーにインスタンスを保持し、同じ組み合わせでは使い回す。
+- 件数は constants.CLIENT_POOL_SIZE までで、最も長く使われていないものから破棄する
+- APIキーが枯渇・削除・変更された場合は evict_api_key でそのキーのインスタンスをまとめて破棄する
+- 同じキーの生成は1スレッドだけが行い、他のスレッドは完成を待って同じインスタンスを受け取る
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import constants
+
+_pool: "OrderedDict[Tuple[str, str, str], Any]" = OrderedDict()
+_creating: Dict[Tuple[str, str, str], threading.Lock] = {}
+_lock = threading.Lock()
+
+
+def _fingerprint(api_key: Optional[str]) -> str:
+    # プールのキーにAPIキーそのものは保持しない
+    if not api_key:
+        return ""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+def _freeze(params: Any) -> str:
+    return json.dumps(params, sort_keys=True, ensure_ascii=False, default=repr)
+
+
+def get_or_create(kind: str, api_key: Optional[str], params: Any, factory: Callable[[], Any]) -> Any:
+    """
+    プール済みのインスタンスを返す。無ければ factory() で生成してプールに加える。
+
+    Args:
+        kind: インスタンスの種類（"gemini_chat", "openai_chat", "genai_client" など）
+        api_key: 使用するAPIキー（キーごとの破棄に使う。不要なら None）
+        params: APIキー以外の生成パラメータ（JSONにできる値。できない値は repr で比較する）
+        factory: インスタンスを生成する関数（例外は送出され、プールには加えない）
+    """
+    key = (kind, _fingerprint(api_key), _freeze(params))
+    with _lock:
+        instance = _pool.get(key)
+        if instance is not None:
+            _pool.move_to_end(key)
+            return instance
+        creating = _creating.setdefault(key, threading.Lock())
+
+    # 同じキーの二重生成（ローカルモデルの二重ロードなど）を防ぐ
+    with creating:
+        with _lock:
+            instance = _pool.get(key)
+            if instance is not None:
+                _pool.move_to_end(key)
+                return instance
+        try:
+            instance = factory()
+        finally:
+            with _lock:
+                _creating.pop(key, None)
+        with _lock:
+            _pool[key] = instance
+            while len(_pool) > constants.CLIENT_POOL_SIZE:
+                _pool.popitem(last=False)
+    return instance
+
+
+def get_genai_client(api_key: str):
+    """APIキーごとに genai.Client を使い回す（HTTP 接続も再利用される）"""
+    from google import genai
+    return get_or_create("genai_client", api_key, None, lambda: genai.Client(api_key=api_key))
+
+
+def evict_api_key(api_key: Optional[str]) -> int:
+    """指定したAPIキーで生成したインスタンスをすべて破棄し、破棄した件数を返す"""
+    fingerprint = _fingerprint(api_key)
+    if not fingerprint:
+        return 0
+    with _lock:
+        keys = [key for key in _pool if key[1] == fingerprint]
+        for key in keys:
+            del _pool[key]
+    return len(keys)
+
+
+def clear():
+    """プールを空にする"""
+    with _lock:
+        _pool.clear()
+
+
+class SerializedClient:
+    """
+    スレッドセーフでないクライアント（llama.cpp のモデルなど）を共有するためのラッパー。
+    生成呼び出しを1つずつ実行し、ストリーミングの場合は最後まで読み終えるまで他の呼び出しを待たせる。
+    """
+
+    def __init__(self, client: Any, methods: Tuple[str, ...]):
+        self._client = client
+        self._methods = methods
+        self._call_lock = threading.Lock()
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._client, name)
+        if name not in self._methods or not callable(attr):
+            return attr
+
+        def _serialized(*args, **kwargs):
+            if kwargs.get("stream"):
+                return self._stream(attr, args, kwargs)
+            with self._call_lock:
+                return attr(*args, **kwargs)
+
+        return _serialized
+
+    def _stream(self, method, args, kwargs):
+        with self._call_lock:
+            yield from method(*args, **kwargs)
@@ -7,8 +7,12 @@ from typing import Any, List, Dict, Tuple, Optional
 import time 
 import shutil 
 import datetime 
+import threading
+import copy
 
 import constants
+import room_manager
+import client_pool
 
 # --- グローバル変数 ---
 CONFIG_GLOBAL = {}
@@ -104,17 +108,72 @@ def _restore_from_backup() -> bool:
         print(f"!!! エラー: バックアップからの復元に失敗しました: {e}")
         return False
 
+# --- config.json のスナップショット ---
+# (パス, inode, mtime_ns, サイズ) をキーに、config.json のテキストと解析結果をまとめて保持する。
+# 差し替えはタプルの代入1回で行うため、読み手が書き込み途中の状態を見ることはない。
+_config_file_snapshot: Optional[Tuple[tuple, str, dict]] = None
+# load_config() が最後にグローバル変数へ反映した時点の config.json の署名
+_loaded_config_signature: Optional[tuple] = None
+_config_load_lock = threading.RLock()
+_config_write_lock = threading.Lock()
+
+
+def _config_file_signature() -> Optional[tuple]:
+    try:
+        st = os.stat(constants.CONFIG_FILE)
+    except OSError:
+        return None
+    return (os.path.abspath(constants.CONFIG_FILE), st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _read_config_snapshot() -> Optional[Tuple[tuple, str, dict]]:
+    """
+    config.json の (署名, テキスト, 解析結果) を返す。ファイルが前回と変わっていなければ読み込まない。
+    ファイルが無い場合は None、空や破損している場合は例外を送出する。
+    """
+    global _config_file_snapshot
+    # 署名は読み込みより先に取る（読み込み中に差し替えられても、次回の呼び出しで読み直される）
+    signature = _config_file_signature()
+    if signature is None:
+        return None
+    snapshot = _config_file_snapshot
+    if snapshot is not None and snapshot[0] == signature:
+        return snapshot
+
+    with open(constants.CONFIG_FILE, "r", encoding="utf-8") as f:
+        content = f.read()
+    if not content.strip(): # 空ファイルの場合
+        raise json.JSONDecodeError("File is empty", "", 0)
+    snapshot = (signature, content, json.loads(content))
+    _config_file_snapshot = snapshot
+    return snapshot
+
+
+def get_config_snapshot() -> dict:
+    """
+    設定を参照するだけの呼び出し向けに、config.json の解析済みの内容をコピーせずに返す。
+    戻り値は共有されているため変更しないこと（変更して保存する場合は load_config_file を使う）。
+    """
+    try:
+        snapshot = _read_config_snapshot()
+        if snapshot is not None:
+            return snapshot[2]
+    except (json.JSONDecodeError, IOError):
+        pass
+    # 破損している場合は、バックアップからの復元を含む通常の読み込みに任せる
+    return load_config_file()
+
+
 def load_config_file() -> dict:
     """
     config.jsonを安全に読み込む。ファイルが破損している場合はバックアップから自動復元を試みる。
+    ファイルが前回から変わっていなければ、保持しているテキストから新しい辞書を作って返す（呼び出し側で変更してよい）。
     """
     if os.path.exists(constants.CONFIG_FILE):
         try:
-            with open(constants.CONFIG_FILE, "r", encoding="utf-8") as f:
-                content = f.read()
-            if not content.strip(): # 空ファイルの場合
-                raise json.JSONDecodeError("File is empty", "", 0)
-            return json.loads(content)
+            snapshot = _read_config_snapshot()
+            if snapshot is not None:
+                return json.loads(snapshot[1])
         except (json.JSONDecodeError, IOError):
             print("警告: config.jsonが空または破損しています。バックアップからの復元を試みます...")
             if _restore_from_backup():
@@ -139,12 +198,16 @@ def _save_config_file(config_data: dict):
     temp_file_path = constants.CONFIG_FILE + ".tmp"
     max_retries = 5
     retry_delay = 0.1
+    content = json.dumps(config_data, indent=2, ensure_ascii=False)
 
     for attempt in range(max_retries):
         try:
-            with open(temp_file_path, "w", encoding="utf-8") as f:
-                json.dump(config_data, f, indent=2, ensure_ascii=False)
-            os.replace(temp_file_path, constants.CONFIG_FILE)
+            with _config_write_lock:
+                with open(temp_file_path, "w", encoding="utf-8") as f:
+                    f.write(content)
+                os.replace(temp_file_path, constants.CONFIG_FILE)
+                # 書き込んだ内容を新しいスナップショットとして公開する（次の読み込みでファイルを読み直さない）
+                _publish_config_snapshot(content)
             return
         except PermissionError as e:
             if attempt < max_retries - 1:
@@ -166,6 +229,13 @@ def _save_config_file(config_data: dict):
             return
 
 
+def _publish_config_snapshot(content: str):
+    global _config_file_snapshot
+    signature = _config_file_signature()
+    if signature is not None:
+        _config_file_snapshot = (signature, content, json.loads(content))
+
+
 def save_zhipu_models(models: list[str]) -> bool:
     """
     Zhipu AIの利用可能モデルリストを保存する。
@@ -238,14 +308,19 @@ def add_or_update_gemini_key(key_name: str, key_value: str):
     if len(existing_keys) == 1 and "your_key_name" in existing_keys:
         del existing_keys["your_key_name"]
 
+    old_value = config["gemini_api_keys"].get(key_name)
     config["gemini_api_keys"][key_name] = key_value
     _save_config_file(config)
+    if old_value and old_value != key_value:
+        # 古いキーで生成したクライアントは使わないので破棄する
+        client_pool.evict_api_key(old_value)
     GEMINI_API_KEYS = config["gemini_api_keys"]
 
 def delete_gemini_key(key_name: str):
     global GEMINI_API_KEYS
     config = load_config_file()
     if "gemini_api_keys" in config and isinstance(config.get("gemini_api_keys"), dict) and key_name in config["gemini_api_keys"]:
+        client_pool.evict_api_key(config["gemini_api_keys"][key_name])
         del config["gemini_api_keys"][key_name]
 
         if not config["gemini_api_keys"]:
@@ -564,6 +639,21 @@ def _get_default_config() -> dict:
 
 # --- メインの読み込み関数 (真・最終版) ---
 def load_config():
+    """
+    config.json を読み込み、グローバル変数に反映する。
+    前回反映した時点から config.json が変わっていなければ何もしない（LLMFactory などから毎回呼ばれるため）。
+    """
+    global _loaded_config_signature
+    with _config_load_lock:
+        signature = _config_file_signature()
+        if signature is not None and signature == _loaded_config_signature:
+            return
+        _reload_config()
+        # ステップ7で保存した場合も含め、反映した内容の署名を記録する
+        _loaded_config_signature = _config_file_signature()
+
+
+def _reload_config():
     global CONFIG_GLOBAL, GEMINI_API_KEYS, TAVILY_API_KEY, initial_api_key_name_global, initial_room_global, initial_model_global
     global initial_send_thoughts_to_api_global, initial_api_history_limit_option_global, initial_alarm_api_history_turns_global
     global AVAILABLE_MODELS_GLOBAL, DEFAULT_MODEL_GLOBAL, initial_streaming_speed_global
@@ -971,9 +1061,9 @@ def get_effective_settings(room_name: str, **kwargs) -> dict:
     room_provider = None  # ルーム個別プロバイダ設定（Noneは共通設定に従う）
     if os.path.exists(room_config_path):
         try:
-            with open(room_config_path, "r", encoding="utf-8") as f:
-                room_config = json.load(f)
-            override_settings = room_config.get("override_settings", {})
+            room_config = room_manager.get_room_config_snapshot(room_name) or {}
+            # 下の openai_settings への APIキー注入でキャッシュを書き換えないよう、コピーして使う
+            override_settings = copy.deepcopy(room_config.get("override_settings", {}))
             for k, v in override_settings.items():
                 # model_name は後で別ロジックで処理するので、ここでは読み込まない
                 # providerとopenai_settingsはUI表示用にそのまま含める
@@ -1103,7 +1193,7 @@ def get_latest_api_key_name_from_config() -> Optional[str]:
     config.jsonを直接読み込み、最後に選択された有効なAPIキー名を返す。
     UIの状態に依存しないため、バックグラウンドスレッドから安全に呼び出せる。
     """
-    config = load_config_file()
+    config = get_config_snapshot()
     last_key_name = config.get("last_api_key_name")
 
     # 有効な（値が設定されている）APIキーのリストを取得
@@ -1139,8 +1229,7 @@ def get_active_gemini_api_key(room_name: str = None) -> Optional[str]:
         room_config_path = os.path.join(constants.ROOMS_DIR, room_name, "room_config.json")
         if os.path.exists(room_config_path):
             try:
-                with open(room_config_path, "r", encoding="utf-8") as f:
-                    room_config = json.load(f)
+                room_config = room_manager.get_room_config_snapshot(room_name) or {}
                 override_settings = room_config.get("override_settings", {})
                 
                 # 個別設定でのスイッチ確認 (Noneなら共通設定に従う)
@@ -1200,8 +1289,7 @@ def get_active_gemini_api_key_name(room_name: str = None) -> Optional[str]:
         room_config_path = os.path.join(constants.ROOMS_DIR, room_name, "room_config.json")
         if os.path.exists(room_config_path):
             try:
-                with open(room_config_path, "r", encoding="utf-8") as f:
-                    room_config = json.load(f)
+                room_config = room_manager.get_room_config_snapshot(room_name) or {}
                 override_settings = room_config.get("override_settings", {})
                 
                 # 個別設定でのスイッチ確認
@@ -1276,7 +1364,7 @@ def get_current_global_model() -> str:
     有効なグローバルモデル名を返す。
     """
     # 常に最新の設定をファイルから読み込む
-    config = load_config_file()
+    config = get_config_snapshot()
     
     # last_modelキーが存在し、かつ利用可能モデルリストに含まれていればそれを優先
     last_model = config.get("last_model")
@@ -1299,8 +1387,7 @@ def get_active_provider(room_name: str = None) -> str:
         room_config_path = os.path.join(constants.ROOMS_DIR, room_name, "room_config.json")
         if os.path.exists(room_config_path):
             try:
-                with open(room_config_path, "r", encoding="utf-8") as f:
-                    room_config = json.load(f)
+                room_config = room_manager.get_room_config_snapshot(room_name) or {}
                 override_settings = room_config.get("override_settings", {})
                 room_provider = override_settings.get("provider")
                 # ルーム個別にプロバイダが設定されている場合はそれを使用
@@ -1392,8 +1479,7 @@ def is_tool_use_enabled(room_name: str = None) -> bool:
         room_config_path = os.path.join(constants.ROOMS_DIR, room_name, "room_config.json")
         if os.path.exists(room_config_path):
             try:
-                with open(room_config_path, "r", encoding="utf-8") as f:
-                    room_config = json.load(f)
+                room_config = room_manager.get_room_config_snapshot(room_name) or {}
                 override_settings = room_config.get("override_settings", {})
                 room_openai_settings = override_settings.get("openai_settings", {})
                 # ルーム個別のtool_use_enabledが明示的に設定されている場合はそれを使用
@@ -1527,6 +1613,8 @@ def mark_key_as_exhausted(key_name: str):
         'exhausted_at': time.time()
     }
     print(f"--- [API Key Rotation] Key '{key_name}' marked as EXHAUSTED ---")
+    # ローテーションで別のキーに切り替わるため、枯渇したキーのクライアントはプールから外す
+    client_pool.evict_api_key(GEMINI_API_KEYS.get(key_name))
 
 def is_key_exhausted(key_name: str) -> bool:
     """
@@ -1563,7 +1651,7 @@ def get_next_available_gemini_key(current_exhausted_key: str = None, excluded_ke
     if excluded_keys is None:
         excluded_keys = set()
         
-    config = load_config_file()
+    config = get_config_snapshot()
     valid_keys = [
         k for k, v in GEMINI_API_KEYS.items()
         if v and isinstance(v, str) and not v.startswith("YOUR_API_KEY")
@@ -26,9 +26,34 @@ UI_HISTORY_MAX_LIMIT = 200
 API_HISTORY_LIMIT_OPTIONS = {"today": "本日分", "1": "1往復", "3": "3往復", "5": "5往復", "10": "10往復", "20": "20往復", "30": "30往復", "40": "40往復", "50": "50往復", "60": "60往復", "70": "70往復", "80": "80往復", "90": "90往復", "100": "100往復", "all": "全ログ"}
 DEFAULT_API_HISTORY_LIMIT_OPTION = "20"
 DEFAULT_ALARM_API_HISTORY_TURNS = 10
+# チャット表示用に描画済みのメッセージを保存するキャッシュ（ルームごとの cache/html_cache.json）の最大件数
+HTML_CACHE_MAX_ENTRIES = 3000
+# タイプライター表示の最短フレーム間隔（秒）。1フレームで複数文字をまとめて送る
+TYPEWRITER_FRAME_INTERVAL = 1 / 30
+# JSON状態ファイル（json_state_store.py）への書き込みをまとめて保存するまでの待ち時間（秒）
+JSON_STATE_FLUSH_DELAY = 0.5
 
 # --- 自律行動設定 ---
 MIN_AUTONOMOUS_INTERVAL_MINUTES = 120  # 自律行動の最小実行間隔（分）
+# 睡眠時記憶整理（sleep_consolidation.py）
+SLEEP_CONSOLIDATION_WORKERS = 2  # 同時に記憶整理を行うルーム数
+SLEEP_CONSOLIDATION_STAGES_PER_MINUTE = 4  # APIキーごとに1分あたりに開始できる整理ステージ数
+SLEEP_CONSOLIDATION_STAGE_BURST = 2  # 上記の制限の範囲で、連続して開始できるステージ数
+SLEEP_CONSOLIDATION_MAX_ATTEMPTS = 2  # 失敗したステージを同じ日に試行する最大回数
+
+# エンティティ記憶の目録（entity_memory_manager.py）が、ディレクトリに変化が無くても各ファイルを確認し直す間隔（秒）
+ENTITY_CATALOG_RESCAN_SECONDS = 60
+
+# --- ウォッチリスト取得設定（watchlist_fetcher.py） ---
+WATCHLIST_FETCH_CONCURRENCY = 8  # 同時に取得するURL数
+WATCHLIST_PER_HOST_CONCURRENCY = 2  # 同じホストへの同時接続数
+WATCHLIST_PER_HOST_INTERVAL = 1.0  # 同じホストへのリクエストの最短間隔（秒）
+
+# --- 音声合成設定（audio_manager.py） ---
+TTS_CACHE_DIR_NAME = "audio_cache"  # ルームフォルダ内の音声の保存先（テキスト・声・スタイル・モデルのハッシュをファイル名にする）
+TTS_CACHE_MAX_BYTES = 200 * 1024 * 1024  # ルームごとのキャッシュの上限サイズ。超えたら古く使われていないものから削除（キャッシュのファイル名のものだけ）
+TTS_SEGMENT_CHARS = 300  # 1回の音声合成リクエストに含める最大文字数（文単位で区切る）
+TTS_SYNTH_CONCURRENCY = 3  # 同時に合成するセグメント数
 
 # --- 「本日分」ログ設定 ---
 MIN_TODAY_LOG_FALLBACK_TURNS = 5  # エピソード記憶作成後の最低表示・送信往復数
@@ -38,6 +63,28 @@ INTERNAL_PROCESSING_MODEL = "gemini-2.5-flash-lite"
 SUMMARIZATION_MODEL = "gemini-2.5-flash"          # 高品質（要約、文章生成など）
 EMBEDDING_MODEL = "gemini-embedding-001"
 SUPERVISOR_MODEL = "gemma-3-12b-it"
+# 生成済みのチャットモデル・APIクライアントを使い回す件数の上限（client_pool.py）
+CLIENT_POOL_SIZE = 16
+
+# --- エンベディングのスループット制御（embedding_scheduler.py） ---
+EMBEDDING_BATCH_MAX_TOKENS = 8000        # 1リクエストに含めるテキストの推定トークン数の合計
+EMBEDDING_BATCH_MAX_ITEMS = 100          # 1リクエストに含めるテキストの最大件数
+EMBEDDING_MAX_CONCURRENCY = 8            # 1回のベクトル化で同時に送るリクエスト数
+EMBEDDING_PER_KEY_CONCURRENCY = 2        # 1つのAPIキーで同時に処理中にできるリクエスト数
+EMBEDDING_KEY_INITIAL_RPM = 30           # APIキーごとの送信レートの初期値（1分あたりのリクエスト数）
+EMBEDDING_KEY_MIN_RPM = 2                # 送信レートの下限
+EMBEDDING_KEY_MAX_RPM = 150              # 送信レートの上限
+EMBEDDING_AIMD_INCREASE_RPM = 5          # 成功するたびに上げる送信レート
+EMBEDDING_AIMD_DECREASE_FACTOR = 0.5     # 429を受けたときに送信レートに掛ける係数
+EMBEDDING_AIMD_SLOW_FACTOR = 0.8         # 応答が遅かったときに送信レートに掛ける係数
+EMBEDDING_LATENCY_TARGET_SECONDS = 10    # これより応答が遅ければ混雑とみなす（秒）
+EMBEDDING_KEY_MAX_CONSECUTIVE_429 = 3    # 429がこの回数続いたキーは枯渇扱いにする
+EMBEDDING_MAX_ATTEMPTS = 6               # 1リクエストの最大試行回数（キーを替えての再送を含む）
+EMBEDDING_INDEX_BATCH_DOCS = 200         # APIモードの索引作成で、1回にまとめてベクトル化するチャンク数
+# 検索用インデックスのキャッシュ（rag_manager.py）に保持する合計サイズの上限（バイト）。超えたら古く使われていないものから破棄
+RAG_INDEX_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# 検索用に共有する RAGManager（rag_manager.get_manager）を保持するルーム・モデルの組の数
+RAG_MANAGER_REGISTRY_SIZE = 16
 
 # --- Intent-Aware Retrieval設定 (2026-01-15) ---
 # クエリ意図に応じた複合スコアリングの重み
@@ -51,6 +98,10 @@ INTENT_WEIGHTS = {
 }
 DEFAULT_INTENT = "factual"  # Intent分類失敗時のデフォルト
 TIME_DECAY_RATE = 0.05  # 時間減衰率（約14日で半減）
+# ローカル意図分類器（intent_classifier.py）の確信度がこれ未満ならLLMで分類する
+INTENT_CLASSIFIER_MIN_CONFIDENCE = 0.7
+# LLMの分類記録がこの件数に達するまでは、ローカル分類器を使わずLLMで分類して記録を集める
+INTENT_CLASSIFIER_MIN_RECORDS = 50
 
 # --- 自動会話要約設定 ---
 AUTO_SUMMARY_DEFAULT_THRESHOLD = 20000  # デフォルト閾値（文字数）
@@ -176,6 +227,18 @@ EPISODIC_MONTHLY_COMPRESSION_WEEKS = 4  # 4週経過後に月次圧縮
 EPISODIC_WEEKLY_BUDGET = 600            # 週次圧縮の目標文字数
 EPISODIC_MONTHLY_BUDGET = 800           # 月次圧縮の目標文字数
 
+# --- エピソード記憶ストレージ設定 ---
+# 月次ジャーナル（YYYY-MM.jsonl）がこの行数に達したらスナップショット（YYYY-MM.json）へ畳み込む
+EPISODIC_JOURNAL_COMPACTION_THRESHOLD = 50
+
+# --- 日次エピソード要約設定（episode_summarizer.py） ---
+EPISODIC_SUMMARY_CONCURRENCY = 3           # 同時に実行する要約リクエスト数
+EPISODIC_SUMMARY_REQUESTS_PER_MINUTE = 10  # APIキーごとに1分あたりに開始できる要約リクエスト数
+EPISODIC_SUMMARY_BURST = 3                 # 上記の制限の範囲で、連続して開始できるリクエスト数
+EPISODIC_BATCH_DAY_MAX_CHARS = 3000        # この文字数以下の日だけを、複数日まとめて要約する
+EPISODIC_BATCH_MAX_CHARS = 12000           # 1リクエストにまとめる会話ログの合計文字数
+EPISODIC_BATCH_MAX_DAYS = 7                # 1リクエストにまとめる最大日数
+
 # --- Zhipu AI Models ---
 ZHIPU_MODELS = [
     "glm-4.7-flash",
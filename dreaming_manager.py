@@ -159,7 +159,7 @@ class DreamingManager:
             return f"クエリ生成に失敗しました: {e}"
 
         # 4. RAG検索
-        rag = rag_manager.RAGManager(self.room_name, self.api_key)
+        rag = rag_manager.get_manager(self.room_name, self.api_key)
         search_results = rag.search(search_query, k=5)
         
         if not search_results:
@@ -417,7 +417,7 @@ class DreamingManager:
                 if candidates:
                     print(f"  - [Shadow] {len(candidates)}件のエンティティ候補を抽出しました")
                     # 各候補に関連する記憶を検索して付与
-                    rag = rag_manager.RAGManager(self.room_name, self.api_key)
+                    rag = rag_manager.get_manager(self.room_name, self.api_key)
                     for candidate in candidates:
                         related_memories = rag.search(candidate.get("name", ""), k=3)
                         candidate["related_context"] = [doc.page_content for doc in related_memories]
@@ -0,0 +1,205 @@
+# embedding_cache.py
+"""
+エンベディング永続キャッシュ
+
+RAG索引の作成・再構築時に、同じチャンクテキストを何度もベクトル化しないためのキャッシュ。
+キーは「エンベディングモデルID + 正規化したチャンクテキスト」の sha256。
+ベクトルは float32 の生配列ファイルに追記し、読み出しは numpy.memmap で行う。
+
+保存形式（モデルIDごとのサブディレクトリ）:
+  - meta.json    : {"model_id": ..., "dim": ...}
+  - keys.bin     : 32バイトのダイジェストを行順に連結したもの（追記専用）
+  - vectors.f32  : dim 個の float32 を行順に連結したもの（追記専用）
+
+ベクトル → キーの順で書き込むため、keys.bin に現れた行は必ず vectors.f32 に存在する。
+"""
+
+import hashlib
+import json
+import os
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from file_lock_utils import get_file_lock
+
+DIGEST_SIZE = 32
+
+# プロセス内で共有するキャッシュ {絶対パス: EmbeddingCache}
+_caches: Dict[str, "EmbeddingCache"] = {}
+_caches_lock = threading.Lock()
+
+
+def normalize_text(text: str) -> str:
+    """キャッシュキー用にチャンクテキストを正規化する（NFC・改行統一・前後空白除去）"""
+    text = unicodedata.normalize("NFC", text)
+    return text.replace("\r\n", "\n").replace("\r", "\n").strip()
+
+
+def make_key(model_id: str, text: str) -> bytes:
+    """モデルIDとチャンクテキストからキャッシュキー（sha256ダイジェスト）を作る"""
+    return hashlib.sha256(f"{model_id}\n{normalize_text(text)}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """1つのエンベディングモデルに対応する永続キャッシュ"""
+
+    def __init__(self, cache_dir: Path, model_id: str):
+        self.cache_dir = Path(cache_dir)
+        self.model_id = model_id
+        self.meta_path = self.cache_dir / "meta.json"
+        self.keys_path = self.cache_dir / "keys.bin"
+        self.vectors_path = self.cache_dir / "vectors.f32"
+        self.dim: Optional[int] = None
+        self._rows: Dict[bytes, int] = {}
+        self._keys_read_bytes = 0
+        self._vectors: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def for_model(cls, root_dir: Path, model_id: str) -> "EmbeddingCache":
+        """モデルIDごとのキャッシュをプロセス内で共有して返す"""
+        model_dir = Path(root_dir) / hashlib.sha256(model_id.encode("utf-8")).hexdigest()[:16]
+        key = str(model_dir.resolve())
+        with _caches_lock:
+            cache = _caches.get(key)
+            if cache is None:
+                cache = cls(model_dir, model_id)
+                _caches[key] = cache
+            return cache
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._sync()
+            return len(self._rows)
+
+    def _sync(self):
+        """他プロセス・他インスタンスが追記したキーを取り込む（ロック保持中に呼ぶ）"""
+        if self.dim is None:
+            if not self.meta_path.exists():
+                return
+            try:
+                with open(self.meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                return
+            if meta.get("model_id") != self.model_id:
+                return
+            self.dim = int(meta["dim"])
+
+        if not self.keys_path.exists():
+            return
+        keys_size = self.keys_path.stat().st_size
+        if keys_size < self._keys_read_bytes:
+            # 外部で削除・作り直しされた
+            self._rows.clear()
+            self._keys_read_bytes = 0
+            self._vectors = None
+        if keys_size - self._keys_read_bytes < DIGEST_SIZE:
+            return
+
+        vector_rows = self.vectors_path.stat().st_size // (self.dim * 4) if self.vectors_path.exists() else 0
+        with open(self.keys_path, "rb") as f:
+            f.seek(self._keys_read_bytes)
+            data = f.read(keys_size - self._keys_read_bytes)
+        row = self._keys_read_bytes // DIGEST_SIZE
+        usable = len(data) - len(data) % DIGEST_SIZE
+        for pos in range(0, usable, DIGEST_SIZE):
+            if row >= vector_rows:
+                # ベクトルが欠けている行（書き込み中断など）は採用しない
+                usable = pos
+                break
+            self._rows.setdefault(data[pos:pos + DIGEST_SIZE], row)
+            row += 1
+        self._keys_read_bytes += usable
+
+    def _vector_at(self, row: int) -> np.ndarray:
+        if self._vectors is None or row >= self._vectors.shape[0]:
+            total_rows = self.vectors_path.stat().st_size // (self.dim * 4)
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(total_rows, self.dim))
+        return self._vectors[row]
+
+    def get_many(self, keys: List[bytes]) -> List[Optional[List[float]]]:
+        """キーに対応するベクトルを返す（未登録は None）"""
+        results: List[Optional[List[float]]] = []
+        with self._lock:
+            self._sync()
+            for key in keys:
+                row = self._rows.get(key)
+                if row is None:
+                    results.append(None)
+                    self.misses += 1
+                else:
+                    results.append(self._vector_at(row).tolist())
+                    self.hits += 1
+        return results
+
+    def put_many(self, keys: List[bytes], vectors: List[List[float]]):
+        """ベクトルを追記する（既に登録済みのキーは無視）"""
+        if not keys:
+            return
+        array = np.asarray(vectors, dtype=np.float32)
+        if array.ndim != 2 or array.shape[0] != len(keys):
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock, get_file_lock(str(self.keys_path)):
+            self._sync()
+            if self.dim is None:
+                self.dim = int(array.shape[1])
+                with open(self.meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"model_id": self.model_id, "dim": self.dim}, f, ensure_ascii=False)
+            if array.shape[1] != self.dim:
+                return
+
+            new_keys, new_rows, seen = [], [], set()
+            for key, vec in zip(keys, array):
+                if key in self._rows or key in seen:
+                    continue
+                seen.add(key)
+                new_keys.append(key)
+                new_rows.append(vec)
+            if not new_keys:
+                return
+
+            # 途中で中断された書き込みの端数を切り詰めてから追記する
+            start_row = self._keys_read_bytes // DIGEST_SIZE
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(start_row * self.dim * 4)
+                f.write(np.ascontiguousarray(new_rows, dtype=np.float32).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.keys_path, "ab") as f:
+                f.truncate(self._keys_read_bytes)
+                f.write(b"".join(new_keys))
+            self._sync()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    既存のエンベディングをラップし、embed_documents の前にキャッシュを参照する。
+    クエリはタスク種別が異なる場合があるため、キャッシュせずにそのまま委譲する。
+    """
+
+    def __init__(self, base: Embeddings, cache: EmbeddingCache):
+        self.base = base
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [make_key(self.cache.model_id, text) for text in texts]
+        results = self.cache.get_many(keys)
+        missing = [i for i, vec in enumerate(results) if vec is None]
+        if missing:
+            computed = self.base.embed_documents([texts[i] for i in missing])
+            for i, vec in zip(missing, computed):
+                results[i] = list(vec)
+            self.cache.put_many([keys[i] for i in missing], [results[i] for i in missing])
+        return results
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.base.embed_query(text)
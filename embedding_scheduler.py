@@ -0,0 +1,279 @@
+# embedding_scheduler.py
+"""
+Gemini エンベディングのスループット制御
+
+RAGManager の索引作成は、20チャンクずつのバッチを1つのAPIキーで順番にベクトル化し、
+成功するたびに無条件で2秒待っていた。キーは429で失敗したときにしか切り替えないため、
+複数のキーがあっても全体の再構築はほぼ待ち時間だけで決まっていた。
+
+- ベクトル化するテキストは、推定トークン数（constants.EMBEDDING_BATCH_MAX_TOKENS）と
+  件数（constants.EMBEDDING_BATCH_MAX_ITEMS）の範囲でリクエスト単位にまとめる
+- リクエストは GEMINI_API_KEYS のうち枯渇していない全キーに並行して割り振る
+- キーごとの送信レート（1分あたりのリクエスト数）は AIMD で調整する。成功するたびに少しずつ上げ、
+  429 や応答の遅延を検知したら大きく下げる。429 が続いたキーは config_manager で枯渇扱いにする
+- スケジューラはプロセス内で1つだけ持ち、同時に動く複数のRAG処理（ルーム）が同じキーのレートを共有する
+"""
+
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+
+from langchain_core.embeddings import Embeddings
+
+import constants
+import config_manager
+
+_RATE_LIMIT_MARKERS = ("429", "ResourceExhausted", "RESOURCE_EXHAUSTED")
+_TRANSIENT_MARKERS = ("500", "502", "503", "504", "UNAVAILABLE", "deadline exceeded", "DEADLINE_EXCEEDED")
+
+
+class EmbeddingQuotaExhausted(Exception):
+    """利用できるAPIキーが残っていない（全キーが枯渇している）"""
+
+    def __init__(self, message: str = "429 ResourceExhausted: 利用可能なAPIキーがありません"):
+        super().__init__(message)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    テキストのトークン数の概算。
+    日本語は概ね1文字1トークン前後、英数字は4文字程度で1トークンになるため、多めに見積もる。
+    """
+    ascii_count = sum(1 for ch in text if ord(ch) < 128)
+    return (len(text) - ascii_count) + (ascii_count + 3) // 4
+
+
+def make_batches(texts: Sequence[str], max_tokens: Optional[int] = None,
+                 max_items: Optional[int] = None) -> List[List[int]]:
+    """テキストの添字を、推定トークン数と件数の上限に収まるリクエスト単位にまとめる"""
+    max_tokens = constants.EMBEDDING_BATCH_MAX_TOKENS if max_tokens is None else max_tokens
+    max_items = constants.EMBEDDING_BATCH_MAX_ITEMS if max_items is None else max_items
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    error_str = str(error)
+    return any(marker in error_str for marker in _RATE_LIMIT_MARKERS)
+
+
+def _is_transient_error(error: Exception) -> bool:
+    error_str = str(error)
+    return any(marker in error_str for marker in _TRANSIENT_MARKERS)
+
+
+def _retry_delay(error: Exception) -> Optional[float]:
+    match = re.search(r"retry_delay {\s*seconds: (\d+)", str(error))
+    return float(match.group(1)) if match else None
+
+
+def _key_name(api_key: str) -> str:
+    """キーの設定名。設定に登録されていないキー（直接渡されたキーなど）は末尾から仮の名前を作る"""
+    name = config_manager.get_key_name_by_value(api_key)
+    return name if name != "Unknown" else f"__direct__{api_key[-6:]}"
+
+
+def _default_client_factory(api_key: str, task_type: str) -> Embeddings:
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    return GoogleGenerativeAIEmbeddings(
+        model=constants.EMBEDDING_MODEL,
+        google_api_key=api_key,
+        task_type=task_type
+    )
+
+
+class _KeyLane:
+    """1つのAPIキーの送信状況と、AIMD で調整する送信レート"""
+
+    def __init__(self, name: str, api_key: str):
+        self.name = name
+        self.api_key = api_key
+        self.rate_per_minute = float(constants.EMBEDDING_KEY_INITIAL_RPM)
+        self.next_at = 0.0
+        self.in_flight = 0
+        self.consecutive_rate_limits = 0
+        self.clients: Dict[str, Embeddings] = {}
+
+
+class EmbeddingScheduler:
+    """全APIキーにエンベディングのリクエストを割り振る（プロセス内で共有）"""
+
+    def __init__(self, client_factory: Callable[[str, str], Embeddings] = _default_client_factory,
+                 clock: Callable[[], float] = time.monotonic):
+        self._client_factory = client_factory
+        self._clock = clock
+        self._lanes: Dict[str, _KeyLane] = {}
+        self._cond = threading.Condition()
+
+    # --- キーの選択 ---
+
+    def _candidate_keys(self, api_key: str, use_all_keys: bool) -> Dict[str, str]:
+        """このリクエストで使ってよいキー {名前: 値}（枯渇中のキーは除く）"""
+        keys: Dict[str, str] = {}
+        if use_all_keys:
+            for name, value in config_manager.GEMINI_API_KEYS.items():
+                if value and isinstance(value, str) and not value.startswith("YOUR_API_KEY") \
+                        and not config_manager.is_key_exhausted(name):
+                    keys[name] = value
+        own_name = _key_name(api_key)
+        if api_key and not config_manager.is_key_exhausted(own_name):
+            keys.setdefault(own_name, api_key)
+        return keys
+
+    def _lane(self, name: str, api_key: str) -> _KeyLane:
+        lane = self._lanes.get(name)
+        if lane is None or lane.api_key != api_key:
+            lane = self._lanes[name] = _KeyLane(name, api_key)
+        return lane
+
+    def _acquire(self, api_key: str, use_all_keys: bool) -> _KeyLane:
+        """送信枠が空いている中で最も早く送れるキーを選び、その時刻まで待ってから枠を確保する"""
+        with self._cond:
+            while True:
+                keys = self._candidate_keys(api_key, use_all_keys)
+                if not keys:
+                    raise EmbeddingQuotaExhausted()
+                lanes = [self._lane(name, value) for name, value in keys.items()]
+                available = [lane for lane in lanes if lane.in_flight < constants.EMBEDDING_PER_KEY_CONCURRENCY]
+                if not available:
+                    self._cond.wait(1.0)
+                    continue
+                lane = min(available, key=lambda l: (l.next_at, l.in_flight))
+                now = self._clock()
+                if lane.next_at > now:
+                    self._cond.wait(min(lane.next_at - now, 1.0))
+                    continue
+                lane.next_at = now + 60.0 / lane.rate_per_minute
+                lane.in_flight += 1
+                return lane
+
+    def _release(self, lane: _KeyLane, latency: float = 0.0, error: Optional[Exception] = None) -> None:
+        """結果に応じてキーのレートを調整する（加算的に増やし、乗算的に減らす）"""
+        with self._cond:
+            lane.in_flight -= 1
+            now = self._clock()
+            if error is not None and is_rate_limit_error(error):
+                lane.rate_per_minute = max(constants.EMBEDDING_KEY_MIN_RPM,
+                                           lane.rate_per_minute * constants.EMBEDDING_AIMD_DECREASE_FACTOR)
+                delay = _retry_delay(error)
+                lane.next_at = max(lane.next_at, now + (delay if delay is not None else 60.0 / lane.rate_per_minute))
+                lane.consecutive_rate_limits += 1
+                if lane.consecutive_rate_limits >= constants.EMBEDDING_KEY_MAX_CONSECUTIVE_429:
+                    print(f"      [Embedding] キー '{lane.name}' で429が続いたため、枯渇扱いにします")
+                    config_manager.mark_key_as_exhausted(lane.name)
+                    lane.consecutive_rate_limits = 0
+            elif error is None:
+                lane.consecutive_rate_limits = 0
+                if latency > constants.EMBEDDING_LATENCY_TARGET_SECONDS:
+                    # 応答が遅いのは混雑の兆候なので、少し下げる
+                    lane.rate_per_minute = max(constants.EMBEDDING_KEY_MIN_RPM,
+                                               lane.rate_per_minute * constants.EMBEDDING_AIMD_SLOW_FACTOR)
+                else:
+                    lane.rate_per_minute = min(constants.EMBEDDING_KEY_MAX_RPM,
+                                               lane.rate_per_minute + constants.EMBEDDING_AIMD_INCREASE_RPM)
+            self._cond.notify_all()
+
+    # --- ベクトル化 ---
+
+    def _embed_batch(self, texts: List[str], api_key: str, use_all_keys: bool, task_type: str) -> List[List[float]]:
+        last_error: Optional[Exception] = None
+        for attempt in range(constants.EMBEDDING_MAX_ATTEMPTS):
+            lane = self._acquire(api_key, use_all_keys)
+            started = self._clock()
+            try:
+                client = lane.clients.get(task_type)
+                if client is None:
+                    client = lane.clients[task_type] = self._client_factory(lane.api_key, task_type)
+                vectors = client.embed_documents(texts)
+            except Exception as e:
+                self._release(lane, error=e)
+                last_error = e
+                if is_rate_limit_error(e):
+                    print(f"      [Embedding] API制限検知 (キー '{lane.name}', 試行 {attempt+1}): 他のキー・レートで再送します")
+                    continue
+                if _is_transient_error(e):
+                    wait_time = min(30, 2 ** attempt)
+                    print(f"      [Embedding] 一時的エラー (試行 {attempt+1}): {e} - {wait_time}秒後に再送します")
+                    time.sleep(wait_time)
+                    continue
+                raise
+            self._release(lane, latency=self._clock() - started)
+            return vectors
+        raise last_error
+
+    def embed_documents(self, texts: Sequence[str], api_key: str, use_all_keys: bool = True,
+                        task_type: str = "retrieval_document") -> List[List[float]]:
+        """テキストをベクトル化する。リクエストは使えるキーに並行して割り振り、結果は入力と同じ順で返す"""
+        texts = list(texts)
+        if not texts:
+            return []
+        batches = make_batches(texts)
+        results: List[Optional[List[float]]] = [None] * len(texts)
+
+        def run(indices: List[int]):
+            vectors = self._embed_batch([texts[i] for i in indices], api_key, use_all_keys, task_type)
+            for i, vec in zip(indices, vectors):
+                results[i] = list(vec)
+
+        if len(batches) == 1:
+            run(batches[0])
+            return results
+
+        workers = min(len(batches), constants.EMBEDDING_MAX_CONCURRENCY)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embedding") as executor:
+            # 1つでも失敗したら例外をそのまま呼び出し元へ送る（残りの結果は捨てる）
+            for future in [executor.submit(run, indices) for indices in batches]:
+                future.result()
+        return results
+
+    def embed_query(self, text: str, api_key: str, task_type: str = "retrieval_document") -> List[float]:
+        """検索クエリは待たせないよう、レート制御を通さずに指定のキーでベクトル化する"""
+        with self._cond:
+            lane = self._lane(_key_name(api_key), api_key)
+            client = lane.clients.get(task_type)
+            if client is None:
+                client = lane.clients[task_type] = self._client_factory(api_key, task_type)
+        return client.embed_query(text)
+
+
+_scheduler: Optional[EmbeddingScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> EmbeddingScheduler:
+    """プロセス内で共有するスケジューラを返す"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = EmbeddingScheduler()
+        return _scheduler
+
+
+class ScheduledEmbeddings(Embeddings):
+    """RAGManager から使う LangChain Embeddings。ベクトル化は共有スケジューラに任せる"""
+
+    def __init__(self, api_key: str, use_all_keys: bool = True, task_type: str = "retrieval_document",
+                 scheduler: Optional[EmbeddingScheduler] = None):
+        self.api_key = api_key
+        self.use_all_keys = use_all_keys
+        self.task_type = task_type
+        self.scheduler = scheduler or get_scheduler()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.scheduler.embed_documents(texts, self.api_key, self.use_all_keys, self.task_type)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.scheduler.embed_query(text, self.api_key, self.task_type)
@@ -2,11 +2,163 @@
 
 import os
 import json
+import threading
+import time
 from pathlib import Path
 from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 import constants
+import keyword_index
 from llm_factory import LLMFactory
 
+
+class _EntityCatalog:
+    """
+    ルームのエンティティ記憶の目録。
+    エンティティ名と本文（小文字化）をメモリ上に保持し、文字のユニグラム・バイグラム
+    （keyword_index と同じトークン）からエンティティへの転置インデックスを持つ。
+    ポスティングはエンティティ番号のビット集合（int）で表し、AND で候補を絞り込む。
+
+    EntityMemoryManager 経由の作成・更新・削除は update / remove で即座に反映する。
+    それ以外（UI での直接編集や外部エディタ）による変更は、ディレクトリの更新時刻の変化、
+    または constants.ENTITY_CATALOG_RESCAN_SECONDS ごとのファイル確認で検知する。
+    """
+
+    def __init__(self, entities_dir: Path):
+        self.entities_dir = entities_dir
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.dir_mtime_ns: Optional[int] = None
+        self.checked_at = 0.0
+        self.ids: Dict[str, int] = {}
+        self.names: List[Optional[str]] = []
+        self.texts: Dict[str, Tuple[str, str]] = {}  # 名前 -> (小文字の名前, 小文字の本文)
+        self.stats: Dict[str, Tuple[int, int]] = {}  # 名前 -> (更新時刻ns, サイズ)
+        self.postings: Dict[str, int] = {}
+        self.free_ids: List[int] = []
+
+    def _dir_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.entities_dir).st_mtime_ns
+        except OSError:
+            return None
+
+    def _tokens(self, name: str) -> set:
+        name_lower, content_lower = self.texts[name]
+        return keyword_index.tokenize(name_lower) | keyword_index.tokenize(content_lower)
+
+    def _remove(self, name: str) -> None:
+        entity_id = self.ids.pop(name, None)
+        if entity_id is None:
+            return
+        bit = 1 << entity_id
+        for token in self._tokens(name):
+            mask = self.postings.get(token, 0) & ~bit
+            if mask:
+                self.postings[token] = mask
+            else:
+                self.postings.pop(token, None)
+        del self.texts[name]
+        self.stats.pop(name, None)
+        self.names[entity_id] = None
+        self.free_ids.append(entity_id)
+
+    def _add(self, name: str, path: Path) -> None:
+        self._remove(name)
+        try:
+            st = path.stat()
+            content = path.read_text(encoding="utf-8")
+        except (OSError, UnicodeDecodeError):
+            return
+        if self.free_ids:
+            entity_id = self.free_ids.pop()
+            self.names[entity_id] = name
+        else:
+            entity_id = len(self.names)
+            self.names.append(name)
+        self.ids[name] = entity_id
+        self.texts[name] = (name.lower(), content.lower())
+        self.stats[name] = (st.st_mtime_ns, st.st_size)
+        bit = 1 << entity_id
+        for token in self._tokens(name):
+            self.postings[token] = self.postings.get(token, 0) | bit
+
+    def _rescan(self) -> None:
+        """ディレクトリ内のファイルと目録を突き合わせ、変わったものだけ読み直す"""
+        current = {}
+        try:
+            with os.scandir(self.entities_dir) as it:
+                for entry in it:
+                    if entry.name.endswith(".md") and entry.is_file():
+                        st = entry.stat()
+                        current[entry.name[:-3]] = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            pass
+        for name in [n for n in self.ids if n not in current]:
+            self._remove(name)
+        for name, stat in current.items():
+            if self.stats.get(name) != stat:
+                self._add(name, self.entities_dir / f"{name}.md")
+
+    def sync(self) -> None:
+        """必要な場合だけ目録をファイルと同期する（lock を取得して呼ぶこと）"""
+        dir_mtime = self._dir_mtime()
+        now = time.monotonic()
+        if (not self.loaded or dir_mtime != self.dir_mtime_ns
+                or now - self.checked_at >= constants.ENTITY_CATALOG_RESCAN_SECONDS):
+            self._rescan()
+            self.loaded = True
+            self.dir_mtime_ns = dir_mtime
+            self.checked_at = now
+
+    def update(self, name: str) -> None:
+        with self.lock:
+            if self.loaded:
+                self._add(name, self.entities_dir / f"{name}.md")
+                self.dir_mtime_ns = self._dir_mtime()
+
+    def remove(self, name: str) -> None:
+        with self.lock:
+            if self.loaded:
+                self._remove(name)
+                self.dir_mtime_ns = self._dir_mtime()
+
+    def search(self, query_words: List[str]) -> List[Tuple[str, int]]:
+        """各単語について名前または本文に含むエンティティを探し、(名前, マッチした単語数) を返す"""
+        with self.lock:
+            self.sync()
+            counts: Dict[str, int] = {}
+            for word in query_words:
+                mask = -1
+                for token in keyword_index.query_tokens(word):
+                    mask &= self.postings.get(token, 0)
+                    if not mask:
+                        break
+                if mask == -1:
+                    continue
+                while mask:
+                    low = mask & -mask
+                    name = self.names[low.bit_length() - 1]
+                    mask ^= low
+                    name_lower, content_lower = self.texts[name]
+                    # バイグラムは候補の絞り込みにだけ使い、最終判定は従来どおりの部分一致
+                    if word in name_lower or word in content_lower:
+                        counts[name] = counts.get(name, 0) + 1
+            return list(counts.items())
+
+
+_catalogs: Dict[str, _EntityCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def _get_catalog(entities_dir: Path) -> _EntityCatalog:
+    key = os.path.abspath(entities_dir)
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = _catalogs[key] = _EntityCatalog(Path(key))
+        return catalog
+
 class EntityMemoryManager:
     """
     Manages structured memories about specific entities (people, topics, objects).
@@ -17,6 +169,7 @@ class EntityMemoryManager:
         self.room_dir = Path(constants.ROOMS_DIR) / room_name
         self.entities_dir = self.room_dir / "memory" / "entities"
         self.entities_dir.mkdir(parents=True, exist_ok=True)
+        self._catalog = _get_catalog(self.entities_dir)
 
     def _get_entity_path(self, entity_name: str) -> Path:
         # Sanitize entity name for filename
@@ -38,13 +191,22 @@ class EntityMemoryManager:
         if append and path.exists():
             with open(path, "a", encoding="utf-8") as f:
                 f.write(f"\n\n--- Update: {timestamp} ---\n{content}")
+            self._catalog.update(path.stem)
             return f"Entity memory for '{entity_name}' updated (appended)."
         else:
             header = f"# Entity Memory: {entity_name}\nCreated: {timestamp}\n\n"
-            with open(path, "w", encoding="utf-8") as f:
-                f.write(header + content)
+            self.write_entry(entity_name, header + content)
             return f"Entity memory for '{entity_name}' created/overwritten."
 
+    def write_entry(self, entity_name: str, content: str) -> None:
+        """
+        Overwrites an entity memory file with the given content as-is.
+        """
+        path = self._get_entity_path(entity_name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        self._catalog.update(path.stem)
+
     def consolidate_entry(self, entity_name: str, new_content: str, api_key: str) -> str:
         """
         既存の記憶と新しい情報をLLMで統合・整理します。
@@ -117,8 +279,7 @@ class EntityMemoryManager:
             response = llm.invoke(prompt).content.strip()
             
             # 保存
-            with open(path, "w", encoding="utf-8") as f:
-                f.write(response)
+            self.write_entry(entity_name, response)
             
             return f"Entity memory for '{entity_name}' consolidated and updated."
         except Exception as e:
@@ -176,24 +337,11 @@ class EntityMemoryManager:
         if not query_words:
             return []
         
-        scored_matches = []
-        all_entities = self.list_entries()
-        
-        for name in all_entities:
-            name_lower = name.lower()
-            content_lower = self.read_entry(name).lower()
-            
-            # マッチした単語数をカウント
-            match_count = 0
-            for word in query_words:
-                if word in name_lower or word in content_lower:
-                    match_count += 1
-            
-            if match_count > 0:
-                scored_matches.append((name, match_count))
+        # ファイルを毎回読む代わりに、ルームの目録（転置インデックス）で検索する
+        scored_matches = self._catalog.search(query_words)
         
-        # マッチ数の多い順にソート
-        scored_matches.sort(key=lambda x: x[1], reverse=True)
+        # マッチ数の多い順にソート（同数の場合は名前順）
+        scored_matches.sort(key=lambda x: (-x[1], x[0]))
         return [name for name, _ in scored_matches]
 
 
@@ -204,5 +352,6 @@ class EntityMemoryManager:
         path = self._get_entity_path(entity_name)
         if path.exists():
             path.unlink()
+            self._catalog.remove(path.stem)
             return True
         return False
@@ -0,0 +1,339 @@
+# episode_summarizer.py
+"""
+日次エピソード記憶の要約パイプライン（EpisodicMemoryManager.update_memory の実体）
+
+従来の update_memory は、実行のたびに現行ログと全アーカイブを読み直して未要約の日付を探し、
+日付ごとに1回ずつ LLM を順番に呼び出していたため、大量の過去ログを取り込んだ直後は
+何時間もかかり、再実行しても毎回すべてのログを走査し直していた。
+
+- ログファイルごとに、走査済みの位置（署名と最後のヘッダー位置）と含まれる日付を
+  memory/episodic_scan_state.json に記録し、変化したファイル・追記された部分だけを走査する
+- 未要約の日付の会話だけを、その日付を含むログファイルから集める
+- 短い日は、合計文字数（constants.EPISODIC_BATCH_MAX_CHARS）の範囲で複数日を1回のリクエストにまとめ、
+  日付をキーにした JSON で要約を受け取る
+- リクエストは constants.EPISODIC_SUMMARY_CONCURRENCY 本まで並行に実行し、APIキーごとの
+  トークンバケットで開始間隔を制限する
+- 要約は日付ごとに完了した時点で保存するので、中断しても次回は残りの日付から再開する
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import chat_log_index
+import constants
+import json_state_store
+import utils
+
+if TYPE_CHECKING:
+    from sleep_consolidation import TokenBucket
+
+SCAN_STATE_VERSION = 1
+
+_DATE_PATTERN = re.compile(r'(\d{4}-\d{2}-\d{2}) \(...\) \d{2}:\d{2}:\d{2}')
+_TEMPORARY_ERROR_CODES = ["429", "ResourceExhausted", "500", "503", "504", "deadline exceeded"]
+
+
+# --- ログの走査 ---
+
+def scan_state_path(room_dir: str) -> str:
+    return os.path.join(room_dir, "memory", "episodic_scan_state.json")
+
+
+def _message_date(content: str) -> Optional[str]:
+    match = _DATE_PATTERN.search(content)
+    return match.group(1) if match else None
+
+
+def _scan_file(file_path: str, st: os.stat_result, record: Optional[Dict]) -> Dict:
+    """
+    1つのログファイルの日付一覧を更新した記録を返す。
+    同じファイルに追記されただけの場合は、前回の最後のメッセージ以降だけを調べる。
+    """
+    index = chat_log_index.get_index(file_path)
+    if index is None:
+        return {"signature": None, "resume_offset": 0, "dates": []}
+
+    dates = set()
+    resume_offset = 0
+    if record and record.get("signature") and record["signature"][0] == st.st_ino \
+            and st.st_size >= record["signature"][1]:
+        dates.update(record.get("dates", []))
+        # 最後のメッセージは追記で本文（タイムスタンプ）が伸びている可能性があるため、そこから調べ直す
+        resume_offset = record.get("resume_offset", 0)
+
+    for offset, msg in zip(index.offsets, index.messages):
+        if offset < resume_offset:
+            continue
+        date = _message_date(msg.get("content", ""))
+        if date:
+            dates.add(date)
+
+    return {
+        "signature": [st.st_ino, index.size, st.st_mtime_ns],
+        "resume_offset": index.offsets[-1] if index.offsets else 0,
+        "dates": sorted(dates),
+    }
+
+
+def scan_log_dates(room_dir: str, log_files: Sequence[str]) -> Dict[str, List[str]]:
+    """
+    ログファイルごとの、会話が含まれる日付一覧を返す。
+    前回の走査から変化していないファイル（アーカイブなど）は読み込まない。
+    """
+    state_path = scan_state_path(room_dir)
+    state = json_state_store.read(state_path, default={})
+    if not isinstance(state, dict) or state.get("version") != SCAN_STATE_VERSION:
+        state = {"version": SCAN_STATE_VERSION, "files": {}}
+    records = state.setdefault("files", {})
+
+    result: Dict[str, List[str]] = {}
+    new_records: Dict[str, Dict] = {}
+    changed = False
+    for file_path in log_files:
+        rel_path = os.path.relpath(file_path, room_dir)
+        record = records.get(rel_path)
+        try:
+            st = os.stat(file_path)
+            if record and record.get("signature") == [st.st_ino, st.st_size, st.st_mtime_ns]:
+                new_records[rel_path] = record
+            else:
+                new_records[rel_path] = _scan_file(file_path, st, record)
+                changed = True
+        except Exception as e:
+            print(f"  - Error reading {file_path}: {e}")
+            continue
+        result[file_path] = new_records[rel_path]["dates"]
+
+    if changed or set(new_records) != set(records):
+        json_state_store.write(state_path, {"version": SCAN_STATE_VERSION, "files": new_records})
+    return result
+
+
+def collect_daily_logs(file_dates: Dict[str, List[str]], target_dates: Iterable[str],
+                       user_name: str, agent_name: str) -> Dict[str, List[str]]:
+    """対象の日付を含むログファイルだけを読み、日付ごとの「話者: 本文」の一覧を返す"""
+    targets = set(target_dates)
+    logs_by_date: Dict[str, List[str]] = {}
+    for file_path, dates in file_dates.items():
+        if targets.isdisjoint(dates):
+            continue
+        try:
+            for msg in utils.load_chat_log(file_path):
+                content = msg.get('content', '')
+                current_date = _message_date(content)
+                if current_date not in targets:
+                    continue
+
+                role = msg.get('role', 'UNKNOWN')
+                responder = msg.get('responder', '')
+                # 固定の「ユーザー/AI」ではなく、設定された名前を使う
+                if role == 'USER':
+                    speaker = user_name
+                else:
+                    # responderが具体的な名前ならそれを使う、なければ設定上の名前
+                    speaker = responder if responder and responder != "model" else agent_name
+
+                # 本文が空になる日（思考ログのみ等）も、短いログとして記録されるようにキーは作っておく
+                day_logs = logs_by_date.setdefault(current_date, [])
+                clean_text = utils.remove_thoughts_from_text(content)
+                clean_text = re.sub(r'\n\n\d{4}-\d{2}-\d{2}.*$', '', clean_text).strip()
+                if clean_text:
+                    day_logs.append(f"{speaker}: {clean_text}")
+        except Exception as e:
+            print(f"  - Error reading {file_path}: {e}")
+    return logs_by_date
+
+
+# --- リクエストのまとめ方 ---
+
+def pack_days(daily_logs: Sequence[Tuple[str, str]],
+              max_chars: Optional[int] = None,
+              max_days: Optional[int] = None,
+              day_max_chars: Optional[int] = None) -> List[List[Tuple[str, str]]]:
+    """
+    (日付, 会話ログ) の一覧をリクエスト単位にまとめる。
+    day_max_chars 以下の短い日だけを、日付順に合計 max_chars・max_days 日まで1つにまとめる。
+    長い日は従来どおり1日で1リクエストにする。
+    """
+    max_chars = constants.EPISODIC_BATCH_MAX_CHARS if max_chars is None else max_chars
+    max_days = constants.EPISODIC_BATCH_MAX_DAYS if max_days is None else max_days
+    day_max_chars = constants.EPISODIC_BATCH_DAY_MAX_CHARS if day_max_chars is None else day_max_chars
+
+    groups: List[List[Tuple[str, str]]] = []
+    current: List[Tuple[str, str]] = []
+    current_chars = 0
+    for date_str, daily_log in daily_logs:
+        if len(daily_log) > day_max_chars:
+            groups.append([(date_str, daily_log)])
+            continue
+        if current and (current_chars + len(daily_log) > max_chars or len(current) >= max_days):
+            groups.append(current)
+            current, current_chars = [], 0
+        current.append((date_str, daily_log))
+        current_chars += len(daily_log)
+    if current:
+        groups.append(current)
+    groups.sort(key=lambda group: group[0][0])
+    return groups
+
+
+def build_day_prompt(date_str: str, daily_log: str, user_name: str, agent_name: str) -> str:
+    return f"""
+あなたは、今日の出来事を自分の言葉で振り返る日記の執筆者（{agent_name}本人）です。
+以下の会話ログは、ある一日のあなた（{agent_name}）と「{user_name}」のやり取りです。
+この日の出来事、話題、そして感情の動きを、**後から読み返して文脈を思い出せるような「エピソード記憶」として要約**してください。
+
+【会話ログ ({date_str})】
+---
+{daily_log}
+---
+
+【要約のルール】
+1.  **前置きや序文なしで、直接本題から書き始める**こと（「振り返ると」「今日は」などで始めない）。
+2.  **会話ログ内のあなた（{agent_name}）の口調・一人称・二人称をそのまま使用**すること。
+3.  あなたの視点から振り返りつつ、**後から読んで何があったか分かるように客観的な事実を重視**。
+4.  **[★重要]マークがついた会話は詳細に**記録すること。
+5.  ★マークのない会話は1〜2文で簡潔に言及する程度にとどめること。
+6.  特に「決定事項」「約束」「感情的な交流」を優先的に記録。
+7.  **必ず800〜1200文字以内**に収めること（これを超えてはならない）。
+
+【出力（要約のみ、前置きなし）】
+"""
+
+
+def build_batch_prompt(days: Sequence[Tuple[str, str]], user_name: str, agent_name: str) -> str:
+    sections = "\n\n".join(f"【会話ログ ({date_str})】\n---\n{daily_log}\n---" for date_str, daily_log in days)
+    date_list = ", ".join(f'"{date_str}"' for date_str, _ in days)
+    return f"""
+あなたは、日々の出来事を自分の言葉で振り返る日記の執筆者（{agent_name}本人）です。
+以下の会話ログは、複数の日のあなた（{agent_name}）と「{user_name}」のやり取りです。日付ごとに区切られています。
+それぞれの日の出来事、話題、そして感情の動きを、**後から読み返して文脈を思い出せるような「エピソード記憶」として、日付ごとに別々に要約**してください。
+
+{sections}
+
+【要約のルール】
+1.  各要約は**前置きや序文なしで、直接本題から書き始める**こと（「振り返ると」「今日は」などで始めない）。
+2.  **会話ログ内のあなた（{agent_name}）の口調・一人称・二人称をそのまま使用**すること。
+3.  あなたの視点から振り返りつつ、**後から読んで何があったか分かるように客観的な事実を重視**。
+4.  **[★重要]マークがついた会話は詳細に**記録すること。
+5.  特に「決定事項」「約束」「感情的な交流」を優先的に記録。
+6.  別の日の出来事を混ぜないこと。各要約は**その日のログの分量に見合った長さで、800文字以内**に収めること。
+
+【出力形式】
+次の日付をキー、要約を値とする JSON オブジェクトのみを出力すること（コードブロックや説明は不要）。
+キー: {date_list}
+"""
+
+
+def parse_batch_response(text: str, dates: Sequence[str]) -> Dict[str, str]:
+    """まとめたリクエストの応答から、日付ごとの要約を取り出す（取り出せなかった日付は含まない）"""
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        return {}
+    try:
+        data = json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    summaries = {}
+    for date_str in dates:
+        value = data.get(date_str)
+        if isinstance(value, str) and value.strip():
+            summaries[date_str] = value.strip()
+    return summaries
+
+
+# --- 実行 ---
+
+_limiters: Dict[str, "TokenBucket"] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(api_key: str):
+    """APIキーごとに共有する、要約リクエストの開始を制限するトークンバケット"""
+    from sleep_consolidation import TokenBucket
+    with _limiters_lock:
+        limiter = _limiters.get(api_key)
+        if limiter is None:
+            limiter = _limiters[api_key] = TokenBucket(
+                constants.EPISODIC_SUMMARY_REQUESTS_PER_MINUTE, constants.EPISODIC_SUMMARY_BURST
+            )
+        return limiter
+
+
+def invoke_with_retry(llm, prompt: str, label: str, acquire: Callable[[], None],
+                      max_retries: int = 3) -> Tuple[Optional[str], bool]:
+    """
+    LLM を呼び出し、(要約, 一時的エラーで終わったか) を返す。
+    空の応答や恒久的なエラーは、そのまま記録するための文言を要約として返す。
+    """
+    summary_result = None
+    is_temporary_error = False
+    for attempt in range(max_retries):
+        try:
+            acquire()
+            # invokeの結果が空の場合も考慮
+            result = llm.invoke(prompt)
+            content = result.content.strip()
+
+            if content:
+                return content, False
+            # コンテンツが空（ブロック等）の場合。リトライしても恐らく同じなので抜ける
+            print(f"  - Warning: Empty response for {label} (Attempt {attempt+1})")
+            return "（コンテンツポリシーにより要約できませんでした）", False
+
+        except Exception as e:
+            error_str = str(e)
+            # 一時的なエラー（リトライすべきもの）
+            if any(code in error_str for code in _TEMPORARY_ERROR_CODES):
+                is_temporary_error = True
+                if "429" in error_str or "ResourceExhausted" in error_str:
+                    wait_time = 10
+                    match = re.search(r"retry_delay {\s*seconds: (\d+)", error_str)
+                    if match: wait_time = int(match.group(1)) + 2
+                    print(f"    -> API制限検知({attempt+1}/{max_retries})。{wait_time}秒待機...")
+                    time.sleep(wait_time)
+                else:
+                    print(f"    -> 一時的エラー検知({attempt+1}/{max_retries}): {e}")
+                continue
+            # 恒久的なエラー（このまま保存して終わるもの）
+            print(f"  - 恒久的なエラーまたは未知のエラー: {e}")
+            return f"（エラーにより要約できませんでした: {e}）", False
+    return summary_result, is_temporary_error
+
+
+def summarize_group(llm, days: Sequence[Tuple[str, str]], user_name: str, agent_name: str,
+                    acquire: Callable[[], None]) -> List[Tuple[str, Optional[str], bool]]:
+    """
+    1リクエスト分の日付を要約し、[(日付, 要約, 一時的エラーで終わったか)] を返す。
+    まとめたリクエストの応答から取り出せなかった日付は、1日ずつ要約し直す。
+    まとめたリクエスト自体が一時的エラーで終わった場合は、同じキーへ1日ずつ送り直さず、
+    全日付を次回の実行に回す。
+    """
+    results: List[Tuple[str, Optional[str], bool]] = []
+    remaining = list(days)
+    if len(days) > 1:
+        dates = [date_str for date_str, _ in days]
+        print(f"  - {dates[0]} ～ {dates[-1]} の{len(dates)}日分をまとめて要約中...")
+        prompt = build_batch_prompt(days, user_name, agent_name)
+        text, is_temporary_error = invoke_with_retry(llm, prompt, f"{dates[0]}~{dates[-1]}", acquire)
+        if text is None and is_temporary_error:
+            print(f"    -> 一時的エラーが解消されなかったため、{len(dates)}日分を次回に回します。")
+            return [(date_str, None, True) for date_str in dates]
+        summaries = parse_batch_response(text or "", dates)
+        results.extend((date_str, summaries[date_str], False) for date_str in dates if date_str in summaries)
+        remaining = [(date_str, daily_log) for date_str, daily_log in days if date_str not in summaries]
+        if remaining:
+            print(f"    -> {len(remaining)}日分を取り出せなかったため、1日ずつ要約します。")
+
+    for date_str, daily_log in remaining:
+        print(f"  - {date_str} の要約を作成中...")
+        prompt = build_day_prompt(date_str, daily_log, user_name, agent_name)
+        summary, is_temporary_error = invoke_with_retry(llm, prompt, date_str, acquire)
+        results.append((date_str, summary, is_temporary_error))
+    return results
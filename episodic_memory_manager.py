@@ -6,13 +6,13 @@ import datetime
 import traceback
 from pathlib import Path
 from typing import List, Dict, Optional
-import time
 import re
 import glob # <--- 追加
 
 import constants
 import config_manager
 import utils
+from episodic_store import EpisodicStore, month_key_for, split_date_range
 
 class EpisodicMemoryManager:
     def __init__(self, room_name: str):
@@ -25,29 +25,17 @@ class EpisodicMemoryManager:
         # ディレクトリの保証
         self.memory_dir.mkdir(parents=True, exist_ok=True)
         self.episodic_dir.mkdir(parents=True, exist_ok=True)
+
+        # 月次スナップショット＋追記ジャーナルのストア（読み込み結果と索引はプロセス内で共有）
+        self.store = EpisodicStore(self.episodic_dir, self.legacy_memory_file)
     
     def _get_monthly_file_path(self, date_str: str) -> Path:
         """
         日付文字列から対応する月次ファイルのパスを返す。
         例: "2026-01-15" -> memory/episodic/2026-01.json
+        範囲日付の場合は開始日を使用し、パース失敗時は unknown.json。
         """
-        try:
-            # 範囲日付の場合は開始日を使用
-            if '~' in date_str:
-                date_str = date_str.split('~')[0].strip()
-            elif '～' in date_str:
-                date_str = date_str.split('～')[0].strip()
-            
-            # YYYY-MM形式を抽出
-            match = re.match(r'^(\d{4}-\d{2})', date_str.strip())
-            if match:
-                month_str = match.group(1)
-                return self.episodic_dir / f"{month_str}.json"
-        except Exception:
-            pass
-        
-        # パース失敗時はunknownファイルに
-        return self.episodic_dir / "unknown.json"
+        return self.store.snapshot_path(month_key_for(date_str))
     
     def _generate_episode_id(self, date_str: str) -> str:
         """
@@ -55,12 +43,12 @@ class EpisodicMemoryManager:
         フォーマット: episode_{日付}_{連番}
         例: episode_2026-01-15_001
         """
-        # 既存のエピソードからこの日付の連番を取得
-        existing = self._load_memory()
-        date_prefix = f"episode_{date_str.split('~')[0].split('～')[0].strip()}_"
+        # 同じ開始日を持つ既存エピソードの連番を日付索引から取得
+        start_date = split_date_range(date_str)[0]
+        date_prefix = f"episode_{start_date}_"
         
         max_seq = 0
-        for ep in existing:
+        for ep in self.store.find_by_start_date(start_date):
             ep_id = ep.get("id", "")
             if ep_id.startswith(date_prefix):
                 try:
@@ -73,64 +61,18 @@ class EpisodicMemoryManager:
 
     def _load_memory(self) -> List[Dict]:
         """
-        全ての月次ファイル + レガシーファイルからエピソード記憶を読み込む（ロック付き）。
+        全ての月次ファイル（スナップショット＋ジャーナル）+ レガシーファイルからエピソード記憶を読み込む。
         後方互換性: episodic_memory.json が存在する場合も読み込む。
+        返り値の各エピソードはコピーなので、変更しても保存するまでストアには反映されない。
         """
-        from file_lock_utils import safe_json_read
-        
-        all_episodes = []
-        
-        # 1. レガシーファイル（episodic_memory.json）を読み込み
-        if self.legacy_memory_file.exists():
-            try:
-                data = safe_json_read(str(self.legacy_memory_file), default=[])
-                if isinstance(data, list):
-                    all_episodes.extend(data)
-            except Exception as e:
-                print(f"Warning: Legacy episodic memory file error: {e}")
-        
-        # 2. 月次ファイル（episodic/*.json）を読み込み
-        if self.episodic_dir.exists():
-            for monthly_file in sorted(self.episodic_dir.glob("*.json")):
-                try:
-                    data = safe_json_read(str(monthly_file), default=[])
-                    if isinstance(data, list):
-                        all_episodes.extend(data)
-                except Exception as e:
-                    print(f"Warning: Monthly episodic file error ({monthly_file.name}): {e}")
-        
-        return all_episodes
+        return self.store.all_episodes()
 
     def _save_memory(self, data: List[Dict]):
         """
         エピソード記憶を月次ファイルに振り分けて保存する（ロック付き）。
-        各エピソードの日付に応じて適切な月次ファイルに保存。
+        圧縮・正規化などの一括更新用。単一エピソードの追加は _append_single_episode を使うこと。
         """
-        from file_lock_utils import safe_json_write
-        
-        # 日付順にソート
-        def get_sort_key_for_save(item):
-            d = item.get('date', '').strip()
-            if '~' in d: return d.split('~')[0].strip()
-            if '～' in d: return d.split('～')[0].strip()
-            return d
-        
-        data.sort(key=get_sort_key_for_save)
-        
-        # 月ごとにグループ化
-        monthly_groups: Dict[Path, List[Dict]] = {}
-        for episode in data:
-            date_str = episode.get('date', '')
-            monthly_path = self._get_monthly_file_path(date_str)
-            if monthly_path not in monthly_groups:
-                monthly_groups[monthly_path] = []
-            monthly_groups[monthly_path].append(episode)
-        
-        # 各月次ファイルに保存
-        for monthly_path, episodes in monthly_groups.items():
-            safe_json_write(str(monthly_path), episodes)
-        
-        # print(f"  - 記憶を {len(monthly_groups)} 個の月次ファイルに保存しました（計 {len(data)} 件）")
+        self.store.replace_all(data)
 
 
     def _annotate_logs_with_arousal(self, logs: List[str], date_str: str) -> str:
@@ -173,9 +115,12 @@ class EpisodicMemoryManager:
     def update_memory(self, api_key: str) -> str:
         """
         全ログ（現行＋アーカイブ）を解析し、未処理の過去日付について要約を作成・追記する。
-        【v3: 名前解決・逐次保存版】
+        【v4: 増分走査・まとめて並行要約版】
+        ログの走査・リクエストのまとめ方・並行実行は episode_summarizer を参照。
         """
+        from concurrent.futures import ThreadPoolExecutor, as_completed
         from llm_factory import LLMFactory
+        import episode_summarizer
 
         print(f"--- [Episodic Memory] 更新処理開始: {self.room_name} ---")
         
@@ -189,46 +134,17 @@ class EpisodicMemoryManager:
         current_log = self.room_dir / "log.txt"
         if current_log.exists(): log_files.append(str(current_log))
         archives_dir = self.room_dir / "log_archives"
-        if archives_dir.exists(): log_files.extend(glob.glob(str(archives_dir / "*.txt")))
+        if archives_dir.exists(): log_files.extend(sorted(glob.glob(str(archives_dir / "*.txt"))))
 
         if not log_files: return "ログファイルが見つかりません。"
 
         print(f"  - 読み込み対象ファイル数: {len(log_files)}")
 
-        # 2. ログの読み込みと日付ごとのグループ化
-        logs_by_date = {}
-        date_pattern = re.compile(r'(\d{4}-\d{2}-\d{2}) \(...\) \d{2}:\d{2}:\d{2}')
-        
-        for file_path in log_files:
-            try:
-                raw_logs = utils.load_chat_log(file_path)
-                for msg in raw_logs:
-                    content = msg.get('content', '')
-                    match = date_pattern.search(content)
-                    current_date = match.group(1) if match else None
-                    
-                    if current_date:
-                        if current_date not in logs_by_date:
-                            logs_by_date[current_date] = []
-                        
-                        role = msg.get('role', 'UNKNOWN')
-                        responder = msg.get('responder', '')
-                        
-                        # ▼▼▼【修正】固定の「ユーザー/AI」ではなく、設定された名前を使う ▼▼▼
-                        if role == 'USER':
-                            speaker = user_name
-                        else:
-                            # responderが具体的な名前ならそれを使う、なければ設定上の名前
-                            speaker = responder if responder and responder != "model" else agent_name
-                        # ▲▲▲【修正ここまで】▲▲▲
-                        
-                        clean_text = utils.remove_thoughts_from_text(content)
-                        clean_text = re.sub(r'\n\n\d{4}-\d{2}-\d{2}.*$', '', clean_text).strip()
-                        
-                        if clean_text:
-                            logs_by_date[current_date].append(f"{speaker}: {clean_text}")
-            except Exception as e:
-                print(f"  - Error reading {file_path}: {e}")
+        # 2. ログに含まれる日付の一覧（前回から変化したファイル・追記部分だけを走査する）
+        file_dates = episode_summarizer.scan_log_dates(str(self.room_dir), log_files)
+        log_dates = set()
+        for dates in file_dates.values():
+            log_dates.update(dates)
 
         # 3. 処理対象の選定
         existing_memory = self._load_memory()
@@ -247,11 +163,6 @@ class EpisodicMemoryManager:
             and item.get('type') not in special_types
         }
         print(f"  - 解析された単独エントリ数: {len(existing_dates_single)}")
-        
-        if len(existing_dates_single) > 0:
-            may_dates = sorted([d for d in existing_dates_single if "2025-05" in d])
-            if may_dates:
-                print(f"  - 5月の単独エントリ例: {may_dates[:10]}")
 
         # 既にある日付範囲（週圧縮済み用）
         existing_date_ranges = []
@@ -266,13 +177,11 @@ class EpisodicMemoryManager:
                     existing_date_ranges.append((parts[0].strip(), parts[1].strip()))
         
         print(f"  - 解析された既知の範囲数: {len(existing_date_ranges)}")
-        if existing_date_ranges:
-            print(f"  - 解析された既知の範囲: {existing_date_ranges}")
 
         today_str = datetime.datetime.now().strftime('%Y-%m-%d')
         
         target_dates = []
-        for date_str in sorted(logs_by_date.keys()):
+        for date_str in sorted(log_dates):
             date_str_clean = date_str.strip() # ここでもトリミング
             if date_str_clean == today_str: continue
             
@@ -294,22 +203,19 @@ class EpisodicMemoryManager:
             print("  - 新規に要約すべき日付はありません。")
             return "新規に要約すべき過去の日付はありませんでした（全ての過去ログは処理済みです）。"
 
-        # 4. 要約の生成と逐次保存
-        effective_settings = config_manager.get_effective_settings(self.room_name)
-        llm = LLMFactory.create_chat_model(
-            api_key=api_key,
-            generation_config=effective_settings,
-            internal_role="summarization"
-        )
-        
+        # 4. 対象日付の会話だけを集める
+        logs_by_date = episode_summarizer.collect_daily_logs(file_dates, target_dates, user_name, agent_name)
+
         success_count = 0
         error_count = 0
         
         print(f"  - 処理対象の日付: {target_dates}")
 
+        daily_logs = []
         for date_str in target_dates:
             # Arousalアノテーション付きでログを結合
-            daily_log = self._annotate_logs_with_arousal(logs_by_date[date_str], date_str)
+            # （会話を取り出せなかった日付も、短いログとしてスキップ記録し、毎回対象に戻らないようにする）
+            daily_log = self._annotate_logs_with_arousal(logs_by_date.get(date_str, []), date_str)
             
             # ログが短い場合はスキップ記録
             if len(daily_log) < 50:
@@ -320,106 +226,69 @@ class EpisodicMemoryManager:
                     "created_at": datetime.datetime.now().isoformat()
                 })
                 continue
-                
-            print(f"  - {date_str} の要約を作成中...")            
+            daily_logs.append((date_str, daily_log))
 
-            prompt = f"""
-あなたは、今日の出来事を自分の言葉で振り返る日記の執筆者（{agent_name}本人）です。
-以下の会話ログは、ある一日のあなた（{agent_name}）と「{user_name}」のやり取りです。
-この日の出来事、話題、そして感情の動きを、**後から読み返して文脈を思い出せるような「エピソード記憶」として要約**してください。
-
-【会話ログ ({date_str})】
----
-{daily_log}
----
+        if not daily_logs:
+            return f"処理完了: 成功 {success_count}件 / エラー・スキップ {error_count}件"
 
-【要約のルール】
-1.  **前置きや序文なしで、直接本題から書き始める**こと（「振り返ると」「今日は」などで始めない）。
-2.  **会話ログ内のあなた（{agent_name}）の口調・一人称・二人称をそのまま使用**すること。
-3.  あなたの視点から振り返りつつ、**後から読んで何があったか分かるように客観的な事実を重視**。
-4.  **[★重要]マークがついた会話は詳細に**記録すること。
-5.  ★マークのない会話は1〜2文で簡潔に言及する程度にとどめること。
-6.  特に「決定事項」「約束」「感情的な交流」を優先的に記録。
-7.  **必ず800〜1200文字以内**に収めること（これを超えてはならない）。
-
-【出力（要約のみ、前置きなし）】
-"""
+        # 5. 要約の生成（短い日はまとめて、並行に）と日付ごとの逐次保存
+        effective_settings = config_manager.get_effective_settings(self.room_name)
+        llm = LLMFactory.create_chat_model(
+            api_key=api_key,
+            generation_config=effective_settings,
+            internal_role="summarization"
+        )
+        limiter = episode_summarizer.get_limiter(api_key)
+        groups = episode_summarizer.pack_days(daily_logs)
+        print(f"  - {len(daily_logs)}日分を {len(groups)}件のリクエストで要約します。")
 
-            summary_result = None
-            is_temporary_error = False
-            max_retries = 3
-            
-            for attempt in range(max_retries):
+        workers = max(1, min(constants.EPISODIC_SUMMARY_CONCURRENCY, len(groups)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(episode_summarizer.summarize_group, llm, group, user_name, agent_name, limiter.acquire)
+                for group in groups
+            ]
+            for future in as_completed(futures):
                 try:
-                    # invokeの結果が空の場合も考慮
-                    result = llm.invoke(prompt)
-                    content = result.content.strip()
-                    
-                    if content:
-                        summary_result = content
-                        is_temporary_error = False
-                        break
-                    else:
-                        # コンテンツが空（ブロック等）の場合
-                        print(f"  - Warning: Empty response for {date_str} (Attempt {attempt+1})")
-                        summary_result = "（コンテンツポリシーにより要約できませんでした）"
-                        is_temporary_error = False
-                        break # リトライしても恐らく同じなので抜ける
-
+                    results = future.result()
                 except Exception as e:
-                    error_str = str(e)
-                    # 一時的なエラー（リトライすべきもの）
-                    if any(code in error_str for code in ["429", "ResourceExhausted", "500", "503", "504", "deadline exceeded"]):
-                        is_temporary_error = True
-                        if "429" in error_str or "ResourceExhausted" in error_str:
-                            wait_time = 10
-                            match = re.search(r"retry_delay {\s*seconds: (\d+)", error_str)
-                            if match: wait_time = int(match.group(1)) + 2
-                            print(f"    -> API制限検知({attempt+1}/{max_retries})。{wait_time}秒待機...")
-                            time.sleep(wait_time)
-                        else:
-                            print(f"    -> 一時的エラー検知({attempt+1}/{max_retries}): {e}")
+                    print(f"  - 要約リクエストでエラーが発生しました: {e}")
+                    traceback.print_exc()
+                    error_count += 1
+                    continue
+
+                for date_str, summary_result, is_temporary_error in results:
+                    # --- 保存判定 ---
+                    if summary_result:
+                        # 成功したか、恒久的に失敗した場合は保存して「完了」とする
+                        # [Phase 2] Arousal平均値を取得
+                        arousal_score = 0.5  # デフォルト
+                        try:
+                            import session_arousal_manager
+                            arousal_score = session_arousal_manager.get_daily_average(self.room_name, date_str)
+                        except Exception as e:
+                            print(f"  - [Arousal] 取得失敗: {e}")
                         
-                        # ループの最後なら次へ行く（自然に attempt が増える）
-                        continue
+                        self._append_single_episode({
+                            "date": date_str,
+                            "summary": summary_result,
+                            "arousal": arousal_score,  # Arousal追加
+                            "created_at": datetime.datetime.now().isoformat()
+                        })
+                        
+                        if "エラー" in summary_result or "できませんでした" in summary_result:
+                            error_count += 1
+                        else:
+                            success_count += 1
+                    elif is_temporary_error:
+                        # すべてのリトライが一時的エラーで終わった場合。
+                        # 保存しないことで、次回の update_memory 実行時に再度対象に含まれるようにする。
+                        print(f"  - {date_str}: 一時的エラーが解消されなかったため、保存せずに今回はスキップします（次回再試行）。")
+                        error_count += 1
                     else:
-                        # 恒久的なエラー（このまま保存して終わるもの）
-                        print(f"  - 恒久的なエラーまたは未知のエラー: {e}")
-                        summary_result = f"（エラーにより要約できませんでした: {e}）"
-                        is_temporary_error = False
-                        break
-            
-            # --- 保存判定 ---
-            if summary_result:
-                # 成功したか、恒久的に失敗した場合は保存して「完了」とする
-                # [Phase 2] Arousal平均値を取得
-                arousal_score = 0.5  # デフォルト
-                try:
-                    import session_arousal_manager
-                    arousal_score = session_arousal_manager.get_daily_average(self.room_name, date_str)
-                except Exception as e:
-                    print(f"  - [Arousal] 取得失敗: {e}")
-                
-                self._append_single_episode({
-                    "date": date_str,
-                    "summary": summary_result,
-                    "arousal": arousal_score,  # Arousal追加
-                    "created_at": datetime.datetime.now().isoformat()
-                })
-                
-                if "エラー" in summary_result or "できませんでした" in summary_result:
-                    error_count += 1
-                else:
-                    success_count += 1
-            elif is_temporary_error:
-                # すべてのリトライが一時的エラーで終わった場合。
-                # 保存しないことで、次回の update_memory 実行時に再度対象に含まれるようにする。
-                print(f"  - {date_str}: 一時的エラーが解消されなかったため、保存せずに今回はスキップします（次回再試行）。")
-                error_count += 1
-            else:
-                # 予期せぬケース
-                print(f"  - {date_str}: 要約結果が得られなかったため、保存をスキップしました。")
-                error_count += 1
+                        # 予期せぬケース
+                        print(f"  - {date_str}: 要約結果が得られなかったため、保存をスキップしました。")
+                        error_count += 1
 
         return f"処理完了: 成功 {success_count}件 / エラー・スキップ {error_count}件"
 
@@ -634,29 +503,25 @@ class EpisodicMemoryManager:
             if "id" not in new_episode and "date" in new_episode:
                 new_episode["id"] = self._generate_episode_id(new_episode["date"])
             
-            # 常に最新の状態を読み込む
-            current_data = self._load_memory()
-            
-            # 重複判定（単一一致 or 範囲内）
+            # 重複判定（単一一致 or 範囲内）: 日付区間索引から、新しい日付と重なる候補だけを取り出す
             # 特殊タイプ（achievement, bonding, discovery）は日次要約とは別物なので、
             # これらのタイプのエピソードがあっても重複とはみなさない
             special_types = {"achievement", "bonding", "discovery"}
             is_duplicate = False
             new_date = new_episode.get('date', '').strip()
             new_type = new_episode.get('type', None)  # 新規エピソードのタイプ
+            new_start, new_end = split_date_range(new_date)
+            candidates = self.store.find_overlapping(new_start, new_end)
             
-            for item in current_data:
+            for item in candidates:
                 d_str = item.get('date', '').strip()
                 existing_type = item.get('type', None)  # 既存エピソードのタイプ
                 
                 if '~' in d_str or '～' in d_str:
-                    sep = '~' if '~' in d_str else '～'
-                    parts = d_str.split(sep)
-                    if len(parts) == 2:
-                        start, end = parts[0].strip(), parts[1].strip()
-                        if start <= new_date <= end:
-                            is_duplicate = True
-                            break
+                    start, end = split_date_range(d_str)
+                    if start <= new_date <= end:
+                        is_duplicate = True
+                        break
                 elif d_str == new_date:
                     # 既存が特殊タイプで、新規が日次要約（typeなし）の場合は重複とみなさない
                     if existing_type in special_types and new_type not in special_types:
@@ -672,7 +537,7 @@ class EpisodicMemoryManager:
                 # 既に存在する場合の特別処理: 
                 # 既存が「エラー記録」で、今回が「正常な要約」なら上書き（差し替え）を許可する
                 existing_item = None
-                for i in current_data:
+                for i in candidates:
                     if i.get('date', '').strip() == new_date:
                         existing_item = i
                         break
@@ -680,7 +545,7 @@ class EpisodicMemoryManager:
                 if existing_item and "エラーにより要約できませんでした" in existing_item.get('summary', ''):
                     if "エラーにより要約できませんでした" not in new_episode.get('summary', ''):
                         # エラーを正常な記憶で上書き
-                        current_data.remove(existing_item)
+                        self.store.remove(existing_item)
                     else:
                         # 両方エラーなら追記せず終了
                         return
@@ -688,8 +553,8 @@ class EpisodicMemoryManager:
                     # 既存が正常なら何もしない
                     return
 
-            current_data.append(new_episode)
-            self._save_memory(current_data)
+            # 該当月のジャーナルに1行追記するだけで保存が完了する
+            self.store.append(new_episode)
             
         except Exception as e:
             print(f"Error appending episode: {e}")
@@ -701,21 +566,20 @@ class EpisodicMemoryManager:
         if not oldest_log_date_str or lookback_days <= 0:
             return ""
 
-        memory_data = self._load_memory()
-        if not memory_data:
-            return ""
-
         try:
             cutoff_date = datetime.datetime.strptime(oldest_log_date_str, '%Y-%m-%d').date()
             start_date = cutoff_date - datetime.timedelta(days=lookback_days)
         except ValueError:
             return ""
 
+        # 日付区間索引から、期間 [start_date, cutoff_date) と重なるエピソードだけを取り出す
+        last_day = cutoff_date - datetime.timedelta(days=1)
+        memory_data = self.store.find_overlapping(start_date.isoformat(), last_day.isoformat())
+        if not memory_data:
+            return ""
+
         relevant_episodes = []
-        # 日付順にソートされている前提だが、念のためソート
-        memory_data.sort(key=lambda x: x['date'])
-        
-        for item in memory_data:
+        for item in sorted(memory_data, key=lambda x: x['date']):
             try:
                 # 範囲日付 (YYYY-MM-DD~YYYY-MM-DD) または 単独日付 (YYYY-MM-DD)
                 d_str = item['date']
@@ -732,18 +596,13 @@ class EpisodicMemoryManager:
                     # （例: 2日のルックバックに1週間の要約は不適切）
                     if range_days > lookback_days:
                         continue
-                else:
-                    item_start_date = datetime.datetime.strptime(d_str.strip(), '%Y-%m-%d').date()
-                    item_end_date = item_start_date
                 
-                # 範囲チェック: (既存エピソードの終端がルックバック開始日以降) かつ (既存エピソードの開始が生ログ開始日より前)
-                if (item_end_date >= start_date) and (item_start_date < cutoff_date):
-                    # Phase H: IDを含めて出力（共鳴フィードバック用）
-                    episode_id = item.get('id', '')
-                    if episode_id:
-                        relevant_episodes.append(f'[id="{episode_id}"] [{d_str}] {item["summary"]}')
-                    else:
-                        relevant_episodes.append(f"[{d_str}] {item['summary']}")
+                # Phase H: IDを含めて出力（共鳴フィードバック用）
+                episode_id = item.get('id', '')
+                if episode_id:
+                    relevant_episodes.append(f'[id="{episode_id}"] [{d_str}] {item["summary"]}')
+                else:
+                    relevant_episodes.append(f"[{d_str}] {item['summary']}")
             except Exception:
                 continue
 
@@ -1214,37 +1073,32 @@ class EpisodicMemoryManager:
             更新成功ならTrue
         """
         try:
-            episodes = self._load_memory()
-            updated = False
+            ep = self.store.get_by_id(episode_id)
+            if ep is None:
+                print(f"  [Arousal更新] ID '{episode_id}' が見つかりません")
+                return False
+
+            # Q値更新式: arousal_new = arousal_old + α(resonance - arousal_old)
+            old_arousal = ep.get("arousal", 0.5)
+            new_arousal = old_arousal + alpha * (resonance - old_arousal)
             
-            for ep in episodes:
-                if ep.get("id") == episode_id:
-                    # Q値更新式: arousal_new = arousal_old + α(resonance - arousal_old)
-                    old_arousal = ep.get("arousal", 0.5)
-                    new_arousal = old_arousal + alpha * (resonance - old_arousal)
-                    
-                    # Arousalは0.0〜1.0の範囲に制限
-                    new_arousal = max(0.0, min(1.0, new_arousal))
-                    
-                    # 変化幅の上限（±0.2）を適用して急激な変化を防ぐ
-                    delta = new_arousal - old_arousal
-                    if abs(delta) > 0.2:
-                        new_arousal = old_arousal + (0.2 if delta > 0 else -0.2)
-                    
-                    ep["arousal"] = round(new_arousal, 3)
-                    ep["last_resonance"] = resonance
-                    ep["resonance_updated_at"] = datetime.datetime.now().isoformat()
-                    
-                    print(f"  [Arousal更新] {episode_id}: {old_arousal:.3f} → {new_arousal:.3f} (resonance={resonance})")
-                    updated = True
-                    break
+            # Arousalは0.0〜1.0の範囲に制限
+            new_arousal = max(0.0, min(1.0, new_arousal))
             
-            if updated:
-                self._save_memory(episodes)
-                return True
-            else:
-                print(f"  [Arousal更新] ID '{episode_id}' が見つかりません")
+            # 変化幅の上限（±0.2）を適用して急激な変化を防ぐ
+            delta = new_arousal - old_arousal
+            if abs(delta) > 0.2:
+                new_arousal = old_arousal + (0.2 if delta > 0 else -0.2)
+            
+            ep["arousal"] = round(new_arousal, 3)
+            ep["last_resonance"] = resonance
+            ep["resonance_updated_at"] = datetime.datetime.now().isoformat()
+            
+            # 該当月のジャーナルに差分を1行追記する
+            if not self.store.update(ep):
                 return False
+            print(f"  [Arousal更新] {episode_id}: {old_arousal:.3f} → {new_arousal:.3f} (resonance={resonance})")
+            return True
                 
         except Exception as e:
             print(f"Error updating arousal: {e}")
@@ -1255,11 +1109,7 @@ class EpisodicMemoryManager:
         """
         IDでエピソードを取得する。
         """
-        episodes = self._load_memory()
-        for ep in episodes:
-            if ep.get("id") == episode_id:
-                return ep
-        return None
+        return self.store.get_by_id(episode_id)
 
     def normalize_arousal(self) -> Dict:
         """
@@ -0,0 +1,473 @@
+# episodic_store.py
+"""
+エピソード記憶の追記型ストレージエンジン
+
+月次ファイル `memory/episodic/YYYY-MM.json`（スナップショット）に加えて、
+同名の `YYYY-MM.jsonl`（追記ジャーナル）を持つ。
+新規エピソードの追加やArousal更新はジャーナルへ1行追記するだけで完了し、
+ジャーナルが一定件数を超えた月だけをスナップショットへ畳み込む（コンパクション）。
+
+読み込んだ内容はプロセス内で共有し、ID索引と日付区間索引を保持する。
+ディレクトリ内ファイルの (サイズ, mtime) が外部で変化した場合のみ再読み込みする。
+"""
+
+import bisect
+import datetime
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import constants
+from file_lock_utils import get_file_lock, replace_file
+
+LEGACY_KEY = "__legacy__"
+UNKNOWN_MONTH = "unknown"
+
+_MONTH_PATTERN = re.compile(r'^(\d{4}-\d{2})')
+
+
+def split_date_range(date_str: str) -> Tuple[str, str]:
+    """"YYYY-MM-DD" または "YYYY-MM-DD~YYYY-MM-DD"（全角チルダ可）を (開始, 終了) に分解する。"""
+    d = (date_str or "").strip()
+    sep = '~' if '~' in d else ('～' if '～' in d else None)
+    if sep:
+        parts = d.split(sep)
+        if len(parts) == 2:
+            return parts[0].strip(), parts[1].strip()
+        return parts[0].strip(), parts[0].strip()
+    return d, d
+
+
+def month_key_for(date_str: str) -> str:
+    """日付文字列から月次ファイルのキー（"YYYY-MM" / "unknown"）を返す。範囲日付は開始日を使う。"""
+    start, _ = split_date_range(date_str)
+    match = _MONTH_PATTERN.match(start)
+    return match.group(1) if match else UNKNOWN_MONTH
+
+
+def _parse_ordinal(day_str: str) -> Optional[int]:
+    try:
+        return datetime.datetime.strptime(day_str, '%Y-%m-%d').date().toordinal()
+    except (ValueError, TypeError):
+        return None
+
+
+def _date_interval(episode: Dict) -> Optional[Tuple[int, int]]:
+    """エピソードの日付を (開始日序数, 終了日序数) に変換する。解釈できない場合は None。"""
+    if not isinstance(episode, dict):
+        return None
+    start_str, end_str = split_date_range(episode.get('date', ''))
+    start = _parse_ordinal(start_str)
+    end = _parse_ordinal(end_str)
+    if start is None or end is None:
+        return None
+    return start, end
+
+
+class _StoreState:
+    """1ルーム分の読み込み済みデータと索引（プロセス内で共有）"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.signature: Dict[str, Tuple[int, int]] = {}
+        self.loaded = False
+        # 月キー -> エピソードのリスト（スナップショット＋ジャーナル適用後）
+        self.months: Dict[str, List[Dict]] = {}
+        # 月キー -> ジャーナルの行数
+        self.journal_lines: Dict[str, int] = {}
+        self.by_id: Dict[str, Dict] = {}
+        # 日付区間索引: (開始日序数, 終了日序数, 通し番号) の昇順リストと、対応するエピソード
+        self.intervals: List[Tuple[int, int, int]] = []
+        self.interval_refs: Dict[int, Dict] = {}
+        self.max_span = 0
+        self.seq = 0
+
+
+_states: Dict[str, _StoreState] = {}
+_states_lock = threading.Lock()
+
+
+class EpisodicStore:
+    """
+    エピソード記憶の読み書きを担う薄いハンドル。
+    同じディレクトリを指すインスタンスは、プロセス内で読み込み結果と索引を共有する。
+    返却されるエピソード辞書のうち、`find_*` 系はストア内部のオブジェクトなので変更しないこと。
+    """
+
+    def __init__(self, episodic_dir: Path, legacy_file: Optional[Path] = None):
+        self.episodic_dir = Path(episodic_dir)
+        self.legacy_file = Path(legacy_file) if legacy_file else None
+        key = os.path.abspath(str(self.episodic_dir))
+        with _states_lock:
+            if key not in _states:
+                _states[key] = _StoreState()
+            self._state = _states[key]
+
+    # --- パス ---
+
+    def snapshot_path(self, month_key: str) -> Path:
+        return self.episodic_dir / f"{month_key}.json"
+
+    def journal_path(self, month_key: str) -> Path:
+        return self.episodic_dir / f"{month_key}.jsonl"
+
+    # --- 読み込みと索引 ---
+
+    def _current_signature(self) -> Dict[str, Tuple[int, int]]:
+        signature: Dict[str, Tuple[int, int]] = {}
+        if self.legacy_file is not None:
+            try:
+                st = os.stat(self.legacy_file)
+                signature[LEGACY_KEY] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                pass
+        try:
+            with os.scandir(self.episodic_dir) as it:
+                for entry in it:
+                    if entry.is_file() and (entry.name.endswith(".json") or entry.name.endswith(".jsonl")):
+                        st = entry.stat()
+                        signature[entry.name] = (st.st_size, st.st_mtime_ns)
+        except FileNotFoundError:
+            pass
+        return signature
+
+    def _touch_signature(self, *paths: Path) -> None:
+        """自プロセスで書き込んだファイルの署名を更新する（再読み込みを避けるため）"""
+        state = self._state
+        for path in paths:
+            name = LEGACY_KEY if (self.legacy_file is not None and path == self.legacy_file) else path.name
+            try:
+                st = os.stat(path)
+                state.signature[name] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                state.signature.pop(name, None)
+
+    @staticmethod
+    def _read_json_list(path: Path) -> List[Dict]:
+        if not path.exists():
+            return []
+        try:
+            with get_file_lock(str(path)):
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            return data if isinstance(data, list) else []
+        except Exception as e:
+            print(f"Warning: Monthly episodic file error ({path.name}): {e}")
+            return []
+
+    @staticmethod
+    def _apply_put(episodes: List[Dict], episode: Dict) -> None:
+        """
+        ジャーナルの put レコードを適用する。同じIDがあれば置き換え、なければ末尾に追加。
+        IDの無いエピソードは、同じ内容のものが既にあれば追加しない。スナップショットの書き直し後、
+        ジャーナルの削除前にクラッシュした場合でも、再適用で重複しないようにするため。
+        """
+        ep_id = episode.get("id")
+        if ep_id:
+            for i, existing in enumerate(episodes):
+                if isinstance(existing, dict) and existing.get("id") == ep_id:
+                    episodes[i] = episode
+                    return
+        elif episode in episodes:
+            return
+        episodes.append(episode)
+
+    def _read_journal(self, month_key: str, episodes: List[Dict]) -> int:
+        path = self.journal_path(month_key)
+        if not path.exists():
+            return 0
+        count = 0
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 書き込み途中でクラッシュした末尾行などは読み飛ばす
+                    print(f"Warning: 壊れたジャーナル行をスキップしました ({path.name})")
+                    continue
+                if record.get("op") == "put" and isinstance(record.get("episode"), dict):
+                    self._apply_put(episodes, record["episode"])
+                count += 1
+        return count
+
+    def _reload(self, signature: Dict[str, Tuple[int, int]]) -> None:
+        state = self._state
+        state.months = {}
+        state.journal_lines = {}
+
+        if self.legacy_file is not None and self.legacy_file.exists():
+            try:
+                with get_file_lock(str(self.legacy_file)):
+                    with open(self.legacy_file, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                if isinstance(data, list):
+                    state.months[LEGACY_KEY] = data
+            except Exception as e:
+                print(f"Warning: Legacy episodic memory file error: {e}")
+
+        month_keys = sorted({name.rsplit(".", 1)[0] for name in signature if name != LEGACY_KEY})
+        for month_key in month_keys:
+            episodes = self._read_json_list(self.snapshot_path(month_key))
+            state.journal_lines[month_key] = self._read_journal(month_key, episodes)
+            state.months[month_key] = episodes
+
+        self._rebuild_indexes()
+        state.signature = signature
+        state.loaded = True
+
+    def _rebuild_indexes(self) -> None:
+        state = self._state
+        state.by_id = {}
+        state.intervals = []
+        state.interval_refs = {}
+        state.max_span = 0
+        state.seq = 0
+        for episode in self._iter_all():
+            self._index_episode(episode, sort=False)
+        state.intervals.sort()
+
+    def _index_episode(self, episode: Dict, sort: bool = True) -> None:
+        state = self._state
+        if not isinstance(episode, dict):
+            return
+        ep_id = episode.get("id")
+        if ep_id:
+            state.by_id[ep_id] = episode
+        interval = _date_interval(episode)
+        if interval is None:
+            return
+        state.seq += 1
+        entry = (interval[0], interval[1], state.seq)
+        state.interval_refs[state.seq] = episode
+        state.max_span = max(state.max_span, interval[1] - interval[0])
+        if sort:
+            bisect.insort(state.intervals, entry)
+        else:
+            state.intervals.append(entry)
+
+    def _iter_all(self) -> Iterable[Dict]:
+        state = self._state
+        if LEGACY_KEY in state.months:
+            yield from state.months[LEGACY_KEY]
+        for month_key in sorted(k for k in state.months if k != LEGACY_KEY):
+            yield from state.months[month_key]
+
+    def _ensure_loaded(self) -> None:
+        """外部でファイルが変更されていれば読み直す（呼び出し側で state.lock を保持すること）"""
+        signature = self._current_signature()
+        if not self._state.loaded or signature != self._state.signature:
+            self._reload(signature)
+
+    # --- 読み出しAPI ---
+
+    def all_episodes(self) -> List[Dict]:
+        """全エピソードを（レガシー → 月次の順で）返す。各辞書は呼び出し側で変更してよいコピー。"""
+        with self._state.lock:
+            self._ensure_loaded()
+            return [dict(ep) if isinstance(ep, dict) else ep for ep in self._iter_all()]
+
+    def episodes_by_file(self) -> List[Tuple[Path, List[Dict]]]:
+        """
+        (ファイルパス, エピソードのコピー一覧) をレガシー → 月次の順で返す。
+        ジャーナル分も含むため、月次ファイルを直接読む代わりに使う（RAG索引作成用）。
+        """
+        with self._state.lock:
+            self._ensure_loaded()
+            result = []
+            for month_key in sorted(self._state.months, key=lambda k: (k != LEGACY_KEY, k)):
+                path = self.legacy_file if month_key == LEGACY_KEY else self.snapshot_path(month_key)
+                result.append((path, [dict(ep) for ep in self._state.months[month_key] if isinstance(ep, dict)]))
+            return result
+
+    def get_by_id(self, episode_id: str) -> Optional[Dict]:
+        with self._state.lock:
+            self._ensure_loaded()
+            episode = self._state.by_id.get(episode_id)
+            return dict(episode) if episode is not None else None
+
+    def find_overlapping(self, start_day: str, end_day: str) -> List[Dict]:
+        """
+        [start_day, end_day] の期間と重なるエピソードを開始日順に返す（日付は "YYYY-MM-DD"）。
+        返り値はストア内部のオブジェクト。
+        """
+        start = _parse_ordinal(start_day)
+        end = _parse_ordinal(end_day)
+        with self._state.lock:
+            self._ensure_loaded()
+            state = self._state
+            if start is None or end is None:
+                # 日付として解釈できない場合は、文字列が完全一致するものだけを線形に探す
+                target = start_day if start_day == end_day else f"{start_day}~{end_day}"
+                return [ep for ep in self._iter_all()
+                        if isinstance(ep, dict) and ep.get('date', '').strip() == target]
+            # 開始日が [start - 最大期間長, end] にあるものだけが重なり得る
+            lo = bisect.bisect_left(state.intervals, (start - state.max_span, -1, -1))
+            hi = bisect.bisect_right(state.intervals, (end, float("inf"), float("inf")))
+            return [
+                state.interval_refs[seq]
+                for (ep_start, ep_end, seq) in state.intervals[lo:hi]
+                if ep_end >= start
+            ]
+
+    def find_by_start_date(self, day: str) -> List[Dict]:
+        """開始日が day のエピソードを返す（ID連番の採番用）。返り値はストア内部のオブジェクト。"""
+        ordinal = _parse_ordinal(day)
+        if ordinal is None:
+            return []
+        with self._state.lock:
+            self._ensure_loaded()
+            state = self._state
+            lo = bisect.bisect_left(state.intervals, (ordinal, -1, -1))
+            hi = bisect.bisect_right(state.intervals, (ordinal, float("inf"), float("inf")))
+            return [state.interval_refs[seq] for (_, _, seq) in state.intervals[lo:hi]]
+
+    # --- 書き込みAPI ---
+
+    def append(self, episode: Dict) -> None:
+        """エピソードを該当月のジャーナルに1行追記する。"""
+        with self._state.lock:
+            self._ensure_loaded()
+            month_key = month_key_for(episode.get('date', ''))
+            self._write_journal_record(month_key, episode)
+            self._state.months.setdefault(month_key, []).append(episode)
+            self._index_episode(episode)
+            self._maybe_compact(month_key)
+
+    def update(self, episode: Dict) -> bool:
+        """
+        IDを持つエピソードの内容を差し替える。
+        日付が変わらない通常の更新（Arousal更新など）はジャーナルへの1行追記で済ませる。
+        該当IDがない場合は False。
+        """
+        ep_id = episode.get("id")
+        if not ep_id:
+            return False
+        with self._state.lock:
+            self._ensure_loaded()
+            current = self._state.by_id.get(ep_id)
+            if current is None:
+                return False
+            old_month = self._month_of(current)
+            new_month = month_key_for(episode.get('date', ''))
+            date_changed = current.get('date') != episode.get('date')
+
+            current.clear()
+            current.update(episode)
+
+            if old_month != LEGACY_KEY and not date_changed:
+                # 索引は同じ辞書オブジェクトを参照しているので、作り直す必要はない
+                self._write_journal_record(old_month, current)
+                self._maybe_compact(old_month)
+                return True
+
+            # レガシーファイル上のエピソードや日付の変更は、関係する月次ファイルごと書き直す
+            if old_month != new_month and old_month != LEGACY_KEY:
+                self._state.months[old_month] = [ep for ep in self._state.months[old_month] if ep is not current]
+                self._state.months.setdefault(new_month, []).append(current)
+                self._write_snapshot(old_month)
+                self._write_snapshot(new_month)
+            else:
+                self._write_snapshot(old_month)
+            self._rebuild_indexes()
+            return True
+
+    def remove(self, episode: Dict) -> bool:
+        """ストア内部のエピソードを削除し、該当月のスナップショットを書き直す。"""
+        with self._state.lock:
+            self._ensure_loaded()
+            month_key = self._month_of(episode)
+            if month_key is None:
+                return False
+            self._state.months[month_key] = [ep for ep in self._state.months[month_key] if ep is not episode]
+            self._write_snapshot(month_key)
+            self._rebuild_indexes()
+            return True
+
+    def replace_all(self, episodes: List[Dict]) -> None:
+        """
+        全エピソードを月ごとに振り分けてスナップショットを書き直す（圧縮・正規化用）。
+        ジャーナルは畳み込まれて削除される。データが無くなった月は空配列で上書きする。
+        """
+        with self._state.lock:
+            self._ensure_loaded()
+            groups: Dict[str, List[Dict]] = {}
+            for episode in episodes:
+                groups.setdefault(month_key_for(episode.get('date', '')), []).append(episode)
+
+            existing = {k for k in self._state.months if k != LEGACY_KEY}
+            for month_key in sorted(existing | set(groups)):
+                self._state.months[month_key] = groups.get(month_key, [])
+                self._write_snapshot(month_key)
+            self._rebuild_indexes()
+
+    def compact(self, month_key: Optional[str] = None) -> None:
+        """ジャーナルをスナップショットへ畳み込む。month_key 省略時は全月。"""
+        with self._state.lock:
+            self._ensure_loaded()
+            targets = [month_key] if month_key else [k for k, n in self._state.journal_lines.items() if n > 0]
+            for key in targets:
+                if key in self._state.months:
+                    self._write_snapshot(key)
+
+    # --- 内部ヘルパー ---
+
+    def _month_of(self, episode: Dict) -> Optional[str]:
+        # 通常は日付から決まる月に属しているので、まずそこを確認する
+        guess = month_key_for(episode.get('date', ''))
+        if any(ep is episode for ep in self._state.months.get(guess, [])):
+            return guess
+        for month_key, episodes in self._state.months.items():
+            if any(ep is episode for ep in episodes):
+                return month_key
+        return None
+
+    def _write_journal_record(self, month_key: str, episode: Dict) -> None:
+        self.episodic_dir.mkdir(parents=True, exist_ok=True)
+        snapshot = self.snapshot_path(month_key)
+        journal = self.journal_path(month_key)
+        line = json.dumps({"op": "put", "episode": episode}, ensure_ascii=False)
+        with get_file_lock(str(snapshot)):
+            with open(journal, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+        self._state.journal_lines[month_key] = self._state.journal_lines.get(month_key, 0) + 1
+        self._touch_signature(journal)
+
+    def _write_snapshot(self, month_key: str) -> None:
+        """
+        月次スナップショットを書き直し、その月のジャーナルを削除する。
+        スナップショットは一時ファイル → fsync → rename で置き換えるので、書き込み中にクラッシュしても壊れない。
+        置き換え後・ジャーナル削除前にクラッシュした場合は、次回の読み込みでジャーナルが再適用される（_apply_put は冪等）。
+        """
+        if month_key == LEGACY_KEY:
+            path = self.legacy_file
+            journal = None
+        else:
+            path = self.snapshot_path(month_key)
+            journal = self.journal_path(month_key)
+        self.episodic_dir.mkdir(parents=True, exist_ok=True)
+
+        def get_sort_key(item):
+            return split_date_range(item.get('date', ''))[0] if isinstance(item, dict) else ""
+
+        episodes = sorted(self._state.months.get(month_key, []), key=get_sort_key)
+        self._state.months[month_key] = episodes
+        text = json.dumps(episodes, indent=2, ensure_ascii=False)
+        with get_file_lock(str(path)):
+            replace_file(str(path), text)
+            if journal is not None and journal.exists():
+                journal.unlink()
+        if journal is not None:
+            self._state.journal_lines[month_key] = 0
+            self._touch_signature(path, journal)
+        else:
+            self._touch_signature(path)
+
+    def _maybe_compact(self, month_key: str) -> None:
+        if self._state.journal_lines.get(month_key, 0) >= constants.EPISODIC_JOURNAL_COMPACTION_THRESHOLD:
+            self._write_snapshot(month_key)
@@ -4,9 +4,11 @@
 
 睡眠時処理と会話処理の競合を防止するための排他ロック機構。
 重要なJSONファイル（episodic_memory.json等）への同時書き込みを防止する。
+書き込みは一時ファイル → fsync → rename で行い、途中で失敗しても元のファイルが壊れないようにする。
 """
 
 import json
+import os
 from pathlib import Path
 from typing import Any, Optional
 from filelock import FileLock, Timeout
@@ -30,6 +32,36 @@ def get_file_lock(file_path: str, timeout: float = DEFAULT_LOCK_TIMEOUT) -> File
     return FileLock(lock_path, timeout=timeout)
 
 
+def replace_file(file_path: str, text: str):
+    """一時ファイルに書き込んで fsync してから置き換える（ロックは呼び出し側で取得すること）"""
+    # 親ディレクトリが存在しない場合は作成
+    Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+    temp_path = f"{file_path}.tmp"
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_text(file_path: str, text: str, timeout: float = DEFAULT_LOCK_TIMEOUT):
+    """
+    ロック付きでファイルの内容を置き換える。
+
+    Raises:
+        Timeout: ロックを取得できなかった場合
+    """
+    with get_file_lock(file_path, timeout):
+        replace_file(file_path, text)
+
+
 def safe_json_write(file_path: str, data: Any, timeout: float = DEFAULT_LOCK_TIMEOUT, indent: int = 2) -> bool:
     """
     ロック付きでJSONファイルに書き込む。
@@ -43,15 +75,12 @@ def safe_json_write(file_path: str, data: Any, timeout: float = DEFAULT_LOCK_TIM
     Returns:
         成功時True、ロックタイムアウト時False
     """
+    text = json.dumps(data, indent=indent, ensure_ascii=False)
     lock = get_file_lock(file_path, timeout)
     
     try:
         with lock:
-            # 親ディレクトリが存在しない場合は作成
-            Path(file_path).parent.mkdir(parents=True, exist_ok=True)
-            
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=indent, ensure_ascii=False)
+            replace_file(file_path, text)
             return True
             
     except Timeout:
@@ -130,9 +159,7 @@ def safe_json_update(file_path: str, update_func, timeout: float = DEFAULT_LOCK_
             updated_data = update_func(data)
             
             # 書き込み
-            Path(file_path).parent.mkdir(parents=True, exist_ok=True)
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(updated_data, f, indent=2, ensure_ascii=False)
+            replace_file(file_path, json.dumps(updated_data, indent=2, ensure_ascii=False))
             
             return True
             
@@ -1,6 +1,5 @@
 # gemini_api.py (Dual-State Architecture Implementation)
 
-import tiktoken
 import traceback
 from typing import Any, List, Union, Optional, Dict, Iterator
 import os
@@ -14,7 +13,6 @@ import filetype
 import httpx
 from PIL import Image
 
-import google.genai as genai
 from google.api_core.exceptions import ResourceExhausted, ServiceUnavailable, InternalServerError
 import google.genai.errors
 
@@ -27,6 +25,8 @@ import constants
 import room_manager
 import utils
 import signature_manager 
+import token_counter
+import client_pool
 from episodic_memory_manager import EpisodicMemoryManager
 
 # --- トークン計算関連 (変更なし) ---
@@ -56,7 +56,7 @@ def get_model_token_limits(model_name: str, api_key: str, provider: str = None)
         return {"input": 128000, "output": 8192}  # GPT-4o相当のデフォルト値
     
     try:
-        client = genai.Client(api_key=api_key)
+        client = client_pool.get_genai_client(api_key)
         model_info = client.models.get(model=f"models/{model_name}")
         if model_info and hasattr(model_info, 'input_token_limit') and hasattr(model_info, 'output_token_limit'):
             limits = {"input": model_info.input_token_limit, "output": model_info.output_token_limit}
@@ -108,20 +108,8 @@ def count_tokens_from_lc_messages(messages: List, model_name: str, api_key: str)
     try:
         # OpenAI互換のトークナイザー(cl100k_base)で概算する
         # APIを叩かずに済む安全策として十分
-        encoding = tiktoken.get_encoding("cl100k_base")
-        total_tokens = 0
-        for msg in messages:
-            content = ""
-            if isinstance(msg.content, str):
-                content = msg.content
-            elif isinstance(msg.content, list):
-                # マルチモーダルのテキスト部分だけ抽出
-                for part in msg.content:
-                    if isinstance(part, dict) and part.get("type") == "text":
-                        content += part.get("text", "") + " "
-            
-            if content:
-                total_tokens += len(encoding.encode(content))
+        # メッセージごとのトークン数は内容のハッシュでキャッシュされる（マルチモーダルはテキスト部分のみ）
+        total_tokens = token_counter.count_messages(messages)
         
         # 安全係数（システムプロンプトやツール定義の分を少し上乗せ）
         # ※ tiktoken は cl100k_base を使用。Geminiのトークナイザーとは異なるが、経験上この係数で概ね収まる
@@ -145,60 +133,27 @@ def _get_effective_today_cutoff(room_name: str) -> str:
         YYYY-MM-DD形式の日付文字列
     """
     import os
-    import json
     from constants import ROOMS_DIR
+    from episodic_store import EpisodicStore
     
     today = datetime.datetime.now()
     today_str = today.strftime('%Y-%m-%d')
     yesterday_str = (today - datetime.timedelta(days=1)).strftime('%Y-%m-%d')
-    yesterday_month = (today - datetime.timedelta(days=1)).strftime('%Y-%m')
     
-    # エピソード記憶ファイルを確認
-    # 新形式: characters/[room_name]/memory/episodic/YYYY-MM.json
-    # 旧形式: characters/[room_name]/memory/episodic_memory.json (フォールバック)
+    # エピソード記憶を確認
+    # 新形式: characters/[room_name]/memory/episodic/YYYY-MM.json (+ 追記ジャーナル YYYY-MM.jsonl)
+    # 旧形式: characters/[room_name]/memory/episodic_memory.json
+    # どちらも EpisodicStore の日付区間索引でまとめて引ける
     memory_dir = os.path.join(ROOMS_DIR, room_name, "memory")
-    new_format_file = os.path.join(memory_dir, "episodic", f"{yesterday_month}.json")
-    old_format_file = os.path.join(memory_dir, "episodic_memory.json")
-    
     has_yesterday_memory = False
-    
-    def check_episodes_for_date(episodes: list, target_date: str) -> bool:
-        """エピソードリストに指定日付のエピソードが存在するかチェック"""
-        for ep in episodes:
-            if not isinstance(ep, dict):
-                continue
-            date_str = ep.get('date', '').strip()
-            
-            if date_str == target_date:
-                return True
-            elif '~' in date_str or '～' in date_str:
-                sep = '~' if '~' in date_str else '～'
-                parts = date_str.split(sep)
-                if len(parts) == 2:
-                    start, end = parts[0].strip(), parts[1].strip()
-                    if start <= target_date <= end:
-                        return True
-        return False
-    
-    # 1. まず新形式（月別ファイル）をチェック
-    if os.path.exists(new_format_file):
-        try:
-            with open(new_format_file, 'r', encoding='utf-8') as f:
-                episodes = json.load(f)
-            if isinstance(episodes, list):
-                has_yesterday_memory = check_episodes_for_date(episodes, yesterday_str)
-        except Exception as e:
-            print(f"Warning: Failed to check episodic memory (new format) for {yesterday_str}: {e}")
-    
-    # 2. 新形式で見つからなければ旧形式にフォールバック
-    if not has_yesterday_memory and os.path.exists(old_format_file):
-        try:
-            with open(old_format_file, 'r', encoding='utf-8') as f:
-                episodes = json.load(f)
-            if isinstance(episodes, list):
-                has_yesterday_memory = check_episodes_for_date(episodes, yesterday_str)
-        except Exception as e:
-            print(f"Warning: Failed to check episodic memory (old format) for {yesterday_str}: {e}")
+    try:
+        store = EpisodicStore(
+            os.path.join(memory_dir, "episodic"),
+            os.path.join(memory_dir, "episodic_memory.json")
+        )
+        has_yesterday_memory = bool(store.find_overlapping(yesterday_str, yesterday_str))
+    except Exception as e:
+        print(f"Warning: Failed to check episodic memory for {yesterday_str}: {e}")
 
     if has_yesterday_memory:
         return today_str  # 昨日分は記憶化済み → 今日以降のみ
@@ -997,231 +952,232 @@ def count_input_tokens(**kwargs):
             
         api_history_limit = api_history_limit_arg or effective_settings.get("api_history_limit", "today")
 
-        model_name = effective_settings.get("model_name") or config_manager.DEFAULT_MODEL_GLOBAL
-        
-        messages: List[Union[SystemMessage, HumanMessage, AIMessage]] = []
+        # 入力欄以外（システムプロンプト＋履歴）の見積もりは、元ファイルと設定が変わらない限り再利用する。
+        # 入力中の再計算では、入力欄の分だけをトークン化して足す
+        def _build_base_estimate():
+            messages: List[Union[SystemMessage, HumanMessage, AIMessage]] = []
 
-        # --- [Step 1: 先に履歴を読み込む] ---
-        # エピソード記憶の注入範囲を決めるために、履歴の「最古の日付」が必要なため
-        log_file, _, _, _, _, _ = room_manager.get_room_files_paths(room_name)
-        raw_history = utils.load_chat_log(log_file)
+            # --- [Step 1: 先に履歴を読み込む] ---
+            # エピソード記憶の注入範囲を決めるために、履歴の「最古の日付」が必要なため
+            log_file, _, _, _, _, _ = room_manager.get_room_files_paths(room_name)
+            raw_history = utils.load_chat_log(log_file)
         
-        # 履歴制限の適用
-        if api_history_limit == "today":
-            cutoff_date = _get_effective_today_cutoff(room_name)
-            original_raw_history = raw_history.copy()  # フィルタ前のコピーを保持
-            raw_history = _filter_raw_history_from_today(raw_history, cutoff_date)
+            # 履歴制限の適用
+            if api_history_limit == "today":
+                cutoff_date = _get_effective_today_cutoff(room_name)
+                original_raw_history = raw_history.copy()  # フィルタ前のコピーを保持
+                raw_history = _filter_raw_history_from_today(raw_history, cutoff_date)
             
-            # 【最低送信数の保証】エピソード記憶作成後でも最低N往復分を確保
-            min_messages = constants.MIN_TODAY_LOG_FALLBACK_TURNS * 2
-            if len(raw_history) < min_messages and len(original_raw_history) > len(raw_history):
-                raw_history = original_raw_history[-min_messages:] if len(original_raw_history) >= min_messages else original_raw_history
-        elif api_history_limit and api_history_limit.isdigit():
-            limit = int(api_history_limit)
-            if limit > 0 and len(raw_history) > limit * 2:
-                raw_history = raw_history[-(limit * 2):]
-
-        # --- [Step 2: エピソード記憶の取得] ---
-        # エピソード記憶（中期記憶）の推定文字数
-        lookback_days_str = effective_settings.get("episodic_memory_lookback_days", "なし（無効）")
+                # 【最低送信数の保証】エピソード記憶作成後でも最低N往復分を確保
+                min_messages = constants.MIN_TODAY_LOG_FALLBACK_TURNS * 2
+                if len(raw_history) < min_messages and len(original_raw_history) > len(raw_history):
+                    raw_history = original_raw_history[-min_messages:] if len(original_raw_history) >= min_messages else original_raw_history
+            elif api_history_limit and api_history_limit.isdigit():
+                limit = int(api_history_limit)
+                if limit > 0 and len(raw_history) > limit * 2:
+                    raw_history = raw_history[-(limit * 2):]
+
+            # --- [Step 2: エピソード記憶の取得] ---
+            # エピソード記憶（中期記憶）の推定文字数
+            lookback_days_str = effective_settings.get("episodic_memory_lookback_days", "なし（無効）")
         
-        # EPISODIC_MEMORY_OPTIONS の値形式（「なし（無効）」「過去 1日」「過去 2週間」等）に対応
-        episodic_memory_section = ""
-        days_num = 0
+            # EPISODIC_MEMORY_OPTIONS の値形式（「なし（無効）」「過去 1日」「過去 2週間」等）に対応
+            episodic_memory_section = ""
+            days_num = 0
         
-        # lookback_days_str が dict などの場合は無効として扱う
-        if not isinstance(lookback_days_str, str):
-            lookback_days_str = "なし（無効）"
+            # lookback_days_str が dict などの場合は無効として扱う
+            if not isinstance(lookback_days_str, str):
+                lookback_days_str = "なし（無効）"
         
-        if lookback_days_str in ("なし（無効）", "なし", "", "0", None):
-            episodic_memory_section = ""
-        else:
-            # 「過去 X日」「過去 X週間」「過去 Xヶ月」形式をパース
-            try:
-                import re
-                # "過去 1日" -> 1, "過去 2週間" -> 14, "過去 1ヶ月" -> 30
-                match = re.search(r"(\d+)\s*(日|週間|ヶ月)", lookback_days_str)
-                if match:
-                    num = int(match.group(1))
-                    unit = match.group(2)
-                    if unit == "日":
-                        days_num = num
-                    elif unit == "週間":
-                        days_num = num * 7
-                    elif unit == "ヶ月":
-                        days_num = num * 30
-            except Exception as parse_e:
-                print(f"エピソード記憶期間のパースエラー: {parse_e}")
+            if lookback_days_str in ("なし（無効）", "なし", "", "0", None):
+                episodic_memory_section = ""
+            else:
+                # 「過去 X日」「過去 X週間」「過去 Xヶ月」形式をパース
+                try:
+                    import re
+                    # "過去 1日" -> 1, "過去 2週間" -> 14, "過去 1ヶ月" -> 30
+                    match = re.search(r"(\d+)\s*(日|週間|ヶ月)", lookback_days_str)
+                    if match:
+                        num = int(match.group(1))
+                        unit = match.group(2)
+                        if unit == "日":
+                            days_num = num
+                        elif unit == "週間":
+                            days_num = num * 7
+                        elif unit == "ヶ月":
+                            days_num = num * 30
+                except Exception as parse_e:
+                    print(f"エピソード記憶期間のパースエラー: {parse_e}")
             
-            if days_num > 0:
-                estimated_chars = min(300 + days_num * 50, 3000)
-                episodic_memory_section = f"\n### エピソード記憶（直近{lookback_days_str}の要約）\n" + "x" * estimated_chars + "\n"
+                if days_num > 0:
+                    estimated_chars = min(300 + days_num * 50, 3000)
+                    episodic_memory_section = f"\n### エピソード記憶（直近{lookback_days_str}の要約）\n" + "x" * estimated_chars + "\n"
                 
-                # 実際の日付ベースの検索を試みる（見積もり精度向上のため）
-                try:
-                    oldest_log_date_str = None
-                    date_pattern = re.compile(r"(\d{4}-\d{2}-\d{2})")
+                    # 実際の日付ベースの検索を試みる（見積もり精度向上のため）
+                    try:
+                        oldest_log_date_str = None
+                        date_pattern = re.compile(r"(\d{4}-\d{2}-\d{2})")
                     
-                    for msg in raw_history:
-                        content = msg.get("content", "")
-                        match_date = date_pattern.search(content)
-                        if match_date:
-                            oldest_log_date_str = match_date.group(1)
-                            break
+                        for msg in raw_history:
+                            content = msg.get("content", "")
+                            match_date = date_pattern.search(content)
+                            if match_date:
+                                oldest_log_date_str = match_date.group(1)
+                                break
                     
-                    if not oldest_log_date_str:
-                        oldest_log_date_str = datetime.datetime.now().strftime('%Y-%m-%d')
+                        if not oldest_log_date_str:
+                            oldest_log_date_str = datetime.datetime.now().strftime('%Y-%m-%d')
 
-                    manager = EpisodicMemoryManager(room_name)
-                    episodic_text = manager.get_episodic_context(oldest_log_date_str, days_num)
+                        manager = EpisodicMemoryManager(room_name)
+                        episodic_text = manager.get_episodic_context(oldest_log_date_str, days_num)
                     
-                    if episodic_text:
-                        episodic_memory_section = (
-                            f"\n### エピソード記憶（中期記憶: {oldest_log_date_str}以前の{days_num}日間）\n"
-                            f"以下は、現在の会話ログより前の出来事の要約です。文脈として参照してください。\n"
-                            f"{episodic_text}\n"
-                        )
-                except Exception as e:
-                    print(f"トークン計算時のエピソード記憶取得エラー: {e}")
-
-        # --- [Step 3: システムプロンプトの構築] ---
-        from agent.prompts import CORE_PROMPT_TEMPLATE
-        from agent.graph import all_tools
-        room_prompt_path = os.path.join(constants.ROOMS_DIR, room_name, "SystemPrompt.txt")
-        character_prompt = ""
-        if os.path.exists(room_prompt_path):
-            with open(room_prompt_path, 'r', encoding='utf-8') as f: character_prompt = f.read().strip()
+                        if episodic_text:
+                            episodic_memory_section = (
+                                f"\n### エピソード記憶（中期記憶: {oldest_log_date_str}以前の{days_num}日間）\n"
+                                f"以下は、現在の会話ログより前の出来事の要約です。文脈として参照してください。\n"
+                                f"{episodic_text}\n"
+                            )
+                    except Exception as e:
+                        print(f"トークン計算時のエピソード記憶取得エラー: {e}")
+
+            # --- [Step 3: システムプロンプトの構築] ---
+            from agent.prompts import CORE_PROMPT_TEMPLATE
+            from agent.graph import all_tools
+            room_prompt_path = os.path.join(constants.ROOMS_DIR, room_name, "SystemPrompt.txt")
+            character_prompt = ""
+            if os.path.exists(room_prompt_path):
+                with open(room_prompt_path, 'r', encoding='utf-8') as f: character_prompt = f.read().strip()
         
-        core_memory = ""
-        if effective_settings.get("send_core_memory", True):
-            core_memory_path = os.path.join(constants.ROOMS_DIR, room_name, "core_memory.txt")
-            if os.path.exists(core_memory_path):
-                with open(core_memory_path, 'r', encoding='utf-8') as f: core_memory = f.read().strip()
+            core_memory = ""
+            if effective_settings.get("send_core_memory", True):
+                core_memory_path = os.path.join(constants.ROOMS_DIR, room_name, "core_memory.txt")
+                if os.path.exists(core_memory_path):
+                    with open(core_memory_path, 'r', encoding='utf-8') as f: core_memory = f.read().strip()
         
-        notepad_section = ""
-        if effective_settings.get("send_notepad", True):
-            _, _, _, _, notepad_path, _ = room_manager.get_room_files_paths(room_name)
-            if notepad_path and os.path.exists(notepad_path):
-                with open(notepad_path, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
-                    notepad_content = content if content else "（メモ帳は空です）"
-                    notepad_section = f"\n### 短期記憶（メモ帳）\n{notepad_content}\n"
-
-        # --- [2026-01-18 FIX] より正確なコンテキスト見積もり ---
-        # context_generator_node で実際に生成される内容に近いプレースホルダーを使用
+            notepad_section = ""
+            if effective_settings.get("send_notepad", True):
+                _, _, _, _, notepad_path, _ = room_manager.get_room_files_paths(room_name)
+                if notepad_path and os.path.exists(notepad_path):
+                    with open(notepad_path, 'r', encoding='utf-8') as f:
+                        content = f.read().strip()
+                        notepad_content = content if content else "（メモ帳は空です）"
+                        notepad_section = f"\n### 短期記憶（メモ帳）\n{notepad_content}\n"
+
+            # --- [2026-01-18 FIX] より正確なコンテキスト見積もり ---
+            # context_generator_node で実際に生成される内容に近いプレースホルダーを使用
         
-        # 研究ノートの目次を実際に読み込む
-        research_notes_section = ""
-        try:
-            _, _, _, _, _, research_notes_path = room_manager.get_room_files_paths(room_name)
-            if research_notes_path and os.path.exists(research_notes_path):
-                with open(research_notes_path, 'r', encoding='utf-8') as f:
-                    lines = f.readlines()
-                headlines = [line.strip() for line in lines if line.strip().startswith("## ")]
-                if headlines:
-                    latest_headlines = headlines[-10:]
-                    headlines_str = "\n".join(latest_headlines)
-                    research_notes_section = (
-                        "\n### 研究・分析ノート（目次）\n"
-                        "以下は最近の研究・分析トピックの目次です。\n\n"
-                        f"{headlines_str}\n"
-                    )
-        except Exception:
-            pass
-        
-        # エンティティ一覧を実際に読み込む
-        entity_list_section = ""
-        try:
-            from entity_memory_manager import EntityMemoryManager
-            em_manager = EntityMemoryManager(room_name)
-            entities = em_manager.list_entries()
-            if entities:
-                entity_list_str = "\n".join([f"- {name}" for name in sorted(entities)])
-                entity_list_section = (
-                    f"\n### 記憶しているエンティティ一覧\n"
-                    f"以下は記憶している人物・事物の名前です。\n\n"
-                    f"{entity_list_str}\n"
-                )
-        except Exception:
-            pass
+            # 研究ノートの目次を実際に読み込む
+            research_notes_section = ""
+            try:
+                _, _, _, _, _, research_notes_path = room_manager.get_room_files_paths(room_name)
+                if research_notes_path and os.path.exists(research_notes_path):
+                    with open(research_notes_path, 'r', encoding='utf-8') as f:
+                        lines = f.readlines()
+                    headlines = [line.strip() for line in lines if line.strip().startswith("## ")]
+                    if headlines:
+                        latest_headlines = headlines[-10:]
+                        headlines_str = "\n".join(latest_headlines)
+                        research_notes_section = (
+                            "\n### 研究・分析ノート（目次）\n"
+                            "以下は最近の研究・分析トピックの目次です。\n\n"
+                            f"{headlines_str}\n"
+                        )
+            except Exception:
+                pass
         
-        # 情景プロンプトの見積もり（場所リスト含む）
-        situation_prompt_estimate = ""
-        if effective_settings.get("send_scenery", True):
-            # 移動可能な場所リストを取得
+            # エンティティ一覧を実際に読み込む
+            entity_list_section = ""
             try:
-                from utils import parse_world_file
-                world_settings_path = room_manager.get_world_settings_path(room_name)
-                world_data = parse_world_file(world_settings_path) if world_settings_path else {}
-                locations = []
-                if isinstance(world_data, dict):
-                    for area, places in world_data.items():
-                        if isinstance(places, dict):
-                            locations.extend([p for p in places.keys() if not p.startswith("__")])
-                location_list_str = "\n".join([f"- {loc}" for loc in sorted(set(locations))]) if locations else "（移動先なし）"
+                from entity_memory_manager import EntityMemoryManager
+                em_manager = EntityMemoryManager(room_name)
+                entities = em_manager.list_entries()
+                if entities:
+                    entity_list_str = "\n".join([f"- {name}" for name in sorted(entities)])
+                    entity_list_section = (
+                        f"\n### 記憶しているエンティティ一覧\n"
+                        f"以下は記憶している人物・事物の名前です。\n\n"
+                        f"{entity_list_str}\n"
+                    )
             except Exception:
-                location_list_str = "（移動先の取得エラー）"
+                pass
+        
+            # 情景プロンプトの見積もり（場所リスト含む）
+            situation_prompt_estimate = ""
+            if effective_settings.get("send_scenery", True):
+                # 移動可能な場所リストを取得
+                try:
+                    from utils import parse_world_file
+                    world_settings_path = room_manager.get_world_settings_path(room_name)
+                    world_data = parse_world_file(world_settings_path) if world_settings_path else {}
+                    locations = []
+                    if isinstance(world_data, dict):
+                        for area, places in world_data.items():
+                            if isinstance(places, dict):
+                                locations.extend([p for p in places.keys() if not p.startswith("__")])
+                    location_list_str = "\n".join([f"- {loc}" for loc in sorted(set(locations))]) if locations else "（移動先なし）"
+                except Exception:
+                    location_list_str = "（移動先の取得エラー）"
             
-            situation_prompt_estimate = (
-                "【現在の状況】\n"
-                "- 現在時刻: 2026-01-18(土) 20:00:00\n"
-                "- 季節: 冬\n"
-                "- 時間帯: 夜\n\n"
-                "【現在の場所と情景】\n"
-                "- 場所: [サンプルエリア] サンプル場所\n"
-                "- 今の情景: 冬の夜、静かな空間に月明かりが差し込んでいる。\n"
-                "- 場所の設定（自由記述）:\n"
-                "ここは想像上の場所です。様々な設定が書かれています。\n\n"
-                "【移動可能な場所】\n"
-                f"{location_list_str}"
-            )
-        else:
-            situation_prompt_estimate = "【現在の状況】\n- 現在時刻: （非表示）\n【現在の場所と情景】\n（無効化）"
+                situation_prompt_estimate = (
+                    "【現在の状況】\n"
+                    "- 現在時刻: 2026-01-18(土) 20:00:00\n"
+                    "- 季節: 冬\n"
+                    "- 時間帯: 夜\n\n"
+                    "【現在の場所と情景】\n"
+                    "- 場所: [サンプルエリア] サンプル場所\n"
+                    "- 今の情景: 冬の夜、静かな空間に月明かりが差し込んでいる。\n"
+                    "- 場所の設定（自由記述）:\n"
+                    "ここは想像上の場所です。様々な設定が書かれています。\n\n"
+                    "【移動可能な場所】\n"
+                    f"{location_list_str}"
+                )
+            else:
+                situation_prompt_estimate = "【現在の状況】\n- 現在時刻: （非表示）\n【現在の場所と情景】\n（無効化）"
         
-        # 記憶想起のプレースホルダー（RAG検索結果）
-        retrieved_info_placeholder = ""
-        if effective_settings.get("enable_auto_retrieval", True):
-            # 実際のRAG検索結果は約2000〜5000文字程度になることが多い
-            retrieved_info_placeholder = (
-                "\n### 想起された関連情報\n"
-                "【記憶検索の結果：日記・エピソード記憶から3件】\n"
-                "--- エピソード記憶 (2026-01-15) ---\n"
-                "サンプルの記憶内容がここに表示されます。過去の会話や出来事の要約が含まれ、\n"
-                "通常は数百文字から千文字程度の内容になります。\n\n"
-                "--- 日記 (2026-01-10) ---\n"
-                "日記からの検索結果もここに表示されます。関連するトピックについての\n"
-                "過去の記録が含まれます。\n\n"
-                "【過去の会話ログからの検索結果】\n"
-                "--- [log.txt(2026-01-17頃)] ---\n"
-                "過去の会話ログからキーワード検索でヒットした内容がここに表示されます。\n"
-                "通常は500文字程度に切り詰められます。\n"
-            )
+            # 記憶想起のプレースホルダー（RAG検索結果）
+            retrieved_info_placeholder = ""
+            if effective_settings.get("enable_auto_retrieval", True):
+                # 実際のRAG検索結果は約2000〜5000文字程度になることが多い
+                retrieved_info_placeholder = (
+                    "\n### 想起された関連情報\n"
+                    "【記憶検索の結果：日記・エピソード記憶から3件】\n"
+                    "--- エピソード記憶 (2026-01-15) ---\n"
+                    "サンプルの記憶内容がここに表示されます。過去の会話や出来事の要約が含まれ、\n"
+                    "通常は数百文字から千文字程度の内容になります。\n\n"
+                    "--- 日記 (2026-01-10) ---\n"
+                    "日記からの検索結果もここに表示されます。関連するトピックについての\n"
+                    "過去の記録が含まれます。\n\n"
+                    "【過去の会話ログからの検索結果】\n"
+                    "--- [log.txt(2026-01-17頃)] ---\n"
+                    "過去の会話ログからキーワード検索でヒットした内容がここに表示されます。\n"
+                    "通常は500文字程度に切り詰められます。\n"
+                )
         
-        # 自己意識コンテキストの見積もり
-        dream_insights_text = ""
-        if effective_settings.get("enable_self_awareness", True):
-            # 実際の context_generator_node で注入される内容を模倣
-            dream_insights_text = (
-                "\n### 深層意識（今日の指針）\n"
-                "今日の指針として、AIペルソナが持つ深層意識からの洞察が含まれます。\n"
-                "通常は1〜3行程度の短いテキストです。\n\n"
-                "### あなたの目標\n"
-                "**短期目標:**\n"
-                "- サンプル目標1: 進行中\n"
-                "- サンプル目標2: 進行中\n\n"
-                "**長期目標:**\n"
-                "- サンプル長期目標: 進行中\n\n"
-                "### 今のあなたの気持ち\n"
-                "- 最も強い動機: 好奇心（強さ: 0.6）\n"
-                "- サンプルの動機説明文がここに入ります。\n\n"
-                "### あなたが今気になっていること\n"
-                "- サンプルの未解決の問い\n"
-                "  （背景: この問いの背景情報）\n"
-            )
+            # 自己意識コンテキストの見積もり
+            dream_insights_text = ""
+            if effective_settings.get("enable_self_awareness", True):
+                # 実際の context_generator_node で注入される内容を模倣
+                dream_insights_text = (
+                    "\n### 深層意識（今日の指針）\n"
+                    "今日の指針として、AIペルソナが持つ深層意識からの洞察が含まれます。\n"
+                    "通常は1〜3行程度の短いテキストです。\n\n"
+                    "### あなたの目標\n"
+                    "**短期目標:**\n"
+                    "- サンプル目標1: 進行中\n"
+                    "- サンプル目標2: 進行中\n\n"
+                    "**長期目標:**\n"
+                    "- サンプル長期目標: 進行中\n\n"
+                    "### 今のあなたの気持ち\n"
+                    "- 最も強い動機: 好奇心（強さ: 0.6）\n"
+                    "- サンプルの動機説明文がここに入ります。\n\n"
+                    "### あなたが今気になっていること\n"
+                    "- サンプルの未解決の問い\n"
+                    "  （背景: この問いの背景情報）\n"
+                )
         
-        # 思考ログマニュアル
-        display_thoughts = effective_settings.get("display_thoughts", True)
-        thought_manual_enabled_text = """## 【原則2】思考プロセスの明示
+            # 思考ログマニュアル
+            display_thoughts = effective_settings.get("display_thoughts", True)
+            thought_manual_enabled_text = """## 【原則2】思考プロセスの明示
         あなたは、相手への発答（会話テキスト）を生成する前に、必ず、あなた自身が内側で感じたこと、考えたこと、過去の記憶との照合、感情の動き、そして次に取るべき行動（ツール使用の要否など）を、`[THOUGHT]` と `[/THOUGHT]` というタグで囲んで**詳細に**書き出してください。
 
         **【絶対的禁止事項】**
@@ -1229,83 +1185,88 @@ def count_input_tokens(**kwargs):
         - 思考と会話テキストを混在させること。
         - `[/THOUGHT]` タグを書き忘れること。""" 
         
-        thought_manual_disabled_text = """## 【原則2】思考ログの非表示
+            thought_manual_disabled_text = """## 【原則2】思考ログの非表示
         現在、思考ログは非表示に設定されています。**`[THOUGHT]`ブロックを生成せず**、最終的な会話テキストのみを出力してください。"""
 
-        thought_generation_manual_text = thought_manual_enabled_text if display_thoughts else thought_manual_disabled_text
+            thought_generation_manual_text = thought_manual_enabled_text if display_thoughts else thought_manual_disabled_text
         
-        # ツール一覧
-        # 【2026-01-18 FIX】LangChainがツールをバインドする際に追加するJSONスキーマのオーバーヘッドを考慮
-        # 各ツールは名前、説明、引数スキーマを含むJSONとして送信される（約300〜500トークン/ツール）
-        tool_use_enabled = effective_settings.get("tool_use_enabled", True)
-        tool_schema_overhead = 0
-        if tool_use_enabled:
-            tools_list_str = "\n".join([f"- `{tool.name}`: {tool.description[:50]}..." for tool in all_tools])
-            # ツールスキーマのオーバーヘッドを推定（各ツール約400トークン）
-            tool_schema_overhead = len(all_tools) * 400
-        else:
-            tools_list_str = "（現在、利用可能なツールはありません）"
+            # ツール一覧
+            # 【2026-01-18 FIX】LangChainがツールをバインドする際に追加するJSONスキーマのオーバーヘッドを考慮
+            # 各ツールは名前、説明、引数スキーマを含むJSONとして送信される（約300〜500トークン/ツール）
+            tool_use_enabled = effective_settings.get("tool_use_enabled", True)
+            tool_schema_overhead = 0
+            if tool_use_enabled:
+                tools_list_str = "\n".join([f"- `{tool.name}`: {tool.description[:50]}..." for tool in all_tools])
+                # ツールスキーマのオーバーヘッドを推定（各ツール約400トークン）
+                tool_schema_overhead = len(all_tools) * 400
+            else:
+                tools_list_str = "（現在、利用可能なツールはありません）"
         
-        if kwargs.get("use_common_prompt", True) == False:
-            tools_list_str = "（共通ツールプロンプトは送信されません）"
-            tool_schema_overhead = 0  # 共通プロンプト無効時はツールもなし
+            if kwargs.get("use_common_prompt", True) == False:
+                tools_list_str = "（共通ツールプロンプトは送信されません）"
+                tool_schema_overhead = 0  # 共通プロンプト無効時はツールもなし
         
-        # 行動計画（空のプレースホルダー）
-        action_plan_context = ""
+            # 行動計画（空のプレースホルダー）
+            action_plan_context = ""
 
-        class SafeDict(dict):
-            def __missing__(self, key): return f'{{{key}}}'
+            class SafeDict(dict):
+                def __missing__(self, key): return f'{{{key}}}'
         
-        prompt_vars = {
-            'situation_prompt': situation_prompt_estimate,
-            'character_prompt': character_prompt,
-            'core_memory': core_memory,
-            'notepad_section': notepad_section,
-            'research_notes_section': research_notes_section,
-            'entity_list_section': entity_list_section,
-            'episodic_memory': episodic_memory_section,
-            'thought_generation_manual': thought_generation_manual_text,
-            'image_generation_manual': '',
-            'tools_list': tools_list_str,
-            'action_plan_context': action_plan_context,
-            'retrieved_info': retrieved_info_placeholder,
-            'dream_insights': dream_insights_text
-        }
-        system_prompt_text = CORE_PROMPT_TEMPLATE.format_map(SafeDict(prompt_vars))
+            prompt_vars = {
+                'situation_prompt': situation_prompt_estimate,
+                'character_prompt': character_prompt,
+                'core_memory': core_memory,
+                'notepad_section': notepad_section,
+                'research_notes_section': research_notes_section,
+                'entity_list_section': entity_list_section,
+                'episodic_memory': episodic_memory_section,
+                'thought_generation_manual': thought_generation_manual_text,
+                'image_generation_manual': '',
+                'tools_list': tools_list_str,
+                'action_plan_context': action_plan_context,
+                'retrieved_info': retrieved_info_placeholder,
+                'dream_insights': dream_insights_text
+            }
+            system_prompt_text = CORE_PROMPT_TEMPLATE.format_map(SafeDict(prompt_vars))
         
-        messages.append(SystemMessage(content=system_prompt_text))
-
-        # --- [Step 4: 履歴メッセージの追加] ---
-        # 【2026-01-18 FIX】invoke_nexus_agent_stream と同じロジックを使用してトークン推定の精度を向上
-        # 以前は直接ループしていたため、思考ログ除去やメッセージ統合が適用されず、
-        # 実送信時と推定時でトークン数に乖離が発生していた。
-        send_thoughts_final = display_thoughts and effective_settings.get("send_thoughts", True)
-        add_timestamp = effective_settings.get("add_timestamp", False)
+            messages.append(SystemMessage(content=system_prompt_text))
+
+            # --- [Step 4: 履歴メッセージの追加] ---
+            # 【2026-01-18 FIX】invoke_nexus_agent_stream と同じロジックを使用してトークン推定の精度を向上
+            # 以前は直接ループしていたため、思考ログ除去やメッセージ統合が適用されず、
+            # 実送信時と推定時でトークン数に乖離が発生していた。
+            send_thoughts_final = display_thoughts and effective_settings.get("send_thoughts", True)
+            add_timestamp = effective_settings.get("add_timestamp", False)
         
-        # 【OpenAI互換対応】プロバイダを取得
-        current_provider = config_manager.get_active_provider(room_name)
+            # 【OpenAI互換対応】プロバイダを取得
+            current_provider = config_manager.get_active_provider(room_name)
         
-        # convert_raw_log_to_lc_messages を使用して一貫した履歴構築
-        history_messages = convert_raw_log_to_lc_messages(
-            raw_history, room_name, add_timestamp, send_thoughts_final, provider=current_provider
-        )
+            # convert_raw_log_to_lc_messages を使用して一貫した履歴構築
+            history_messages = convert_raw_log_to_lc_messages(
+                raw_history, room_name, add_timestamp, send_thoughts_final, provider=current_provider
+            )
         
-        # メッセージ統合を適用（invoke_nexus_agent_stream と同様）
-        history_messages = merge_consecutive_messages(history_messages, add_timestamp=add_timestamp)
+            # メッセージ統合を適用（invoke_nexus_agent_stream と同様）
+            history_messages = merge_consecutive_messages(history_messages, add_timestamp=add_timestamp)
         
-        messages.extend(history_messages)
+            messages.extend(history_messages)
+
+            # 【自動会話要約】閾値を超えていたら要約処理
+            # 既存の要約テキストがあればそれを使用し、シミュレーションの精度を向上
+            auto_summary_enabled = effective_settings.get("auto_summary_enabled", False)
+            if api_history_limit == "today" and auto_summary_enabled:
+                messages = _apply_auto_summary(
+                    messages,
+                    room_name,
+                    api_key,
+                    effective_settings.get("auto_summary_threshold", constants.AUTO_SUMMARY_DEFAULT_THRESHOLD),
+                    allow_generation=False
+                )
 
-        # 【自動会話要約】閾値を超えていたら要約処理
-        # 既存の要約テキストがあればそれを使用し、シミュレーションの精度を向上
-        auto_summary_enabled = effective_settings.get("auto_summary_enabled", False)
-        if api_history_limit == "today" and auto_summary_enabled:
-            messages = _apply_auto_summary(
-                messages,
-                room_name,
-                api_key,
-                effective_settings.get("auto_summary_threshold", constants.AUTO_SUMMARY_DEFAULT_THRESHOLD),
-                allow_generation=False
-            )
+            return token_counter.count_messages(messages), tool_schema_overhead
+
+        settings_key = tuple(sorted((k, repr(v)) for k, v in kwargs.items() if k != "parts"))
+        base_tokens, tool_schema_overhead = token_counter.get_base_estimate(room_name, settings_key, _build_base_estimate)
 
         if parts:
             formatted_parts = []
@@ -1328,10 +1289,10 @@ def count_input_tokens(**kwargs):
                         print(f"トークン計算中の画像処理エラー: {e}")
             
             # partsがある場合は、直近メッセージとして追加
-            messages.append(HumanMessage(content=formatted_parts))
+            base_tokens += token_counter.count_messages([HumanMessage(content=formatted_parts)])
 
-        # トークン計算実行
-        total_tokens = count_tokens_from_lc_messages(messages, model_name, api_key)
+        # トークン計算実行（count_tokens_from_lc_messages と同じ安全係数を掛ける）
+        total_tokens = int(base_tokens * 1.1) + 100
         
         # 【2026-01-18 FIX】LangChainがツールをバインドする際のオーバーヘッドを追加
         # 各ツールのJSONスキーマ（名前、説明、引数の型・説明）が送信される分
@@ -1357,7 +1318,7 @@ def correct_punctuation_with_ai(text_to_fix: str, api_key: str, context_type: st
     if not text_to_fix or not api_key:
         return None
 
-    client = genai.Client(api_key=api_key)
+    client = client_pool.get_genai_client(api_key)
     max_retries = 5
     base_retry_delay = 5
 
@@ -1540,18 +1501,22 @@ def get_configured_llm(model_name: str, api_key: str, generation_config: dict):
         if is_reasoning_model:
             print(f"  - [Thinking] Gemini 2.5 Thinking: include_thoughts={extra_params.get('include_thoughts')}, temp={effective_temp}")
 
-    return ChatGoogleGenerativeAI(
-        model=model_name,
-        google_api_key=api_key,
-        # Gemini 3 は公式に system ロールをサポートしているため、Human変換は不要。
-        # むしろ変換するとAct 1/2 の署名プロトコルを乱す可能性がある。
-        convert_system_message_to_human=False, 
-        max_retries=0,
-        temperature=effective_temp,
-        top_p=config.get("top_p", 0.95),
-        # 公式上限: 65,536 (Gemini 3 Flash)
-        max_output_tokens=config.get("max_output_tokens", 65536) if is_reasoning_model else config.get("max_output_tokens"),
-        safety_settings=safety_settings,
-        timeout=600,
-        **extra_params
-    )
+    def _create():
+        return ChatGoogleGenerativeAI(
+            model=model_name,
+            google_api_key=api_key,
+            # Gemini 3 は公式に system ロールをサポートしているため、Human変換は不要。
+            # むしろ変換するとAct 1/2 の署名プロトコルを乱す可能性がある。
+            convert_system_message_to_human=False, 
+            max_retries=0,
+            temperature=effective_temp,
+            top_p=config.get("top_p", 0.95),
+            # 公式上限: 65,536 (Gemini 3 Flash)
+            max_output_tokens=config.get("max_output_tokens", 65536) if is_reasoning_model else config.get("max_output_tokens"),
+            safety_settings=safety_settings,
+            timeout=600,
+            **extra_params
+        )
+
+    # 同じモデル・APIキー・生成設定の組み合わせでは、生成済みのインスタンス（とHTTP接続）を使い回す
+    return client_pool.get_or_create("gemini_chat", api_key, {"model": model_name, "config": config}, _create)
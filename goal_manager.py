@@ -29,7 +29,9 @@ class GoalManager:
     
     def _ensure_goals_file(self):
         """goals.json が存在しない場合は初期化"""
-        if not self.goals_file.exists():
+        import json_state_store
+        
+        if not json_state_store.exists(self.goals_file):
             self._save_goals(self._get_empty_goals())
     
     def _get_empty_goals(self) -> Dict:
@@ -48,23 +50,23 @@ class GoalManager:
         }
     
     def _load_goals(self) -> Dict:
-        """目標データを読み込む（ロック付き）"""
-        from file_lock_utils import safe_json_read
+        """目標データを読み込む（json_state_store 経由）"""
+        import json_state_store
         
         try:
-            data = safe_json_read(str(self.goals_file), default=None)
-            if data is None:
+            data = json_state_store.read(self.goals_file, default={})
+            if not data:
                 return self._get_empty_goals()
             return data if isinstance(data, dict) else self._get_empty_goals()
         except Exception:
             return self._get_empty_goals()
     
     def _save_goals(self, goals: Dict):
-        """目標データを保存する（ロック付き）"""
-        from file_lock_utils import safe_json_write
+        """目標データを保存する（json_state_store 経由。ファイルへの書き込みはまとめて行われる）"""
+        import json_state_store
         
         goals["meta"]["last_updated"] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        safe_json_write(str(self.goals_file), goals)
+        json_state_store.write(self.goals_file, goals)
     
     # ==========================================
     # CRUD Operations
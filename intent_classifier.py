@@ -0,0 +1,276 @@
+# intent_classifier.py
+"""
+RAG検索クエリの意図（Intent）をローカルで分類する軽量モデル
+
+文字 n-gram（1～3文字）と意図ごとのキーワードをハッシュした特徴量に対する
+多クラスロジスティック回帰（NumPy のみで学習）。
+学習データは組み込みの例文と、LLMが下した分類結果（ルームの cache/intent_decisions.jsonl に記録）。
+
+確信度が constants.INTENT_CLASSIFIER_MIN_CONFIDENCE 未満（または記録がまだ少ない）場合は None を返し、
+呼び出し側（RAGManager.classify_query_intent）が従来どおりLLMで分類してその結果を記録する。
+記録が INTENT_RETRAIN_INTERVAL 件たまるごとに、検索の処理を待たせないようバックグラウンドで再学習する。
+"""
+
+import json
+import threading
+import unicodedata
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import constants
+from file_lock_utils import get_file_lock
+
+DECISIONS_FILENAME = "intent_decisions.jsonl"
+
+# 特徴量ハッシュの次元数
+FEATURE_DIM = 1 << 14
+
+# 再学習までに必要な新しい記録の件数
+INTENT_RETRAIN_INTERVAL = 20
+
+# 学習に使う記録の最大件数（新しいものを優先）
+MAX_TRAINING_RECORDS = 2000
+
+# クエリ → (intent, 確信度) のキャッシュ件数
+PREDICTION_CACHE_SIZE = 512
+
+_EPOCHS = 30
+_BATCH_SIZE = 32
+_LEARNING_RATE = 0.5
+_L2 = 1e-4
+
+# 意図ごとの手がかりとなる語（分類プロンプトの説明に対応）
+INTENT_KEYWORDS: Dict[str, List[str]] = {
+    "emotional": ["思った", "思い出", "嬉し", "悲し", "楽し", "寂し", "気持ち", "感じ", "初めて", "好きだった", "泣い", "怒"],
+    "factual": ["名前", "誕生日", "好きな", "嫌いな", "何歳", "どこに住", "趣味", "色", "食べ物"],
+    "technical": ["設定", "方法", "やり方", "手順", "バージョン", "エラー", "インストール", "コード", "動かす", "使い方", "api"],
+    "temporal": ["最近", "昨日", "今日", "今週", "先週", "先月", "この前", "さっき", "予定", "何した"],
+    "relational": ["関係", "誰と", "仲", "どんな人", "友達", "家族", "恋人", "相手", "二人"],
+}
+
+# 組み込みの学習例（分類プロンプトの例文と同系統）
+SEED_EXAMPLES: List[Tuple[str, str]] = [
+    ("あの時どう思った？", "emotional"),
+    ("嬉しかったこと", "emotional"),
+    ("初めて会った日", "emotional"),
+    ("一緒に泣いた夜の思い出", "emotional"),
+    ("寂しかったときの気持ち", "emotional"),
+    ("猫の名前は？", "factual"),
+    ("誕生日いつ？", "factual"),
+    ("好きな食べ物", "factual"),
+    ("趣味は何", "factual"),
+    ("好きな色", "factual"),
+    ("設定方法は？", "technical"),
+    ("どうやって動かす？", "technical"),
+    ("バージョン", "technical"),
+    ("エラーの直し方", "technical"),
+    ("インストール手順", "technical"),
+    ("最近何した？", "temporal"),
+    ("昨日の話", "temporal"),
+    ("今週の予定", "temporal"),
+    ("先週話したこと", "temporal"),
+    ("この前の出来事", "temporal"),
+    ("〇〇との関係は？", "relational"),
+    ("誰と仲良い？", "relational"),
+    ("どんな人？", "relational"),
+    ("家族のこと", "relational"),
+    ("友達との関係", "relational"),
+]
+
+
+def _normalize(query: str) -> str:
+    return unicodedata.normalize("NFKC", query).lower().strip()
+
+
+def _hash_feature(feature: str) -> int:
+    # hash() はプロセスごとに変わるため、決定的な crc32 を使う
+    return zlib.crc32(feature.encode("utf-8")) % FEATURE_DIM
+
+
+def extract_features(query: str) -> np.ndarray:
+    """クエリを特徴量インデックスの配列に変換する"""
+    text = _normalize(query)
+    features = {"bias"}
+    for n in (1, 2, 3):
+        for i in range(len(text) - n + 1):
+            features.add(f"c{n}:{text[i:i + n]}")
+    for intent, keywords in INTENT_KEYWORDS.items():
+        for keyword in keywords:
+            if keyword in text:
+                features.add(f"k:{intent}")
+                features.add(f"kw:{keyword}")
+    return np.fromiter(sorted({_hash_feature(f) for f in features}), dtype=np.int64)
+
+
+class IntentClassifier:
+    """ルームごとの意図分類モデル"""
+
+    _instances: Dict[str, "IntentClassifier"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, decisions_path: Path):
+        self.decisions_path = Path(decisions_path)
+        self.labels = list(constants.INTENT_WEIGHTS.keys())
+        self.weights: Optional[np.ndarray] = None
+        self._records: List[Tuple[str, str]] = []
+        self._loaded = False
+        self._pending = 0
+        # クエリ → (intent, 確信度, LLMによる分類か)
+        self._cache: "OrderedDict[str, Tuple[str, float, bool]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 実行中のバックグラウンド再学習（なければ None）
+        self._retrain_thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def for_room(cls, room_name: str) -> "IntentClassifier":
+        path = Path(constants.ROOMS_DIR) / room_name / "cache" / DECISIONS_FILENAME
+        key = str(path.resolve())
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(path)
+            return cls._instances[key]
+
+    def _load_records(self):
+        """記録済みのLLM分類結果を読み込む（ロック保持中に呼ぶ）"""
+        self._loaded = True
+        if not self.decisions_path.exists():
+            return
+        try:
+            with open(self.decisions_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if entry.get("intent") in self.labels and entry.get("query"):
+                        self._records.append((entry["query"], entry["intent"]))
+        except OSError as e:
+            print(f"  - [Intent] 分類記録の読み込みに失敗: {e}")
+        self._records = self._records[-MAX_TRAINING_RECORDS:]
+
+    def _fit(self, samples: List[Tuple[str, str]]) -> np.ndarray:
+        """(クエリ, intent) の一覧でロジスティック回帰を学習し、重みを返す"""
+        features = [extract_features(q) for q, _ in samples]
+        targets = np.array([self.labels.index(label) for _, label in samples])
+        weights = np.zeros((FEATURE_DIM, len(self.labels)), dtype=np.float64)
+
+        lengths = np.array([len(f) for f in features])
+        rng = np.random.default_rng(0)
+        for epoch in range(_EPOCHS):
+            lr = _LEARNING_RATE / (1.0 + epoch * 0.1)
+            order = rng.permutation(len(samples))
+            for start in range(0, len(order), _BATCH_SIZE):
+                batch = order[start:start + _BATCH_SIZE]
+                flat = np.concatenate([features[i] for i in batch])
+                batch_lengths = lengths[batch]
+                offsets = np.concatenate(([0], np.cumsum(batch_lengths)[:-1]))
+                # ミニバッチ内の各クエリについて、特徴量の重みを合計してソフトマックスを取る
+                logits = np.add.reduceat(weights[flat], offsets, axis=0)
+                probs = np.exp(logits - logits.max(axis=1, keepdims=True))
+                probs /= probs.sum(axis=1, keepdims=True)
+                probs[np.arange(len(batch)), targets[batch]] -= 1.0
+                grad = np.repeat(probs, batch_lengths, axis=0) + _L2 * weights[flat]
+                np.add.at(weights, flat, -lr * grad)
+        return weights
+
+    def _train(self):
+        """組み込み例とLLMの分類記録で学習する（ロック保持中に呼ぶ。初回の分類時のみ）"""
+        self.weights = self._fit(SEED_EXAMPLES + self._records)
+        self._pending = 0
+        self._cache.clear()
+
+    def _retrain(self):
+        """
+        バックグラウンドで再学習する。学習中も古い重みで分類を続け、完成したら差し替える。
+        学習中に追加された記録は次回の再学習に回す。
+        """
+        try:
+            with self._lock:
+                samples = SEED_EXAMPLES + self._records
+                used = self._pending
+            weights = self._fit(samples)
+            with self._lock:
+                self.weights = weights
+                self._pending = max(0, self._pending - used)
+                # LLMが分類済みのクエリは、次の再学習までそのまま返す
+                for query in [q for q, entry in self._cache.items() if not entry[2]]:
+                    del self._cache[query]
+        except Exception as e:
+            print(f"  - [Intent] 再学習に失敗: {e}")
+        finally:
+            with self._lock:
+                self._retrain_thread = None
+
+    def predict(self, query: str) -> Tuple[str, float]:
+        """(intent, 確信度) を返す"""
+        with self._lock:
+            cached = self._cache.get(query)
+            if cached is not None:
+                self._cache.move_to_end(query)
+                return cached[0], cached[1]
+            if not self._loaded:
+                self._load_records()
+            if self.weights is None:
+                self._train()
+
+            logits = self.weights[extract_features(query)].sum(axis=0)
+            probs = np.exp(logits - logits.max())
+            probs /= probs.sum()
+            best = int(probs.argmax())
+            result = (self.labels[best], float(probs[best]))
+            self._remember(query, result + (False,))
+            return result
+
+    def _remember(self, query: str, entry: Tuple[str, float, bool]):
+        """予測キャッシュに登録する（ロック保持中に呼ぶ）"""
+        self._cache[query] = entry
+        self._cache.move_to_end(query)
+        if len(self._cache) > PREDICTION_CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    def classify(self, query: str) -> Optional[str]:
+        """
+        確信度が十分なら intent を、そうでなければ None を返す（LLMへのフォールバック判定用）。
+        LLMの分類記録が INTENT_CLASSIFIER_MIN_RECORDS 件たまるまでは、組み込み例だけのモデルを信用しない。
+        """
+        intent, confidence = self.predict(query)
+        with self._lock:
+            cached = self._cache.get(query)
+            if cached is not None and cached[2]:
+                return cached[0]  # LLMが分類済みのクエリ
+            if len(self._records) < constants.INTENT_CLASSIFIER_MIN_RECORDS:
+                return None
+        if confidence >= constants.INTENT_CLASSIFIER_MIN_CONFIDENCE:
+            return intent
+        return None
+
+    def record(self, query: str, intent: str):
+        """LLMによる分類結果を学習データとして記録する"""
+        if not query or intent not in self.labels:
+            return
+        try:
+            self.decisions_path.parent.mkdir(parents=True, exist_ok=True)
+            with get_file_lock(str(self.decisions_path)):
+                with open(self.decisions_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"query": query, "intent": intent}, ensure_ascii=False) + "\n")
+        except Exception as e:
+            print(f"  - [Intent] 分類記録の保存に失敗: {e}")
+        with self._lock:
+            if not self._loaded:
+                self._load_records()
+            else:
+                self._records.append((query, intent))
+                self._records = self._records[-MAX_TRAINING_RECORDS:]
+            self._pending += 1
+            # 次回の再学習までは、LLMの判断をそのまま返す
+            self._remember(query, (intent, 1.0, True))
+            # 未学習（初回の分類時に学習する）か、再学習中なら何もしない
+            if self.weights is None or self._retrain_thread is not None \
+                    or self._pending < INTENT_RETRAIN_INTERVAL:
+                return
+            self._retrain_thread = threading.Thread(target=self._retrain, name="intent-retrain", daemon=True)
+            self._retrain_thread.start()
@@ -0,0 +1,213 @@
+# json_state_store.py
+"""
+JSON状態ファイルのストア
+
+motivation_manager（internal_state.json）・session_arousal_manager・goal_manager・signature_manager は
+小さな更新のたびにファイル全体を書き直しており、1ターンに何度も書き込みが発生していた。
+また file_lock_utils.safe_json_write は対象ファイルをその場で書き直していたため、
+書き込み途中でプロセスが落ちると中途半端なファイルが残った。
+
+- 読み込みはメモリ上の内容から返す（呼び出し側で変更してよいよう、毎回新しいオブジェクトを作る）
+- 書き込みはメモリ上の内容を更新し、constants.JSON_STATE_FLUSH_DELAY 秒以内の書き込みをまとめて1回で保存する
+- 保存は file_lock_utils.atomic_write_text（ロック + 一時ファイル → fsync → rename）で行う
+- 他のプロセスがファイルを書き換えた場合は (inode, 更新時刻, サイズ) の変化で検知して読み直す
+- 未保存の内容はプロセス終了時（atexit）にも保存する
+"""
+
+import atexit
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from filelock import Timeout
+
+import constants
+import file_lock_utils
+
+
+class _Document:
+    __slots__ = ("text", "signature", "dirty", "generation")
+
+    def __init__(self):
+        self.text: Optional[str] = None  # None はファイルが無いことを表す
+        self.signature: Optional[tuple] = None
+        self.dirty = False
+        self.generation = 0
+
+
+_documents: Dict[str, _Document] = {}
+_lock = threading.RLock()
+# 保存処理は1つずつ行う（古い内容で新しい内容を上書きしないため）
+_flush_lock = threading.Lock()
+_timer: Optional[threading.Timer] = None
+
+
+def _key(path) -> str:
+    return os.path.abspath(str(path))
+
+
+def _matches(key: str, target: Optional[str]) -> bool:
+    return target is None or key == target or key.startswith(target + os.sep)
+
+
+def _file_signature(path: str) -> Optional[tuple]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _load_text(path: str) -> Optional[str]:
+    """
+    メモリ上の内容を返す。未保存の変更が無く、ファイルが変わっていれば読み直す。
+    ファイルロックの待ち（最大で数秒）が他のファイルの読み書きを止めないよう、
+    ファイルの読み込みは _lock の外で行い、_lock は署名の比較と内容の差し替えにだけ使う。
+    """
+    signature = _file_signature(path)
+    with _lock:
+        doc = _documents.get(path)
+        if doc is not None and (doc.dirty or doc.signature == signature):
+            return doc.text
+        generation = doc.generation if doc is not None else 0
+
+    text = None
+    if signature is not None:
+        with file_lock_utils.get_file_lock(path):
+            signature = _file_signature(path)
+            if signature is not None:
+                with open(path, "r", encoding="utf-8") as f:
+                    text = f.read()
+
+    with _lock:
+        doc = _documents.get(path)
+        if doc is None:
+            doc = _documents[path] = _Document()
+        # 読み込み中にこのプロセスで書き込まれていたら、メモリ上の内容を優先する
+        if doc.dirty or doc.generation != generation:
+            return doc.text
+        doc.text = text
+        doc.signature = signature
+        return text
+
+
+def _default_value(default: Any) -> Any:
+    return json.loads(json.dumps(default)) if default is not None else {}
+
+
+def read(path, default: Any = None) -> Any:
+    """
+    JSON状態ファイルの内容を返す。
+
+    Args:
+        path: ファイルパス
+        default: ファイルが存在しない・読めない場合の値（省略時は {}）
+    """
+    key = _key(path)
+    try:
+        text = _load_text(key)
+    except Timeout:
+        print(f"⚠️ [StateStore] 読み込みタイムアウト: {key} (他のプロセスが使用中)")
+        return _default_value(default)
+    if text is None:
+        return _default_value(default)
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as e:
+        print(f"⚠️ [StateStore] JSONパースエラー: {key} - {e}")
+        return _default_value(default)
+
+
+def write(path, data: Any, indent: int = 2) -> bool:
+    """
+    JSON状態ファイルの内容を更新する。ファイルへの保存は少し待ってからまとめて行う。
+    data は呼び出し時点の内容で確定する（その後に data を変更しても反映されない）。
+    """
+    key = _key(path)
+    text = json.dumps(data, indent=indent, ensure_ascii=False)
+    with _lock:
+        doc = _documents.get(key)
+        if doc is None:
+            doc = _documents[key] = _Document()
+        doc.text = text
+        doc.dirty = True
+        doc.generation += 1
+        _schedule_flush()
+    return True
+
+
+def update(path, update_func: Callable[[Any], Any], default: Any = None) -> bool:
+    """現在の内容を update_func に渡し、戻り値で置き換える（読み込みから書き込みまでを排他的に行う）"""
+    # ファイルの読み直しが必要なら、_lock を取る前に済ませておく
+    read(path, default)
+    with _lock:
+        return write(path, update_func(read(path, default)))
+
+
+def exists(path) -> bool:
+    """ファイルが存在するか（まだ保存していない書き込みも存在するものとして扱う）"""
+    doc = _documents.get(_key(path))
+    if doc is not None and doc.dirty:
+        return True
+    return os.path.exists(path)
+
+
+def generation(path) -> int:
+    """path への書き込み回数（プロセス内）。未保存の変更をキャッシュのキーに反映するために使う"""
+    doc = _documents.get(_key(path))
+    return doc.generation if doc is not None else 0
+
+
+def _schedule_flush():
+    global _timer
+    if _timer is None:
+        _timer = threading.Timer(constants.JSON_STATE_FLUSH_DELAY, _flush_from_timer)
+        _timer.daemon = True
+        _timer.start()
+
+
+def _flush_from_timer():
+    global _timer
+    with _lock:
+        _timer = None
+    flush()
+
+
+def flush(path=None):
+    """未保存の内容をファイルに保存する（path にはディレクトリも指定できる。省略するとすべて）"""
+    target = _key(path) if path is not None else None
+    with _flush_lock:
+        with _lock:
+            pending = [(key, doc.text, doc.generation) for key, doc in _documents.items()
+                       if doc.dirty and _matches(key, target)]
+        for key, text, written_generation in pending:
+            try:
+                file_lock_utils.atomic_write_text(key, text)
+            except Exception as e:
+                # 未保存のまま残し、次の書き込み時に再度保存を試みる
+                print(f"❌ [StateStore] 保存エラー: {key} - {e}")
+                continue
+            with _lock:
+                doc = _documents.get(key)
+                if doc is None:
+                    continue
+                doc.signature = _file_signature(key)
+                # 保存中に新しい書き込みがあった場合は、次回の保存まで未保存のまま
+                if doc.generation == written_generation:
+                    doc.dirty = False
+
+
+def forget(path=None):
+    """
+    未保存の内容を保存した上で、メモリ上の内容を破棄する（path にはディレクトリも指定できる。省略するとすべて）。
+    ルームの削除など、ファイルを外部から移動・削除する前に呼ぶ。
+    """
+    flush(path)
+    target = _key(path) if path is not None else None
+    with _lock:
+        for key in [key for key in _documents if _matches(key, target)]:
+            del _documents[key]
+
+
+atexit.register(flush)
@@ -0,0 +1,465 @@
+# keyword_index.py
+"""
+過去ログのキーワード検索用 転置インデックス
+
+log.txt / log_archives/*.txt / log_import_source/*.txt を対象に、
+文字単位のユニグラムとバイグラム（日本語でも分かち書き不要）から
+「そのトークンを含むページ（ヘッダー境界で区切った約 PAGE_BYTES のバイト範囲）」への
+転置インデックスを、ルームごとの SQLite ファイルに保持する。
+
+検索時は候補ページだけを読み出して従来と同じ行単位の部分一致判定を行うため、
+結果は全ファイルを readlines() していた従来の実装と同じで、読み込み量だけが減る。
+ファイルの (サイズ, mtime) を記録しておき、追記された場合は最後のページ以降だけを、
+書き換え・アーカイブでサイズが縮んだ場合はそのファイルだけを再索引する。
+"""
+
+import glob
+import operator
+import re
+import sqlite3
+import threading
+import traceback
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import constants
+
+INDEX_VERSION = 1
+INDEX_FILENAME = "keyword_index.sqlite3"
+
+# 1ページの目安サイズ（バイト）。ページ境界は USER/AGENT ヘッダーの直前に置く
+PAGE_BYTES = 64 * 1024
+
+# 追記判定用に保持する、前回索引時のファイル末尾のバイト数
+_TAIL_SAMPLE_BYTES = 64
+
+# 検索側の判定 `re.match(r"^(## (?:USER|AGENT|SYSTEM):.*)$", line.strip())` に合わせたヘッダー検出
+_HEADER_PATTERN = re.compile(rb'^[ \t\f\v]*## (USER|AGENT|SYSTEM):', re.MULTILINE)
+
+_DATE_PATTERNS = [
+    re.compile(r'(\d{4}-\d{2}-\d{2}) \(...\) \d{2}:\d{2}:\d{2}'),
+    re.compile(r'###\s*(\d{4}-\d{2}-\d{2})')
+]
+
+_room_locks: Dict[str, threading.Lock] = {}
+_room_locks_guard = threading.Lock()
+
+# バックグラウンド更新の状態（ルームディレクトリ -> 実行中/再実行要求）
+_refresh_state: Dict[str, str] = {}
+_refresh_state_lock = threading.Lock()
+
+
+def _lock_for(room_dir: Path) -> threading.Lock:
+    key = str(room_dir.resolve())
+    with _room_locks_guard:
+        if key not in _room_locks:
+            _room_locks[key] = threading.Lock()
+        return _room_locks[key]
+
+
+def _normalize_newlines(text: str) -> str:
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _split_lines(text: str) -> List[str]:
+    """readlines() と同じく、改行を保持したまま行に分割する"""
+    parts = text.split("\n")
+    lines = [p + "\n" for p in parts[:-1]]
+    if parts[-1]:
+        lines.append(parts[-1])
+    return lines
+
+
+def tokenize(text: str) -> Set[str]:
+    """小文字化したテキストから、行をまたがないユニグラムとバイグラムの集合を作る"""
+    tokens: Set[str] = set()
+    for line in text.lower().split("\n"):
+        if not line:
+            continue
+        tokens.update(line)
+        if len(line) > 1:
+            tokens.update(map(operator.add, line, line[1:]))
+    return tokens
+
+
+def query_tokens(keyword: str) -> List[str]:
+    """キーワードが含まれる行に必ず現れるトークン（2文字以上ならバイグラム、1文字ならその文字）"""
+    k = keyword.lower()
+    if len(k) <= 1:
+        return [k] if k else []
+    return sorted({k[i:i + 2] for i in range(len(k) - 1)})
+
+
+def list_source_files(room_dir: Path) -> List[Path]:
+    """検索対象のログファイルを、従来の検索と同じ順序で返す"""
+    paths = [room_dir / "log.txt"]
+    paths.extend(Path(p) for p in glob.glob(str(room_dir / "log_archives" / "*.txt")))
+    paths.extend(Path(p) for p in glob.glob(str(room_dir / "log_import_source" / "*.txt")))
+    return paths
+
+
+class KeywordIndex:
+    """1ルーム分のキーワード転置インデックス"""
+
+    def __init__(self, room_dir: Path):
+        self.room_dir = Path(room_dir)
+        self.db_path = self.room_dir / "cache" / INDEX_FILENAME
+
+    @classmethod
+    def for_room(cls, room_name: str) -> "KeywordIndex":
+        return cls(Path(constants.ROOMS_DIR) / room_name)
+
+    # --- DB ---
+
+    def _connect(self) -> sqlite3.Connection:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != INDEX_VERSION:
+            conn.executescript("""
+                DROP TABLE IF EXISTS sources;
+                DROP TABLE IF EXISTS pages;
+                DROP TABLE IF EXISTS headers;
+                DROP TABLE IF EXISTS postings;
+                CREATE TABLE sources (
+                    file_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    path TEXT UNIQUE NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    tail BLOB NOT NULL
+                );
+                CREATE TABLE pages (
+                    file_id INTEGER NOT NULL,
+                    page_no INTEGER NOT NULL,
+                    start INTEGER NOT NULL,
+                    end INTEGER NOT NULL,
+                    PRIMARY KEY (file_id, page_no)
+                ) WITHOUT ROWID;
+                CREATE TABLE headers (
+                    file_id INTEGER NOT NULL,
+                    start INTEGER NOT NULL,
+                    is_system INTEGER NOT NULL,
+                    PRIMARY KEY (file_id, start)
+                ) WITHOUT ROWID;
+                CREATE TABLE postings (
+                    file_id INTEGER NOT NULL,
+                    token TEXT NOT NULL,
+                    pages BLOB NOT NULL,
+                    PRIMARY KEY (file_id, token)
+                ) WITHOUT ROWID;
+            """)
+            conn.execute(f"PRAGMA user_version={INDEX_VERSION}")
+            conn.commit()
+        return conn
+
+    def exists(self) -> bool:
+        return self.db_path.exists()
+
+    # --- 索引の構築・更新 ---
+
+    def refresh(self, paths: Optional[Iterable[Path]] = None) -> None:
+        """対象ファイルの変更を検出し、必要な部分だけを再索引する"""
+        full_scan = paths is None
+        paths = list(paths) if paths is not None else list_source_files(self.room_dir)
+        with _lock_for(self.room_dir):
+            conn = self._connect()
+            try:
+                known = {row[0]: row for row in conn.execute("SELECT path, file_id, size, mtime_ns, tail FROM sources")}
+                current = set()
+                for path in paths:
+                    try:
+                        st = path.stat()
+                    except OSError:
+                        continue
+                    key = str(path.resolve())
+                    current.add(key)
+                    row = known.get(key)
+                    if row is not None and (row[2], row[3]) == (st.st_size, st.st_mtime_ns):
+                        continue
+                    if row is not None and self._is_append(path, row, st.st_size):
+                        self._index_appended(conn, row[1], path, row[2], st)
+                    else:
+                        if row is not None:
+                            self._delete_file(conn, row[1])
+                        self._index_full(conn, key, path, st)
+                    conn.commit()
+                # 対象外になった（削除・移動された）ファイルの索引を消す
+                for key, row in known.items():
+                    if key not in current and (full_scan or not Path(key).exists()):
+                        self._delete_file(conn, row[1])
+                conn.commit()
+            finally:
+                conn.close()
+
+    @staticmethod
+    def _is_append(path: Path, row, new_size: int) -> bool:
+        old_size, tail = row[2], row[4]
+        if new_size <= old_size:
+            return False
+        with open(path, "rb") as f:
+            f.seek(max(0, old_size - len(tail)))
+            return f.read(len(tail)) == tail
+
+    @staticmethod
+    def _read_range(path: Path, start: int, end: int) -> bytes:
+        with open(path, "rb") as f:
+            f.seek(start)
+            return f.read(end - start)
+
+    @staticmethod
+    def _split_pages(data: bytes, base: int) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+        """
+        バイト列をページに分割し、(ページ範囲一覧, ヘッダー一覧[(絶対位置, is_system)]) を返す。
+        ページ境界は USER/AGENT ヘッダーの直前にのみ置くので、どちらの検索方式でも
+        メッセージブロックがページをまたがない。
+        """
+        headers: List[Tuple[int, int]] = []
+        pages: List[Tuple[int, int]] = []
+        page_start = 0
+        for match in _HEADER_PATTERN.finditer(data):
+            is_system = 1 if match.group(1) == b"SYSTEM" else 0
+            headers.append((base + match.start(), is_system))
+            if not is_system and match.start() - page_start >= PAGE_BYTES:
+                pages.append((base + page_start, base + match.start()))
+                page_start = match.start()
+        if len(data) > page_start or not pages:
+            pages.append((base + page_start, base + len(data)))
+        return pages, headers
+
+    @staticmethod
+    def _page_tokens(data: bytes) -> Set[str]:
+        return tokenize(_normalize_newlines(data.decode("utf-8", errors="replace")))
+
+    def _add_postings(self, conn: sqlite3.Connection, file_id: int, additions: Dict[str, List[int]]) -> None:
+        for token, page_nos in additions.items():
+            row = conn.execute("SELECT pages FROM postings WHERE file_id=? AND token=?", (file_id, token)).fetchone()
+            arr = array("I")
+            if row is not None:
+                arr.frombytes(row[0])
+            arr.extend(page_nos)
+            conn.execute("INSERT OR REPLACE INTO postings (file_id, token, pages) VALUES (?, ?, ?)",
+                         (file_id, token, arr.tobytes()))
+
+    def _remove_page_from_postings(self, conn: sqlite3.Connection, file_id: int, tokens: Iterable[str], page_no: int) -> None:
+        for token in tokens:
+            row = conn.execute("SELECT pages FROM postings WHERE file_id=? AND token=?", (file_id, token)).fetchone()
+            if row is None:
+                continue
+            arr = array("I")
+            arr.frombytes(row[0])
+            # 再索引するのは常に最後のページなので、末尾要素を落とすだけでよい
+            while arr and arr[-1] >= page_no:
+                arr.pop()
+            if arr:
+                conn.execute("UPDATE postings SET pages=? WHERE file_id=? AND token=?", (arr.tobytes(), file_id, token))
+            else:
+                conn.execute("DELETE FROM postings WHERE file_id=? AND token=?", (file_id, token))
+
+    def _insert_range(self, conn: sqlite3.Connection, file_id: int, path: Path, data: bytes, base: int, first_page_no: int) -> None:
+        pages, headers = self._split_pages(data, base)
+        conn.executemany("INSERT OR REPLACE INTO headers (file_id, start, is_system) VALUES (?, ?, ?)",
+                         [(file_id, start, is_system) for start, is_system in headers])
+        additions: Dict[str, List[int]] = {}
+        for offset, (start, end) in enumerate(pages):
+            page_no = first_page_no + offset
+            conn.execute("INSERT OR REPLACE INTO pages (file_id, page_no, start, end) VALUES (?, ?, ?, ?)",
+                         (file_id, page_no, start, end))
+            for token in self._page_tokens(data[start - base:end - base]):
+                additions.setdefault(token, []).append(page_no)
+        self._add_postings(conn, file_id, additions)
+
+    def _index_full(self, conn: sqlite3.Connection, key: str, path: Path, st) -> None:
+        data = path.read_bytes()
+        cur = conn.execute("INSERT INTO sources (path, size, mtime_ns, tail) VALUES (?, ?, ?, ?)",
+                           (key, len(data), st.st_mtime_ns, data[-_TAIL_SAMPLE_BYTES:]))
+        file_id = cur.lastrowid
+        pages, headers = self._split_pages(data, 0)
+        conn.executemany("INSERT INTO headers (file_id, start, is_system) VALUES (?, ?, ?)",
+                         [(file_id, start, is_system) for start, is_system in headers])
+        postings: Dict[str, array] = {}
+        for page_no, (start, end) in enumerate(pages):
+            conn.execute("INSERT INTO pages (file_id, page_no, start, end) VALUES (?, ?, ?, ?)",
+                         (file_id, page_no, start, end))
+            for token in self._page_tokens(data[start:end]):
+                postings.setdefault(token, array("I")).append(page_no)
+        conn.executemany("INSERT INTO postings (file_id, token, pages) VALUES (?, ?, ?)",
+                         [(file_id, token, arr.tobytes()) for token, arr in postings.items()])
+
+    def _index_appended(self, conn: sqlite3.Connection, file_id: int, path: Path, old_size: int, st) -> None:
+        """最後のページを作り直し、追記部分を索引する"""
+        last = conn.execute("SELECT page_no, start, end FROM pages WHERE file_id=? ORDER BY page_no DESC LIMIT 1",
+                            (file_id,)).fetchone()
+        if last is None:
+            page_no, start = 0, 0
+        else:
+            page_no, start, _ = last
+            old_tokens = self._page_tokens(self._read_range(path, start, old_size))
+            self._remove_page_from_postings(conn, file_id, old_tokens, page_no)
+            conn.execute("DELETE FROM pages WHERE file_id=? AND page_no>=?", (file_id, page_no))
+            conn.execute("DELETE FROM headers WHERE file_id=? AND start>=?", (file_id, start))
+
+        data = self._read_range(path, start, st.st_size)
+        self._insert_range(conn, file_id, path, data, start, page_no)
+        new_size = start + len(data)
+        tail = self._read_range(path, max(0, new_size - _TAIL_SAMPLE_BYTES), new_size)
+        conn.execute("UPDATE sources SET size=?, mtime_ns=?, tail=? WHERE file_id=?",
+                     (new_size, st.st_mtime_ns, tail, file_id))
+
+    @staticmethod
+    def _delete_file(conn: sqlite3.Connection, file_id: int) -> None:
+        conn.execute("DELETE FROM postings WHERE file_id=?", (file_id,))
+        conn.execute("DELETE FROM pages WHERE file_id=?", (file_id,))
+        conn.execute("DELETE FROM headers WHERE file_id=?", (file_id,))
+        conn.execute("DELETE FROM sources WHERE file_id=?", (file_id,))
+
+    # --- 検索 ---
+
+    def _candidate_pages(self, conn: sqlite3.Connection, file_id: int, keywords: List[str]) -> List[int]:
+        candidates: Set[int] = set()
+        for keyword in keywords:
+            pages: Optional[Set[int]] = None
+            for token in query_tokens(keyword):
+                row = conn.execute("SELECT pages FROM postings WHERE file_id=? AND token=?", (file_id, token)).fetchone()
+                if row is None:
+                    pages = set()
+                    break
+                arr = array("I")
+                arr.frombytes(row[0])
+                pages = set(arr) if pages is None else pages & set(arr)
+                if not pages:
+                    break
+            if pages:
+                candidates |= pages
+        return sorted(candidates)
+
+    def search_blocks(self, keywords: List[str], exclude_recent_count: int = 0,
+                      include_system_headers: bool = True) -> List[Dict]:
+        """
+        いずれかのキーワードを含む行があるメッセージブロックを返す。
+        返り値は従来の検索と同じ {"content", "date", "source"} の辞書リスト（ファイル順・出現順）。
+
+        Args:
+            keywords: 小文字化済みの検索キーワード（OR検索）
+            exclude_recent_count: log.txt の末尾から除外するメッセージ数
+            include_system_headers: SYSTEM ヘッダーもブロック境界・除外数に数えるか
+        """
+        keywords = [k for k in keywords if k]
+        if not keywords:
+            return []
+
+        paths = list_source_files(self.room_dir)
+        self.refresh()
+
+        found_blocks: List[Dict] = []
+        conn = self._connect()
+        try:
+            for path in paths:
+                row = conn.execute("SELECT file_id, size FROM sources WHERE path=?", (str(path.resolve()),)).fetchone()
+                if row is None or row[1] == 0:
+                    continue
+                file_id = row[0]
+
+                header_filter = "" if include_system_headers else " AND is_system=0"
+                header_count = conn.execute(f"SELECT COUNT(*) FROM headers WHERE file_id=?{header_filter}", (file_id,)).fetchone()[0]
+                if header_count == 0:
+                    continue
+
+                search_end = None
+                if path.name == "log.txt" and exclude_recent_count > 0:
+                    if header_count <= exclude_recent_count:
+                        continue
+                    # 後ろから N 個目のヘッダーの位置を特定
+                    search_end = conn.execute(
+                        f"SELECT start FROM headers WHERE file_id=?{header_filter} ORDER BY start LIMIT 1 OFFSET ?",
+                        (file_id, header_count - exclude_recent_count)
+                    ).fetchone()[0]
+
+                processed_blocks_content = set()
+                for page_no in self._candidate_pages(conn, file_id, keywords):
+                    start, end = conn.execute("SELECT start, end FROM pages WHERE file_id=? AND page_no=?",
+                                              (file_id, page_no)).fetchone()
+                    if search_end is not None:
+                        if start >= search_end:
+                            continue
+                        end = min(end, search_end)
+                    text = _normalize_newlines(self._read_range(path, start, end).decode("utf-8", errors="replace"))
+                    for block_content in self._matching_blocks(_split_lines(text), keywords, include_system_headers):
+                        if block_content in processed_blocks_content:
+                            continue
+                        processed_blocks_content.add(block_content)
+
+                        block_date = None
+                        for pattern in _DATE_PATTERNS:
+                            matches = list(pattern.finditer(block_content))
+                            if matches:
+                                block_date = matches[-1].group(1)
+                                break
+
+                        found_blocks.append({
+                            "content": block_content,
+                            "date": block_date,
+                            "source": path.name
+                        })
+        finally:
+            conn.close()
+        return found_blocks
+
+    @staticmethod
+    def _matching_blocks(lines: List[str], keywords: List[str], include_system_headers: bool) -> List[str]:
+        """ページ内の行を走査し、キーワードを含む行を持つブロックの本文を出現順に返す"""
+        roles = "USER|AGENT|SYSTEM" if include_system_headers else "USER|AGENT"
+        header_re = re.compile(rf"^(## (?:{roles}):.*)$")
+        header_indices = [i for i, line in enumerate(lines) if header_re.match(line.strip())]
+
+        blocks = []
+        for i, line in enumerate(lines):
+            if any(k in line.lower() for k in keywords):
+                start_index = 0
+                for h_idx in reversed(header_indices):
+                    if h_idx <= i:
+                        start_index = h_idx
+                        break
+                end_index = len(lines)
+                for h_idx in header_indices:
+                    if h_idx > start_index:
+                        end_index = h_idx
+                        break
+                blocks.append("".join(lines[start_index:end_index]).strip())
+        return blocks
+
+
+def _run_refresh(room_dir: Path) -> None:
+    key = str(room_dir)
+    while True:
+        try:
+            KeywordIndex(room_dir).refresh()
+        except Exception as e:
+            print(f"--- [KeywordIndex] 索引の更新に失敗しました: {e} ---")
+            traceback.print_exc()
+        with _refresh_state_lock:
+            if _refresh_state.get(key) == "pending":
+                _refresh_state[key] = "running"
+                continue
+            _refresh_state.pop(key, None)
+            return
+
+
+def schedule_refresh(room_dir) -> None:
+    """
+    ログの追記・アーカイブ後に呼ぶ。既に索引が作られているルームだけを、
+    バックグラウンドスレッドで差分更新する（保存処理をブロックしない）。
+    """
+    room_dir = Path(room_dir)
+    index = KeywordIndex(room_dir)
+    if not index.exists():
+        return
+    key = str(room_dir)
+    with _refresh_state_lock:
+        if key in _refresh_state:
+            _refresh_state[key] = "pending"
+            return
+        _refresh_state[key] = "running"
+    threading.Thread(target=_run_refresh, args=(room_dir,), daemon=True).start()
@@ -0,0 +1,129 @@
+# lazy_docstore.py
+"""
+FAISSインデックスの省メモリ読み込み（検索専用）
+
+- ベクトルファイル（index.faiss）はメモリマップで開き、読み込み時にファイル全体をコピーしない
+- ドキュメントは pickle 全体を展開せず、保存時に併せて書き出す docstore.sqlite3 から
+  検索でヒットした分だけを読み出す
+
+メモリマップしたインデックスへの追加・削除はプロセスごと異常終了するため、
+ここで読み込んだ FAISS は検索にのみ使い、索引の更新には通常の FAISS.load_local を使うこと。
+"""
+
+import os
+import pickle
+import sqlite3
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Iterator, List, Union
+
+import faiss
+from langchain_community.docstore.base import Docstore
+from langchain_community.docstore.document import Document
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+DOCSTORE_FILE = "docstore.sqlite3"
+
+# Windows ではマップ中・オープン中のファイルを含むディレクトリを入れ替えられないため、従来どおり全体を読み込む
+MMAP_SUPPORTED = os.name != "nt"
+
+# フラットインデックスのベクトル領域をコピーせずに参照するフラグ（古い faiss では IO_FLAG_MMAP のみ）
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def write_docstore(db: FAISS, folder_path: Path):
+    """FAISS のドキュメントと位置→ID対応を folder_path/docstore.sqlite3 に書き出す"""
+    target = Path(folder_path) / DOCSTORE_FILE
+    if target.exists():
+        target.unlink()
+    conn = sqlite3.connect(str(target))
+    try:
+        conn.execute("CREATE TABLE docs (id TEXT PRIMARY KEY, doc BLOB NOT NULL)")
+        conn.execute("CREATE TABLE positions (pos INTEGER PRIMARY KEY, id TEXT NOT NULL)")
+        conn.executemany(
+            "INSERT INTO positions (pos, id) VALUES (?, ?)",
+            ((int(pos), doc_id) for pos, doc_id in db.index_to_docstore_id.items()),
+        )
+        rows = []
+        for doc_id in db.index_to_docstore_id.values():
+            doc = db.docstore.search(doc_id)
+            if isinstance(doc, Document):
+                rows.append((doc_id, pickle.dumps(doc, protocol=pickle.HIGHEST_PROTOCOL)))
+        conn.executemany("INSERT OR REPLACE INTO docs (id, doc) VALUES (?, ?)", rows)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class _ReadOnlyConnection:
+    """複数スレッドの検索から共有する読み取り専用の SQLite 接続"""
+
+    def __init__(self, path: Path):
+        # 読み込み後にディレクトリが入れ替えられても、開いたファイルは参照し続けられる
+        self._conn = sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def fetchone(self, sql: str, params: tuple = ()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def fetchall(self, sql: str, params: tuple = ()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+
+class ReadOnlyDocstoreError(TypeError):
+    """検索専用で読み込んだインデックスを変更しようとした"""
+
+
+class SQLiteDocstore(Docstore):
+    """docstore.sqlite3 から必要なドキュメントだけを読み出す読み取り専用の Docstore"""
+
+    def __init__(self, connection: _ReadOnlyConnection):
+        self._conn = connection
+
+    def search(self, search: str) -> Union[str, Document]:
+        row = self._conn.fetchone("SELECT doc FROM docs WHERE id = ?", (search,))
+        if row is None:
+            return f"ID {search} not found."
+        return pickle.loads(row[0])
+
+    def delete(self, ids: List) -> None:
+        raise ReadOnlyDocstoreError("SQLiteDocstore は検索専用です")
+
+
+class SQLiteIndexToDocstoreId(Mapping):
+    """FAISS の位置 → ドキュメントID の対応を必要な分だけ読み出すマッピング"""
+
+    def __init__(self, connection: _ReadOnlyConnection):
+        self._conn = connection
+        self._len = connection.fetchone("SELECT COUNT(*) FROM positions")[0]
+
+    def __getitem__(self, pos) -> str:
+        row = self._conn.fetchone("SELECT id FROM positions WHERE pos = ?", (int(pos),))
+        if row is None:
+            raise KeyError(pos)
+        return row[0]
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(pos for (pos,) in self._conn.fetchall("SELECT pos FROM positions ORDER BY pos"))
+
+    def __len__(self) -> int:
+        return self._len
+
+
+def load_index(folder_path: Path, embeddings: Embeddings) -> FAISS:
+    """
+    検索専用に FAISS インデックスを読み込む。
+    docstore.sqlite3 がない旧形式の索引は、ベクトルのみメモリマップしてドキュメントは pickle から読む。
+    """
+    folder_path = Path(folder_path)
+    docstore_path = folder_path / DOCSTORE_FILE
+    if not docstore_path.exists():
+        return FAISS.load_local(str(folder_path), embeddings, allow_dangerous_deserialization=True, io_flags=MMAP_FLAGS)
+
+    index = faiss.read_index(str(folder_path / "index.faiss"), MMAP_FLAGS)
+    connection = _ReadOnlyConnection(docstore_path)
+    return FAISS(embeddings, index, SQLiteDocstore(connection), SQLiteIndexToDocstoreId(connection))
@@ -6,6 +6,7 @@ from langchain_openai import ChatOpenAI
 import config_manager
 import utils
 import gemini_api # 既存のGemini設定ロジックを再利用するため
+import client_pool
 
 class LLMFactory:
     @staticmethod
@@ -37,7 +38,7 @@ class LLMFactory:
             internal_role: [Phase 2] 内部処理のロール。"processing", "summarization", "supervisor"のいずれか。
                           指定すると、config.jsonの内部モデル設定に基づいてプロバイダとモデルを自動選択。
         """
-        config_manager.load_config() 
+        config_manager.load_config()  # config.json が前回から変わっていなければ何もしない
         
         # --- [Phase 2] internal_role優先ロジック ---
         if internal_role:
@@ -67,15 +68,30 @@ class LLMFactory:
                     raise ValueError(f"Local LLM requires a valid GGUF model path. Current: '{local_model_path}'")
                 try:
                     from langchain_community.chat_models import ChatLlamaCpp
-                    return ChatLlamaCpp(
+                except ImportError:
+                    raise ValueError("llama-cpp-python is not installed.")
+
+                def _create_local():
+                    model = ChatLlamaCpp(
                         model_path=local_model_path,
                         temperature=temperature,
                         n_ctx=4096,
                         n_gpu_layers=0,
                         verbose=False
                     )
-                except ImportError:
-                    raise ValueError("llama-cpp-python is not installed.")
+                    # モデルは常駐させて共有するため、スレッド間での同時生成を防ぐ
+                    model.client = client_pool.SerializedClient(
+                        model.client, ("create_chat_completion", "create_completion")
+                    )
+                    return model
+
+                # GGUFのロードは重いため、同じモデル・設定ではロード済みのものを使い回す
+                return client_pool.get_or_create(
+                    "local_chat", None,
+                    {"model_path": os.path.abspath(local_model_path),
+                     "mtime": os.path.getmtime(local_model_path), "temperature": temperature},
+                    _create_local
+                )
             else:
                 # OpenAI互換としての処理
                 openai_setting = config_manager.get_openai_setting_by_name(active_provider)
@@ -109,15 +125,18 @@ class LLMFactory:
                 elif provider_name == "Moonshot AI" or "moonshot" in base_url:
                     if target_temp != 1.0: target_temp = 1.0
 
-                return ChatOpenAI(
+                openai_params = dict(
                     base_url=base_url,
-                    api_key=openai_api_key,
                     model=sanitized_model_name,
                     temperature=target_temp,
                     top_p=target_top_p,
                     max_retries=max_retries,
                     streaming=True
                 )
+                return client_pool.get_or_create(
+                    "openai_chat", openai_api_key, openai_params,
+                    lambda: ChatOpenAI(api_key=openai_api_key, **openai_params)
+                )
         
         # --- 以下は既存ロジック（internal_role未指定時） ---
         
@@ -234,9 +253,8 @@ class LLMFactory:
             print(f"  - Base URL: {base_url}")
             print(f"  - Model: {internal_model_name}")
 
-            return ChatOpenAI(
+            openai_params = dict(
                 base_url=base_url,
-                api_key=openai_api_key,
                 model=internal_model_name,
                 temperature=target_temp,
                 top_p=target_top_p,
@@ -245,6 +263,11 @@ class LLMFactory:
                 streaming=True,
                 model_kwargs=model_kwargs
             )
+            # 同じ接続先・モデル・APIキー・パラメータでは、生成済みのクライアント（とHTTP接続）を使い回す
+            return client_pool.get_or_create(
+                "openai_chat", openai_api_key, openai_params,
+                lambda: ChatOpenAI(api_key=openai_api_key, **openai_params)
+            )
 
         else:
             raise ValueError(f"Unknown provider: {active_provider}")
@@ -0,0 +1,204 @@
+# log_archiver.py
+"""
+会話ログ（log.txt）のアーカイブ
+
+ログが設定サイズ（log_archive_threshold_mb）を超えたら、古い部分を log_archives/ に移し、
+新しい部分（log_keep_size_mb 程度）だけを log.txt に残す。
+
+従来は utils.save_message_to_log の中で log.txt 全体を readlines() して分割していたため、
+メッセージの保存のたびにログ全体の複製がメモリ上に作られ、送信処理も止まっていた。
+
+- 分割位置は chat_log_index のヘッダーオフセットから決める（ログの再走査はしない）
+- 古い部分・新しい部分ともファイル間でストリームコピーする（可能なら os.copy_file_range）
+- 新しい部分は一時ファイルに書き出し、rename で log.txt と入れ替える
+- アーカイブはバックグラウンドスレッドで行い、保存処理はブロックしない
+- 追記（save_message_to_log）とは log_lock で排他し、入れ替え直前に追記された分も取りこぼさない
+"""
+
+import datetime
+import os
+import threading
+import traceback
+from typing import Dict, Optional
+
+import chat_log_index
+import keyword_index
+
+# 一時ファイルへのコピーの単位（バイト）
+_CHUNK_SIZE = 1024 * 1024
+# 入れ替え前に、ログが追記以外の方法で書き換えられていないかを確認するためのバイト数
+_TAIL_SAMPLE_BYTES = 64
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_lock = threading.Lock()
+_threads: Dict[str, threading.Thread] = {}
+_threads_lock = threading.Lock()
+
+
+def log_lock(log_file_path: str) -> threading.Lock:
+    """ログへの追記とアーカイブの入れ替えを排他するためのロック"""
+    key = os.path.abspath(log_file_path)
+    with _locks_lock:
+        lock = _locks.get(key)
+        if lock is None:
+            lock = _locks[key] = threading.Lock()
+        return lock
+
+
+def _copy_range(src_path: str, dst_path: str, start: int, end: int, mode: str = "wb") -> None:
+    """src_path の [start, end) を dst_path にコピーする（mode="ab" なら末尾に追加）"""
+    with open(src_path, "rb") as src, open(dst_path, mode) as dst:
+        remaining = end - start
+        if hasattr(os, "copy_file_range") and mode == "wb":
+            try:
+                offset = start
+                while remaining > 0:
+                    copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining, offset)
+                    if copied == 0:
+                        break
+                    offset += copied
+                    remaining -= copied
+            except OSError:
+                # 対応していないファイルシステムでは通常のコピーでやり直す
+                dst.seek(0)
+                dst.truncate()
+                remaining = end - start
+        src.seek(end - remaining)
+        while remaining > 0:
+            chunk = src.read(min(_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            dst.write(chunk)
+            remaining -= len(chunk)
+        dst.flush()
+        os.fsync(dst.fileno())
+
+
+def _read_sample(log_file_path: str, end: int) -> bytes:
+    with open(log_file_path, "rb") as f:
+        f.seek(max(0, end - _TAIL_SAMPLE_BYTES))
+        return f.read(min(end, _TAIL_SAMPLE_BYTES))
+
+
+def find_split_offset(offsets, size: int, keep_bytes: int) -> int:
+    """
+    アーカイブする範囲の終わり（＝残す部分の先頭のヘッダー位置）を返す。0 の場合は分割しない。
+    末尾から keep_bytes 以上を残せる、最も新しいヘッダーの位置で分割する。
+    """
+    if not offsets:
+        return 0
+    split = 0
+    target = size - keep_bytes
+    if target >= 0:
+        valid = [o for o in offsets if o <= target]
+        # 条件を満たすヘッダーが無い場合は安全のため半分で切る（フォールバック）
+        split = valid[-1] if valid else offsets[len(offsets) // 2]
+    # 分割点が先頭(0)になってしまった場合（全部残すことになってしまう場合）、強制的に古い方1/3をアーカイブする
+    if split == 0 and len(offsets) > 10:
+        print("--- [ログアーカイブ] 適切な分割点が見つからなかったため、強制的に古いログの約1/3をアーカイブします ---")
+        split = offsets[len(offsets) // 3]
+    return split
+
+
+def archive(log_file_path: str, character_name: str, threshold_bytes: int, keep_bytes: int) -> Optional[str]:
+    """ログがしきい値を超えていれば古い部分をアーカイブし、結果メッセージを返す"""
+    # 循環参照を避けるため、ここでローカルインポート
+    import room_manager
+
+    archive_temp = tail_temp = None
+    try:
+        if os.path.getsize(log_file_path) <= threshold_bytes:
+            return None
+
+        print(f"--- [ログアーカイブ開始] {log_file_path} が {threshold_bytes / 1024 / 1024:.1f}MB を超えました ---")
+
+        # Create a backup before modifying the log file
+        room_manager.create_backup(character_name, 'log')
+
+        index = chat_log_index.get_index(log_file_path)
+        if index is None or not index.offsets:
+            print("--- [ログアーカイブ警告] ヘッダーが見つかりませんでした。アーカイブを中止します。 ---")
+            return None
+        size = index.size
+        original_inode = os.stat(log_file_path).st_ino
+        sample = _read_sample(log_file_path, size)
+
+        split = find_split_offset(index.offsets, size, keep_bytes)
+        if split == 0:
+            print("--- [ログアーカイブ] 分割できませんでした ---")
+            return None
+
+        archive_dir = os.path.join(os.path.dirname(log_file_path), "log_archives")
+        os.makedirs(archive_dir, exist_ok=True)
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        archive_path = os.path.join(archive_dir, f"log_archive_{timestamp}.txt")
+
+        # 時間のかかるコピーはロックの外で行う
+        archive_temp = archive_path + ".tmp"
+        tail_temp = log_file_path + ".archiving.tmp"
+        _copy_range(log_file_path, archive_temp, 0, split)
+        _copy_range(log_file_path, tail_temp, split, size)
+
+        with log_lock(log_file_path):
+            st = os.stat(log_file_path)
+            if (st.st_ino != original_inode or st.st_size < size
+                    or _read_sample(log_file_path, size) != sample):
+                print("--- [ログアーカイブ] アーカイブ中にログが書き換えられたため中止しました ---")
+                return None
+            # コピー中に追記された分を加えてから入れ替える
+            if st.st_size > size:
+                _copy_range(log_file_path, tail_temp, size, st.st_size, mode="ab")
+            os.replace(archive_temp, archive_path)
+            os.replace(tail_temp, log_file_path)
+            archive_temp = tail_temp = None
+            chat_log_index.invalidate(log_file_path)
+        keyword_index.schedule_refresh(os.path.dirname(log_file_path))
+
+        archive_size_mb = os.path.getsize(archive_path) / 1024 / 1024
+        message = f"古いログをアーカイブしました ({archive_size_mb:.2f}MB)"
+        print(f"--- [ログアーカイブ完了] {message} -> {archive_path} ---")
+        return message
+
+    except Exception as e:
+        print(f"!!! [ログアーカイブエラー] {e}"); traceback.print_exc()
+        return None
+    finally:
+        for temp_path in (archive_temp, tail_temp):
+            if temp_path and os.path.exists(temp_path):
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+
+
+def schedule(log_file_path: str, character_name: str, threshold_bytes: int, keep_bytes: int) -> bool:
+    """
+    ログがしきい値を超えていれば、バックグラウンドでアーカイブを開始する。
+    同じログのアーカイブが実行中の場合は何もしない。開始した場合は True を返す。
+    """
+    try:
+        if os.path.getsize(log_file_path) <= threshold_bytes:
+            return False
+    except OSError:
+        return False
+    key = os.path.abspath(log_file_path)
+    with _threads_lock:
+        running = _threads.get(key)
+        if running is not None and running.is_alive():
+            return False
+        thread = threading.Thread(
+            target=archive, args=(log_file_path, character_name, threshold_bytes, keep_bytes),
+            name=f"log-archiver-{character_name}", daemon=True
+        )
+        _threads[key] = thread
+        thread.start()
+    return True
+
+
+def wait_idle(timeout: Optional[float] = None) -> bool:
+    """実行中のアーカイブがすべて終わるまで待つ（主にテスト用）"""
+    with _threads_lock:
+        threads = list(_threads.values())
+    for thread in threads:
+        thread.join(timeout)
+    return not any(thread.is_alive() for thread in threads)
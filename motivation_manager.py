@@ -253,28 +253,23 @@ class MotivationManager:
 
     
     def _load_state(self) -> Dict:
-        """内部状態をファイルからロード（ロック付き）"""
-        from file_lock_utils import safe_json_read
+        """内部状態をロード（json_state_store 経由。保存前の変更も反映される）"""
+        import json_state_store
         
-        if self.state_file.exists():
-            try:
-                state = safe_json_read(str(self.state_file), default=None)
-                if state is None:
-                    return self._get_empty_state()
-                # 古い形式の場合はマイグレーション
-                if "drives" not in state:
-                    return self._get_empty_state()
-                return state
-            except Exception:
+        try:
+            state = json_state_store.read(self.state_file, default={})
+            # ファイルが無い場合や古い形式の場合は初期状態から
+            if not isinstance(state, dict) or "drives" not in state:
                 return self._get_empty_state()
-        return self._get_empty_state()
+            return state
+        except Exception:
+            return self._get_empty_state()
     
     def _save_state(self):
-        """内部状態をファイルに保存（ロック付き）"""
-        from file_lock_utils import safe_json_write
+        """内部状態を保存（json_state_store 経由。短時間の連続した更新はまとめてファイルに書き込まれる）"""
+        import json_state_store
         
-        if not safe_json_write(str(self.state_file), self._state):
-            print(f"[MotivationManager] 状態保存タイムアウト")
+        json_state_store.write(self.state_file, self._state)
     
     # ========================================
     # 各動機の計算
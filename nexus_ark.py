@@ -3583,12 +3583,15 @@ try:
         )
 
         # トークン計算イベント（入力内容が変更されるたびに実行）
+        # 計算中に入力が続いた場合は、完了後に最新の入力で1回だけ再計算する（always_last）。
+        # 入力欄以外の見積もりはキャッシュされるため、再計算は入力欄の分のトークン化だけで済む
         token_calc_on_input_inputs = context_token_calc_inputs
         chat_input_multimodal.change(
             fn=ui_handlers.update_token_count_on_input,
             inputs=token_calc_on_input_inputs,
             outputs=token_count_display,
-            show_progress=False
+            show_progress=False,
+            trigger_mode="always_last"
         )
 
         refresh_scenery_button.click(fn=ui_handlers.handle_scenery_refresh, inputs=[current_room_name, api_key_dropdown], outputs=[location_dropdown, current_scenery_display, scenery_image_display, custom_scenery_location_dropdown, style_injector])
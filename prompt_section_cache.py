@@ -0,0 +1,90 @@
+# prompt_section_cache.py
+"""
+システムプロンプトのセクション単位キャッシュ
+
+context_generator_node は毎ターン、SystemPrompt.txt・コアメモリ・メモ帳・研究ノート・世界設定などを
+読み直してシステムプロンプトを組み立てている。ここでは各セクションを、元になったファイルの
+(パス, 更新時刻, サイズ) をキーにしてキャッシュし、ファイルが変わったセクションだけを作り直す。
+
+- ソースにディレクトリを指定した場合は、ディレクトリ自体の更新時刻（エントリの追加・削除で変わる）を使う
+- ビルダーが例外を投げた場合はキャッシュせず、そのまま呼び出し側に伝える
+- 読み出すたびに内容が消えるもの（ペンディングシステムメッセージ）や、
+  時刻で変わるもの（動機の計算）はキャッシュの対象にしないこと
+"""
+
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import json_state_store
+
+_cache: Dict[Tuple[str, str], Tuple[tuple, Any]] = {}
+_lock = threading.Lock()
+
+
+def source_signature(path: Optional[str]) -> tuple:
+    """
+    ファイル（またはディレクトリ）の (パス, 更新時刻ns, サイズ, json_state_store への書き込み回数) を返す。
+    存在しない場合は時刻・サイズが None。書き込み回数により、まだ保存されていない状態ファイルの変更も検知する
+    """
+    if not path:
+        return (None, None, None, 0)
+    written = json_state_store.generation(path)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return (str(path), None, None, written)
+    return (str(path), st.st_mtime_ns, st.st_size, written)
+
+
+class SectionStats:
+    """1ターン分のセクションごとのキャッシュヒット/ミスの記録"""
+
+    def __init__(self):
+        self.hits: List[str] = []
+        self.misses: List[str] = []
+
+    def summary(self) -> str:
+        hits = ", ".join(self.hits) or "なし"
+        misses = ", ".join(self.misses) or "なし"
+        return f"ヒット: {hits} / 再構築: {misses}"
+
+
+def get_section(room_name: str, name: str, sources: Iterable[Optional[str]], builder: Callable[[], Any],
+                stats: Optional[SectionStats] = None, extra_key: Any = None) -> Any:
+    """
+    セクションをキャッシュから返す。ソースファイルのいずれかが変わっていれば builder() で作り直す。
+
+    Args:
+        room_name: ルーム名（キャッシュはルームごと）
+        name: セクション名
+        sources: セクションの元になるファイル・ディレクトリのパス
+        builder: セクションを組み立てる関数
+        stats: ヒット/ミスを記録する SectionStats
+        extra_key: ファイル以外にセクションの内容を左右する値（現在地など）
+    """
+    key = tuple(source_signature(p) for p in sources) + (extra_key,)
+    cache_key = (room_name, name)
+    with _lock:
+        cached = _cache.get(cache_key)
+    if cached is not None and cached[0] == key:
+        if stats is not None:
+            stats.hits.append(name)
+        return cached[1]
+
+    value = builder()
+    with _lock:
+        _cache[cache_key] = (key, value)
+    if stats is not None:
+        stats.misses.append(name)
+    return value
+
+
+def invalidate(room_name: Optional[str] = None):
+    """キャッシュを破棄する（room_name を省略すると全ルーム）"""
+    with _lock:
+        if room_name is None:
+            _cache.clear()
+            return
+        for cache_key in [k for k in _cache if k[0] == room_name]:
+            del _cache[cache_key]
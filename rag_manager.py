@@ -12,8 +12,15 @@ import logging
 import json
 import hashlib
 import math
+import threading
+import uuid
+import weakref
+from collections import OrderedDict
 from datetime import datetime
 
+import faiss
+import numpy as np
+
 from langchain_core.embeddings import Embeddings
 from langchain_community.vectorstores import FAISS
 from langchain_community.docstore.document import Document
@@ -24,6 +31,12 @@ import constants
 import config_manager
 import utils
 import psutil
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+from embedding_scheduler import ScheduledEmbeddings
+import chat_log_index
+import lazy_docstore
+import vector_search
+import intent_classifier
 
 # ロギング設定
 logger = logging.getLogger(__name__)
@@ -46,25 +59,92 @@ class LangChainEmbeddingWrapper(Embeddings):
         return embedding.tolist()
 
 
+class _IndexCache:
+    """
+    検索用インデックスのキャッシュ {str(path): (FAISS_db, (inode, size, mtime_ns))}。
+    全ルームで共有し、推定メモリ量の合計が constants.RAG_INDEX_CACHE_MAX_BYTES を超えたら
+    最も長く使われていないインデックスから破棄する（直近の1件は常に保持）。
+    """
+
+    def __init__(self):
+        self._entries: "OrderedDict[str, Tuple[FAISS, tuple, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str, file_key: tuple) -> Optional[FAISS]:
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry[1] != file_key:
+                return None
+            self._entries.move_to_end(path)
+            return entry[0]
+
+    def put(self, path: str, db: FAISS, file_key: tuple, nbytes: int) -> None:
+        with self._lock:
+            self._entries[path] = (db, file_key, nbytes)
+            self._entries.move_to_end(path)
+            total = sum(entry[2] for entry in self._entries.values())
+            while total > constants.RAG_INDEX_CACHE_MAX_BYTES and len(self._entries) > 1:
+                evicted_path, evicted = self._entries.popitem(last=False)
+                total -= evicted[2]
+                print(f"  - [RAG] インデックスをキャッシュから破棄: {evicted_path}")
+
+    def pop(self, path: str) -> None:
+        with self._lock:
+            self._entries.pop(path, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(entry[2] for entry in self._entries.values())
+
+    def items(self) -> List[Tuple[str, Tuple[FAISS, tuple]]]:
+        with self._lock:
+            return [(path, (entry[0], entry[1])) for path, entry in self._entries.items()]
+
+    def __contains__(self, path: str) -> bool:
+        with self._lock:
+            return path in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+def _estimate_index_bytes(target_path: Path, db: FAISS) -> int:
+    """読み込んだインデックスが占めるメモリ量の目安（ベクトル本体＋メモリ上に展開したドキュメント）"""
+    nbytes = 0
+    files = ["index.faiss"]
+    if not isinstance(db.docstore, lazy_docstore.SQLiteDocstore):
+        files.append("index.pkl")
+    for name in files:
+        try:
+            nbytes += (target_path / name).stat().st_size
+        except OSError:
+            pass
+    return nbytes
+
+
 class RAGManager:
-    # インデックスをメモリ上に保持するキャッシュ {str(path): (FAISS_db, timestamp)}
-    _index_cache: Dict[str, Tuple[FAISS, float]] = {}
+    # 検索用インデックスのキャッシュ（全ルーム共有、サイズ上限つき LRU）
+    _index_cache = _IndexCache()
+    # 検索用インデックスごとの (arousal配列, 日付序数配列)。インデックスが破棄されると自動的に消える
+    _vector_meta: "weakref.WeakKeyDictionary[FAISS, Tuple[np.ndarray, np.ndarray]]" = weakref.WeakKeyDictionary()
+    _vector_meta_lock = threading.Lock()
+    # 現行ログ索引の差分更新用の状態ファイル（ブロックのハッシュとベクトルIDの対応）
+    CURRENT_LOG_STATE_FILE = "log_state.json"
 
     def __init__(self, room_name: str, api_key: str):
         self.room_name = room_name
         self.api_key = api_key
-        
-        # --- [API Key Rotation Limit] ---
-        # このセッションで試行したキーを記録（1周で止めるため）
-        self.tried_keys = set()
-        initial_key_name = config_manager.get_key_name_by_value(self.api_key)
-        if initial_key_name != "Unknown":
-            self.tried_keys.add(initial_key_name)
         self.room_dir = Path(constants.ROOMS_DIR) / room_name
         self.rag_data_dir = self.room_dir / "rag_data"
         
         self.static_index_path = self.rag_data_dir / "faiss_index_static"
         self.dynamic_index_path = self.rag_data_dir / "faiss_index_dynamic"
+        self.current_log_index_path = self.rag_data_dir / "current_log_index"
         self.processed_files_record = self.rag_data_dir / "processed_static_files.json"
         
         self.rag_data_dir.mkdir(parents=True, exist_ok=True)
@@ -75,28 +155,57 @@ class RAGManager:
         
         # エンベディングの初期化
         self.embeddings = None  # 常に遅延初期化
+        # get_manager で共有されたインスタンスを複数スレッドから使うため、初期化を排他する
+        self._embeddings_lock = threading.RLock()
         print(f"[RAGManager] エンベディングモード: {self.embedding_mode} (遅延初期化待ち)")
 
-    def _get_embedding_model_id(self) -> str:
-        """現在のエンベディング設定を識別するユニークなIDを返す"""
-        if self.embedding_mode == "local":
+    @staticmethod
+    def _model_id_for_mode(embedding_mode: str) -> str:
+        if embedding_mode == "local":
             settings = config_manager.get_internal_model_settings()
             model_name = settings.get("embedding_model", "unknown-local")
             return f"local:{model_name}"
         else:
             return f"google:{constants.EMBEDDING_MODEL}"
 
+    def _get_embedding_model_id(self) -> str:
+        """現在のエンベディング設定を識別するユニークなIDを返す"""
+        return self._model_id_for_mode(self.embedding_mode)
+
+    def _set_api_key(self, api_key: str):
+        """
+        共有インスタンスのAPIキーを差し替える。
+        検索中の他のスレッドがいるため、エンベディング（とその永続キャッシュ）は作り直さず、
+        Gemini API のエンベディングが次のリクエストから使うキーだけを入れ替える。
+        """
+        with self._embeddings_lock:
+            if api_key == self.api_key:
+                return
+            self.api_key = api_key
+            embeddings = self.embeddings
+            base = embeddings.base if isinstance(embeddings, CachedEmbeddings) else embeddings
+            if isinstance(base, ScheduledEmbeddings):
+                base.api_key = api_key
+
     def _get_embeddings(self):
         """エンベディングインスタンスを取得（必要に応じて初期化）"""
-        if self.embeddings is not None:
+        embeddings = self.embeddings
+        if embeddings is not None:
+            return embeddings
+        with self._embeddings_lock:
+            if self.embeddings is None:
+                self._init_embeddings()
             return self.embeddings
-        
+
+    def _init_embeddings(self):
+        # キャッシュキー用のモデルID（フォールバック時は実際に使うモデルで区別する）
+        cache_model_id = self._get_embedding_model_id()
         if self.embedding_mode == "local":
             try:
                 # 非常に重いライブラリをここで初めて呼ぶ
                 from topic_cluster_manager import LocalEmbeddingProvider
                 local_provider = LocalEmbeddingProvider()
-                self.embeddings = LangChainEmbeddingWrapper(local_provider)
+                embeddings = LangChainEmbeddingWrapper(local_provider)
                 print(f"[RAGManager] ローカルエンベディング ({self._get_embedding_model_id()}) を初期化しました")
             except Exception as e:
                 # 警告を強調
@@ -112,63 +221,35 @@ class RAGManager:
                 print(f"  - 処置: Google API (gemini-embedding-001) にフォールバックします。")
                 print(f"!"*60 + "\n")
                 
-                from langchain_google_genai import GoogleGenerativeAIEmbeddings
-                self.embeddings = GoogleGenerativeAIEmbeddings(
-                    model=constants.EMBEDDING_MODEL,
-                    google_api_key=self.api_key,
-                    task_type="retrieval_document"
-                )
+                cache_model_id = f"google:{constants.EMBEDDING_MODEL}"
+                embeddings = ScheduledEmbeddings(self.api_key, use_all_keys=self._key_rotation_enabled())
         else:
-            # Gemini API エンベディングを使用
-            from langchain_google_genai import GoogleGenerativeAIEmbeddings
-            self.embeddings = GoogleGenerativeAIEmbeddings(
-                model=constants.EMBEDDING_MODEL,
-                google_api_key=self.api_key,
-                task_type="retrieval_document"
-            )
+            # Gemini API エンベディングを使用（全キーで共有するスケジューラ経由でレートを制御する）
+            embeddings = ScheduledEmbeddings(self.api_key, use_all_keys=self._key_rotation_enabled())
             print(f"[RAGManager] Gemini API エンベディング ({self._get_embedding_model_id()}) を初期化しました")
-            
-        return self.embeddings
         
-    def _rotate_api_key(self, error_str: str) -> bool:
-        """
-        429エラー時にAPIキーをローテーションする。
-        回転に成功した場合は True, 失敗した場合は False (待機してリトライ用) を返す。
-        """
-        if not ("429" in error_str or "ResourceExhausted" in error_str):
-            return False
-
-        if self.embedding_mode != "api":
-            return False
+        # 索引作成時に同じチャンクを再ベクトル化しないよう、永続キャッシュでラップする
+        cache = EmbeddingCache.for_model(self.rag_data_dir / "embedding_cache", cache_model_id)
+        # 他のスレッドが初期化途中のインスタンスを使わないよう、完成してから設定する
+        self.embeddings = CachedEmbeddings(embeddings, cache)
+        return self.embeddings
 
-        # 現在のキー名を特定
-        key_name = config_manager.get_key_name_by_value(self.api_key)
-        if key_name != "Unknown":
-            config_manager.mark_key_as_exhausted(key_name)
-            print(f"      [RAG Rotation] Key '{key_name}' marked as exhausted.")
-        
-        # ローテーション設定確認
+    def _key_rotation_enabled(self) -> bool:
+        """ルーム設定（なければ共通設定）で、APIキーのローテーションが有効かどうか"""
         effective_settings = config_manager.get_effective_settings(self.room_name)
         rotation_enabled = effective_settings.get("enable_api_key_rotation")
         if rotation_enabled is None:
             rotation_enabled = config_manager.CONFIG_GLOBAL.get("enable_api_key_rotation", True)
-            
-        if rotation_enabled:
-            next_key_name = config_manager.get_next_available_gemini_key(
-                current_exhausted_key=key_name,
-                excluded_keys=self.tried_keys
-            )
-            if next_key_name and next_key_name not in self.tried_keys:
-                next_key_val = config_manager.GEMINI_API_KEYS.get(next_key_name)
-                if next_key_val:
-                    print(f"      [RAG Rotation] Switching key: {key_name} -> {next_key_name}")
-                    self.api_key = next_key_val
-                    self.tried_keys.add(next_key_name)
-                    self.embeddings = None # 次の _get_embeddings() で新キーで再生成
-                    return True
-        
-        print(f"      [RAG Rotation] No more keys available to try in this session.")
-        return False
+        return bool(rotation_enabled)
+
+    def _index_batch_size(self) -> int:
+        """
+        索引作成で1回にまとめてベクトル化するチャンク数。
+        APIモードではスケジューラがリクエスト単位に分けて全キーへ並行に送るため、大きめにまとめる。
+        """
+        if self.embedding_mode == "api":
+            return constants.EMBEDDING_INDEX_BATCH_DOCS
+        return 20
 
     def _load_processed_record(self) -> Set[str]:
         if self.processed_files_record.exists():
@@ -222,6 +303,18 @@ class RAGManager:
                 "weights": {"alpha": float, "beta": float, "gamma": float}
             }
         """
+        # ローカル分類器で十分な確信度が得られればLLMを呼ばない
+        classifier = intent_classifier.IntentClassifier.for_room(self.room_name)
+        try:
+            local_intent = classifier.classify(query)
+        except Exception as e:
+            print(f"  - [Intent] ローカル分類エラー、LLMで分類します: {e}")
+            local_intent = None
+        if local_intent:
+            weights = constants.INTENT_WEIGHTS[local_intent]
+            print(f"  - [Intent] Query: '{query[:30]}...' -> {local_intent} [local] (α={weights['alpha']}, β={weights['beta']}, γ={weights['gamma']})")
+            return {"intent": local_intent, "weights": weights}
+
         try:
             from llm_factory import LLMFactory
             
@@ -251,6 +344,7 @@ class RAGManager:
             for valid_intent in constants.INTENT_WEIGHTS.keys():
                 if valid_intent in response:
                     intent = valid_intent
+                    classifier.record(query, intent)  # ローカル分類器の学習データとして記録
                     break
             
             weights = constants.INTENT_WEIGHTS.get(intent, constants.INTENT_WEIGHTS[constants.DEFAULT_INTENT])
@@ -329,6 +423,9 @@ class RAGManager:
         with tempfile.TemporaryDirectory(dir=str(parent_dir), prefix=".tmp_index_") as temp_dir:
             temp_path = Path(temp_dir)
             db.save_local(str(temp_path))
+            # 検索時にドキュメントを必要な分だけ読めるよう、SQLite 形式でも書き出しておく
+            lazy_docstore.write_docstore(db, temp_path)
+            vector_search.write_vector_metadata(db, temp_path)
             
             # Windows/WSLでのファイルロック・競合に対応するためのリトライループ
             max_retries = 3
@@ -363,9 +460,7 @@ class RAGManager:
                         print(f"  - [RAG Warning] モデル情報の保存に失敗: {e}")
 
                     # キャッシュをクリア
-                    cache_key = str(target_path.absolute())
-                    if cache_key in RAGManager._index_cache:
-                        del RAGManager._index_cache[cache_key]
+                    RAGManager._index_cache.pop(str(target_path.resolve()))
 
                     # 成功
                     self._cleanup_old_indices(parent_dir, target_path.name)
@@ -389,24 +484,30 @@ class RAGManager:
         except Exception:
             pass
 
-    def _safe_load_index(self, target_path: Path) -> Optional[FAISS]:
-        """インデックスを安全に読み込む（キャッシュ対応）"""
+    def _safe_load_index(self, target_path: Path, for_update: bool = False) -> Optional[FAISS]:
+        """
+        インデックスを安全に読み込む（キャッシュ対応）
+        検索用はベクトルファイルをメモリマップし、ドキュメントは docstore.sqlite3 からヒットした分だけ読む。
+        for_update=True の場合は追加・削除できるよう全体をメモリ上に展開し、キャッシュは使わない。
+        """
         if not target_path or not target_path.exists():
             return None
         
         # パスを絶対パスかつ文字列として正規化（キャッシュキー用）
         target_abs_path = str(target_path.resolve())
-        mtime = target_path.stat().st_mtime
+        try:
+            # ディレクトリごと入れ替えて保存するため、ベクトルファイルの inode・サイズ・mtime で同一性を判定する
+            index_stat = (target_path / "index.faiss").stat()
+        except OSError:
+            return None
+        file_key = (index_stat.st_ino, index_stat.st_size, index_stat.st_mtime_ns)
         
         # キャッシュの有効性チェック
-        if target_abs_path in RAGManager._index_cache:
-            cache_db, cache_mtime = RAGManager._index_cache[target_abs_path]
-            if cache_mtime == mtime:
-                # print(f"  - [RAG] キャッシュからロード: {target_path.name}")
+        if not for_update:
+            cache_db = RAGManager._index_cache.get(target_abs_path, file_key)
+            if cache_db is not None:
                 return cache_db
         
-        # FAISS.load_local は読み込み中もディレクトリ内のファイルを継続的に参照する場合があるため
-        # 一時ディレクトリに完全にコピーしてからロードを完了させる方式が最も安全
         try:
             # 1. 整合性チェック
             model_info_path = target_path / "model_info.json"
@@ -428,25 +529,22 @@ class RAGManager:
                 except Exception:
                     pass
 
-            # 2. メモリ節約のため、まず一時コピーを作成
-            with tempfile.TemporaryDirectory() as temp_dir:
-                temp_index_dir = Path(temp_dir) / "index"
-                shutil.copytree(str(target_path), str(temp_index_dir))
-                
-                # 埋め込みモデルを取得（遅延初期化対応）
-                embeddings = self._get_embeddings()
-                
-                # ロード実行
-                db = FAISS.load_local(
-                    str(temp_index_dir),
+            # 2. ロード実行（埋め込みモデルは遅延初期化）
+            embeddings = self._get_embeddings()
+            if for_update:
+                return FAISS.load_local(
+                    str(target_path),
                     embeddings,
                     allow_dangerous_deserialization=True
                 )
-                
-                # キャッシュに保存（この時点で db はメモリ上に展開されている）
-                RAGManager._index_cache[target_abs_path] = (db, mtime)
-                # print(f"  - [RAG] ロード成功 (キャッシュ更新): {target_path.name}")
-                return db
+
+            if lazy_docstore.MMAP_SUPPORTED:
+                db = lazy_docstore.load_index(target_path, embeddings)
+            else:
+                db = FAISS.load_local(str(target_path), embeddings, allow_dangerous_deserialization=True)
+            RAGManager._index_cache.put(target_abs_path, db, file_key, _estimate_index_bytes(target_path, db))
+            # print(f"  - [RAG] ロード成功 (キャッシュ更新): {target_path.name}")
+            return db
                 
         except Exception as e:
             print(f"  - [RAG Error] インデックス読み込み失敗 ({target_path.name}): {e}")
@@ -461,8 +559,8 @@ class RAGManager:
         save_callback: 途中保存用コールバック関数 (db) -> None（定期的に呼び出される）
         status_callback: UIへ進捗メッセージを送信するコールバック関数 (message) -> None
         """
-        BATCH_SIZE = 20
-        SAVE_INTERVAL_BATCHES = 20  # 20バッチごと（約40秒間隔）に途中保存・進捗報告
+        BATCH_SIZE = self._index_batch_size()
+        SAVE_INTERVAL_BATCHES = 20  # 20バッチごとに途中保存・進捗報告
         db = existing_db
         total_splits = len(splits)
         total_batches = (total_splits + BATCH_SIZE - 1) // BATCH_SIZE
@@ -502,24 +600,15 @@ class RAGManager:
                     # 進捗を報告
                     if progress_callback:
                         progress_callback(batch_num, total_batches)
-                    
-                    if self.embedding_mode == "api":
-                        time.sleep(2) 
                     break 
                 
                 except Exception as e:
                     error_str = str(e)
                     print(f"      ! ベクトル化エラー (試行 {attempt+1}/{max_retries}): {e}")
                     if "429" in error_str or "ResourceExhausted" in error_str:
-                        # --- [API Key Rotation] ---
-                        if self._rotate_api_key(error_str):
-                            if status_callback:
-                                status_callback(f"API制限検知 - キーを切り替えてリトライします...")
-                            # time.sleep(1) # 短いバックオフ
-                            continue # 同じバッチ番号でリトライ (attemptはリセットされないが、next tryで新キー使用)
-
+                        # キーの切り替えとレート調整はスケジューラが行う。ここに来るのは全キーが枯渇した場合
                         wait_time = 10 * (attempt + 1)
-                        print(f"      ! API制限検知（ローテーション不可）。{wait_time}秒待機してリトライ...")
+                        print(f"      ! API制限検知（利用可能なキーなし）。{wait_time}秒待機してリトライ...")
                         if status_callback:
                             status_callback(f"API制限 - {wait_time}秒待機中...")
                         time.sleep(wait_time)
@@ -527,8 +616,6 @@ class RAGManager:
                         if attempt == max_retries - 1:
                             print(f"      ! このバッチをスキップします。最終エラー: {e}")
                             traceback.print_exc()
-                        if self.embedding_mode == "api":
-                            time.sleep(2)
             
             # 定期進捗報告と途中保存（100バッチごと）
             if batch_num % SAVE_INTERVAL_BATCHES == 0:
@@ -582,21 +669,15 @@ class RAGManager:
                             pending_items.append((record_id, doc))
                     except Exception: pass
 
-        # 2. エピソード記憶収集（月次ファイル + レガシーファイル）
-        episodic_dir = self.room_dir / "memory" / "episodic"
-        legacy_episodic_path = self.room_dir / "memory" / "episodic_memory.json"
-        
-        # エピソードファイルのリストを収集
-        episodic_files = []
-        if legacy_episodic_path.exists():
-            episodic_files.append(legacy_episodic_path)
-        if episodic_dir.exists():
-            episodic_files.extend(sorted(episodic_dir.glob("*.json")))
+        # 2. エピソード記憶収集（月次ファイル + 追記ジャーナル + レガシーファイル）
+        from episodic_store import EpisodicStore
+        episodic_store = EpisodicStore(
+            self.room_dir / "memory" / "episodic",
+            self.room_dir / "memory" / "episodic_memory.json"
+        )
         
-        for episodic_path in episodic_files:
+        for episodic_path, episodes in episodic_store.episodes_by_file():
             try:
-                with open(episodic_path, 'r', encoding='utf-8') as f:
-                    episodes = json.load(f)
                 if isinstance(episodes, list):
                     for ep in episodes:
                         date_str = ep.get('date', 'unknown')
@@ -683,7 +764,7 @@ class RAGManager:
             total_pending = len(pending_items)
             report(f"新規追加アイテム: {total_pending}件。処理中...")
             
-            static_db = self._safe_load_index(self.static_index_path)
+            static_db = self._safe_load_index(self.static_index_path, for_update=True)
             SAVE_INTERVAL = 5 
             text_splitter = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=50)
             processed_count = 0
@@ -745,21 +826,15 @@ class RAGManager:
                             pending_items.append((record_id, doc))
                     except Exception: pass
 
-        # 2. エピソード記憶収集（月次ファイル + レガシーファイル）
-        episodic_dir = self.room_dir / "memory" / "episodic"
-        legacy_episodic_path = self.room_dir / "memory" / "episodic_memory.json"
+        # 2. エピソード記憶収集（月次ファイル + 追記ジャーナル + レガシーファイル）
+        from episodic_store import EpisodicStore
+        episodic_store = EpisodicStore(
+            self.room_dir / "memory" / "episodic",
+            self.room_dir / "memory" / "episodic_memory.json"
+        )
         
-        # エピソードファイルのリストを収集
-        episodic_files = []
-        if legacy_episodic_path.exists():
-            episodic_files.append(legacy_episodic_path)
-        if episodic_dir.exists():
-            episodic_files.extend(sorted(episodic_dir.glob("*.json")))
-        
-        for episodic_path in episodic_files:
+        for episodic_path, episodes in episodic_store.episodes_by_file():
             try:
-                with open(episodic_path, 'r', encoding='utf-8') as f:
-                    episodes = json.load(f)
                 if isinstance(episodes, list):
                     for ep in episodes:
                         date_str = ep.get('date', 'unknown')
@@ -839,7 +914,7 @@ class RAGManager:
         total_pending = len(pending_items)
         yield (0, total_pending, f"新規追加アイテム: {total_pending}件。処理中...")
         
-        static_db = self._safe_load_index(self.static_index_path)
+        static_db = self._safe_load_index(self.static_index_path, for_update=True)
         SAVE_INTERVAL = 5
         text_splitter = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=50)
         processed_count = 0
@@ -858,7 +933,7 @@ class RAGManager:
             splits = self._filter_meaningful_chunks(splits)
             
             # バッチ処理（途中保存付き）
-            BATCH_SIZE = 20
+            BATCH_SIZE = self._index_batch_size()
             total_batches = (len(splits) + BATCH_SIZE - 1) // BATCH_SIZE
             
             for j in range(0, len(splits), BATCH_SIZE):
@@ -872,20 +947,13 @@ class RAGManager:
                             static_db = FAISS.from_documents(batch, self._get_embeddings())
                         else:
                             static_db.add_documents(batch)
-                        
-                        if self.embedding_mode == "api":
-                            time.sleep(2)
                         break
                     except Exception as e:
                         error_str = str(e)
                         print(f"      ! ベクトル化エラー (試行 {attempt+1}/{max_retries}): {e}")
 
-                        if "429" in error_str or "ResourceExhausted" in error_str:
-                            # --- [API Key Rotation] ---
-                            if self._rotate_api_key(error_str):
-                                yield (group_num, total_groups, "API制限検知 - キーを切り替えてリトライ...")
-                                continue
-
+                        # キーの切り替え・レート調整・一時的エラーの再送はスケジューラが行う。
+                        # ここに来るのは全キーが枯渇した場合か、再送しても解消しなかった場合
                         is_retryable = any(code in error_str for code in ["429", "ResourceExhausted", "503", "504", "502", "UNAVAILABLE"])
                         wait_time = (2 ** attempt) * 10 + (5 * (attempt + 1))
                         
@@ -899,8 +967,6 @@ class RAGManager:
                         else:
                             if attempt == max_retries - 1:
                                 print(f"      ! このバッチをスキップします。最終エラー: {e}")
-                            if self.embedding_mode == "api":
-                                time.sleep(2)
                 
                 # 20バッチごとに途中保存と進捗報告
                 if batch_num % 20 == 0:
@@ -973,60 +1039,199 @@ class RAGManager:
         print(f"--- [RAG Knowledge] 完了: {result_msg} ---")
         return result_msg
 
+    def _split_log_blocks(self, log_path: Path, start: int = 0) -> Tuple[List[dict], int]:
+        """
+        log.txt をメッセージ単位（ヘッダー行から次のヘッダー行の直前まで）のブロックに分割する。
+        start バイト目以降のみを対象とし、([{start, end, hash, text}], 読み込んだファイルサイズ) を返す。
+        """
+        index = chat_log_index.get_index(str(log_path))
+        if index is None or index.size <= start:
+            return [], (index.size if index else 0)
+
+        boundaries = [offset for offset in index.offsets if offset >= start]
+        if not boundaries or boundaries[0] > start:
+            boundaries.insert(0, start)
+
+        with open(log_path, "rb") as f:
+            f.seek(start)
+            data = f.read(index.size - start)
+
+        blocks = []
+        for i, block_start in enumerate(boundaries):
+            block_end = boundaries[i + 1] if i + 1 < len(boundaries) else index.size
+            raw = data[block_start - start:block_end - start].strip()
+            if not raw:
+                continue
+            blocks.append({
+                "start": block_start,
+                "end": block_end,
+                "hash": hashlib.sha256(raw).hexdigest(),
+                "text": raw.decode("utf-8", errors="replace").replace("\r\n", "\n"),
+            })
+        return blocks, index.size
+
+    def _load_current_log_index(self, index_path: Path) -> Tuple[Optional[FAISS], Optional[dict]]:
+        """差分更新用に現行ログ索引と状態ファイルを読み込む（どちらかが使えなければ (None, None)）"""
+        state_path = index_path / self.CURRENT_LOG_STATE_FILE
+        if not state_path.exists():
+            return None, None
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get("model_id") != self._get_embedding_model_id():
+                print(f"  - [RAG CurrentLog] エンベディングモデルが変わったため、現行ログ索引を作り直します")
+                return None, None
+            # 検索用キャッシュと共有しないよう、更新用に別インスタンスとして読み込む
+            db = FAISS.load_local(str(index_path), self._get_embeddings(), allow_dangerous_deserialization=True)
+            return db, state
+        except Exception as e:
+            print(f"  - [RAG CurrentLog] 索引の状態を読み込めませんでした。作り直します: {e}")
+            return None, None
+
+    def _is_current_log_append(self, state: dict, log_path: Path, st: os.stat_result) -> bool:
+        """前回索引化した位置までの内容が変わらず、後ろに追記されただけかどうか"""
+        indexed_bytes = state.get("indexed_bytes", 0)
+        if state.get("file_key") != [st.st_dev, st.st_ino] or st.st_size < indexed_bytes:
+            return False
+        tail_start = max(0, indexed_bytes - 64)
+        with open(log_path, "rb") as f:
+            f.seek(tail_start)
+            tail = f.read(indexed_bytes - tail_start)
+        return tail.hex() == state.get("tail", "")
+
+    def _save_current_log_index(self, db: FAISS, index_path: Path, log_path: Path, indexed_bytes: int, blocks: List[dict]):
+        """現行ログ索引を保存し、差分更新用の状態ファイルを書き込む"""
+        self._safe_save_index(db, index_path)
+        st = log_path.stat()
+        tail_start = max(0, indexed_bytes - 64)
+        with open(log_path, "rb") as f:
+            f.seek(tail_start)
+            tail = f.read(indexed_bytes - tail_start)
+        state = {
+            "model_id": self._get_embedding_model_id(),
+            "file_key": [st.st_dev, st.st_ino],
+            "indexed_bytes": indexed_bytes,
+            "tail": tail.hex(),
+            "blocks": [{"start": b["start"], "end": b["end"], "hash": b["hash"], "ids": b["ids"]} for b in blocks],
+        }
+        with open(index_path / self.CURRENT_LOG_STATE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+
     def update_current_log_index_with_progress(self):
         """
-        現行ログ（log.txt）のみをインデックス化する（進捗をyieldするジェネレーター版）
+        現行ログ（log.txt）の索引を差分更新する（進捗をyieldするジェネレーター版）
+        ログをメッセージ単位のブロックに分け、ブロックのハッシュとベクトルIDの対応を状態ファイルに保持する。
+        前回索引化した位置以降の追記分のみをベクトル化し、アーカイブ等でログから消えたブロックのベクトルは削除する。
         yields: (batch_num, total_batches, status_message)
         """
         current_log_path = self.room_dir / "log.txt"
+        current_log_index_path = self.current_log_index_path
         if not current_log_path.exists():
             yield (0, 0, "現行ログ: ファイルが存在しません")
             return
         
         try:
-            content = current_log_path.read_text(encoding="utf-8")
-            
-            if not content.strip():
+            st = current_log_path.stat()
+            db, state = self._load_current_log_index(current_log_index_path)
+
+            # 追記のみなら最後のブロック以降だけを読み直す（最後のメッセージが伸びている可能性があるため）。
+            # 前回失敗したブロックがあれば、indexed_bytes はその先頭を指しているので、そこから読み直す
+            kept_blocks, candidate_blocks, read_from = [], [], 0
+            if state is not None:
+                if self._is_current_log_append(state, current_log_path, st) and state["blocks"]:
+                    read_from = min(state.get("indexed_bytes", 0), state["blocks"][-1]["start"])
+                    kept_blocks = [b for b in state["blocks"] if b["start"] < read_from]
+                    candidate_blocks = [b for b in state["blocks"] if b["start"] >= read_from]
+                else:
+                    candidate_blocks = state["blocks"]
+
+            new_blocks, indexed_bytes = self._split_log_blocks(current_log_path, read_from)
+            if not kept_blocks and not new_blocks:
                 yield (0, 0, "現行ログ: 空のファイルです")
                 return
-            
-            doc = Document(page_content=content, metadata={"source": "log.txt", "type": "current_log"})
-            
+
+            # 内容（ハッシュ）が一致するブロックは既存のベクトルをそのまま使う
+            reusable: Dict[str, List[dict]] = {}
+            for block in candidate_blocks:
+                reusable.setdefault(block["hash"], []).append(block)
+
             text_splitter = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=50)
-            splits = text_splitter.split_documents([doc])
-            splits = self._filter_meaningful_chunks(splits)  # [2026-01-09] 無意味なチャンクを除外
-            
-            BATCH_SIZE = 20
+            blocks = list(kept_blocks)
+            pending_pairs = []  # (ブロック, チャンク)
+            for block in new_blocks:
+                same = reusable.get(block["hash"])
+                if same:
+                    old = same.pop(0)
+                    blocks.append({"start": block["start"], "end": block["end"], "hash": block["hash"], "ids": old["ids"]})
+                    continue
+                entry = {"start": block["start"], "end": block["end"], "hash": block["hash"], "ids": [], "pending": True}
+                blocks.append(entry)
+                doc = Document(page_content=block["text"], metadata={"source": "log.txt", "type": "current_log"})
+                for split in text_splitter.split_documents([doc]):
+                    pending_pairs.append((entry, split))
+
+            splits = self._filter_meaningful_chunks([split for _, split in pending_pairs])  # [2026-01-09] 無意味なチャンクを除外
+            meaningful = set(map(id, splits))
+            pending_ids = []
+            for entry, split in pending_pairs:
+                if id(split) in meaningful:
+                    chunk_id = uuid.uuid4().hex
+                    entry["ids"].append(chunk_id)
+                    pending_ids.append(chunk_id)
+
+            # ログから消えたブロックと、中断などで状態ファイルに記録されなかったベクトルを削除する
+            stale_ids = []
+            if db is not None:
+                referenced = {chunk_id for block in blocks for chunk_id in block["ids"]}
+                stale_ids = [i for i in db.index_to_docstore_id.values() if i not in referenced]
+                if stale_ids:
+                    db.delete(stale_ids)
+
+            if not splits:
+                if db is None:
+                    yield (0, 0, "現行ログ: 索引化失敗")
+                    return
+                self._save_current_log_index(db, current_log_index_path, current_log_path, indexed_bytes, blocks)
+                yield (0, 0, f"✅ 現行ログ: 追加なし / {len(stale_ids)}チャンクを削除（索引 {db.index.ntotal}件）")
+                return
+
+            BATCH_SIZE = self._index_batch_size()
             total_batches = (len(splits) + BATCH_SIZE - 1) // BATCH_SIZE
             
-            yield (0, total_batches, f"開始: {len(splits)}チャンク, {total_batches}バッチ")
+            yield (0, total_batches, f"開始: 追加 {len(splits)}チャンク / 削除 {len(stale_ids)}チャンク, {total_batches}バッチ")
             
-            db = None
+            added_ids = set()
+
+            def completed_blocks():
+                # 保存時点で全チャンクが索引に入っているブロックのみを状態に記録する
+                return [b for b in blocks if not b.get("pending") or all(i in added_ids for i in b["ids"])]
+
+            def resume_offset(saved_blocks):
+                # 記録できなかったブロックがあれば、次回はその先頭から読み直す
+                saved = set(map(id, saved_blocks))
+                return min((b["start"] for b in blocks if id(b) not in saved), default=indexed_bytes)
+
             for i in range(0, len(splits), BATCH_SIZE):
                 batch = splits[i : i + BATCH_SIZE]
+                batch_ids = pending_ids[i : i + BATCH_SIZE]
                 batch_num = (i // BATCH_SIZE) + 1
                 
                 max_retries = 3
                 for attempt in range(max_retries):
                     try:
                         if db is None:
-                            db = FAISS.from_documents(batch, self._get_embeddings())
+                            db = FAISS.from_documents(batch, self._get_embeddings(), ids=batch_ids)
                         else:
-                            db.add_documents(batch)
+                            db.add_documents(batch, ids=batch_ids)
+                        added_ids.update(batch_ids)
                         
                         yield (batch_num, total_batches, f"処理中: {batch_num}/{total_batches} バッチ完了")
-                        if self.embedding_mode == "api":
-                            time.sleep(2)
                         break
                     except Exception as e:
                         error_str = str(e)
                         print(f"      ! [CurrentLog] ベクトル化エラー (試行 {attempt+1}/{max_retries}): {e}")
                         if "429" in error_str or "ResourceExhausted" in error_str:
-                            # --- [API Key Rotation] ---
-                            if self._rotate_api_key(error_str):
-                                yield (batch_num, total_batches, "API制限検知 - キーを切り替えてリトライ...")
-                                continue
-
+                            # キーの切り替えとレート調整はスケジューラが行う。ここに来るのは全キーが枯渇した場合
                             wait_time = 10 * (attempt + 1)
                             yield (batch_num, total_batches, f"API制限 - {wait_time}秒待機中...")
                             time.sleep(wait_time)
@@ -1035,24 +1240,28 @@ class RAGManager:
                                 yield (batch_num, total_batches, f"エラー: バッチ{batch_num}をスキップ")
                                 print(f"      ! このバッチをスキップします。最終エラー: {e}")
                                 traceback.print_exc()
-                            if self.embedding_mode == "api":
-                                time.sleep(2)
 
                 # 20バッチごとに途中保存
                 if db and batch_num % 20 == 0:
-                    current_log_index_path = self.room_dir / "rag_data" / "current_log_index"
-                    self._safe_save_index(db, current_log_index_path)
+                    saved_blocks = completed_blocks()
+                    self._save_current_log_index(db, current_log_index_path, current_log_path,
+                                                 resume_offset(saved_blocks), saved_blocks)
                     gc.collect()
             
             if db:
-                current_log_index_path = self.room_dir / "rag_data" / "current_log_index"
-                self._safe_save_index(db, current_log_index_path)
-                yield (total_batches, total_batches, f"✅ 現行ログ: {len(splits)}チャンクを索引化完了")
+                # 一部のチャンクが失敗したブロックは記録せず、次回まとめてやり直す
+                final_blocks = completed_blocks()
+                final_block_keys = set(map(id, final_blocks))
+                partial_ids = [i for b in blocks if id(b) not in final_block_keys for i in b["ids"] if i in added_ids]
+                if partial_ids:
+                    db.delete(partial_ids)
+                self._save_current_log_index(db, current_log_index_path, current_log_path,
+                                             resume_offset(final_blocks), final_blocks)
+                yield (total_batches, total_batches, f"✅ 現行ログ: {len(added_ids) - len(partial_ids)}チャンクを追加 / {len(stale_ids)}チャンクを削除（索引 {db.index.ntotal}件）")
             else:
                 yield (0, total_batches, "現行ログ: 索引化失敗")
                 
         except Exception as e:
-            import traceback
             traceback.print_exc()
             yield (0, 0, f"エラー: {e}")
 
@@ -1067,9 +1276,43 @@ class RAGManager:
         print(f"--- [RAG] 処理完了: {final_msg} ---")
         return final_msg
 
+    def _resolve_search_weights(self, query: str, score_threshold: float, enable_intent_aware: bool, intent: Optional[str]) -> dict:
+        """クエリ意図を決定し、複合スコアの重みを返す"""
+        # [Intent-Aware] クエリ意図の決定
+        # 1. intentが外部から渡された場合はそれを使用（APIコスト削減）
+        # 2. それ以外はLLMで分類
+        if intent and intent in constants.INTENT_WEIGHTS:
+            print(f"--- [RAG Search Debug] Query: '{query}' (Intent: {intent} [pre-classified], Threshold: {score_threshold}) ---")
+            return constants.INTENT_WEIGHTS[intent]
+        elif enable_intent_aware and self.api_key:
+            intent_info = self.classify_query_intent(query)
+            print(f"--- [RAG Search Debug] Query: '{query}' (Intent: {intent_info['intent']}, Threshold: {score_threshold}) ---")
+            return intent_info["weights"]
+        else:
+            print(f"--- [RAG Search Debug] Query: '{query}' (Intent: disabled, Threshold: {score_threshold}) ---")
+            return constants.INTENT_WEIGHTS[constants.DEFAULT_INTENT]
+
+    def _load_search_targets(self) -> list:
+        """検索対象のインデックス（動的・静的・現行ログ）と、ベクトルごとの (arousal, 日付序数) 配列を返す"""
+        targets = []
+        for label, index_path in (("Dynamic", self.dynamic_index_path),
+                                  ("Static", self.static_index_path),
+                                  ("CurrentLog", self.current_log_index_path)):
+            db = self._safe_load_index(index_path)
+            if db is None or db.index.ntotal == 0:
+                continue
+            with RAGManager._vector_meta_lock:
+                meta = RAGManager._vector_meta.get(db)
+            if meta is None:
+                meta = vector_search.load_vector_metadata(index_path, db)
+                with RAGManager._vector_meta_lock:
+                    RAGManager._vector_meta[db] = meta
+            targets.append((label, db, meta[0], meta[1]))
+        return targets
+
     def search(self, query: str, k: int = 10, score_threshold: float = 0.75, enable_intent_aware: bool = True, intent: str = None) -> List[Document]:
         """
-        静的・動的インデックスの両方を検索し、複合スコアでリランキングして結果を統合する。
+        静的・動的・現行ログのインデックスを検索し、複合スコアでリランキングして結果を統合する。
         
         [Phase 1.5+] Intent-Aware Retrieval対応:
         - クエリ意図を分類し、Intent別に重み付けを動的に調整
@@ -1079,105 +1322,115 @@ class RAGManager:
             intent: 外部から渡されたIntent（retrieval_nodeで事前分類済みの場合）。
                     指定時はLLM分類をスキップしてAPIコストを削減。
         """
-        results_with_scores = []
-        
-        # [Intent-Aware] クエリ意図の決定
-        # 1. intentが外部から渡された場合はそれを使用（APIコスト削減）
-        # 2. それ以外はLLMで分類
-        if intent and intent in constants.INTENT_WEIGHTS:
-            weights = constants.INTENT_WEIGHTS[intent]
-            print(f"--- [RAG Search Debug] Query: '{query}' (Intent: {intent} [pre-classified], Threshold: {score_threshold}) ---")
-        elif enable_intent_aware and self.api_key:
-            intent_info = self.classify_query_intent(query)
-            intent = intent_info["intent"]
-            weights = intent_info["weights"]
-            print(f"--- [RAG Search Debug] Query: '{query}' (Intent: {intent}, Threshold: {score_threshold}) ---")
-        else:
-            intent = constants.DEFAULT_INTENT
-            weights = constants.INTENT_WEIGHTS[constants.DEFAULT_INTENT]
-            print(f"--- [RAG Search Debug] Query: '{query}' (Intent: disabled, Threshold: {score_threshold}) ---")
+        return self.search_many([query], k=k, score_threshold=score_threshold,
+                                enable_intent_aware=enable_intent_aware, intent=intent)[0]
 
-        dynamic_db = self._safe_load_index(self.dynamic_index_path)
-        if dynamic_db:
+    def search_many(self, queries: List[str], k: int = 10, score_threshold: float = 0.75, enable_intent_aware: bool = True, intent: str = None) -> List[List[Document]]:
+        """
+        複数クエリをまとめて検索する（結果はクエリと同じ順のリスト）。
+        クエリは1回ずつだけベクトル化し、各インデックスに対して全クエリの k-NN を一度に実行する。
+        Arousal・時間減衰・複合スコアは、保存時に前計算したベクトルごとの配列から NumPy でまとめて計算する。
+        """
+        if not queries:
+            return []
+
+        weights_list = [self._resolve_search_weights(q, score_threshold, enable_intent_aware, intent) for q in queries]
+
+        targets = self._load_search_targets()
+        if not targets:
+            return [[] for _ in queries]
+
+        # 同じクエリは1回だけベクトル化する
+        unique_queries = list(dict.fromkeys(queries))
+        embeddings = self._get_embeddings()
+        query_vectors = np.asarray([embeddings.embed_query(q) for q in unique_queries], dtype=np.float32)
+        row_of = {q: i for i, q in enumerate(unique_queries)}
+
+        # インデックスごとに全クエリの k-NN を1回で実行
+        knn = []
+        for label, db, arousal, dates in targets:
+            vectors = query_vectors
+            if db._normalize_L2:
+                vectors = query_vectors.copy()
+                faiss.normalize_L2(vectors)
             try:
-                dynamic_results = dynamic_db.similarity_search_with_score(query, k=k)
-                results_with_scores.extend(dynamic_results)
-            except Exception as e: print(f"  - [RAG Warning] Dynamic index search failed: {e}")
+                distances, positions = db.index.search(vectors, k)
+                knn.append((db, arousal, dates, distances, positions))
+            except Exception as e:
+                print(f"  - [RAG Warning] {label} index search failed: {e}")
+
+        today_ordinal = datetime.now().toordinal()
+        all_results = []
+        for query, weights in zip(queries, weights_list):
+            row = row_of[query]
+            sims, arousals, date_ords, sources = [], [], [], []
+            for target_no, (db, arousal, dates, distances, positions) in enumerate(knn):
+                found = positions[row] != -1
+                pos = positions[row][found]
+                sims.append(distances[row][found].astype(np.float64))
+                arousals.append(arousal[pos])
+                date_ords.append(dates[pos])
+                sources.extend((target_no, int(p)) for p in pos)
+            if not sources:
+                all_results.append([])
+                continue
 
-        static_db = self._safe_load_index(self.static_index_path)
-        if static_db:
-            try:
-                static_results = static_db.similarity_search_with_score(query, k=k)
-                results_with_scores.extend(static_results)
-            except Exception as e: print(f"  - [RAG Warning] Static index search failed: {e}")
-
-        # [Intent-Aware] 3項式複合スコアリング:
-        # Score = α × similarity + β × (1 - arousal) + γ × (1 - decay) × (1 - arousal)
-        # - α: 類似度の重み
-        # - β: Arousalの重み（高Arousal = 重要な記憶）
-        # - γ: 時間減衰の重み（高Arousalで抑制）
-        alpha = weights["alpha"]
-        beta = weights["beta"]
-        gamma = weights["gamma"]
-        
-        scored_results = []
-        for doc, similarity_score in results_with_scores:
-            arousal = doc.metadata.get("arousal", 0.5)  # デフォルト0.5（中立）
-            time_decay = self.calculate_time_decay(doc.metadata)  # 0.0~1.0（新しいほど高い）
-            
-            # 3項式複合スコア:
-            # - 類似度は低いほど良い（L2距離）
-            # - Arousalは高いほど良い → (1 - arousal) で反転
-            # - 時間減衰は新しいほど良い → (1 - decay) で古いほどペナルティ
-            # - ただし高Arousal記憶は (1 - arousal) で減衰ペナルティを軽減
-            time_penalty = (1.0 - time_decay) * (1.0 - arousal)  # Arousal高いと減衰無効化
-            composite_score = alpha * similarity_score + beta * (1.0 - arousal) + gamma * time_penalty
-            
-            scored_results.append((doc, similarity_score, arousal, time_decay, composite_score))
-        
-        # 複合スコアでソート（低いほど良い）
-        scored_results.sort(key=lambda x: x[4])
-        
-        # [2026-01-10 追加] コンテンツベースの重複除去
-        seen_contents = set()
-        unique_results = []
-        duplicate_count = 0
-        for doc, sim_score, arousal, decay, comp_score in scored_results:
-            # 先頭100文字で重複判定（完全一致ではなくプレフィックス比較）
-            content_key = doc.page_content[:100].strip()
-            if content_key not in seen_contents:
-                seen_contents.add(content_key)
-                unique_results.append((doc, sim_score, arousal, decay, comp_score))
-            else:
-                duplicate_count += 1
-        
-        if duplicate_count > 0:
-            print(f"  - [RAG] 重複除去: {len(scored_results)}件 → {len(unique_results)}件 ({duplicate_count}件除去)")
-
-        filtered_docs = []
-        arousal_boost_count = 0
-        for doc, sim_score, arousal, decay, comp_score in unique_results:
-            is_relevant = sim_score <= score_threshold
-            clean_content = doc.page_content.replace('\n', ' ')[:50]
-            status_icon = "✅" if is_relevant else "❌"
-            
-            # Arousalが高い場合は★マーク、Decayが高い場合は🆕マーク
-            markers = ""
-            if arousal > 0.6:
-                markers += " ★"
-                arousal_boost_count += 1
-            if decay > 0.9:
-                markers += " 🆕"
-            
-            print(f"  - {status_icon} Sim: {sim_score:.3f} | Arousal: {arousal:.2f} | Decay: {decay:.2f} | Comp: {comp_score:.3f}{markers} | {clean_content}...")
+            similarity = np.concatenate(sims)
+            arousal_values = np.concatenate(arousals)
+            decay_values = vector_search.time_decay(np.concatenate(date_ords), today_ordinal, constants.TIME_DECAY_RATE)
+            # [Intent-Aware] 3項式複合スコアリング（高Arousalでは時間減衰のペナルティを無効化）
+            composite = vector_search.composite_scores(similarity, arousal_values, decay_values, weights)
+
+            # 複合スコアでソート（低いほど良い）。同点時は従来どおり動的→静的の順
+            order = np.argsort(composite, kind="stable")
+
+            # [2026-01-10 追加] コンテンツベースの重複除去
+            seen_contents = set()
+            unique_results = []
+            duplicate_count = 0
+            for i in order:
+                db = knn[sources[i][0]][0]
+                doc = db.docstore.search(db.index_to_docstore_id[sources[i][1]])
+                if not isinstance(doc, Document):
+                    continue
+                # 先頭100文字で重複判定（完全一致ではなくプレフィックス比較）
+                content_key = doc.page_content[:100].strip()
+                if content_key not in seen_contents:
+                    seen_contents.add(content_key)
+                    unique_results.append((doc, float(similarity[i]), float(arousal_values[i]), float(decay_values[i]), float(composite[i])))
+                else:
+                    duplicate_count += 1
+
+            if duplicate_count > 0:
+                print(f"  - [RAG] 重複除去: {len(order)}件 → {len(unique_results)}件 ({duplicate_count}件除去)")
+
+            filtered_docs = []
+            arousal_boost_count = 0
+            for doc, sim_score, arousal, decay, comp_score in unique_results:
+                is_relevant = sim_score <= score_threshold
+                clean_content = doc.page_content.replace('\n', ' ')[:50]
+                status_icon = "✅" if is_relevant else "❌"
+                
+                # Arousalが高い場合は★マーク、Decayが高い場合は🆕マーク
+                markers = ""
+                if arousal > 0.6:
+                    markers += " ★"
+                    arousal_boost_count += 1
+                if decay > 0.9:
+                    markers += " 🆕"
+                
+                print(f"  - {status_icon} Sim: {sim_score:.3f} | Arousal: {arousal:.2f} | Decay: {decay:.2f} | Comp: {comp_score:.3f}{markers} | {clean_content}...")
+                
+                if is_relevant:
+                    filtered_docs.append(doc)
             
-            if is_relevant:
-                filtered_docs.append(doc)
-        
-        if arousal_boost_count > 0:
-            print(f"  - [RAG] 高Arousal記憶: {arousal_boost_count}件がブースト対象")
+            if arousal_boost_count > 0:
+                print(f"  - [RAG] 高Arousal記憶: {arousal_boost_count}件がブースト対象")
+
+            all_results.append(filtered_docs[:k])
+
+        return all_results
 
-        return filtered_docs[:k]
     def rebuild_all_indices(self, status_callback=None) -> str:
         """
         既存のすべてのインデックスを破棄し、ゼロから再構築する。
@@ -1190,11 +1443,12 @@ class RAGManager:
         report("インデックスの完全再構築を開始します...")
         
         # 1. 既存のディレクトリとファイルを削除
+        # ※ embedding_cache はモデルIDをキーに含むため残す（変更のないチャンクは再ベクトル化しない）
         paths_to_delete = [
             self.static_index_path,
             self.dynamic_index_path,
             self.processed_files_record,
-            self.room_dir / "rag_data" / "current_log_index"
+            self.current_log_index_path
         ]
         
         for p in paths_to_delete:
@@ -1208,8 +1462,9 @@ class RAGManager:
                 except Exception as e:
                     report(f"警告: {p.name} の削除に失敗: {e}")
 
-        # キャッシュもクリア
-        RAGManager._index_cache.clear()
+        # このルームのインデックスをキャッシュから外す（他のルームのキャッシュは残す）
+        for p in (self.static_index_path, self.dynamic_index_path, self.current_log_index_path):
+            RAGManager._index_cache.pop(str(p.resolve()))
 
         # 2. 再構築（通常の更新メソッドを呼ぶが、ファイルがないので全件処理になる）
         report("記憶索引の再構築を開始...")
@@ -1221,3 +1476,51 @@ class RAGManager:
         final_msg = f"再構築完了: {memory_result} / {knowledge_result}"
         report(final_msg)
         return final_msg
+
+
+# --- 検索用インスタンスの共有 ---
+# 記憶検索ツール・知識検索ツール・夢想などは、呼び出しのたびに RAGManager を作り直していたため、
+# 設定の解決やエンベディングの初期化（ローカルモデルの読み込みを含む）を毎回やり直していた。
+# (ルーム, エンベディングモデルID) ごとに1つのインスタンスを保持し、検索ではそれを使い回す。
+# 読み込んだインデックスは RAGManager._index_cache（全ルーム共有、サイズ上限つき）に保持される。
+_managers: "OrderedDict[Tuple[str, str], RAGManager]" = OrderedDict()
+_managers_lock = threading.Lock()
+
+
+def get_manager(room_name: str, api_key: str) -> RAGManager:
+    """
+    検索用に共有する RAGManager を返す（スレッドセーフ）。
+    エンベディングの設定が変わった場合は別のインスタンスになる。索引の作成・更新には使わないこと。
+    """
+    effective_settings = config_manager.get_effective_settings(room_name)
+    model_id = RAGManager._model_id_for_mode(effective_settings.get("embedding_mode", "api"))
+    key = (room_name, model_id)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is not None:
+            _managers.move_to_end(key)
+    if manager is None:
+        created = RAGManager(room_name, api_key)
+        with _managers_lock:
+            manager = _managers.setdefault(key, created)
+            _managers.move_to_end(key)
+            while len(_managers) > constants.RAG_MANAGER_REGISTRY_SIZE:
+                _managers.popitem(last=False)
+    manager._set_api_key(api_key)
+    return manager
+
+
+def forget_managers(room_name: Optional[str] = None) -> None:
+    """
+    共有インスタンスを破棄する（ルーム名を省略した場合はすべて）。
+    ルームの削除時に呼び、そのルームの読み込み済みインデックスもキャッシュから外す。
+    """
+    with _managers_lock:
+        for key in [k for k in _managers if room_name is None or k[0] == room_name]:
+            del _managers[key]
+    if room_name is None:
+        return
+    room_dir = str((Path(constants.ROOMS_DIR) / room_name).resolve())
+    for path, _ in RAGManager._index_cache.items():
+        if path.startswith(room_dir + os.sep):
+            RAGManager._index_cache.pop(path)
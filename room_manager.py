@@ -1,20 +1,32 @@
 # room_manager.py
 
 import os
+import copy
 import json
 import re
 import shutil
+import sys
 import traceback
 import datetime
 import threading
 import time
-from typing import Optional, List, Tuple
+from typing import Dict, Optional, List, Tuple
 from send2trash import send2trash
 import constants
+import json_state_store
 
 # スレッドセーフなファイル操作のためのロック
 _room_config_lock = threading.Lock()
 
+# --- ルームレジストリ ---
+# ensure_room_files による検証済みのルームと、解決済みのファイルパスをプロセス内で保持する。
+# キーはルームディレクトリの絶対パス、値は (ディレクトリの (inode, mtime_ns), get_room_files_paths の戻り値)。
+# 直下のファイル・フォルダの作成・削除・改名でディレクトリの mtime が変わるため、その時だけ検証し直す。
+_room_registry: Dict[str, Tuple[tuple, tuple]] = {}
+# room_config.json の解析結果。キーは絶対パス、値は ((inode, mtime_ns, size), 設定の辞書)
+_room_config_cache: Dict[str, Tuple[tuple, dict]] = {}
+_registry_lock = threading.Lock()
+
 def generate_safe_folder_name(room_name: str) -> str:
     """
     ユーザーが入力したルーム名から、安全でユニークなフォルダ名を生成する。
@@ -141,6 +153,115 @@ def ensure_room_files(room_name: str) -> bool:
         print(f"ルーム '{room_name}' ファイル作成/確認エラー: {e}"); traceback.print_exc()
         return False
 
+# ensure_room_files が作るファイル・ディレクトリを直接含むディレクトリ（ルーム直下からの相対パス）。
+# 中身が削除・追加されるとそのディレクトリの更新時刻が変わるので、これらの署名でレイアウトの変化を検知する
+_LAYOUT_DIRS = ("", "spaces", "cache", "memory", "private", "log_archives", "log_import_source", "backups")
+
+
+def _dir_signature(path: str) -> Optional[tuple]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns)
+
+
+def _layout_signature(base_path: str) -> Optional[tuple]:
+    """ルームのレイアウトの署名（ルームのディレクトリが無ければ None）"""
+    signatures = tuple(_dir_signature(os.path.join(base_path, sub) if sub else base_path) for sub in _LAYOUT_DIRS)
+    return signatures if signatures[0] is not None else None
+
+
+def _build_room_files_paths(room_name: str) -> Tuple[str, str, Optional[str], str, str, str]:
+    base_path = os.path.join(constants.ROOMS_DIR, room_name)
+    log_file = os.path.join(base_path, "log.txt")
+    system_prompt_file = os.path.join(base_path, "SystemPrompt.txt")
+    profile_image_path = os.path.join(base_path, constants.PROFILE_IMAGE_FILENAME)
+    # memory.txt へのパスを memory/memory_main.txt に変更
+    memory_main_path = os.path.join(base_path, "memory", "memory_main.txt")
+    notepad_path = os.path.join(base_path, constants.NOTEPAD_FILENAME)
+    research_notes_path = os.path.join(base_path, constants.RESEARCH_NOTES_FILENAME)
+    if not os.path.exists(profile_image_path): profile_image_path = None
+    return log_file, system_prompt_file, profile_image_path, memory_main_path, notepad_path, research_notes_path
+
+
+def _resolve_room(room_name: str) -> Optional[tuple]:
+    """
+    ルームのレイアウトを保証し、get_room_files_paths の戻り値を返す（失敗時は None）。
+    一度検証したルームは、ルーム直下と必須ファイルを含むサブディレクトリが変わらない限り、
+    ensure_room_files を呼ばずにキャッシュを返す。
+    """
+    if not room_name or not isinstance(room_name, str): return None
+    base_path = os.path.abspath(os.path.join(constants.ROOMS_DIR, room_name))
+    signature = _layout_signature(base_path)
+    with _registry_lock:
+        entry = _room_registry.get(base_path)
+    if entry is not None and signature is not None and entry[0] == signature:
+        return entry[1]
+
+    if not ensure_room_files(room_name): return None
+    paths = _build_room_files_paths(room_name)
+    signature = _layout_signature(base_path)
+    if signature is not None:
+        with _registry_lock:
+            _room_registry[base_path] = (signature, paths)
+    return paths
+
+
+def invalidate_room_cache(room_name: Optional[str] = None):
+    """ルームレジストリと設定のキャッシュを破棄する（room_name を省略すると全ルーム）"""
+    with _registry_lock:
+        if room_name is None:
+            _room_registry.clear()
+            _room_config_cache.clear()
+            return
+        base_path = os.path.abspath(os.path.join(constants.ROOMS_DIR, room_name))
+        _room_registry.pop(base_path, None)
+        _room_config_cache.pop(os.path.join(base_path, "room_config.json"), None)
+
+
+def _read_room_config_snapshot(config_file: str) -> dict:
+    """
+    room_config.json を読み込む。(inode, mtime, サイズ) が前回と同じなら解析済みの内容を返す。
+    戻り値はキャッシュそのものなので、呼び出し側で変更してはならない。
+    """
+    config_file = os.path.abspath(config_file)
+    st = os.stat(config_file)
+    signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+    with _registry_lock:
+        cached = _room_config_cache.get(config_file)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    with open(config_file, "r", encoding="utf-8") as f:
+        content = f.read()
+    if not content.strip():
+        raise json.JSONDecodeError("File is empty", "", 0)
+    config = json.loads(content)
+    with _registry_lock:
+        _room_config_cache[config_file] = (signature, config)
+    return config
+
+
+def _load_room_config_file(config_file: str) -> dict:
+    """room_config.json を読み込む。呼び出し側で変更してもキャッシュに影響しないよう、常にコピーを返す。"""
+    return copy.deepcopy(_read_room_config_snapshot(config_file))
+
+
+def get_room_config_snapshot(folder_name: str) -> Optional[dict]:
+    """
+    設定を参照するだけの呼び出し（モデル・プロバイダ・APIキーの決定など）向けに、
+    room_config.json の解析済みの内容をコピーせずに返す。戻り値は変更しないこと。
+    ファイルが無い場合は None。破損している場合は例外をそのまま送出する。
+    """
+    if not folder_name:
+        return None
+    try:
+        return _read_room_config_snapshot(os.path.join(constants.ROOMS_DIR, folder_name, "room_config.json"))
+    except FileNotFoundError:
+        return None
+
+
 def get_room_list_for_ui() -> List[Tuple[str, str]]:
     """
     UIのドロップダウン表示用に、有効なルームのリストを `[('表示名', 'フォルダ名'), ...]` の形式で返す。
@@ -157,10 +278,9 @@ def get_room_list_for_ui() -> List[Tuple[str, str]]:
             config_file = os.path.join(room_path, "room_config.json")
             if os.path.exists(config_file):
                 try:
-                    with open(config_file, "r", encoding="utf-8") as f:
-                        config = json.load(f)
-                        display_name = config.get("room_name", folder_name)
-                        valid_rooms.append((display_name, folder_name))
+                    config = _load_room_config_file(config_file)
+                    display_name = config.get("room_name", folder_name)
+                    valid_rooms.append((display_name, folder_name))
                 except (json.JSONDecodeError, IOError) as e:
                     print(f"警告: ルーム '{folder_name}' の設定ファイルが読めません: {e}")
 
@@ -206,11 +326,7 @@ def get_room_config(folder_name: str) -> Optional[dict]:
     def _read_json():
         if os.path.exists(config_file):
             try:
-                with open(config_file, "r", encoding="utf-8") as f:
-                    content = f.read()
-                if not content.strip():
-                    raise json.JSONDecodeError("File is empty", "", 0)
-                return json.loads(content)
+                return _load_room_config_file(config_file)
             except (json.JSONDecodeError, IOError) as e:
                 print(f"警告: ルーム '{folder_name}' の設定ファイルが破損しています: {e}")
                 return None
@@ -236,20 +352,12 @@ def get_room_files_paths(room_name: str) -> Optional[Tuple[str, str, Optional[st
     Returns:
         (log_file, system_prompt_file, profile_image_path, memory_main_path, notepad_path, research_notes_path)
     """
-    if not room_name or not ensure_room_files(room_name): return None, None, None, None, None, None
-    base_path = os.path.join(constants.ROOMS_DIR, room_name)
-    log_file = os.path.join(base_path, "log.txt")
-    system_prompt_file = os.path.join(base_path, "SystemPrompt.txt")
-    profile_image_path = os.path.join(base_path, constants.PROFILE_IMAGE_FILENAME)
-    # memory.txt へのパスを memory/memory_main.txt に変更
-    memory_main_path = os.path.join(base_path, "memory", "memory_main.txt")
-    notepad_path = os.path.join(base_path, constants.NOTEPAD_FILENAME)
-    research_notes_path = os.path.join(base_path, constants.RESEARCH_NOTES_FILENAME)
-    if not os.path.exists(profile_image_path): profile_image_path = None
-    return log_file, system_prompt_file, profile_image_path, memory_main_path, notepad_path, research_notes_path
+    paths = _resolve_room(room_name)
+    if paths is None: return None, None, None, None, None, None
+    return paths
 
 def get_world_settings_path(room_name: str):
-    if not room_name or not ensure_room_files(room_name): return None
+    if _resolve_room(room_name) is None: return None
     return os.path.join(constants.ROOMS_DIR, room_name, "spaces", "world_settings.txt")
 
 def get_all_personas_in_log(main_room_name: str, api_history_limit_key: str) -> list[str]:
@@ -488,8 +596,14 @@ def delete_room(room_name: str) -> bool:
         return False
     
     try:
-        # ディレクトリ全体をゴミ箱に移動（復元可能）
+        # 未保存の状態ファイルを書き出してから、ディレクトリ全体をゴミ箱に移動（復元可能）
+        json_state_store.forget(room_path)
         send2trash(room_path)
+        invalidate_room_cache(room_name)
+        # 検索用に共有している RAGManager とインデックスも手放す（読み込まれていなければ何もしない）
+        rag_manager = sys.modules.get("rag_manager")
+        if rag_manager is not None:
+            rag_manager.forget_managers(room_name)
         print(f"--- ルーム '{room_name}' をゴミ箱に移動しました ---")
         return True
     except PermissionError as e:
@@ -19,15 +19,12 @@ def get_arousal_file_path(room_name: str) -> Path:
 
 
 def _load_arousal_data(room_name: str) -> Dict:
-    """Arousal蓄積データを読み込む（ロック付き）"""
-    from file_lock_utils import safe_json_read
+    """Arousal蓄積データを読み込む（json_state_store 経由）"""
+    import json_state_store
     
     path = get_arousal_file_path(room_name)
-    if not path.exists():
-        return {}
-    
     try:
-        data = safe_json_read(str(path), default={})
+        data = json_state_store.read(path, default={})
         return data if isinstance(data, dict) else {}
     except Exception as e:
         print(f"[SessionArousal] 読み込みエラー: {e}")
@@ -35,14 +32,10 @@ def _load_arousal_data(room_name: str) -> Dict:
 
 
 def _save_arousal_data(room_name: str, data: Dict):
-    """Arousal蓄積データを保存する（ロック付き）"""
-    from file_lock_utils import safe_json_write
-    
-    path = get_arousal_file_path(room_name)
-    path.parent.mkdir(parents=True, exist_ok=True)
+    """Arousal蓄積データを保存する（json_state_store 経由。ファイルへの書き込みはまとめて行われる）"""
+    import json_state_store
     
-    if not safe_json_write(str(path), data):
-        print(f"[SessionArousal] 保存タイムアウト - 他のプロセスが使用中")
+    json_state_store.write(get_arousal_file_path(room_name), data)
 
 
 def add_arousal_score(room_name: str, arousal_score: float):
@@ -1,8 +1,8 @@
 # signature_manager.py
 
 import os
-import json
 import constants
+import json_state_store
 from typing import Optional, Dict, Any
 
 def _get_signature_file_path(room_name: str) -> str:
@@ -20,7 +20,6 @@ def save_turn_context(room_name: str, signature, tool_calls: list):
         return
 
     file_path = _get_signature_file_path(room_name)
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
 
     # 二幕構成の Act 2 (最終回答) でツール呼び出し情報が消えないように、マージ処理を行う
     final_tool_calls = tool_calls
@@ -39,8 +38,8 @@ def save_turn_context(room_name: str, signature, tool_calls: list):
     }
 
     try:
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        # 1ターンに何度も呼ばれるため、ファイルへの書き込みは json_state_store でまとめて行う
+        json_state_store.write(file_path, data)
         # print(f"  - [SignatureManager] ターンコンテキストを保存しました: {room_name}")
     except Exception as e:
         print(f"  - [SignatureManager] 保存エラー: {e}")
@@ -48,13 +47,9 @@ def save_turn_context(room_name: str, signature, tool_calls: list):
 def get_turn_context(room_name: str) -> Dict[str, Any]:
     """JSONファイルから最新のターンコンテキストを読み込む"""
     file_path = _get_signature_file_path(room_name)
-    if not os.path.exists(file_path):
-        return {}
-
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            return data
+        data = json_state_store.read(file_path, default={})
+        return data if isinstance(data, dict) else {}
     except Exception:
         return {}
 
@@ -0,0 +1,328 @@
+# sleep_consolidation.py
+"""
+睡眠時記憶整理のジョブ実行
+
+従来は alarm_manager.check_autonomous_actions が全ルームを順に回り、眠ったルームの
+夢想・エピソード記憶更新・記憶索引更新・現行ログ索引更新・エピソード圧縮をスケジューラスレッドで
+直列に実行していたため、その間はアラームのチェックも止まっていた。
+
+- 記憶整理はルーム単位のジョブとして、constants.SLEEP_CONSOLIDATION_WORKERS 本のワーカーで並行に実行する
+- 1つのルームのジョブは同時に1つだけ（待機中のジョブは最新の設定で置き換える）
+- 各ステージの開始は APIキーごとのトークンバケットで制限し、複数ルームが同じキーの上限を食い潰さないようにする
+- ステージごとの完了状況を memory/sleep_consolidation.json に日付つきで記録し、中断・失敗した場合は
+  次回のチェックで残りのステージから再開する（失敗したステージは SLEEP_CONSOLIDATION_MAX_ATTEMPTS 回まで）
+"""
+
+import datetime
+import os
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Set
+
+import constants
+import json_state_store
+import room_manager
+
+# ステージ名と表示名（実行順）
+STAGE_LABELS = {
+    "dream": "夢想",
+    "episodic_memory": "エピソード記憶更新",
+    "memory_index": "記憶索引更新",
+    "current_log_index": "現行ログ索引更新",
+    "compress_episodes": "エピソード圧縮",
+}
+
+
+class TokenBucket:
+    """1分あたり rate_per_minute 個、最大 capacity 個まで貯まるトークンバケット"""
+
+    def __init__(self, rate_per_minute: float, capacity: float,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity
+        self.tokens = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """トークンを1つ取得する（無ければ貯まるまで待つ）"""
+        while True:
+            with self._lock:
+                now = self._clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate_per_second)
+                self._updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate_per_second
+            self._sleep(wait)
+
+
+_limiters: Dict[str, TokenBucket] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(key: str) -> TokenBucket:
+    """APIキー（またはプロバイダ）ごとに共有するトークンバケットを返す"""
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = TokenBucket(
+                constants.SLEEP_CONSOLIDATION_STAGES_PER_MINUTE, constants.SLEEP_CONSOLIDATION_STAGE_BURST
+            )
+        return limiter
+
+
+class ConsolidationJob:
+    """1ルーム分の睡眠時記憶整理"""
+
+    def __init__(self, room_folder: str, api_key_name: str, api_key_val: str, effective_settings: dict,
+                 on_complete: Optional[Callable[[], None]] = None):
+        self.room_folder = room_folder
+        self.api_key_name = api_key_name
+        self.api_key_val = api_key_val
+        self.effective_settings = effective_settings
+        # 全ステージの終了後に呼ぶ処理（記憶整理後の静かな自律行動など）
+        self.on_complete = on_complete
+
+
+# --- チェックポイント ---
+
+def _checkpoint_path(room_folder: str) -> str:
+    return os.path.join(constants.ROOMS_DIR, room_folder, "memory", "sleep_consolidation.json")
+
+
+def load_checkpoint(room_folder: str, today: Optional[str] = None) -> dict:
+    """今日の記憶整理の進捗を返す（今日の記録が無ければ空の記録）"""
+    today = today or datetime.date.today().isoformat()
+    data = json_state_store.read(_checkpoint_path(room_folder), default={})
+    if not isinstance(data, dict) or data.get("date") != today:
+        return {"date": today, "stages": {}}
+    data.setdefault("stages", {})
+    return data
+
+
+def enabled_stages(effective_settings: dict) -> List[str]:
+    """ルーム設定（sleep_consolidation）で有効になっているステージ"""
+    sleep_consolidation = effective_settings.get("sleep_consolidation", {})
+    flags = {
+        "dream": True,
+        "episodic_memory": sleep_consolidation.get("update_episodic_memory", True),
+        "memory_index": sleep_consolidation.get("update_memory_index", True),
+        "current_log_index": sleep_consolidation.get("update_current_log_index", False),
+        "compress_episodes": sleep_consolidation.get("compress_old_episodes", False),
+    }
+    return [stage for stage in STAGE_LABELS if flags[stage]]
+
+
+def pending_stages(checkpoint: dict, effective_settings: dict) -> List[str]:
+    """まだ完了しておらず、試行回数が上限に達していないステージ"""
+    pending = []
+    for stage in enabled_stages(effective_settings):
+        record = checkpoint["stages"].get(stage, {})
+        if record.get("status") == "done":
+            continue
+        if record.get("attempts", 0) >= constants.SLEEP_CONSOLIDATION_MAX_ATTEMPTS:
+            continue
+        pending.append(stage)
+    return pending
+
+
+def needs_consolidation(room_folder: str, effective_settings: dict, has_dreamed_today: bool) -> bool:
+    """
+    今日の記憶整理を（再開も含めて）行う必要があるか。
+    今日の記録が無い場合は、従来どおり今日すでに夢を見たかで判断する（UIから手動で夢想した場合など）。
+    """
+    checkpoint = load_checkpoint(room_folder)
+    if checkpoint["stages"]:
+        return bool(pending_stages(checkpoint, effective_settings))
+    return not has_dreamed_today
+
+
+# --- ステージ ---
+
+def _stage_dream(job: ConsolidationJob) -> str:
+    import dreaming_manager
+    dm = dreaming_manager.DreamingManager(job.room_folder, job.api_key_val)
+    # 自動レベル判定: 週次/月次省察が必要か自動判定
+    return dm.dream_with_auto_level()
+
+
+def _stage_episodic_memory(job: ConsolidationJob) -> str:
+    from episodic_memory_manager import EpisodicMemoryManager
+    em = EpisodicMemoryManager(job.room_folder)
+    # 日次要約でエピソード記憶を生成
+    result = em.update_memory(job.api_key_val)
+    # 更新日時をroom_config.jsonに保存
+    status_text = f"最終更新: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+    room_manager.update_room_config(job.room_folder, {"last_episodic_update": status_text})
+    return result
+
+
+def _stage_memory_index(job: ConsolidationJob) -> str:
+    import rag_manager
+    rm = rag_manager.RAGManager(job.room_folder, job.api_key_val)
+    return rm.update_memory_index()
+
+
+def _stage_current_log_index(job: ConsolidationJob) -> str:
+    import rag_manager
+    from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+
+    def run_current_log_index_update():
+        rm = rag_manager.RAGManager(job.room_folder, job.api_key_val)
+        result = None
+        for batch_num, total_batches, status in rm.update_current_log_index_with_progress():
+            if batch_num == total_batches:
+                result = status
+        return result
+
+    # タイムアウト付きで実行（最大10分）
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        future = executor.submit(run_current_log_index_update)
+        try:
+            return future.result(timeout=600)  # 10分
+        except FuturesTimeoutError:
+            raise TimeoutError("現行ログ索引更新がタイムアウトしました（10分経過）。次回に再試行します。")
+    finally:
+        executor.shutdown(wait=False)
+
+
+def _stage_compress_episodes(job: ConsolidationJob) -> str:
+    from episodic_memory_manager import EpisodicMemoryManager
+    emm = EpisodicMemoryManager(job.room_folder)
+    # 週次圧縮
+    compress_result = emm.compress_old_episodes(job.api_key_val)
+    print(f"  ✅ {job.room_folder}: {compress_result}")
+    # 月次圧縮
+    monthly_result = emm.compress_weekly_to_monthly(job.api_key_val)
+    # 圧縮結果をroom_config.jsonに保存
+    room_manager.update_room_config(job.room_folder, {
+        "last_compression_result": f"{compress_result} / {monthly_result}"
+    })
+    return monthly_result
+
+
+_STAGE_FUNCTIONS: Dict[str, Callable[[ConsolidationJob], str]] = {
+    "dream": _stage_dream,
+    "episodic_memory": _stage_episodic_memory,
+    "memory_index": _stage_memory_index,
+    "current_log_index": _stage_current_log_index,
+    "compress_episodes": _stage_compress_episodes,
+}
+
+
+def run_job(job: ConsolidationJob):
+    """ジョブを実行する。完了済みのステージは飛ばし、各ステージの結果をチェックポイントに記録する"""
+    room_folder = job.room_folder
+    checkpoint_path = _checkpoint_path(room_folder)
+    checkpoint = load_checkpoint(room_folder)
+    stages = pending_stages(checkpoint, job.effective_settings)
+    limiter = get_limiter(f"google:{job.api_key_name}")
+
+    if "dream" in stages:
+        print(f"💤 {room_folder}: 深い眠りにつきました（夢想プロセス開始）...")
+    elif stages:
+        print(f"💤 {room_folder}: 中断していた記憶整理を再開します（残り: {', '.join(STAGE_LABELS[s] for s in stages)}）")
+
+    for stage in stages:
+        limiter.acquire()
+        if stage != "dream":
+            print(f"  🌙 {room_folder}: {STAGE_LABELS[stage]}を実行中...")
+        record = checkpoint["stages"].setdefault(stage, {})
+        record["attempts"] = record.get("attempts", 0) + 1
+        try:
+            result = _STAGE_FUNCTIONS[stage](job)
+            record["status"] = "done"
+            record.pop("error", None)
+            if stage != "dream" and result:
+                print(f"  ✅ {room_folder}: {result}")
+        except Exception as e:
+            record["status"] = "failed"
+            record["error"] = str(e)
+            print(f"  ❌ {room_folder}: {STAGE_LABELS[stage]}エラー - {e}")
+        record["finished_at"] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        json_state_store.write(checkpoint_path, checkpoint)
+
+    print(f"🛌 {room_folder}: 睡眠時記憶整理が完了しました。")
+    if job.on_complete:
+        job.on_complete()
+
+
+# --- ワーカー ---
+
+_queue: Deque[str] = deque()
+_jobs: Dict[str, ConsolidationJob] = {}
+_running: Set[str] = set()
+_workers: List[threading.Thread] = []
+_cond = threading.Condition()
+
+
+def _ensure_workers():
+    # _cond を取得して呼ぶこと
+    alive = [t for t in _workers if t.is_alive()]
+    _workers[:] = alive
+    while len(_workers) < constants.SLEEP_CONSOLIDATION_WORKERS:
+        thread = threading.Thread(target=_worker_loop, name=f"SleepConsolidation-{len(_workers)}", daemon=True)
+        thread.start()
+        _workers.append(thread)
+
+
+def _worker_loop():
+    while True:
+        with _cond:
+            while not _queue:
+                _cond.wait()
+            room_folder = _queue.popleft()
+            job = _jobs.pop(room_folder)
+            _running.add(room_folder)
+        try:
+            run_job(job)
+        except Exception as e:
+            print(f"  - 睡眠時記憶整理エラー ({room_folder}): {e}")
+            traceback.print_exc()
+        finally:
+            with _cond:
+                _running.discard(room_folder)
+                _cond.notify_all()
+
+
+def submit(job: ConsolidationJob) -> bool:
+    """
+    ジョブを待ち行列に加える。実行中のルームは受け付けない。
+    待機中のルームは新しいジョブで置き換える。新たに待ち行列に加えた場合は True を返す
+    """
+    with _cond:
+        if job.room_folder in _running:
+            return False
+        queued = job.room_folder in _jobs
+        _jobs[job.room_folder] = job
+        if queued:
+            return False
+        _queue.append(job.room_folder)
+        _ensure_workers()
+        _cond.notify()
+        return True
+
+
+def is_busy(room_folder: str) -> bool:
+    """ルームの記憶整理が待機中または実行中か"""
+    with _cond:
+        return room_folder in _jobs or room_folder in _running
+
+
+def wait_idle(timeout: Optional[float] = None) -> bool:
+    """すべてのジョブが終わるまで待つ（テスト・終了処理用）"""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with _cond:
+        while _queue or _jobs or _running:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            _cond.wait(remaining)
+    return True
@@ -0,0 +1,76 @@
+"""
+会話ログ増分パーサー（chat_log_index）のテスト
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chat_log_index
+
+
+class TestChatLogIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.test_dir, "log.txt")
+        chat_log_index.invalidate()
+
+    def tearDown(self):
+        chat_log_index.invalidate()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _append(self, text: str):
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(text)
+
+    def test_parse_matches_header_format(self):
+        self._append("## USER:user\nこんにちは\n\n## AGENT:ルシアン\nやあ。\n## 見出し\n続き\n\n## SYSTEM:notice\n通知\n\n")
+        messages = chat_log_index.load_messages(self.log_path)
+        self.assertEqual(len(messages), 3)
+        self.assertEqual(messages[0], {"role": "USER", "responder": "user", "content": "こんにちは"})
+        self.assertEqual(messages[1]["responder"], "ルシアン")
+        self.assertEqual(messages[1]["content"], "やあ。\n## 見出し\n続き")
+        self.assertEqual(messages[2]["role"], "SYSTEM")
+
+    def test_append_reparses_only_tail(self):
+        self._append("## USER:user\n一通目\n\n## AGENT:ルシアン\n返信")
+        first = chat_log_index.get_index(self.log_path)
+        self.assertEqual(len(first.messages), 2)
+
+        # 最後のメッセージの続きと新しいメッセージを追記する
+        self._append("の続き\n\n## USER:user\n二通目\n\n")
+        second = chat_log_index.get_index(self.log_path)
+        self.assertEqual([m["content"] for m in second.messages], ["一通目", "返信の続き", "二通目"])
+        # 先頭側のメッセージオブジェクトは再利用されている
+        self.assertIs(second.messages[0], first.messages[0])
+
+        with open(self.log_path, "rb") as f:
+            data = f.read()
+        for offset in second.offsets:
+            self.assertTrue(data[offset:].startswith(b"## "))
+
+    def test_rewrite_triggers_full_reparse(self):
+        self._append("## USER:user\n古い内容\n\n## AGENT:ルシアン\n返信\n\n")
+        chat_log_index.load_messages(self.log_path)
+
+        with open(self.log_path, "w", encoding="utf-8") as f:
+            f.write("## USER:user\n書き換えた内容で、前より長くなっている\n\n## AGENT:ルシアン\n返信\n\n")
+        messages = chat_log_index.load_messages(self.log_path)
+        self.assertEqual(messages[0]["content"], "書き換えた内容で、前より長くなっている")
+
+    def test_returned_messages_are_copies(self):
+        self._append("## USER:user\n内容\n\n")
+        messages = chat_log_index.load_messages(self.log_path)
+        messages[0]["content"] = "変更"
+        self.assertEqual(chat_log_index.load_messages(self.log_path)[0]["content"], "内容")
+
+    def test_missing_file(self):
+        self.assertEqual(chat_log_index.load_messages(os.path.join(self.test_dir, "none.txt")), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+"""
+チャットモデル・APIクライアントのプール（client_pool）のテスト
+"""
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import constants
+import client_pool
+
+
+class TestClientPool(unittest.TestCase):
+
+    def setUp(self):
+        client_pool.clear()
+
+    def tearDown(self):
+        client_pool.clear()
+
+    def test_instances_are_reused_per_key(self):
+        """同じ種類・APIキー・パラメータでは使い回し、どれかが違えば別に生成する"""
+        created = []
+
+        def factory():
+            created.append(object())
+            return created[-1]
+
+        first = client_pool.get_or_create("openai_chat", "key-a", {"model": "m", "temperature": 0.7}, factory)
+        self.assertIs(client_pool.get_or_create("openai_chat", "key-a", {"temperature": 0.7, "model": "m"}, factory), first)
+        client_pool.get_or_create("openai_chat", "key-b", {"model": "m", "temperature": 0.7}, factory)
+        client_pool.get_or_create("openai_chat", "key-a", {"model": "m", "temperature": 1.0}, factory)
+        client_pool.get_or_create("gemini_chat", "key-a", {"model": "m", "temperature": 0.7}, factory)
+        self.assertEqual(len(created), 4)
+
+    def test_pool_is_bounded_and_failures_are_not_cached(self):
+        """上限を超えたら古いものから破棄し、生成に失敗した場合はプールに残さない"""
+        with mock.patch.object(constants, "CLIENT_POOL_SIZE", 2):
+            for i in range(3):
+                client_pool.get_or_create("genai_client", f"key-{i}", None, object)
+            self.assertEqual(len(client_pool._pool), 2)
+
+        def broken():
+            raise RuntimeError("接続できません")
+
+        with self.assertRaises(RuntimeError):
+            client_pool.get_or_create("genai_client", "key-x", None, broken)
+        instance = client_pool.get_or_create("genai_client", "key-x", None, object)
+        self.assertIsNotNone(instance)
+
+    def test_evict_api_key(self):
+        """APIキーが枯渇・削除されたら、そのキーのインスタンスだけを破棄する"""
+        kept = client_pool.get_or_create("genai_client", "key-b", None, object)
+        client_pool.get_or_create("genai_client", "key-a", None, object)
+        client_pool.get_or_create("gemini_chat", "key-a", {"model": "m"}, object)
+        self.assertEqual(client_pool.evict_api_key("key-a"), 2)
+        self.assertEqual(client_pool.evict_api_key(None), 0)
+        self.assertIs(client_pool.get_or_create("genai_client", "key-b", None, object), kept)
+
+    def test_concurrent_checkout_creates_once(self):
+        """複数スレッドから同時に要求しても、生成は1回だけで同じインスタンスを受け取る"""
+        calls = []
+
+        def slow_factory():
+            calls.append(1)
+            time.sleep(0.05)
+            return object()
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                client_pool.get_or_create("local_chat", None, {"model_path": "model.gguf"}, slow_factory)))
+            for _ in range(5)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len({id(r) for r in results}), 1)
+
+    def test_serialized_client_holds_lock_while_streaming(self):
+        """共有するローカルモデルは、ストリーミングを読み終えるまで次の生成を待たせる"""
+        events = []
+
+        class FakeLlama:
+            model_path = "model.gguf"
+
+            def create_chat_completion(self, messages, stream=False):
+                if stream:
+                    return iter(["a", "b"])
+                events.append("call")
+                return "done"
+
+        client = client_pool.SerializedClient(FakeLlama(), ("create_chat_completion",))
+        self.assertEqual(client.model_path, "model.gguf")
+        stream = client.create_chat_completion(messages=[], stream=True)
+        self.assertEqual(next(stream), "a")
+
+        worker = threading.Thread(target=lambda: client.create_chat_completion(messages=[]))
+        worker.start()
+        worker.join(0.05)
+        self.assertEqual(events, [])
+        self.assertEqual(list(stream), ["b"])
+        worker.join()
+        self.assertEqual(events, ["call"])
+
+    def test_gemini_chat_model_is_reused(self):
+        """同じモデル・APIキー・生成設定の Gemini チャットモデルは使い回す"""
+        import gemini_api
+        first = gemini_api.get_configured_llm("gemini-2.5-flash", "dummy-key", {"temperature": 0.5})
+        self.assertIs(gemini_api.get_configured_llm("gemini-2.5-flash", "dummy-key", {"temperature": 0.5}), first)
+        self.assertIsNot(gemini_api.get_configured_llm("gemini-2.5-flash", "dummy-key", {"temperature": 0.9}), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+設定スナップショット（config_manager / room_manager の再読み込み抑制）のテスト
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import constants
+import config_manager
+import room_manager
+
+
+class TestConfigSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.config_file = os.path.join(self.temp_dir, "config.json")
+        self.rooms_dir = os.path.join(self.temp_dir, "characters")
+        self.patches = [
+            mock.patch.object(constants, "CONFIG_FILE", self.config_file),
+            mock.patch.object(constants, "ROOMS_DIR", self.rooms_dir),
+            # バックアップは一時ディレクトリの外に作らない
+            mock.patch.object(config_manager, "_create_config_backup"),
+        ]
+        for patch in self.patches:
+            patch.start()
+        room_manager.invalidate_room_cache()
+
+    def tearDown(self):
+        for patch in reversed(self.patches):
+            patch.stop()
+        room_manager.invalidate_room_cache()
+        config_manager._config_file_snapshot = None
+        config_manager._loaded_config_signature = None
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_load_config_skips_unchanged_file(self):
+        """config.json が変わっていなければ load_config は再構築せず、保存後は反映し直す"""
+        config_manager.load_config()
+        self.assertTrue(os.path.exists(self.config_file))
+        with mock.patch.object(config_manager, "_reload_config", wraps=config_manager._reload_config) as reload:
+            config_manager.load_config()
+            config_manager.load_config()
+            self.assertEqual(reload.call_count, 0)
+
+            config_manager.save_config_if_changed("last_model", "gemini-2.5-pro")
+            config_manager.load_config()
+            self.assertEqual(reload.call_count, 1)
+        self.assertEqual(config_manager.CONFIG_GLOBAL["last_model"], "gemini-2.5-pro")
+
+    def test_config_file_is_read_once_and_copied(self):
+        """保存した内容はファイルを読み直さずに返し、呼び出し側の変更はキャッシュに影響しない"""
+        config_manager._save_config_file({"last_room": "Olivie", "theme_settings": {}})
+        with mock.patch("builtins.open", side_effect=AssertionError("読み込みは発生しないはず")):
+            config = config_manager.load_config_file()
+            config["theme_settings"]["active_theme"] = "書き換え"
+            self.assertEqual(config_manager.load_config_file()["theme_settings"], {})
+            self.assertEqual(config_manager.get_config_snapshot()["last_room"], "Olivie")
+
+        # 外部からの書き換えは署名の変化で検知する
+        with open(self.config_file, "w", encoding="utf-8") as f:
+            json.dump({"last_room": "Lucian"}, f)
+        self.assertEqual(config_manager.get_config_snapshot()["last_room"], "Lucian")
+
+    def test_room_settings_use_snapshot(self):
+        """ルーム個別設定はスナップショットから参照し、APIキーの注入でキャッシュを書き換えない"""
+        config_manager.load_config()
+        room_manager.get_room_files_paths("room")
+        override = {
+            "provider": "openai",
+            "openai_settings": {"name": "Zhipu AI", "api_key": "", "tool_use_enabled": False},
+        }
+        self.assertTrue(room_manager.save_room_override_settings("room", override))
+        config_manager.CONFIG_GLOBAL["zhipu_api_key"] = "secret"
+
+        with mock.patch.object(room_manager.json, "loads", wraps=json.loads) as loads:
+            self.assertEqual(config_manager.get_active_provider("room"), "openai")
+            self.assertFalse(config_manager.is_tool_use_enabled("room"))
+            config_manager.get_effective_settings("room")
+            config_manager.get_effective_settings("room")
+            self.assertEqual(loads.call_count, 1)
+
+        snapshot = room_manager.get_room_config_snapshot("room")
+        self.assertEqual(snapshot["override_settings"]["openai_settings"]["api_key"], "")
+        self.assertIsNone(room_manager.get_room_config_snapshot("missing"))
+
+
+if __name__ == '__main__':
+    unittest.main()
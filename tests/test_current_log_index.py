@@ -0,0 +1,148 @@
+"""
+現行ログ索引の差分更新（RAGManager.update_current_log_index_with_progress）のテスト
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.embeddings import Embeddings
+
+import chat_log_index
+import config_manager
+import constants
+import rag_manager
+
+
+class FakeEmbeddings(Embeddings):
+    """文字コードから決まる簡易ベクトルを返し、ベクトル化したテキストを記録する"""
+
+    def __init__(self):
+        self.embedded = []
+        # このテキストを含むリクエストは失敗させる（429 以外のエラー）
+        self.fail_on = None
+
+    def embed_documents(self, texts):
+        if self.fail_on and any(self.fail_on in t for t in texts):
+            raise RuntimeError("400 Bad Request")
+        self.embedded.extend(texts)
+        return [self.embed_query(t) for t in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), float(sum(map(ord, text)) % 101), 1.0]
+
+
+class TestCurrentLogIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.rooms_dir = tempfile.mkdtemp()
+        self.patches = [
+            mock.patch.object(constants, "ROOMS_DIR", self.rooms_dir),
+            mock.patch.object(config_manager, "get_effective_settings", return_value={"embedding_mode": "local"}),
+            mock.patch.object(config_manager, "get_internal_model_settings", return_value={"embedding_model": "fake"}),
+            mock.patch.object(config_manager, "get_key_name_by_value", return_value="Unknown"),
+        ]
+        for p in self.patches:
+            p.start()
+        os.makedirs(os.path.join(self.rooms_dir, "room"))
+        self.log_path = os.path.join(self.rooms_dir, "room", "log.txt")
+        self.embeddings = FakeEmbeddings()
+        chat_log_index.invalidate()
+        rag_manager.RAGManager._index_cache.clear()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        chat_log_index.invalidate()
+        rag_manager.RAGManager._index_cache.clear()
+        shutil.rmtree(self.rooms_dir, ignore_errors=True)
+
+    def _write(self, text, mode="a"):
+        with open(self.log_path, mode, encoding="utf-8") as f:
+            f.write(text)
+
+    def _update(self):
+        manager = rag_manager.RAGManager("room", "")
+        manager.embeddings = self.embeddings
+        self.embeddings.embedded = []
+        results = list(manager.update_current_log_index_with_progress())
+        db, state = manager._load_current_log_index(manager.room_dir / "rag_data" / "current_log_index")
+        return results[-1][2], db, state
+
+    @staticmethod
+    def _contents(db):
+        return sorted(doc.page_content for doc in db.docstore._dict.values())
+
+    def test_append_embeds_only_new_messages(self):
+        self._write("## USER:user\n最初のメッセージです。\n\n## AGENT:ルシアン\n最初の返事をします。\n\n")
+        message, db, _ = self._update()
+        self.assertTrue(message.startswith("✅"))
+        self.assertEqual(db.index.ntotal, 2)
+
+        self._write("## USER:user\n二つ目のメッセージです。\n\n")
+        _, db, _ = self._update()
+        self.assertEqual(self.embeddings.embedded, ["## USER:user\n二つ目のメッセージです。"])
+        self.assertEqual(db.index.ntotal, 3)
+
+        # 変更がなければ何もベクトル化しない
+        _, db, _ = self._update()
+        self.assertEqual(self.embeddings.embedded, [])
+        self.assertEqual(db.index.ntotal, 3)
+
+    def test_archived_text_is_removed(self):
+        messages = [f"## USER:user\nメッセージ番号{i}の本文です。\n\n" for i in range(5)]
+        self._write("".join(messages))
+        self._update()
+
+        # log_archiver.archive と同様に、先頭側をアーカイブへ移して残りで書き換える
+        self._write("".join(messages[3:]).strip() + "\n\n", mode="w")
+        _, db, state = self._update()
+        self.assertEqual(self.embeddings.embedded, [])
+        self.assertEqual(self._contents(db), sorted(m.strip() for m in messages[3:]))
+        self.assertEqual([b["start"] for b in state["blocks"]], [0, len(messages[3].encode("utf-8"))])
+
+    def test_failed_batch_is_skipped(self):
+        """429 以外のエラーで失敗したバッチは飛ばし、残りのバッチは索引化する"""
+        self._write("".join(f"## USER:user\nメッセージ番号{i}の本文です。\n\n" for i in range(25)))
+        self.embeddings.fail_on = "メッセージ番号10の"
+        message, db, _ = self._update()
+        self.assertTrue(message.startswith("✅"), message)
+        self.assertEqual(db.index.ntotal, 5)
+
+    def test_failed_middle_batch_is_recovered_next_run(self):
+        """途中のバッチが失敗しても、次回の追記更新でそのブロックから読み直して索引化する"""
+        messages = [f"## USER:user\nメッセージ番号{i}の本文です。\n\n" for i in range(45)]
+        self._write("".join(messages))
+        self.embeddings.fail_on = "メッセージ番号25の"
+        _, db, state = self._update()
+        self.assertEqual(db.index.ntotal, 25)
+        self.assertEqual(state["indexed_bytes"], len("".join(messages[:20]).encode("utf-8")))
+
+        self.embeddings.fail_on = None
+        self._write("## USER:user\n追記したメッセージです。\n\n")
+        _, db, state = self._update()
+        self.assertEqual(len(self.embeddings.embedded), 21)
+        self.assertEqual(db.index.ntotal, 46)
+        self.assertEqual(self._contents(db), sorted([m.strip() for m in messages]
+                                                    + ["## USER:user\n追記したメッセージです。"]))
+        self.assertEqual(state["indexed_bytes"], os.path.getsize(self.log_path))
+
+        _, db, _ = self._update()
+        self.assertEqual(self.embeddings.embedded, [])
+        self.assertEqual(db.index.ntotal, 46)
+
+    def test_state_is_rebuilt_when_missing(self):
+        self._write("## USER:user\n状態ファイルのテストです。\n\n")
+        self._update()
+        os.remove(os.path.join(self.rooms_dir, "room", "rag_data", "current_log_index", "log_state.json"))
+        _, db, _ = self._update()
+        self.assertEqual(len(self.embeddings.embedded), 1)
+        self.assertEqual(db.index.ntotal, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+"""
+エンベディング永続キャッシュ（embedding_cache）のテスト
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import embedding_cache
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+
+
+class CountingEmbeddings:
+    """呼び出されたテキストを記録するダミーのエンベディング"""
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t)), float(sum(map(ord, t)) % 97), 0.5] for t in texts]
+
+    def embed_query(self, text):
+        return [0.0, 0.0, 1.0]
+
+
+class TestEmbeddingCache(unittest.TestCase):
+
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        embedding_cache._caches.clear()
+
+    def tearDown(self):
+        embedding_cache._caches.clear()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _wrap(self, model_id="google:test-model"):
+        base = CountingEmbeddings()
+        return base, CachedEmbeddings(base, EmbeddingCache.for_model(self.root, model_id))
+
+    def test_only_new_text_is_embedded(self):
+        base, embeddings = self._wrap()
+        first = embeddings.embed_documents(["りんご", "みかん"])
+        self.assertEqual(base.calls, [["りんご", "みかん"]])
+
+        second = embeddings.embed_documents(["みかん", "ぶどう", "りんご "])
+        self.assertEqual(base.calls[-1], ["ぶどう"])
+        self.assertEqual(second[0], first[1])
+        # 正規化（前後空白の除去）後に同じテキストはヒットする
+        self.assertEqual(second[2], first[0])
+
+    def test_persists_across_processes(self):
+        _, embeddings = self._wrap()
+        vectors = embeddings.embed_documents(["星空の話", "散歩の話"])
+
+        # プロセス再起動を模してインスタンスを作り直す
+        embedding_cache._caches.clear()
+        base, embeddings = self._wrap()
+        self.assertEqual(embeddings.embed_documents(["散歩の話", "星空の話"]), vectors[::-1])
+        self.assertEqual(base.calls, [])
+
+    def test_model_id_separates_entries(self):
+        _, embeddings = self._wrap("google:model-a")
+        embeddings.embed_documents(["同じテキスト"])
+        base, other = self._wrap("local:model-b")
+        other.embed_documents(["同じテキスト"])
+        self.assertEqual(base.calls, [["同じテキスト"]])
+
+    def test_truncated_vectors_are_ignored(self):
+        _, embeddings = self._wrap()
+        embeddings.embed_documents(["一", "二"])
+        cache = embeddings.cache
+        # 書き込み途中で中断され、最後のベクトルが欠けた状態を再現する
+        with open(cache.vectors_path, "r+b") as f:
+            f.truncate(cache.dim * 4 + 2)
+
+        embedding_cache._caches.clear()
+        base, embeddings = self._wrap()
+        embeddings.embed_documents(["一", "二"])
+        self.assertEqual(base.calls, [["二"]])
+        self.assertEqual(len(embeddings.cache), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
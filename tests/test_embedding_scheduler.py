@@ -0,0 +1,164 @@
+"""
+エンベディングのスループット制御（embedding_scheduler）のテスト
+"""
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config_manager
+import constants
+import embedding_scheduler
+from embedding_scheduler import EmbeddingQuotaExhausted, EmbeddingScheduler
+
+
+class FakeClient:
+    """キーごとのダミーのエンベディング。rate_limited_keys のキーは 429 を返す"""
+
+    def __init__(self, api_key, calls, rate_limited_keys, delay=0.0):
+        self.api_key = api_key
+        self.calls = calls
+        self.rate_limited_keys = rate_limited_keys
+        self.delay = delay
+
+    def embed_documents(self, texts):
+        self.calls.append((self.api_key, list(texts)))
+        if self.delay:
+            time.sleep(self.delay)
+        if self.api_key in self.rate_limited_keys:
+            raise RuntimeError("429 Resource has been exhausted (e.g. check quota).")
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        return [0.0, 1.0]
+
+
+class TestMakeBatches(unittest.TestCase):
+
+    def test_batches_are_bounded_by_tokens_and_items(self):
+        """推定トークン数と件数の上限でリクエストを区切る"""
+        self.assertEqual(embedding_scheduler.estimate_tokens("あいう"), 3)
+        self.assertEqual(embedding_scheduler.estimate_tokens("abcdefgh"), 2)
+        texts = ["あ" * 40, "い" * 40, "う" * 40, "abc", "え" * 200]
+        self.assertEqual(embedding_scheduler.make_batches(texts, max_tokens=100, max_items=10),
+                         [[0, 1], [2, 3], [4]])
+        self.assertEqual(embedding_scheduler.make_batches(texts, max_tokens=10000, max_items=2),
+                         [[0, 1], [2, 3], [4]])
+
+
+class TestEmbeddingScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.patches = [
+            mock.patch.object(config_manager, "GEMINI_API_KEYS", {"key_a": "value-a", "key_b": "value-b"}),
+            mock.patch.object(config_manager, "GEMINI_KEY_STATES", {}),
+            mock.patch.object(config_manager.client_pool, "evict_api_key"),
+            mock.patch.object(constants, "EMBEDDING_KEY_INITIAL_RPM", 6000),
+            mock.patch.object(constants, "EMBEDDING_KEY_MAX_RPM", 12000),
+            mock.patch.object(constants, "EMBEDDING_BATCH_MAX_ITEMS", 2),
+        ]
+        for patch in self.patches:
+            patch.start()
+        self.calls = []
+        self.rate_limited = set()
+        self.delay = 0.0
+        self.scheduler = EmbeddingScheduler(
+            client_factory=lambda key, task: FakeClient(key, self.calls, self.rate_limited, self.delay)
+        )
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+    def test_requests_fan_out_across_keys(self):
+        """リクエストは全キーに並行して割り振られ、結果は入力と同じ順で返る"""
+        self.delay = 0.05
+        texts = [f"text{i}" * (i + 1) for i in range(12)]
+        vectors = self.scheduler.embed_documents(texts, "value-a")
+        self.assertEqual(vectors, [[float(len(t)), 1.0] for t in texts])
+        self.assertEqual(len(self.calls), 6)
+        self.assertEqual({key for key, _ in self.calls}, {"value-a", "value-b"})
+
+    def test_rate_limited_key_backs_off_and_work_moves_to_other_key(self):
+        """429 を返したキーはレートを下げて後回しにし、続けば枯渇扱いにして他のキーで処理する"""
+        self.rate_limited.add("value-a")
+        texts = [f"t{i}" for i in range(8)]
+        vectors = self.scheduler.embed_documents(texts, "value-a")
+        self.assertEqual(vectors, [[float(len(t)), 1.0] for t in texts])
+
+        lane_a = self.scheduler._lanes["key_a"]
+        lane_b = self.scheduler._lanes["key_b"]
+        self.assertLess(lane_a.rate_per_minute, 6000)
+        self.assertGreater(lane_b.rate_per_minute, 6000)
+
+        # 他に使えるキーが無ければ同じキーで再送し、429 が続けば枯渇扱いにする
+        with self.assertRaises(EmbeddingQuotaExhausted):
+            self.scheduler.embed_documents(["x"], "value-a", use_all_keys=False)
+        self.assertTrue(config_manager.is_key_exhausted("key_a"))
+        self.assertFalse(config_manager.is_key_exhausted("key_b"))
+
+    def test_all_keys_exhausted(self):
+        """使えるキーが残っていなければ、429 として扱える例外を送出する"""
+        self.rate_limited.update({"value-a", "value-b"})
+        with self.assertRaises(EmbeddingQuotaExhausted) as ctx:
+            self.scheduler.embed_documents(["a", "b", "c"], "value-a")
+        self.assertIn("ResourceExhausted", str(ctx.exception))
+
+    def test_rotation_disabled_uses_only_own_key(self):
+        """キーのローテーションが無効なら、指定したキーだけを使う"""
+        self.scheduler.embed_documents([f"t{i}" for i in range(6)], "value-b", use_all_keys=False)
+        self.assertEqual({key for key, _ in self.calls}, {"value-b"})
+
+    def test_aimd_rate_adjustment(self):
+        """成功で加算的に上がり、429 で半減し、遅い応答では少し下がる"""
+        clock = [100.0]
+        scheduler = EmbeddingScheduler(client_factory=lambda key, task: None, clock=lambda: clock[0])
+        lane = scheduler._acquire("value-a", use_all_keys=False)
+        scheduler._release(lane, latency=0.1)
+        self.assertEqual(lane.rate_per_minute, 6000 + constants.EMBEDDING_AIMD_INCREASE_RPM)
+
+        clock[0] = 101.0
+        lane = scheduler._acquire("value-a", use_all_keys=False)
+        scheduler._release(lane, error=RuntimeError("429 retry_delay { seconds: 7 }"))
+        self.assertEqual(lane.rate_per_minute, (6000 + constants.EMBEDDING_AIMD_INCREASE_RPM) * 0.5)
+        self.assertEqual(lane.next_at, 108.0)
+
+        clock[0] = 108.0
+        before = lane.rate_per_minute
+        lane = scheduler._acquire("value-a", use_all_keys=False)
+        scheduler._release(lane, latency=constants.EMBEDDING_LATENCY_TARGET_SECONDS + 1)
+        self.assertAlmostEqual(lane.rate_per_minute, before * constants.EMBEDDING_AIMD_SLOW_FACTOR)
+
+    def test_shared_budget_across_jobs(self):
+        """同時に動く複数の処理が、同じキーの同時実行数の上限を共有する"""
+        self.delay = 0.05
+        in_flight = []
+        peak = [0]
+        lock = threading.Lock()
+        original_acquire = self.scheduler._acquire
+
+        def tracking_acquire(*args, **kwargs):
+            lane = original_acquire(*args, **kwargs)
+            with lock:
+                in_flight.append(lane)
+                peak[0] = max(peak[0], sum(l.in_flight for l in self.scheduler._lanes.values()))
+            return lane
+
+        with mock.patch.object(self.scheduler, "_acquire", side_effect=tracking_acquire):
+            threads = [threading.Thread(target=self.scheduler.embed_documents,
+                                        args=([f"job{j}-{i}" for i in range(10)], "value-a"))
+                       for j in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(self.calls), 15)
+        self.assertLessEqual(peak[0], 2 * constants.EMBEDDING_PER_KEY_CONCURRENCY)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+"""
+エンティティ記憶の目録（entity_memory_manager._EntityCatalog）のテスト
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import constants
+import entity_memory_manager
+from entity_memory_manager import EntityMemoryManager
+
+
+class TestEntityCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.rooms_dir = tempfile.mkdtemp()
+        self.patch = mock.patch.object(constants, "ROOMS_DIR", self.rooms_dir)
+        self.patch.start()
+        entity_memory_manager._catalogs.clear()
+        self.manager = EntityMemoryManager("room")
+        self.manager.create_or_update_entry("Alice", "彼女は紅茶が好きで、毎朝庭を散歩する。")
+        self.manager.create_or_update_entry("Bob", "コーヒー派。Alice とは幼なじみ。")
+        self.manager.create_or_update_entry("図書館", "静かな場所。紅茶は持ち込み禁止。")
+
+    def tearDown(self):
+        self.patch.stop()
+        entity_memory_manager._catalogs.clear()
+        shutil.rmtree(self.rooms_dir, ignore_errors=True)
+
+    def _scan_search(self, query):
+        """従来の実装（全ファイルを読んで部分一致）と同じ判定"""
+        words = [w.lower() for w in query.split() if w.strip()]
+        scored = []
+        for name in self.manager.list_entries():
+            content = self.manager.read_entry(name).lower()
+            count = sum(1 for w in words if w in name.lower() or w in content)
+            if count:
+                scored.append((name, count))
+        scored.sort(key=lambda x: (-x[1], x[0]))
+        return [name for name, _ in scored]
+
+    def test_results_match_full_scan(self):
+        """名前・本文の部分一致とマッチ数の順序が従来の判定と一致する"""
+        for query in ["紅茶", "alice 紅茶", "ALICE", "茶", "散歩 コーヒー 図書", "存在しない", "  "]:
+            self.assertEqual(self.manager.search_entries(query), self._scan_search(query), query)
+        self.assertEqual(self.manager.search_entries("alice 紅茶"), ["Alice", "Bob", "図書館"])
+
+    def test_files_are_not_reread_for_each_query(self):
+        """2回目以降の検索ではファイルを読まない"""
+        self.manager.search_entries("紅茶")
+        with mock.patch.object(entity_memory_manager.Path, "read_text") as read_text:
+            self.manager.search_entries("紅茶 散歩")
+            EntityMemoryManager("room").search_entries("コーヒー")
+            read_text.assert_not_called()
+
+    def test_catalog_follows_create_update_delete(self):
+        """作成・追記・上書き・削除が次の検索に反映される"""
+        self.assertEqual(self.manager.search_entries("ケーキ"), [])
+        self.manager.create_or_update_entry("Bob", "最近はケーキ作りに夢中。", append=True)
+        self.assertEqual(self.manager.search_entries("ケーキ"), ["Bob"])
+        self.manager.create_or_update_entry("Carol", "ケーキ屋の店主。")
+        self.assertEqual(self.manager.search_entries("ケーキ"), ["Bob", "Carol"])
+        self.manager.write_entry("Bob", "# Entity Memory: Bob\n紅茶派に転向した。")
+        self.assertEqual(self.manager.search_entries("ケーキ"), ["Carol"])
+        self.assertTrue(self.manager.delete_entry("Carol"))
+        self.assertEqual(self.manager.search_entries("ケーキ"), [])
+        self.assertEqual(self.manager.search_entries("紅茶"), self._scan_search("紅茶"))
+
+    def test_external_edits_are_detected(self):
+        """マネージャーを経由しないファイルの追加・削除・編集も検知する"""
+        self.manager.search_entries("紅茶")
+        entities_dir = self.manager.entities_dir
+        (entities_dir / "Dave.md").write_text("# Entity Memory: Dave\n紅茶の研究者。", encoding="utf-8")
+        os.remove(entities_dir / "図書館.md")
+        self.assertEqual(self.manager.search_entries("紅茶"), ["Alice", "Dave"])
+
+        # ディレクトリが変わらない編集は、一定時間ごとの確認で反映される
+        (entities_dir / "Bob.md").write_text("# Entity Memory: Bob\n紅茶も飲むようになった。", encoding="utf-8")
+        with mock.patch.object(constants, "ENTITY_CATALOG_RESCAN_SECONDS", 0):
+            self.assertEqual(self.manager.search_entries("紅茶"), ["Alice", "Bob", "Dave"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,204 @@
+"""
+日次エピソード要約のパイプライン（episode_summarizer / EpisodicMemoryManager.update_memory）のテスト
+"""
+import json
+import os
+import re
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chat_log_index
+import constants
+import episode_summarizer
+import episodic_store
+import json_state_store
+from episodic_memory_manager import EpisodicMemoryManager
+
+
+def _day(date_str, text, weekday="Mon"):
+    text = text * 5
+    return (f"## USER:user\n{text}\n\n{date_str} ({weekday}) 10:00:00\n\n"
+            f"## AGENT:room\n{text}への返事です。\n\n{date_str} ({weekday}) 10:00:05\n\n")
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeLLM:
+    """まとめたリクエストには日付ごとの JSON を、1日分のリクエストには固定の要約を返す"""
+
+    def __init__(self, drop_dates=()):
+        self.prompts = []
+        self.drop_dates = set(drop_dates)
+        self.lock = threading.Lock()
+
+    def invoke(self, prompt):
+        with self.lock:
+            self.prompts.append(prompt)
+        if "JSON オブジェクトのみを出力" in prompt:
+            dates = re.findall(r'"(\d{4}-\d{2}-\d{2})"', prompt.split("キー:")[-1])
+            keys = [d for d in dates if d not in self.drop_dates]
+            return FakeResponse("```json\n" + json.dumps({d: f"{d}のまとめ要約" for d in keys}, ensure_ascii=False) + "\n```")
+        return FakeResponse("一日分の要約")
+
+
+class TestPackDays(unittest.TestCase):
+
+    def test_short_days_are_packed_within_budget(self):
+        """短い日は文字数・日数の上限までまとめ、長い日は単独のリクエストにする"""
+        days = [("2026-01-01", "a" * 40), ("2026-01-02", "b" * 40), ("2026-01-03", "c" * 500),
+                ("2026-01-04", "d" * 40), ("2026-01-05", "e" * 40), ("2026-01-06", "f" * 40)]
+        groups = episode_summarizer.pack_days(days, max_chars=100, max_days=5, day_max_chars=100)
+        self.assertEqual([[d for d, _ in group] for group in groups],
+                         [["2026-01-01", "2026-01-02"], ["2026-01-03"],
+                          ["2026-01-04", "2026-01-05"], ["2026-01-06"]])
+        groups = episode_summarizer.pack_days(days[:2], max_chars=1000, max_days=1, day_max_chars=100)
+        self.assertEqual(len(groups), 2)
+
+    def test_parse_batch_response(self):
+        """JSON の前後に余計な文字があっても、要求した日付の要約だけを取り出す"""
+        text = '以下です。\n```json\n{"2026-01-01": " 要約1 ", "2026-01-02": "", "2026-01-09": "他"}\n```'
+        self.assertEqual(episode_summarizer.parse_batch_response(text, ["2026-01-01", "2026-01-02"]),
+                         {"2026-01-01": "要約1"})
+        self.assertEqual(episode_summarizer.parse_batch_response("JSONではない", ["2026-01-01"]), {})
+
+
+class TestEpisodeSummarizer(unittest.TestCase):
+
+    def setUp(self):
+        self.rooms_dir = tempfile.mkdtemp()
+        self.patches = [
+            mock.patch.object(constants, "ROOMS_DIR", self.rooms_dir),
+            mock.patch.object(constants, "EPISODIC_SUMMARY_BURST", 100),
+            mock.patch("room_manager.get_room_config", return_value={"room_name": "ルーム"}),
+            mock.patch("config_manager.get_effective_settings", return_value={}),
+            mock.patch("session_arousal_manager.get_daily_average", return_value=0.5),
+            mock.patch("session_arousal_manager.get_sessions_for_date_all", return_value=[]),
+        ]
+        for patch in self.patches:
+            patch.start()
+        json_state_store.forget()
+        chat_log_index.invalidate()
+        episode_summarizer._limiters.clear()
+        self.room_dir = os.path.join(self.rooms_dir, "room")
+        os.makedirs(os.path.join(self.room_dir, "log_archives"))
+        self.archive_path = os.path.join(self.room_dir, "log_archives", "log_archive_1.txt")
+        self.log_path = os.path.join(self.room_dir, "log.txt")
+        with open(self.archive_path, "w", encoding="utf-8") as f:
+            f.write(_day("2026-01-01", "初日の話題") + _day("2026-01-02", "二日目の話題")
+                    + _day("2026-01-03", "長い話題" * 200))
+        with open(self.log_path, "w", encoding="utf-8") as f:
+            f.write(_day("2026-01-04", "四日目の話題"))
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        json_state_store.forget()
+        chat_log_index.invalidate()
+        episodic_store._states.clear()
+        shutil.rmtree(self.rooms_dir, ignore_errors=True)
+
+    def _update(self, llm):
+        manager = EpisodicMemoryManager("room")
+        with mock.patch("llm_factory.LLMFactory.create_chat_model", return_value=llm):
+            result = manager.update_memory("key")
+        summaries = {ep["date"]: ep["summary"] for ep in manager._load_memory()}
+        return result, summaries
+
+    def test_short_days_are_summarized_together(self):
+        """短い日は1回のリクエストにまとめ、長い日は従来のプロンプトで要約して日付ごとに保存する"""
+        llm = FakeLLM()
+        result, summaries = self._update(llm)
+        self.assertEqual(len(llm.prompts), 2)
+        self.assertEqual(summaries, {
+            "2026-01-01": "2026-01-01のまとめ要約",
+            "2026-01-02": "2026-01-02のまとめ要約",
+            "2026-01-03": "一日分の要約",
+            "2026-01-04": "2026-01-04のまとめ要約",
+        })
+        self.assertIn("成功 4件", result)
+
+    def test_missing_dates_fall_back_to_single_requests(self):
+        """まとめた応答に含まれなかった日付は、1日ずつ要約し直す"""
+        llm = FakeLLM(drop_dates={"2026-01-02"})
+        _, summaries = self._update(llm)
+        self.assertEqual(summaries["2026-01-02"], "一日分の要約")
+        self.assertEqual(summaries["2026-01-01"], "2026-01-01のまとめ要約")
+
+    def test_rerun_only_scans_new_log_and_summarizes_new_dates(self):
+        """2回目は変化していないアーカイブを読まず、追記された日付だけを要約する"""
+        self._update(FakeLLM())
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(_day("2026-01-05", "五日目の話題"))
+
+        llm = FakeLLM()
+        with mock.patch.object(chat_log_index, "get_index", wraps=chat_log_index.get_index) as get_index:
+            _, summaries = self._update(llm)
+        self.assertEqual([call.args[0] for call in get_index.call_args_list], [self.log_path, self.log_path])
+        self.assertEqual(len(llm.prompts), 1)
+        self.assertNotIn("四日目", llm.prompts[0])
+        self.assertEqual(summaries["2026-01-05"], "一日分の要約")
+
+        llm = FakeLLM()
+        result, _ = self._update(llm)
+        self.assertEqual(llm.prompts, [])
+        self.assertIn("新規に要約すべき過去の日付はありませんでした", result)
+
+    def test_temporary_errors_are_retried_on_next_run(self):
+        """一時的エラーで要約できなかった日付は保存せず、次回の実行で再開する"""
+        llm = FakeLLM()
+        original_invoke = llm.invoke
+
+        def flaky_invoke(prompt):
+            if "長い話題" in prompt:
+                raise RuntimeError("503 Service Unavailable")
+            return original_invoke(prompt)
+
+        with mock.patch.object(llm, "invoke", side_effect=flaky_invoke):
+            result, summaries = self._update(llm)
+        self.assertNotIn("2026-01-03", summaries)
+        self.assertIn("エラー・スキップ 1件", result)
+
+        llm = FakeLLM()
+        _, summaries = self._update(llm)
+        self.assertEqual(len(llm.prompts), 1)
+        self.assertEqual(summaries["2026-01-03"], "一日分の要約")
+
+    def test_day_without_conversation_is_recorded_once(self):
+        """本文が空になる日（思考ログのみ）も短いログとして記録し、次回の対象に戻さない"""
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write("## AGENT:room\n[THOUGHT]考え中 2026-01-05 (Mon) 10:00:00[/THOUGHT]\n\n")
+        _, summaries = self._update(FakeLLM())
+        self.assertEqual(summaries["2026-01-05"], "（特筆すべき会話ログはありませんでした）")
+
+        llm = FakeLLM()
+        result, _ = self._update(llm)
+        self.assertEqual(llm.prompts, [])
+        self.assertIn("新規に要約すべき過去の日付はありませんでした", result)
+
+    def test_batch_temporary_error_defers_all_days(self):
+        """まとめたリクエストが一時的エラーで終わったら、1日ずつ送り直さずに全日付を次回に回す"""
+        llm = FakeLLM()
+        calls = []
+
+        def rate_limited_invoke(prompt):
+            calls.append(prompt)
+            raise RuntimeError("503 Service Unavailable")
+
+        days = [("2026-01-01", "a" * 40), ("2026-01-02", "b" * 40)]
+        with mock.patch.object(llm, "invoke", side_effect=rate_limited_invoke):
+            results = episode_summarizer.summarize_group(llm, days, "user", "room", lambda: None)
+        self.assertEqual(results, [("2026-01-01", None, True), ("2026-01-02", None, True)])
+        self.assertEqual(len(calls), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+"""
+エピソード記憶ストレージ（episodic_store）のテスト
+"""
+import json
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import constants
+import episodic_store
+from episodic_store import EpisodicStore
+
+
+class TestEpisodicStore(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.episodic_dir = self.test_dir / "episodic"
+        self.episodic_dir.mkdir()
+        self.legacy_file = self.test_dir / "episodic_memory.json"
+        with open(self.episodic_dir / "2026-01.json", "w", encoding="utf-8") as f:
+            json.dump([
+                {"id": "episode_2026-01-10_001", "date": "2026-01-10", "summary": "一日目", "arousal": 0.5},
+                {"date": "2026-01-12~2026-01-18", "summary": "週次", "arousal": 0.4},
+            ], f, ensure_ascii=False)
+
+    def tearDown(self):
+        episodic_store._states.clear()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _store(self):
+        return EpisodicStore(self.episodic_dir, self.legacy_file)
+
+    def test_append_writes_only_journal(self):
+        store = self._store()
+        snapshot_before = (self.episodic_dir / "2026-01.json").read_text(encoding="utf-8")
+        store.append({"id": "episode_2026-02-01_001", "date": "2026-02-01", "summary": "新規"})
+
+        self.assertTrue((self.episodic_dir / "2026-02.jsonl").exists())
+        self.assertFalse((self.episodic_dir / "2026-02.json").exists())
+        self.assertEqual((self.episodic_dir / "2026-01.json").read_text(encoding="utf-8"), snapshot_before)
+
+        # 別の状態（再起動後）から読み直してもジャーナル分が見える
+        episodic_store._states.clear()
+        self.assertEqual(self._store().get_by_id("episode_2026-02-01_001")["summary"], "新規")
+
+    def test_find_overlapping_uses_ranges(self):
+        store = self._store()
+        dates = [ep["date"] for ep in store.find_overlapping("2026-01-15", "2026-01-15")]
+        self.assertEqual(dates, ["2026-01-12~2026-01-18"])
+        dates = [ep["date"] for ep in store.find_overlapping("2026-01-01", "2026-01-12")]
+        self.assertEqual(dates, ["2026-01-10", "2026-01-12~2026-01-18"])
+        self.assertEqual(store.find_overlapping("2026-02-01", "2026-02-28"), [])
+
+    def test_update_is_replayed_from_journal(self):
+        store = self._store()
+        episode = store.get_by_id("episode_2026-01-10_001")
+        episode["arousal"] = 0.9
+        self.assertTrue(store.update(episode))
+
+        episodic_store._states.clear()
+        self.assertEqual(self._store().get_by_id("episode_2026-01-10_001")["arousal"], 0.9)
+        self.assertEqual(len(self._store().all_episodes()), 2)
+
+    def test_compaction_folds_journal_into_snapshot(self):
+        store = self._store()
+        with mock.patch.object(constants, "EPISODIC_JOURNAL_COMPACTION_THRESHOLD", 2):
+            store.append({"date": "2026-01-20", "summary": "A"})
+            store.append({"date": "2026-01-21", "summary": "B"})
+
+        self.assertFalse((self.episodic_dir / "2026-01.jsonl").exists())
+        with open(self.episodic_dir / "2026-01.json", encoding="utf-8") as f:
+            self.assertEqual(len(json.load(f)), 4)
+
+    def test_external_modification_is_detected(self):
+        store = self._store()
+        self.assertEqual(len(store.all_episodes()), 2)
+        with open(self.episodic_dir / "2026-03.json", "w", encoding="utf-8") as f:
+            json.dump([{"date": "2026-03-01", "summary": "外部で追加"}], f, ensure_ascii=False)
+        self.assertEqual(len(store.all_episodes()), 3)
+
+    def test_crash_before_journal_unlink_does_not_duplicate(self):
+        """スナップショットを書き直した後、ジャーナルの削除前に落ちても、再適用でエピソードが重複しない"""
+        store = self._store()
+        store.append({"date": "2026-01-20", "summary": "IDなし", "created_at": "2026-01-21T00:00:00"})
+        store.append({"id": "episode_2026-01-21_001", "date": "2026-01-21", "summary": "IDあり"})
+        journal = self.episodic_dir / "2026-01.jsonl"
+        journal_text = journal.read_text(encoding="utf-8")
+        store.compact("2026-01")
+        self.assertFalse(journal.exists())
+        journal.write_text(journal_text, encoding="utf-8")
+
+        episodic_store._states.clear()
+        summaries = sorted(ep["summary"] for ep in self._store().all_episodes())
+        self.assertEqual(summaries, ["IDあり", "IDなし", "一日目", "週次"])
+
+    def test_failed_snapshot_write_keeps_previous_file(self):
+        """スナップショットの書き込みに失敗しても、元のファイルとジャーナルは残る"""
+        store = self._store()
+        store.append({"id": "episode_2026-01-22_001", "date": "2026-01-22", "summary": "追記"})
+        snapshot = self.episodic_dir / "2026-01.json"
+        before = snapshot.read_text(encoding="utf-8")
+        with mock.patch("file_lock_utils.os.fsync", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                store.compact("2026-01")
+        self.assertEqual(snapshot.read_text(encoding="utf-8"), before)
+        self.assertTrue((self.episodic_dir / "2026-01.jsonl").exists())
+        self.assertEqual(list(self.episodic_dir.glob("*.tmp")), [])
+
+        episodic_store._states.clear()
+        self.assertEqual(self._store().get_by_id("episode_2026-01-22_001")["summary"], "追記")
+
+
+if __name__ == '__main__':
+    unittest.main()
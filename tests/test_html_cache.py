@@ -0,0 +1,114 @@
+"""
+描画済みメッセージのキャッシュ（utils.load_html_cache / format_history_for_gradio）のテスト
+"""
+import json
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import constants
+import utils
+
+try:
+    import ui_handlers
+except ImportError:
+    ui_handlers = None
+
+
+class TestHtmlCache(unittest.TestCase):
+
+    def setUp(self):
+        self.rooms_dir = tempfile.mkdtemp()
+        self.patch = mock.patch.object(constants, "ROOMS_DIR", self.rooms_dir)
+        self.patch.start()
+        utils._html_cache_memory.clear()
+
+    def tearDown(self):
+        self.patch.stop()
+        utils._html_cache_memory.clear()
+        shutil.rmtree(self.rooms_dir, ignore_errors=True)
+
+    def test_cache_is_kept_in_memory_until_file_changes(self):
+        """保存後はファイルを読み直さず、外部でファイルが変わったら読み直す"""
+        cache = utils.load_html_cache("room")
+        cache["a"] = [["text", "A"]]
+        utils.save_html_cache("room", cache)
+        with mock.patch.object(utils.json, "load") as load:
+            self.assertEqual(utils.load_html_cache("room"), cache)
+            load.assert_not_called()
+
+        cache_path = os.path.join(self.rooms_dir, "room", "cache", "html_cache.json")
+        with open(cache_path, "w", encoding="utf-8") as f:
+            f.write('{"b": [["text", "BB"]]}')
+        self.assertEqual(utils.load_html_cache("room"), {"b": [["text", "BB"]]})
+
+    def test_concurrent_callers_get_independent_copies(self):
+        """同じルームを同時に描画しても、読み込んだキャッシュの変更が他の呼び出しや保存中の内容に影響しない"""
+        utils.save_html_cache("room", {"a": [["text", "A"]]})
+        first = utils.load_html_cache("room")
+        second = utils.load_html_cache("room")
+        self.assertIsNot(first, second)
+        first["b"] = [["text", "B"]]
+        self.assertEqual(second, {"a": [["text", "A"]]})
+        self.assertEqual(utils.load_html_cache("room"), {"a": [["text", "A"]]})
+
+        errors = []
+
+        def worker(n):
+            try:
+                for i in range(30):
+                    cache = utils.load_html_cache("room")
+                    cache[f"{n}-{i}"] = [["text", str(i)]]
+                    utils.save_html_cache("room", cache)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        cache_path = os.path.join(self.rooms_dir, "room", "cache", "html_cache.json")
+        with open(cache_path, encoding="utf-8") as f:
+            self.assertEqual(json.load(f), utils.load_html_cache("room"))
+
+    def test_oldest_entries_are_dropped(self):
+        """上限を超えた分は先頭（最も長く使われていないもの）から削除する"""
+        cache = {str(i): [["text", str(i)]] for i in range(5)}
+        with mock.patch.object(constants, "HTML_CACHE_MAX_ENTRIES", 3):
+            utils.save_html_cache("room", cache)
+        utils._html_cache_memory.clear()
+        self.assertEqual(list(utils.load_html_cache("room")), ["2", "3", "4"])
+
+    @unittest.skipIf(ui_handlers is None, "ui_handlers を読み込めない環境")
+    def test_unchanged_messages_are_not_rendered_again(self):
+        """2回目の表示では、追加されたメッセージだけを描画する"""
+        messages = [
+            {"role": "USER", "responder": "user", "content": "こんにちは"},
+            {"role": "AGENT", "responder": "room", "content": "[THOUGHT]考え中[/THOUGHT]\nやあ"},
+        ]
+        with mock.patch.object(ui_handlers.room_manager, "get_room_config", return_value={"room_name": "ルーム"}):
+            first = ui_handlers.format_history_for_gradio(messages, "room", True)
+            with mock.patch.object(ui_handlers, "_render_history_text",
+                                   wraps=ui_handlers._render_history_text) as render:
+                messages.append({"role": "USER", "responder": "user", "content": "元気？"})
+                second = ui_handlers.format_history_for_gradio(messages, "room", True)
+                self.assertEqual(render.call_count, 1)
+                # 表示設定が変われば描画し直す
+                ui_handlers.format_history_for_gradio(messages, "room", True, display_thoughts=False)
+                self.assertEqual(render.call_count, 4)
+        self.assertEqual(second[0][:2], first[0])
+        self.assertEqual(second[1], [0, 1, 2])
+        self.assertTrue(second[0][1][1].startswith("**ルーム:**"))
+        self.assertIn("```\n考え中\n```", second[0][1][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
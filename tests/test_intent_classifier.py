@@ -0,0 +1,91 @@
+"""
+ローカル意図分類器（intent_classifier）のテスト
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import constants
+import intent_classifier
+from intent_classifier import IntentClassifier
+
+TRAINING = {
+    "emotional": ["{}の時の気持ち", "{}で嬉しかったこと", "{}の思い出", "{}で悲しかったこと"],
+    "factual": ["{}の名前は", "{}の誕生日", "{}の好きな食べ物", "{}の趣味"],
+    "technical": ["{}の設定方法", "{}のエラー", "{}のインストール手順", "{}のバージョン"],
+    "temporal": ["昨日の{}", "最近の{}", "先週の{}", "今週の{}"],
+    "relational": ["{}との関係", "{}と仲がいい人", "{}はどんな人", "{}の友達"],
+}
+TOPICS = ["猫", "旅行", "仕事", "音楽", "映画"]
+
+
+class TestIntentClassifier(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.classifier = IntentClassifier(self.test_dir / "cache" / intent_classifier.DECISIONS_FILENAME)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _record_training(self):
+        for intent, templates in TRAINING.items():
+            for template in templates:
+                for topic in TOPICS:
+                    self.classifier.record(template.format(topic), intent)
+
+    def test_falls_back_until_enough_records(self):
+        self.assertIsNone(self.classifier.classify("昨日の散歩"))
+        self.classifier.record("昨日の散歩", "temporal")
+        # LLMが分類済みのクエリはそのまま返す
+        self.assertEqual(self.classifier.classify("昨日の散歩"), "temporal")
+
+    def test_learns_from_recorded_decisions(self):
+        self._record_training()
+        self.assertEqual(self.classifier.classify("昨日の料理"), "temporal")
+        self.assertEqual(self.classifier.classify("料理の設定方法"), "technical")
+        self.assertEqual(self.classifier.classify("料理の思い出"), "emotional")
+
+        # 記録はファイルに残り、別インスタンスでも学習に使われる
+        reloaded = IntentClassifier(self.classifier.decisions_path)
+        self.assertEqual(reloaded.classify("先週の料理"), "temporal")
+
+    def test_low_confidence_returns_none(self):
+        self._record_training()
+        with mock.patch.object(constants, "INTENT_CLASSIFIER_MIN_CONFIDENCE", 1.01):
+            self.assertIsNone(self.classifier.classify("料理"))
+
+    def test_retrains_in_background(self):
+        """記録が一定数たまると、分類を待たせずにバックグラウンドで再学習する"""
+        self.classifier.predict("最初の分類")
+        seed_weights = self.classifier.weights
+        with mock.patch.object(intent_classifier, "INTENT_RETRAIN_INTERVAL", 5):
+            for i in range(4):
+                self.classifier.record(f"昨日の出来事{i}", "temporal")
+            self.assertIsNone(self.classifier._retrain_thread)
+            self.classifier.record("昨日の出来事4", "temporal")
+            thread = self.classifier._retrain_thread
+            self.assertIsNotNone(thread)
+            # 再学習中も古い重みで分類できる
+            self.classifier.predict("別のクエリ")
+            thread.join(timeout=30)
+        self.assertIsNot(self.classifier.weights, seed_weights)
+        self.assertEqual(self.classifier._pending, 0)
+        self.assertIsNone(self.classifier._retrain_thread)
+        self.assertEqual(self.classifier.classify("昨日の出来事2"), "temporal")
+
+    def test_prediction_cache_is_bounded(self):
+        with mock.patch.object(intent_classifier, "PREDICTION_CACHE_SIZE", 3):
+            for i in range(5):
+                self.classifier.predict(f"クエリ{i}")
+            self.assertEqual(list(self.classifier._cache), ["クエリ2", "クエリ3", "クエリ4"])
+
+
+if __name__ == '__main__':
+    unittest.main()
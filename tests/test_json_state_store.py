@@ -0,0 +1,124 @@
+"""
+JSON状態ファイルのストア（json_state_store）のテスト
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import constants
+import file_lock_utils
+import json_state_store
+
+
+class TestJsonStateStore(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "memory", "internal_state.json")
+        # テスト中はタイマーで保存させず、flush() を明示的に呼ぶ
+        self.patch = mock.patch.object(constants, "JSON_STATE_FLUSH_DELAY", 60)
+        self.patch.start()
+        json_state_store.forget()
+
+    def tearDown(self):
+        self.patch.stop()
+        if json_state_store._timer is not None:
+            json_state_store._timer.cancel()
+            json_state_store._timer = None
+        json_state_store.forget()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _read_file(self):
+        with open(self.path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def test_writes_are_coalesced_and_served_from_memory(self):
+        """連続した書き込みは保存前でもメモリから読め、保存は最後の内容で1回だけ行う"""
+        with mock.patch.object(file_lock_utils, "atomic_write_text", wraps=file_lock_utils.atomic_write_text) as writer:
+            for i in range(5):
+                json_state_store.write(self.path, {"count": i})
+            self.assertFalse(os.path.exists(self.path))
+            self.assertTrue(json_state_store.exists(self.path))
+            self.assertEqual(json_state_store.read(self.path), {"count": 4})
+
+            json_state_store.flush()
+            json_state_store.flush()
+            self.assertEqual(writer.call_count, 1)
+        self.assertEqual(self._read_file(), {"count": 4})
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+
+    def test_read_returns_copies(self):
+        """読み込んだ辞書や書き込み後の元の辞書を変更しても、ストアの内容は変わらない"""
+        data = {"drives": {"boredom": 0.1}}
+        json_state_store.write(self.path, data)
+        data["drives"]["boredom"] = 0.9
+        loaded = json_state_store.read(self.path)
+        loaded["drives"]["boredom"] = 0.5
+        self.assertEqual(json_state_store.read(self.path), {"drives": {"boredom": 0.1}})
+        self.assertEqual(json_state_store.read(os.path.join(self.temp_dir, "none.json"), default=[]), [])
+
+    def test_external_changes_are_reloaded(self):
+        """他のプロセスがファイルを書き換えた場合は読み直す"""
+        json_state_store.write(self.path, {"value": "old"})
+        json_state_store.flush()
+        file_lock_utils.safe_json_write(self.path, {"value": "external"})
+        self.assertEqual(json_state_store.read(self.path), {"value": "external"})
+
+    def test_contended_file_does_not_block_other_files(self):
+        """他のプロセスがロックしているファイルの読み込み待ちの間も、別のファイルは読み書きできる"""
+        other = os.path.join(self.temp_dir, "memory", "other.json")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        for path in (self.path, other):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"value": os.path.basename(path)}, f)
+
+        results = []
+        lock = file_lock_utils.get_file_lock(self.path)
+        lock.acquire()
+        try:
+            reader = threading.Thread(target=lambda: results.append(json_state_store.read(self.path)))
+            reader.start()
+            time.sleep(0.2)
+            started = time.monotonic()
+            self.assertEqual(json_state_store.read(other), {"value": "other.json"})
+            json_state_store.update(other, lambda data: {**data, "count": 1})
+            self.assertLess(time.monotonic() - started, 1.0)
+            self.assertTrue(reader.is_alive())
+        finally:
+            lock.release()
+        reader.join(timeout=5)
+        self.assertEqual(results, [{"value": "internal_state.json"}])
+
+    def test_failed_save_keeps_original_file(self):
+        """保存に失敗しても元のファイルは壊れず、内容は未保存のまま残る"""
+        json_state_store.write(self.path, {"value": "saved"})
+        json_state_store.flush()
+        json_state_store.write(self.path, {"value": "pending"})
+        with mock.patch.object(file_lock_utils.os, "replace", side_effect=OSError("disk full")):
+            json_state_store.flush()
+        self.assertEqual(self._read_file(), {"value": "saved"})
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+
+        json_state_store.flush()
+        self.assertEqual(self._read_file(), {"value": "pending"})
+
+    def test_goal_manager_does_not_reset_pending_goals(self):
+        """保存前に GoalManager を作り直しても、未保存の目標が初期化されない"""
+        from goal_manager import GoalManager
+        with mock.patch.object(constants, "ROOMS_DIR", self.temp_dir):
+            os.makedirs(os.path.join(self.temp_dir, "room"))
+            GoalManager("room").add_goal("ルシアンと庭を散歩する")
+            goals = GoalManager("room").get_active_goals("short_term")
+            self.assertEqual([g["goal"] for g in goals], ["ルシアンと庭を散歩する"])
+
+
+if __name__ == '__main__':
+    unittest.main()
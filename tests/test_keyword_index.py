@@ -0,0 +1,104 @@
+"""
+過去ログ検索用転置インデックス（keyword_index）のテスト
+従来の readlines() による全走査と同じ結果になることを確認する。
+"""
+import os
+import re
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import keyword_index
+from keyword_index import KeywordIndex
+
+
+def legacy_search(room_dir: Path, keywords, exclude_recent_count, include_system_headers):
+    """従来の search_past_conversations / _keyword_search_for_retrieval と同じ走査"""
+    roles = "USER|AGENT|SYSTEM" if include_system_headers else "USER|AGENT"
+    found = []
+    for path in keyword_index.list_source_files(room_dir):
+        if not path.exists() or path.stat().st_size == 0:
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        header_indices = [i for i, line in enumerate(lines) if re.match(rf"^(## (?:{roles}):.*)$", line.strip())]
+        if not header_indices:
+            continue
+        search_end_line = len(lines)
+        if path.name == "log.txt" and exclude_recent_count > 0:
+            if len(header_indices) <= exclude_recent_count:
+                continue
+            search_end_line = header_indices[-exclude_recent_count]
+        processed = set()
+        for i, line in enumerate(lines[:search_end_line]):
+            if any(k in line.lower() for k in keywords):
+                start_index = 0
+                for h_idx in reversed(header_indices):
+                    if h_idx <= i:
+                        start_index = h_idx
+                        break
+                end_index = len(lines)
+                for h_idx in header_indices:
+                    if h_idx > start_index:
+                        end_index = h_idx
+                        break
+                block = "".join(lines[start_index:end_index]).strip()
+                if block not in processed:
+                    processed.add(block)
+                    found.append((path.name, block))
+    return found
+
+
+class TestKeywordIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.room_dir = Path(tempfile.mkdtemp())
+        (self.room_dir / "log_archives").mkdir()
+        words = ["猫", "りんご", "Python", "星空", "散歩", "記憶"]
+        parts = []
+        for i in range(60):
+            role = "SYSTEM:notice" if i % 7 == 3 else ("USER:user" if i % 2 == 0 else "AGENT:ルシアン")
+            parts.append(f"## {role}\n{words[i % len(words)]}の話 その{i}\n今日は2026-01-{i % 28 + 1:02d} (Mon) 12:00:00\n\n")
+        with open(self.room_dir / "log_archives" / "log_archive_1.txt", "w", encoding="utf-8") as f:
+            f.write("".join(parts[:30]).strip())
+        with open(self.room_dir / "log.txt", "w", encoding="utf-8") as f:
+            f.write("".join(parts[30:]))
+        self.page_patch = mock.patch.object(keyword_index, "PAGE_BYTES", 256)
+        self.page_patch.start()
+
+    def tearDown(self):
+        self.page_patch.stop()
+        shutil.rmtree(self.room_dir, ignore_errors=True)
+
+    def _assert_same(self, keywords, exclude, include_system):
+        index = KeywordIndex(self.room_dir)
+        actual = [(b["source"], b["content"]) for b in index.search_blocks(keywords, exclude, include_system)]
+        expected = legacy_search(self.room_dir, keywords, exclude, include_system)
+        self.assertEqual(actual, expected)
+        return actual
+
+    def test_matches_legacy_scan(self):
+        for include_system in (True, False):
+            self.assertTrue(self._assert_same(["猫"], 0, include_system))
+            self._assert_same(["python", "星空"], 4, include_system)
+            self._assert_same(["存在しない語"], 0, include_system)
+
+    def test_incremental_append_and_rewrite(self):
+        self._assert_same(["りんご"], 2, True)
+        with open(self.room_dir / "log.txt", "a", encoding="utf-8") as f:
+            f.write("## USER:user\n追記したりんごの話\n\n## AGENT:ルシアン\n返事\n\n")
+        self.assertIn("追記したりんごの話", "".join(c for _, c in self._assert_same(["りんご"], 1, True)))
+
+        # アーカイブでログが縮んだ場合も追従する
+        with open(self.room_dir / "log.txt", "w", encoding="utf-8") as f:
+            f.write("## USER:user\n新しいりんご\n\n## AGENT:ルシアン\n返事\n\n")
+        self._assert_same(["りんご"], 0, False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+"""
+FAISSインデックスの省メモリ読み込み（lazy_docstore / RAGManager._safe_load_index）のテスト
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_community.docstore.document import Document
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+import config_manager
+import constants
+import lazy_docstore
+import rag_manager
+
+
+class FakeEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), float(sum(map(ord, text)) % 101), 1.0]
+
+
+class TestLazyDocstore(unittest.TestCase):
+
+    def setUp(self):
+        self.rooms_dir = tempfile.mkdtemp()
+        self.patches = [
+            mock.patch.object(constants, "ROOMS_DIR", self.rooms_dir),
+            mock.patch.object(config_manager, "get_effective_settings", return_value={"embedding_mode": "local"}),
+            mock.patch.object(config_manager, "get_internal_model_settings", return_value={"embedding_model": "fake"}),
+            mock.patch.object(config_manager, "get_key_name_by_value", return_value="Unknown"),
+        ]
+        for p in self.patches:
+            p.start()
+        os.makedirs(os.path.join(self.rooms_dir, "room"))
+        rag_manager.RAGManager._index_cache.clear()
+        self.manager = rag_manager.RAGManager("room", "")
+        self.manager.embeddings = FakeEmbeddings()
+        self.docs = [
+            Document(page_content=f"記憶その{i}: " + "あ" * i, metadata={"source": "test", "arousal": i / 10})
+            for i in range(8)
+        ]
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        rag_manager.RAGManager._index_cache.clear()
+        shutil.rmtree(self.rooms_dir, ignore_errors=True)
+
+    def _save(self, docs):
+        db = FAISS.from_documents(docs, self.manager.embeddings)
+        self.manager._safe_save_index(db, self.manager.static_index_path)
+        return db
+
+    @unittest.skipUnless(lazy_docstore.MMAP_SUPPORTED, "メモリマップ読み込みは Windows では無効")
+    def test_search_uses_lazy_docstore(self):
+        original = self._save(self.docs)
+        db = self.manager._safe_load_index(self.manager.static_index_path)
+        self.assertIsInstance(db.docstore, lazy_docstore.SQLiteDocstore)
+        with self.assertRaises(lazy_docstore.ReadOnlyDocstoreError):
+            db.docstore.delete(["id"])
+
+        query = "記憶その3: あああ"
+        expected = original.similarity_search_with_score(query, k=3)
+        actual = db.similarity_search_with_score(query, k=3)
+        self.assertEqual([(d.page_content, d.metadata) for d, _ in actual],
+                         [(d.page_content, d.metadata) for d, _ in expected])
+
+        # 同じファイルならキャッシュを返し、保存し直せば読み直す
+        self.assertIs(self.manager._safe_load_index(self.manager.static_index_path), db)
+        self._save(self.docs[:2])
+        reloaded = self.manager._safe_load_index(self.manager.static_index_path)
+        self.assertIsNot(reloaded, db)
+        self.assertEqual(reloaded.index.ntotal, 2)
+        # 入れ替え前に読み込んだインデックスも引き続き検索できる
+        self.assertEqual(len(db.similarity_search_with_score(query, k=3)), 3)
+
+    def test_for_update_is_writable(self):
+        self._save(self.docs)
+        db = self.manager._safe_load_index(self.manager.static_index_path, for_update=True)
+        db.add_documents([Document(page_content="追加した記憶です", metadata={})])
+        self.assertEqual(db.index.ntotal, len(self.docs) + 1)
+        self.assertNotIn(str(self.manager.static_index_path.resolve()), rag_manager.RAGManager._index_cache)
+
+    def test_legacy_index_without_sqlite(self):
+        self._save(self.docs)
+        os.remove(self.manager.static_index_path / lazy_docstore.DOCSTORE_FILE)
+        db = self.manager._safe_load_index(self.manager.static_index_path)
+        self.assertEqual(len(db.similarity_search_with_score("記憶その1: あ", k=2)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+"""
+会話ログのアーカイブ（log_archiver）のテスト
+"""
+import os
+import sys
+import glob
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import constants
+import config_manager
+import log_archiver
+import utils
+
+
+class TestLogArchiver(unittest.TestCase):
+
+    def setUp(self):
+        self.rooms_dir = tempfile.mkdtemp()
+        self.patch = mock.patch.object(constants, "ROOMS_DIR", self.rooms_dir)
+        self.patch.start()
+        self.room_dir = os.path.join(self.rooms_dir, "room")
+        os.makedirs(self.room_dir)
+        self.log_path = os.path.join(self.room_dir, "log.txt")
+        self.messages = [f"## USER:user\nメッセージ{i:02d}の本文です。\n\n" for i in range(20)]
+        with open(self.log_path, "w", encoding="utf-8") as f:
+            f.write("".join(self.messages))
+
+    def tearDown(self):
+        self.patch.stop()
+        log_archiver.wait_idle(5)
+        shutil.rmtree(self.rooms_dir, ignore_errors=True)
+
+    def _archives(self):
+        return sorted(glob.glob(os.path.join(self.room_dir, "log_archives", "*.txt")))
+
+    def _read(self, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def test_find_split_offset(self):
+        """keep_bytes 以上を残せる最も新しいヘッダーで分割し、分割できなければ古い方1/3をアーカイブする"""
+        offsets = [0, 100, 200, 300]
+        self.assertEqual(log_archiver.find_split_offset(offsets, 400, 150), 200)
+        self.assertEqual(log_archiver.find_split_offset(offsets, 400, 1000), 0)
+        self.assertEqual(log_archiver.find_split_offset(list(range(0, 1200, 100)), 1200, 5000), 400)
+        self.assertEqual(log_archiver.find_split_offset([], 400, 10), 0)
+
+    def test_archive_splits_at_header(self):
+        """古い部分はアーカイブへ、新しい部分はヘッダーの位置から log.txt に残る"""
+        keep = len("".join(self.messages[15:]).encode("utf-8"))
+        message = log_archiver.archive(self.log_path, "room", 10, keep)
+        self.assertIn("アーカイブしました", message)
+        self.assertEqual(self._read(self.log_path), "".join(self.messages[15:]))
+        self.assertEqual(self._read(self._archives()[0]), "".join(self.messages[:15]))
+        self.assertEqual(len(utils.load_chat_log(self.log_path)), 5)
+        self.assertEqual(os.listdir(self.room_dir).count("log.txt.archiving.tmp"), 0)
+
+    def test_messages_appended_during_archive_are_kept(self):
+        """コピー中に追記されたメッセージも、入れ替え後のログに残る"""
+        original_copy = log_archiver._copy_range
+        calls = []
+
+        def copy_and_append(src, dst, start, end, mode="wb"):
+            original_copy(src, dst, start, end, mode)
+            calls.append(dst)
+            if len(calls) == 2:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write("## AGENT:room\n追記されたメッセージ\n\n")
+
+        with mock.patch.object(log_archiver, "_copy_range", side_effect=copy_and_append):
+            self.assertIsNotNone(log_archiver.archive(self.log_path, "room", 10, 10))
+        log = self._read(self.log_path)
+        self.assertTrue(log.startswith("## USER:user\nメッセージ19"))
+        self.assertTrue(log.endswith("## AGENT:room\n追記されたメッセージ\n\n"))
+
+    def test_rewritten_log_is_not_replaced(self):
+        """コピー中にログが書き換えられた場合は入れ替えを中止する"""
+        original_copy = log_archiver._copy_range
+
+        def copy_and_rewrite(src, dst, start, end, mode="wb"):
+            original_copy(src, dst, start, end, mode)
+            # メッセージの削除などで、同じファイルが上書きされた場合
+            with open(self.log_path, "w", encoding="utf-8") as f:
+                f.write("".join(self.messages[1:]))
+
+        with mock.patch.object(log_archiver, "_copy_range", side_effect=copy_and_rewrite):
+            self.assertIsNone(log_archiver.archive(self.log_path, "room", 10, 10))
+        self.assertEqual(self._archives(), [])
+        self.assertEqual(self._read(self.log_path), "".join(self.messages[1:]))
+
+    def test_save_message_schedules_archive_in_background(self):
+        """メッセージの保存はアーカイブを待たずに戻り、アーカイブはバックグラウンドで行われる"""
+        with mock.patch.dict(config_manager.CONFIG_GLOBAL, {"log_archive_threshold_mb": 0.0001, "log_keep_size_mb": 0}), \
+                mock.patch.object(log_archiver, "archive", wraps=log_archiver.archive) as archive:
+            self.assertIsNone(utils.save_message_to_log(self.log_path, "## USER:user", "新しいメッセージ"))
+            self.assertTrue(log_archiver.wait_idle(5))
+            archive.assert_called_once()
+        self.assertEqual(len(self._archives()), 1)
+        self.assertEqual(utils.load_chat_log(self.log_path)[-1]["content"], "新しいメッセージ")
+
+
+if __name__ == '__main__':
+    unittest.main()
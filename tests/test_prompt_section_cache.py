@@ -0,0 +1,83 @@
+"""
+システムプロンプトのセクション単位キャッシュ（prompt_section_cache）のテスト
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import prompt_section_cache
+
+
+class TestPromptSectionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "core_memory.txt")
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("最初の内容")
+        self.builds = 0
+        prompt_section_cache.invalidate()
+
+    def tearDown(self):
+        prompt_section_cache.invalidate()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _build(self):
+        self.builds += 1
+        with open(self.path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def _get(self, stats=None, extra_key=None):
+        return prompt_section_cache.get_section("room", "core_memory", [self.path], self._build,
+                                                stats=stats, extra_key=extra_key)
+
+    def test_reuses_until_file_changes(self):
+        """ファイルが変わらない間は再構築せず、変わったら作り直す"""
+        stats = prompt_section_cache.SectionStats()
+        self.assertEqual(self._get(stats), "最初の内容")
+        self.assertEqual(self._get(stats), "最初の内容")
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(stats.misses, ["core_memory"])
+        self.assertEqual(stats.hits, ["core_memory"])
+
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("書き換えた内容です")
+        self.assertEqual(self._get(), "書き換えた内容です")
+        self.assertEqual(self.builds, 2)
+
+    def test_extra_key_and_missing_file(self):
+        """追加キーが変わった場合と、ファイルが作られた・消えた場合も作り直す"""
+        self._get(extra_key="書斎")
+        self._get(extra_key="書斎")
+        self._get(extra_key="庭")
+        self.assertEqual(self.builds, 2)
+
+        missing = os.path.join(self.temp_dir, "notepad.md")
+        build = lambda: os.path.exists(missing)
+        self.assertFalse(prompt_section_cache.get_section("room", "notepad", [missing], build))
+        with open(missing, "w", encoding="utf-8") as f:
+            f.write("メモ")
+        self.assertTrue(prompt_section_cache.get_section("room", "notepad", [missing], build))
+
+    def test_directory_source_and_errors(self):
+        """ディレクトリはエントリの追加で作り直し、ビルダーの例外はキャッシュしない"""
+        entities_dir = os.path.join(self.temp_dir, "entities")
+        os.makedirs(entities_dir)
+        build = lambda: sorted(os.listdir(entities_dir))
+        self.assertEqual(prompt_section_cache.get_section("room", "entity_list", [entities_dir], build), [])
+        open(os.path.join(entities_dir, "猫.md"), "w").close()
+        self.assertEqual(prompt_section_cache.get_section("room", "entity_list", [entities_dir], build), ["猫.md"])
+
+        def failing():
+            raise IOError("読み込み失敗")
+        with self.assertRaises(IOError):
+            prompt_section_cache.get_section("room", "research_notes", [self.path], failing)
+        self.assertEqual(prompt_section_cache.get_section("room", "research_notes", [self.path], self._build), "最初の内容")
+
+
+if __name__ == '__main__':
+    unittest.main()
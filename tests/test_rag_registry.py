@@ -0,0 +1,155 @@
+"""
+検索用 RAGManager の共有（rag_manager.get_manager）と、インデックスキャッシュのサイズ上限のテスト
+"""
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_community.docstore.document import Document
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+import config_manager
+import constants
+import rag_manager
+
+
+class FakeEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), float(sum(map(ord, text)) % 101), 1.0]
+
+
+class TestIndexCache(unittest.TestCase):
+
+    def test_lru_is_bounded_by_bytes(self):
+        """合計サイズが上限を超えたら、最も長く使われていないものから破棄する"""
+        cache = rag_manager._IndexCache()
+        with mock.patch.object(constants, "RAG_INDEX_CACHE_MAX_BYTES", 250):
+            cache.put("a", "db_a", (1,), 100)
+            cache.put("b", "db_b", (1,), 100)
+            self.assertEqual(cache.get("a", (1,)), "db_a")
+            cache.put("c", "db_c", (1,), 100)
+            self.assertNotIn("b", cache)
+            self.assertEqual([path for path, _ in cache.items()], ["a", "c"])
+            self.assertEqual(cache.total_bytes(), 200)
+            # 上限より大きくても、直近の1件は保持する
+            cache.put("d", "db_d", (1,), 1000)
+            self.assertEqual([path for path, _ in cache.items()], ["d"])
+        self.assertIsNone(cache.get("d", (2,)))
+
+
+class TestRagRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.rooms_dir = tempfile.mkdtemp()
+        self.settings = {"embedding_mode": "local"}
+        self.patches = [
+            mock.patch.object(constants, "ROOMS_DIR", self.rooms_dir),
+            mock.patch.object(config_manager, "get_effective_settings", side_effect=lambda room: dict(self.settings)),
+            mock.patch.object(config_manager, "get_internal_model_settings", return_value={"embedding_model": "fake"}),
+            mock.patch.object(config_manager, "get_key_name_by_value", return_value="Unknown"),
+        ]
+        for p in self.patches:
+            p.start()
+        rag_manager.forget_managers()
+        rag_manager.RAGManager._index_cache.clear()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        rag_manager.forget_managers()
+        rag_manager.RAGManager._index_cache.clear()
+        shutil.rmtree(self.rooms_dir, ignore_errors=True)
+
+    def test_one_instance_per_room_and_model(self):
+        """同じルーム・モデルでは同じインスタンスを返し、モデルが変われば別のインスタンスにする"""
+        first = rag_manager.get_manager("room1", "key-1")
+        self.assertIs(rag_manager.get_manager("room1", "key-1"), first)
+        self.assertIsNot(rag_manager.get_manager("room2", "key-1"), first)
+
+        self.settings["embedding_mode"] = "api"
+        api_manager = rag_manager.get_manager("room1", "key-1")
+        self.assertIsNot(api_manager, first)
+        self.assertEqual(api_manager.embedding_mode, "api")
+
+    def test_api_key_change_keeps_local_embeddings(self):
+        """ローカルモードではキーが変わってもエンベディングを保持する"""
+        local = rag_manager.get_manager("room1", "key-1")
+        local.embeddings = FakeEmbeddings()
+        self.assertIs(rag_manager.get_manager("room1", "key-2"), local)
+        self.assertIsNotNone(local.embeddings)
+        self.assertEqual(local.api_key, "key-2")
+
+    def test_api_key_change_keeps_shared_embeddings(self):
+        """APIモードでキーが変わっても、検索中のスレッドがいるためエンベディングは作り直さず、使うキーだけを替える"""
+        self.settings["embedding_mode"] = "api"
+        manager = rag_manager.get_manager("room1", "key-1")
+        embeddings = manager._get_embeddings()
+        self.assertEqual(embeddings.base.api_key, "key-1")
+        self.assertIs(rag_manager.get_manager("room1", "key-2"), manager)
+        self.assertIs(manager._get_embeddings(), embeddings)
+        self.assertEqual(embeddings.base.api_key, "key-2")
+
+    def test_forget_managers_on_room_delete(self):
+        """ルームを忘れると、共有インスタンスとそのルームのキャッシュ済みインデックスを手放す"""
+        room1 = rag_manager.get_manager("room1", "key-1")
+        room2 = rag_manager.get_manager("room2", "key-1")
+        rag_manager.RAGManager._index_cache.put(str(room1.static_index_path.resolve()), "db1", (1,), 10)
+        rag_manager.RAGManager._index_cache.put(str(room2.static_index_path.resolve()), "db2", (1,), 10)
+        rag_manager.forget_managers("room1")
+        self.assertIsNot(rag_manager.get_manager("room1", "key-1"), room1)
+        self.assertIs(rag_manager.get_manager("room2", "key-1"), room2)
+        self.assertEqual([path for path, _ in rag_manager.RAGManager._index_cache.items()],
+                         [str(room2.static_index_path.resolve())])
+
+    def test_concurrent_callers_share_one_instance(self):
+        """複数スレッドから同時に取得しても、インスタンスは1つだけになる"""
+        results = []
+        barrier = threading.Barrier(8)
+
+        def worker():
+            barrier.wait()
+            results.append(rag_manager.get_manager("room1", "key-1"))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(m) for m in results}), 1)
+
+    def test_loaded_indices_are_evicted_across_rooms(self):
+        """複数ルームのインデックスを読み込んでも、キャッシュは上限のサイズに収まる"""
+        managers = []
+        for room in ("room1", "room2"):
+            os.makedirs(os.path.join(self.rooms_dir, room), exist_ok=True)
+            manager = rag_manager.get_manager(room, "")
+            manager.embeddings = FakeEmbeddings()
+            docs = [Document(page_content=f"{room}の記憶{i}", metadata={"arousal": 0.5}) for i in range(20)]
+            manager._safe_save_index(FAISS.from_documents(docs, manager.embeddings), manager.static_index_path)
+            managers.append(manager)
+
+        first_path = str(managers[0].static_index_path.resolve())
+        second_path = str(managers[1].static_index_path.resolve())
+        one_index = (managers[0].static_index_path / "index.faiss").stat().st_size
+        with mock.patch.object(constants, "RAG_INDEX_CACHE_MAX_BYTES", one_index * 3 // 2):
+            self.assertTrue(managers[0].search("room1の記憶3", k=3, score_threshold=0.0, enable_intent_aware=False))
+            self.assertIn(first_path, rag_manager.RAGManager._index_cache)
+            self.assertTrue(managers[1].search("room2の記憶3", k=3, score_threshold=0.0, enable_intent_aware=False))
+            self.assertIn(second_path, rag_manager.RAGManager._index_cache)
+            self.assertNotIn(first_path, rag_manager.RAGManager._index_cache)
+            # 破棄されたインデックスは次の検索で読み直される
+            self.assertTrue(managers[0].search("room1の記憶3", k=3, score_threshold=0.0, enable_intent_aware=False))
+
+
+if __name__ == '__main__':
+    unittest.main()
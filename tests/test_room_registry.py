@@ -0,0 +1,85 @@
+"""
+ルームレジストリ（room_manager のパス・設定キャッシュ）のテスト
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import constants
+import room_manager
+
+
+class TestRoomRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.rooms_dir = tempfile.mkdtemp()
+        self.patch = mock.patch.object(constants, "ROOMS_DIR", self.rooms_dir)
+        self.patch.start()
+        room_manager.invalidate_room_cache()
+
+    def tearDown(self):
+        self.patch.stop()
+        room_manager.invalidate_room_cache()
+        shutil.rmtree(self.rooms_dir, ignore_errors=True)
+
+    def test_layout_is_validated_once(self):
+        """2回目以降は ensure_room_files を呼ばず、ルーム直下が変わったら検証し直す"""
+        with mock.patch.object(room_manager, "ensure_room_files", wraps=room_manager.ensure_room_files) as ensure:
+            first = room_manager.get_room_files_paths("room")
+            self.assertEqual(room_manager.get_room_files_paths("room"), first)
+            self.assertIsNotNone(room_manager.get_world_settings_path("room"))
+            self.assertEqual(ensure.call_count, 1)
+
+            log_file = first[0]
+            os.remove(log_file)
+            room_manager.get_room_files_paths("room")
+            self.assertEqual(ensure.call_count, 2)
+            self.assertTrue(os.path.exists(log_file))
+
+    def test_deleted_nested_files_are_recreated(self):
+        """サブディレクトリ内の必須ファイルが削除された場合も、次のアクセスで作り直す"""
+        first = room_manager.get_room_files_paths("room")
+        world_settings = room_manager.get_world_settings_path("room")
+        memory_main = first[3]
+        backups_logs = os.path.join(self.rooms_dir, "room", "backups", "logs")
+        for path in (world_settings, memory_main):
+            os.remove(path)
+            room_manager.get_room_files_paths("room")
+            self.assertTrue(os.path.exists(path))
+        os.rmdir(backups_logs)
+        room_manager.get_room_files_paths("room")
+        self.assertTrue(os.path.isdir(backups_logs))
+
+    def test_profile_image_path_follows_file(self):
+        """プロフィール画像の有無がパスに反映される"""
+        self.assertIsNone(room_manager.get_room_files_paths("room")[2])
+        image_path = os.path.join(self.rooms_dir, "room", constants.PROFILE_IMAGE_FILENAME)
+        open(image_path, "wb").close()
+        self.assertEqual(room_manager.get_room_files_paths("room")[2], image_path)
+
+    def test_invalid_names_are_rejected(self):
+        self.assertEqual(room_manager.get_room_files_paths("../room"), (None,) * 6)
+        self.assertIsNone(room_manager.get_world_settings_path(""))
+
+    def test_room_config_is_parsed_once_and_copied(self):
+        """room_config.json は変更されるまで再解析せず、返した辞書を変更してもキャッシュに影響しない"""
+        room_manager.get_room_files_paths("room")
+        with mock.patch.object(room_manager.json, "loads", wraps=json.loads) as loads:
+            self.assertEqual(room_manager.get_room_list_for_ui(), [("room", "room")])
+            config = room_manager.get_room_config("room")
+            config["room_name"] = "書き換え"
+            self.assertEqual(room_manager.get_room_config("room")["room_name"], "room")
+            self.assertEqual(loads.call_count, 1)
+
+        self.assertTrue(room_manager.update_room_config("room", {"room_name": "新しい名前"}))
+        self.assertEqual(room_manager.get_room_list_for_ui(), [("新しい名前", "room")])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+"""
+情景画像の目録（utils.find_scenery_image）のテスト
+"""
+import os
+import sys
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import constants
+import utils
+
+
+class TestSceneryCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.rooms_dir = tempfile.mkdtemp()
+        self.patch = mock.patch.object(constants, "ROOMS_DIR", self.rooms_dir)
+        self.patch.start()
+        self.image_dir = os.path.join(self.rooms_dir, "room", "spaces", "images")
+        os.makedirs(self.image_dir)
+        utils._scenery_catalogs.clear()
+
+    def tearDown(self):
+        self.patch.stop()
+        utils._scenery_catalogs.clear()
+        shutil.rmtree(self.rooms_dir, ignore_errors=True)
+
+    def _touch(self, *names):
+        for name in names:
+            open(os.path.join(self.image_dir, name), "wb").close()
+
+    def _find(self, location="書斎", season="winter", time_of_day="afternoon"):
+        path = utils.find_scenery_image("room", location, season_en=season, time_of_day_en=time_of_day)
+        return os.path.basename(path) if path else None
+
+    def test_fallback_order(self):
+        """季節・時間帯のフォールバック順序は従来どおり"""
+        self._touch("書斎.png", "書斎_winter.png", "書斎_night.png", "書斎_summer_morning.png", "書斎_winter_midnight.png")
+        self.assertEqual(self._find(), "書斎_summer_morning.png")
+        self.assertEqual(self._find(time_of_day="evening"), "書斎_night.png")
+        self.assertEqual(self._find(time_of_day="midnight"), "書斎_winter_midnight.png")
+        self.assertEqual(self._find(season="spring", time_of_day="daytime"), "書斎.png")
+        self.assertIsNone(self._find(location="居間"))
+
+    def test_prefix_and_desperation_fallbacks(self):
+        """接頭辞一致と、時間帯名を含まない画像・最終手段の選択"""
+        self._touch("書斎_winter_noon_2.png", "居間_winter_night.png", "台所_1.png")
+        self.assertEqual(self._find(), "書斎_winter_noon_2.png")
+        self.assertEqual(self._find(location="台所"), "台所_1.png")
+        self.assertEqual(self._find(location="居間"), "居間_winter_night.png")
+
+    def test_results_are_cached_until_folder_changes(self):
+        """フォルダが変わるまではファイルシステムを調べず、画像が追加されたら検索し直す"""
+        self._touch("書斎.png")
+        self.assertEqual(self._find(), "書斎.png")
+        with mock.patch.object(utils.os, "listdir") as listdir, \
+                mock.patch.object(utils.os.path, "exists") as exists:
+            self.assertEqual(self._find(), "書斎.png")
+            listdir.assert_not_called()
+            exists.assert_not_called()
+
+        time.sleep(0.01)
+        self._touch("書斎_winter_afternoon.png")
+        self.assertEqual(self._find(), "書斎_winter_afternoon.png")
+
+    def test_missing_folder(self):
+        shutil.rmtree(self.image_dir)
+        self.assertIsNone(self._find())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+"""
+睡眠時記憶整理のジョブ実行（sleep_consolidation）のテスト
+"""
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import constants
+import json_state_store
+import sleep_consolidation
+
+
+class FakeClock:
+    """sleep で進む仮想時計"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_burst_then_rate_limited(self):
+        """最初は capacity 個まで即座に取得でき、その後は1分あたり rate 個に制限される"""
+        clock = FakeClock()
+        bucket = sleep_consolidation.TokenBucket(4, 2, clock=clock, sleep=clock.sleep)
+        bucket.acquire()
+        bucket.acquire()
+        self.assertEqual(clock.now, 0.0)
+        bucket.acquire()
+        self.assertAlmostEqual(clock.now, 15.0)
+
+
+class TestSleepConsolidation(unittest.TestCase):
+
+    def setUp(self):
+        self.rooms_dir = tempfile.mkdtemp()
+        self.patches = [
+            mock.patch.object(constants, "ROOMS_DIR", self.rooms_dir),
+            mock.patch.object(constants, "SLEEP_CONSOLIDATION_STAGE_BURST", 100),
+        ]
+        for patch in self.patches:
+            patch.start()
+        sleep_consolidation._limiters.clear()
+        json_state_store.forget()
+        self.calls = []
+        self.calls_lock = threading.Lock()
+        self.settings = {"sleep_consolidation": {"update_current_log_index": True}}
+
+    def tearDown(self):
+        self.assertTrue(sleep_consolidation.wait_idle(timeout=5))
+        for patch in reversed(self.patches):
+            patch.stop()
+        sleep_consolidation._limiters.clear()
+        json_state_store.forget()
+        shutil.rmtree(self.rooms_dir, ignore_errors=True)
+
+    def _stages(self, failing=(), barrier=None):
+        def make(stage):
+            def run(job):
+                with self.calls_lock:
+                    self.calls.append((job.room_folder, stage))
+                if barrier is not None and stage == "dream":
+                    barrier.wait(timeout=5)
+                if stage in failing:
+                    raise RuntimeError("API error")
+                return f"{stage} ok"
+            return run
+        return mock.patch.dict(sleep_consolidation._STAGE_FUNCTIONS,
+                               {stage: make(stage) for stage in sleep_consolidation.STAGE_LABELS})
+
+    def _job(self, room, on_complete=None):
+        return sleep_consolidation.ConsolidationJob(room, "key", "secret", self.settings, on_complete=on_complete)
+
+    def test_enabled_stages_follow_settings(self):
+        self.assertEqual(sleep_consolidation.enabled_stages({}), ["dream", "episodic_memory", "memory_index"])
+        self.assertEqual(sleep_consolidation.enabled_stages(self.settings),
+                         ["dream", "episodic_memory", "memory_index", "current_log_index"])
+
+    def test_failed_stage_is_resumed_from_checkpoint(self):
+        """失敗したステージだけを次回に再試行し、上限回数に達したら諦める"""
+        with self._stages(failing={"memory_index"}):
+            sleep_consolidation.run_job(self._job("room"))
+            self.assertEqual([s for _, s in self.calls],
+                             ["dream", "episodic_memory", "memory_index", "current_log_index"])
+            self.assertTrue(sleep_consolidation.needs_consolidation("room", self.settings, has_dreamed_today=True))
+
+            self.calls.clear()
+            sleep_consolidation.run_job(self._job("room"))
+            self.assertEqual(self.calls, [("room", "memory_index")])
+
+        checkpoint = sleep_consolidation.load_checkpoint("room")
+        self.assertEqual(checkpoint["stages"]["memory_index"]["attempts"], constants.SLEEP_CONSOLIDATION_MAX_ATTEMPTS)
+        self.assertFalse(sleep_consolidation.needs_consolidation("room", self.settings, has_dreamed_today=True))
+
+    def test_without_checkpoint_uses_dream_history(self):
+        """今日の記録が無い場合は、今日すでに夢を見たかで判断する"""
+        self.assertTrue(sleep_consolidation.needs_consolidation("room", {}, has_dreamed_today=False))
+        self.assertFalse(sleep_consolidation.needs_consolidation("room", {}, has_dreamed_today=True))
+
+    def test_rooms_run_concurrently_and_jobs_are_deduplicated(self):
+        """複数ルームが並行して整理され、同じルームのジョブは重複しない"""
+        completed = []
+        barrier = threading.Barrier(2)
+        with mock.patch.object(constants, "SLEEP_CONSOLIDATION_WORKERS", 2), self._stages(barrier=barrier):
+            on_complete_a = lambda: completed.append("room_a")
+            self.assertTrue(sleep_consolidation.submit(self._job("room_a", on_complete_a)))
+            self.assertTrue(sleep_consolidation.submit(self._job("room_b", lambda: completed.append("room_b"))))
+            self.assertTrue(sleep_consolidation.is_busy("room_a"))
+            # 待機中・実行中のルームは新たに待ち行列に加えない
+            self.assertFalse(sleep_consolidation.submit(self._job("room_a", on_complete_a)))
+            self.assertTrue(sleep_consolidation.wait_idle(timeout=5))
+
+        # 両ルームの夢想が同時に進まなければ Barrier がタイムアウトし、後続のステージは失敗する
+        self.assertFalse(barrier.broken)
+        self.assertEqual(sorted(completed), ["room_a", "room_b"])
+        self.assertEqual(len(self.calls), 8)
+        self.assertFalse(sleep_consolidation.is_busy("room_a"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+"""
+入力トークン数見積もりのキャッシュ（token_counter）のテスト
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+import constants
+import prompt_section_cache
+import token_counter
+
+
+class FakeEncoding:
+    """2文字を1トークンとみなすエンコーダ（エンコードの回数を数える）"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, text):
+        self.calls += 1
+        return [text[i:i + 2] for i in range(0, len(text), 2)]
+
+
+class TestTokenCounter(unittest.TestCase):
+
+    def setUp(self):
+        self.rooms_dir = tempfile.mkdtemp()
+        self.patch = mock.patch.object(constants, "ROOMS_DIR", self.rooms_dir)
+        self.patch.start()
+        self.room_dir = os.path.join(self.rooms_dir, "room")
+        os.makedirs(os.path.join(self.room_dir, "memory", "episodic"))
+        self.log_path = os.path.join(self.room_dir, "log.txt")
+        with open(self.log_path, "w", encoding="utf-8") as f:
+            f.write("## USER:user\nこんにちは\n")
+        prompt_section_cache.invalidate()
+        self.builds = 0
+
+    def tearDown(self):
+        self.patch.stop()
+        prompt_section_cache.invalidate()
+        token_counter._cache.clear()
+        shutil.rmtree(self.rooms_dir, ignore_errors=True)
+
+    def _build(self):
+        self.builds += 1
+        return 1000 + self.builds, 400
+
+    def test_counts_are_cached_per_message(self):
+        """メッセージごとの合計が従来の計算と一致し、同じ内容は再エンコードしない"""
+        encoding = FakeEncoding()
+        messages = [
+            SystemMessage(content="あなたはルシアンです。"),
+            HumanMessage(content=[{"type": "text", "text": "画像を見て"}, {"type": "image", "image": b""},
+                                  {"type": "text", "text": "どう思う？"}]),
+            AIMessage(content="とても綺麗な景色ですね。"),
+            AIMessage(content=""),
+        ]
+        self.assertEqual(token_counter.message_text(messages[1]), "画像を見て どう思う？ ")
+        expected = sum(len(FakeEncoding().encode(token_counter.message_text(m))) for m in messages)
+        with mock.patch.object(token_counter, "_encoding", return_value=encoding):
+            token_counter._cache.clear()
+            self.assertEqual(token_counter.count_messages(messages), expected)
+            self.assertEqual(encoding.calls, 3)
+            # 履歴に1件増えても、エンコードするのは増えた分だけ
+            messages.append(HumanMessage(content="ありがとう"))
+            self.assertEqual(token_counter.count_messages(messages), expected + 3)
+            self.assertEqual(encoding.calls, 4)
+
+    def test_base_estimate_is_reused_until_sources_change(self):
+        """入力欄以外の見積もりは、ファイルと設定が変わるまで再計算しない"""
+        key = (("api_history_limit", "'today'"),)
+        self.assertEqual(token_counter.get_base_estimate("room", key, self._build), (1001, 400))
+        self.assertEqual(token_counter.get_base_estimate("room", key, self._build), (1001, 400))
+        self.assertEqual(self.builds, 1)
+
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write("## AGENT:room\nやあ\n")
+        self.assertEqual(token_counter.get_base_estimate("room", key, self._build), (1002, 400))
+
+        other = (("api_history_limit", "'all'"),)
+        self.assertEqual(token_counter.get_base_estimate("room", other, self._build), (1003, 400))
+
+    def test_episodic_journal_append_invalidates(self):
+        """エピソード記憶の月次ジャーナルへの追記でも再計算する"""
+        journal = os.path.join(self.room_dir, "memory", "episodic", "2026-10.jsonl")
+        with open(journal, "w", encoding="utf-8") as f:
+            f.write("{}\n")
+        token_counter.get_base_estimate("room", (), self._build)
+        with open(journal, "a", encoding="utf-8") as f:
+            f.write('{"date": "2026-10-16"}\n')
+        token_counter.get_base_estimate("room", (), self._build)
+        self.assertEqual(self.builds, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+"""
+音声合成のキャッシュと文単位の並行生成（audio_manager）のテスト
+"""
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+import wave
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import constants
+import audio_manager
+
+
+class FakeModels:
+    """プロンプトの文字数ぶんの PCM を返し、呼び出されたプロンプトを記録する"""
+
+    def __init__(self):
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def generate_content(self, model, contents, config):
+        prompt = contents[0].parts[0].text
+        with self._lock:
+            self.prompts.append(prompt)
+        part = SimpleNamespace(inline_data=SimpleNamespace(data=b"\x01\x00" * len(prompt)))
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+
+class TestTtsCache(unittest.TestCase):
+
+    def setUp(self):
+        self.rooms_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.rooms_dir, "room", "audio_cache")
+        self.models = FakeModels()
+        self.patches = [
+            mock.patch.object(constants, "ROOMS_DIR", self.rooms_dir),
+            mock.patch.object(audio_manager.client_pool, "get_genai_client",
+                              return_value=SimpleNamespace(models=self.models)),
+            mock.patch.object(audio_manager, "_audio_format", return_value="wav"),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in reversed(self.patches):
+            p.stop()
+        shutil.rmtree(self.rooms_dir, ignore_errors=True)
+
+    def test_split_into_segments(self):
+        """文の区切りでまとめ、上限を超えたら次のセグメントにする"""
+        text = "おはよう。今日はいい天気だね！散歩に行こうか？"
+        self.assertEqual(audio_manager.split_into_segments(text, max_chars=100), [text])
+        self.assertEqual(audio_manager.split_into_segments(text, max_chars=12),
+                         ["おはよう。", "今日はいい天気だね！", "散歩に行こうか？"])
+        self.assertEqual(audio_manager.split_into_segments("  \n"), [])
+
+    def test_same_request_is_served_from_cache(self):
+        """同じテキスト・声・スタイルは再生成せず、声やスタイルが違えば生成し直す"""
+        path = audio_manager.generate_audio_from_text("こんにちは。", "key", "iapetus", "room", "やさしく")
+        self.assertTrue(path.startswith(self.cache_dir))
+        self.assertEqual(self.models.prompts, ["やさしく: こんにちは。"])
+        self.assertEqual(audio_manager.generate_audio_from_text("こんにちは。", "key", "iapetus", "room", "やさしく"), path)
+        self.assertEqual(len(self.models.prompts), 1)
+
+        self.assertNotEqual(audio_manager.generate_audio_from_text("こんにちは。", "key", "kore", "room", "やさしく"), path)
+        self.assertNotEqual(audio_manager.generate_audio_from_text("こんにちは。", "key", "iapetus", "room", ""), path)
+        self.assertEqual(len(self.models.prompts), 3)
+
+        # ルームが違えば、そのルームのフォルダに保存する
+        other = audio_manager.generate_audio_from_text("こんにちは。", "key", "iapetus", "other", "やさしく")
+        self.assertTrue(other.startswith(os.path.join(self.rooms_dir, "other", "audio_cache")))
+
+    def test_key_locks_do_not_grow(self):
+        """音声ごとのロックは固定数で、生成した音声の種類が増えても増えない"""
+        for i in range(10):
+            audio_manager.generate_audio_from_text(f"テキスト{i}。", "key", "iapetus", "room")
+        self.assertEqual(len(audio_manager._key_locks), audio_manager._KEY_LOCK_STRIPES)
+        key = os.path.join(self.cache_dir, "abc")
+        self.assertIs(audio_manager._key_lock(key), audio_manager._key_lock(key))
+
+    def test_segments_are_joined_in_order(self):
+        """セグメントごとに生成した音声を元の順に結合する"""
+        with mock.patch.object(constants, "TTS_SEGMENT_CHARS", 5):
+            path = audio_manager.generate_audio_from_text("一二三。四五。六。", "key", "iapetus", "room")
+        self.assertEqual(sorted(self.models.prompts), sorted(["一二三。", "四五。六。"]))
+        with wave.open(path, "rb") as wf:
+            self.assertEqual(wf.getframerate(), 24000)
+            self.assertEqual(wf.getnframes(), 9)
+
+    def test_cache_is_size_bounded(self):
+        """上限を超えたら、最後に使われた時刻が古いものから削除する"""
+        os.makedirs(self.cache_dir)
+        # 以前の形式で保存された音声は、上限の計算にも削除にも含めない
+        legacy = os.path.join(self.cache_dir, "room_20250101_120000.wav")
+        with open(legacy, "wb") as f:
+            f.write(b"\0" * 10000)
+        os.utime(legacy, (0, 0))
+        first = audio_manager.generate_audio_from_text("あ" * 100, "key", "iapetus", "room")
+        second = audio_manager.generate_audio_from_text("い" * 100, "key", "iapetus", "room")
+        os.utime(first, (1, 1))
+        os.utime(second, (2, 2))
+        # first を使うと最終使用時刻が更新され、second の方が古くなる
+        audio_manager.generate_audio_from_text("あ" * 100, "key", "iapetus", "room")
+        limit = os.path.getsize(first) * 2 + 10
+        with mock.patch.object(constants, "TTS_CACHE_MAX_BYTES", limit):
+            third = audio_manager.generate_audio_from_text("う" * 100, "key", "iapetus", "room")
+        self.assertTrue(os.path.exists(first))
+        self.assertFalse(os.path.exists(second))
+        self.assertTrue(os.path.exists(third))
+        self.assertTrue(os.path.exists(legacy))
+
+
+if __name__ == '__main__':
+    unittest.main()
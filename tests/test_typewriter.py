@@ -0,0 +1,67 @@
+"""
+タイプライター表示のフレーム生成（typewriter）のテスト
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import typewriter
+
+
+class FakeClock:
+    """sleep で進む仮想時計"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestTypewriter(unittest.TestCase):
+
+    def _frames(self, text, char_interval=0.01, frame_interval=1 / 30):
+        clock = FakeClock()
+        frames = list(typewriter.iter_frames(text, char_interval, frame_interval, clock=clock, sleep=clock.sleep))
+        return frames, clock
+
+    def test_frames_are_grouped_and_paced(self):
+        """フレーム数は文字数ではなく表示時間 × フレームレートになり、最後は全文になる"""
+        text = "こんにちは、今日はいい天気ですね。" * 20
+        frames, clock = self._frames(text)
+        self.assertEqual(frames[-1], text)
+        self.assertTrue(all(b.startswith(a) for a, b in zip(frames, frames[1:])))
+        self.assertLess(len(frames), len(text) / 3 + 2)
+        # 全体の表示時間は 1文字あたりの間隔 × 文字数 と同程度
+        self.assertAlmostEqual(clock.now, len(text) * 0.01, delta=2 / 30)
+
+    def test_slow_speed_shows_one_unit_per_frame(self):
+        """1文字の間隔がフレーム間隔より長い場合は、従来どおり1文字ずつ表示する"""
+        frames, clock = self._frames("あいう", char_interval=0.1)
+        self.assertEqual(frames, ["あ", "あい", "あいう"])
+        self.assertAlmostEqual(clock.now, 0.2)
+
+    def test_markup_and_graphemes_are_not_split(self):
+        """HTMLタグ・文字参照・結合文字・絵文字のZWJ連結は途中で切らない"""
+        family = "\U0001F468\u200d\U0001F469\u200d\U0001F467"
+        text = f"<p>が゙&amp;{family}👍🏽</p>"
+        self.assertEqual(typewriter.split_units(text),
+                         ["<p>", "が゙", "&amp;", family, "👍🏽", "</p>"])
+        frames, _ = self._frames(text, char_interval=0.1)
+        for frame in frames:
+            self.assertEqual(frame.count("<"), frame.count(">"))
+            self.assertFalse(frame.endswith("\u200d"))
+
+    def test_english_words_are_kept_whole(self):
+        """英単語はフレームの途中で切らない"""
+        frames, _ = self._frames("hello world", char_interval=0.1)
+        self.assertEqual(frames, ["hello", "hello ", "hello world"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+"""
+RAG検索の統合・ベクトル化スコアリング（RAGManager.search / search_many）のテスト
+従来の「インデックスごとに similarity_search_with_score → Python ループで複合スコア」と同じ結果になることを確認する。
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_community.docstore.document import Document
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+import config_manager
+import constants
+import rag_manager
+import vector_search
+
+
+class FakeEmbeddings(Embeddings):
+    def __init__(self):
+        self.query_calls = 0
+
+    def embed_documents(self, texts):
+        return [self._vec(t) for t in texts]
+
+    def embed_query(self, text):
+        self.query_calls += 1
+        return self._vec(text)
+
+    @staticmethod
+    def _vec(text):
+        return [len(text) / 10.0, (sum(map(ord, text)) % 13) / 13.0, text.count("記") / 3.0]
+
+
+def legacy_search(manager, query, k, score_threshold, weights, dbs):
+    """従来の RAGManager.search のスコアリング"""
+    results = []
+    for db in dbs:
+        results.extend(db.similarity_search_with_score(query, k=k))
+    scored = []
+    for doc, sim in results:
+        arousal = doc.metadata.get("arousal", 0.5)
+        decay = manager.calculate_time_decay(doc.metadata)
+        comp = weights["alpha"] * sim + weights["beta"] * (1.0 - arousal) + weights["gamma"] * (1.0 - decay) * (1.0 - arousal)
+        scored.append((doc, sim, comp))
+    scored.sort(key=lambda x: x[2])
+    seen, docs = set(), []
+    for doc, sim, _ in scored:
+        key = doc.page_content[:100].strip()
+        if key in seen:
+            continue
+        seen.add(key)
+        if sim <= score_threshold:
+            docs.append(doc)
+    return docs[:k]
+
+
+class TestVectorSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.rooms_dir = tempfile.mkdtemp()
+        self.patches = [
+            mock.patch.object(constants, "ROOMS_DIR", self.rooms_dir),
+            mock.patch.object(config_manager, "get_effective_settings", return_value={"embedding_mode": "local"}),
+            mock.patch.object(config_manager, "get_internal_model_settings", return_value={"embedding_model": "fake"}),
+            mock.patch.object(config_manager, "get_key_name_by_value", return_value="Unknown"),
+        ]
+        for p in self.patches:
+            p.start()
+        os.makedirs(os.path.join(self.rooms_dir, "room"))
+        rag_manager.RAGManager._index_cache.clear()
+        self.manager = rag_manager.RAGManager("room", "")
+        self.embeddings = FakeEmbeddings()
+        self.manager.embeddings = self.embeddings
+
+        today = datetime.now()
+        static_docs, dynamic_docs = [], []
+        for i in range(30):
+            date = (today - timedelta(days=i * 5)).strftime("%Y-%m-%d")
+            metadata = {"date": date, "arousal": (i % 10) / 10, "type": "diary"}
+            if i % 4 == 0:
+                metadata = {"date": f"{date}~{date}", "type": "episodic_memory"}
+            static_docs.append(Document(page_content=f"記憶{i}: " + "話" * (i % 7), metadata=metadata))
+        for i in range(10):
+            dynamic_docs.append(Document(page_content=f"知識{i}の記述" + "・" * i, metadata={"source": "knowledge.md"}))
+        # 重複除去の対象になる同一内容
+        dynamic_docs.append(Document(page_content=static_docs[3].page_content, metadata={"source": "dup"}))
+
+        self.static_db = FAISS.from_documents(static_docs, self.embeddings)
+        self.dynamic_db = FAISS.from_documents(dynamic_docs, self.embeddings)
+        self.manager._safe_save_index(self.static_db, self.manager.static_index_path)
+        self.manager._safe_save_index(self.dynamic_db, self.manager.dynamic_index_path)
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        rag_manager.RAGManager._index_cache.clear()
+        shutil.rmtree(self.rooms_dir, ignore_errors=True)
+
+    def test_matches_legacy_scoring(self):
+        for intent in constants.INTENT_WEIGHTS:
+            for query in ("記憶3: 話話話", "知識の記述", "今日のこと"):
+                expected = legacy_search(self.manager, query, 10, 2.0, constants.INTENT_WEIGHTS[intent],
+                                         [self.dynamic_db, self.static_db])
+                actual = self.manager.search(query, k=10, score_threshold=2.0, intent=intent)
+                self.assertEqual([d.page_content for d in actual], [d.page_content for d in expected])
+
+    def test_search_many_embeds_each_query_once(self):
+        queries = ["記憶5: 話", "知識2の記述", "記憶5: 話"]
+        self.embeddings.query_calls = 0
+        batched = self.manager.search_many(queries, k=5, score_threshold=2.0, intent="factual")
+        self.assertEqual(self.embeddings.query_calls, 2)
+        for query, docs in zip(queries, batched):
+            single = self.manager.search(query, k=5, score_threshold=2.0, intent="factual")
+            self.assertEqual([d.page_content for d in docs], [d.page_content for d in single])
+
+    def test_current_log_index_is_searched(self):
+        log_db = FAISS.from_documents([Document(page_content="## USER:user\n現行ログだけにある話題", metadata={"type": "current_log"})], self.embeddings)
+        self.manager._safe_save_index(log_db, self.manager.current_log_index_path)
+        results = self.manager.search("## USER:user\n現行ログだけにある話題", k=3, score_threshold=0.01, intent="factual")
+        self.assertEqual([d.metadata["type"] for d in results], ["current_log"])
+
+    def test_time_decay_matches_scalar_version(self):
+        today = datetime.now()
+        metadatas = [
+            {"date": today.strftime("%Y-%m-%d")},
+            {"date": (today - timedelta(days=40)).strftime("%Y-%m-%d") + " 10:00:00"},
+            {"created_at": "2026-01-01~2026-01-07"},
+            {"date": (today + timedelta(days=3)).strftime("%Y-%m-%d")},
+            {"date": "不明"},
+            {},
+        ]
+        dates = np.array([vector_search.date_ordinal(m) for m in metadatas], dtype=np.int32)
+        decay = vector_search.time_decay(dates, today.toordinal(), constants.TIME_DECAY_RATE)
+        for value, metadata in zip(decay, metadatas):
+            self.assertAlmostEqual(value, self.manager.calculate_time_decay(metadata))
+
+
+if __name__ == '__main__':
+    unittest.main()
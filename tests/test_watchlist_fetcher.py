@@ -0,0 +1,145 @@
+"""
+ウォッチリストの並行取得（watchlist_fetcher / WatchlistManager.check_entries）のテスト
+"""
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import constants
+import watchlist_fetcher
+from watchlist_manager import WatchlistManager
+
+
+class FakeResponse:
+
+    def __init__(self, status_code=200, text="", headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class FakeSession:
+    """URLごとの応答を返し、送られたヘッダーと同時接続数を記録する"""
+
+    def __init__(self, pages, delay=0.0):
+        self.pages = pages
+        self.delay = delay
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def get(self, url, timeout=None, headers=None):
+        with self._lock:
+            self.requests.append((url, dict(headers or {})))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            page = self.pages[url]
+            etag = page.get("etag")
+            if etag and (headers or {}).get("If-None-Match") == etag:
+                return FakeResponse(304, headers={"ETag": etag})
+            if "status" in page:
+                return FakeResponse(page["status"])
+            return FakeResponse(200, page["html"], {"ETag": etag} if etag else {})
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+class TestWatchlistFetcher(unittest.TestCase):
+
+    def setUp(self):
+        self.rooms_dir = tempfile.mkdtemp()
+        self.patches = [
+            mock.patch.object(constants, "ROOMS_DIR", self.rooms_dir),
+            mock.patch.object(constants, "WATCHLIST_PER_HOST_INTERVAL", 0.0),
+            mock.patch.object(watchlist_fetcher, "TAVILY_AVAILABLE", False),
+            mock.patch.object(watchlist_fetcher, "_hosts", {}),
+        ]
+        for p in self.patches:
+            p.start()
+        os.makedirs(os.path.join(self.rooms_dir, "room"))
+
+    def tearDown(self):
+        for p in reversed(self.patches):
+            p.stop()
+        shutil.rmtree(self.rooms_dir, ignore_errors=True)
+
+    def _use_session(self, session):
+        patch = mock.patch.object(watchlist_fetcher, "_get_session", return_value=session)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_content_hash_ignores_whitespace(self):
+        """空白や空行だけの違いは同じハッシュになる"""
+        self.assertEqual(watchlist_fetcher.content_hash("a\n\n  b  \n"), watchlist_fetcher.content_hash("a\nb"))
+        self.assertNotEqual(watchlist_fetcher.content_hash("a\nb"), watchlist_fetcher.content_hash("a\nc"))
+
+    def test_fetch_many_is_concurrent_with_per_host_limit(self):
+        """複数ホストは並行して取得し、同じホストへの同時接続は上限までに抑える"""
+        pages = {f"https://host{i % 3}.example/{i}": {"html": f"<p>{i}</p>"} for i in range(9)}
+        session = FakeSession(pages, delay=0.05)
+        self._use_session(session)
+        with mock.patch.object(constants, "WATCHLIST_PER_HOST_CONCURRENCY", 1):
+            results = watchlist_fetcher.fetch_many([(url, None, None) for url in pages])
+        self.assertEqual(len(results), 9)
+        self.assertTrue(all(r.success for r in results.values()))
+        self.assertEqual(results["https://host1.example/4"].content, "4")
+        self.assertGreater(session.max_active, 1)
+        self.assertLessEqual(session.max_active, 3)
+
+    def test_fetch_reports_errors(self):
+        """取得に失敗したURLはエラーとして返す"""
+        self._use_session(FakeSession({"https://example.com/": {"status": 500}}))
+        result = watchlist_fetcher.fetch("https://example.com/")
+        self.assertFalse(result.success)
+        self.assertIn("取得エラー", result.content)
+
+    def test_check_entries_uses_validators_and_hash(self):
+        """2回目以降は条件付きリクエストを送り、304 や同じ本文ではキャッシュを書き換えない"""
+        pages = {
+            "https://a.example/": {"html": "<p>記事1</p>", "etag": '"v1"'},
+            "https://b.example/": {"html": "<p>お知らせ</p>"},
+        }
+        session = FakeSession(pages)
+        self._use_session(session)
+        manager = WatchlistManager("room")
+        manager.add_entry("https://a.example/", "A")
+        manager.add_entry("https://b.example/", "B")
+
+        first = manager.check_entries(manager.get_entries())
+        self.assertEqual([(r[1], r[2], r[3]) for r in first], [(True, True, "初回取得（新規コンテンツ）")] * 2)
+        stored = manager.get_entry_by_url("https://a.example/")
+        self.assertEqual(stored["etag"], '"v1"')
+        self.assertTrue(stored["content_hash"])
+
+        session.requests.clear()
+        with mock.patch.object(manager, "_save_cache") as save_cache, \
+                mock.patch.object(manager, "detect_changes") as detect:
+            second = manager.check_entries(manager.get_entries())
+            save_cache.assert_not_called()
+            detect.assert_not_called()
+        self.assertEqual([(r[1], r[2], r[3]) for r in second], [(True, False, "変更なし")] * 2)
+        self.assertEqual(dict(session.requests)["https://a.example/"], {"If-None-Match": '"v1"'})
+
+        pages["https://b.example/"]["html"] = "<p>お知らせ</p><p>新着</p>"
+        third = manager.check_entries([manager.get_entry_by_url("https://b.example/")])
+        self.assertEqual((third[0][2], third[0][3], third[0][4]), (True, "+1行追加", "お知らせ\n新着"))
+        self.assertIsNotNone(manager.get_entry_by_url("https://b.example/")["last_checked"])
+
+
+if __name__ == '__main__':
+    unittest.main()
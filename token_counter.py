@@ -0,0 +1,107 @@
+# token_counter.py
+"""
+入力トークン数見積もりのキャッシュ
+
+チャット入力欄が変わるたびに gemini_api.count_input_tokens が呼ばれ、そのたびにログ全体の読み込み・
+LangChainメッセージへの変換・tiktoken による再トークン化を行っていた。
+
+- count_text: テキストのトークン数を内容のハッシュをキーに LRU キャッシュする（メッセージ単位）
+- get_base_estimate: 入力欄以外（システムプロンプト＋履歴）の生トークン数を、元ファイルの署名と
+  設定をキーに保持する（prompt_section_cache を利用）。入力中はキャッシュ済みの値に入力欄の分を足すだけになる
+"""
+
+import datetime
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Tuple
+
+import tiktoken
+
+import constants
+import prompt_section_cache
+
+# トークン数をキャッシュするテキストの件数
+TEXT_TOKEN_CACHE_SIZE = 8192
+
+_cache: "OrderedDict[bytes, int]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _encoding():
+    # tiktoken 側でエンコーディングはキャッシュされる
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def count_text(text: str) -> int:
+    """テキストの cl100k_base トークン数（内容のハッシュでキャッシュ）"""
+    if not text:
+        return 0
+    key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+    with _lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+            return cached
+    count = len(_encoding().encode(text))
+    with _lock:
+        _cache[key] = count
+        if len(_cache) > TEXT_TOKEN_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return count
+
+
+def message_text(msg) -> str:
+    """トークン数の見積もり対象となるメッセージのテキスト（マルチモーダルはテキスト部分のみ）"""
+    content = ""
+    if isinstance(msg.content, str):
+        content = msg.content
+    elif isinstance(msg.content, list):
+        for part in msg.content:
+            if isinstance(part, dict) and part.get("type") == "text":
+                content += part.get("text", "") + " "
+    return content
+
+
+def count_messages(messages: List) -> int:
+    """メッセージごとのトークン数の合計（係数を掛ける前の値）"""
+    return sum(count_text(message_text(msg)) for msg in messages)
+
+
+def base_estimate_sources(room_name: str) -> List[str]:
+    """入力欄以外の見積もり（システムプロンプト＋履歴）が依存するファイル"""
+    room_dir = os.path.join(constants.ROOMS_DIR, room_name)
+    memory_dir = os.path.join(room_dir, "memory")
+    episodic_dir = os.path.join(memory_dir, "episodic")
+    sources = [
+        constants.CONFIG_FILE,
+        os.path.join(room_dir, "room_config.json"),
+        os.path.join(room_dir, "log.txt"),
+        os.path.join(room_dir, "SystemPrompt.txt"),
+        os.path.join(room_dir, "core_memory.txt"),
+        os.path.join(room_dir, constants.NOTEPAD_FILENAME),
+        os.path.join(room_dir, constants.RESEARCH_NOTES_FILENAME),
+        os.path.join(room_dir, "today_summary.json"),
+        os.path.join(room_dir, "spaces", "world_settings.txt"),
+        os.path.join(memory_dir, "entities"),
+        os.path.join(memory_dir, "episodic_memory.json"),
+        episodic_dir,
+    ]
+    # 月次ジャーナルへの追記はディレクトリの更新時刻を変えないため、ファイルごとに見る
+    try:
+        sources.extend(sorted(entry.path for entry in os.scandir(episodic_dir) if entry.is_file()))
+    except OSError:
+        pass
+    return sources
+
+
+def get_base_estimate(room_name: str, settings_key: tuple, builder: Callable[[], Tuple[int, int]]) -> Tuple[int, int]:
+    """
+    入力欄以外の (生トークン数, ツールスキーマ分) を返す。
+    ファイルと設定が前回と同じで日付も変わっていなければ builder を呼ばずにキャッシュを返す。
+    """
+    extra_key = (settings_key, datetime.date.today().isoformat())
+    return prompt_section_cache.get_section(
+        room_name, "token_base_estimate", base_estimate_sources(room_name), builder, extra_key=extra_key
+    )
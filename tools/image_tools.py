@@ -11,11 +11,12 @@ import httpx
 from langchain_core.tools import tool
 from google.genai import types
 import config_manager 
+import client_pool
 
 
 def _generate_with_gemini(prompt: str, model_name: str, api_key: str, save_dir: str, room_name: str) -> str:
     """Gemini (google.genai) で画像を生成する"""
-    client = genai.Client(api_key=api_key)
+    client = client_pool.get_genai_client(api_key)
     
     response = client.models.generate_content(
         model=model_name,
@@ -35,7 +35,7 @@ def search_knowledge_base(query: str, room_name: str, api_key: str = None) -> st
         
     try:
         # --- [RAGManagerを使用した新しい検索ロジック] ---
-        manager = rag_manager.RAGManager(room_name, api_key)
+        manager = rag_manager.get_manager(room_name, api_key)
         
         # 検索実行 (上位4件取得)
         docs = manager.search(query, k=4)
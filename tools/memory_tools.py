@@ -17,6 +17,7 @@ import glob
 from pathlib import Path
 import random 
 import config_manager
+import keyword_index
 
 @tool
 def recall_memories(query: str, room_name: str, api_key: str) -> str:
@@ -36,7 +37,7 @@ def recall_memories(query: str, room_name: str, api_key: str) -> str:
     
     try:
         import rag_manager
-        rm = rag_manager.RAGManager(room_name, api_key)
+        rm = rag_manager.get_manager(room_name, api_key)
         
         # 検索実行（日記・過去ログ・エピソード記憶・夢日記を対象）
         # 知識ベース（knowledge）は除外されている
@@ -123,75 +124,14 @@ def search_past_conversations(query: str, room_name: str, api_key: str, exclude_
 
     print(f"--- 過去ログ検索実行 (ルーム: {room_name}, クエリ: '{query}') ---")
     try:
-        base_path = Path(constants.ROOMS_DIR) / room_name
-        search_paths = [str(base_path / "log.txt")]
-        search_paths.extend(glob.glob(str(base_path / "log_archives" / "*.txt")))
-        search_paths.extend(glob.glob(str(base_path / "log_import_source" / "*.txt")))
-
-        found_blocks = []
-        date_patterns = [
-            re.compile(r'(\d{4}-\d{2}-\d{2}) \(...\) \d{2}:\d{2}:\d{2}'),
-            re.compile(r'###\s*(\d{4}-\d{2}-\d{2})')
-        ]
-        
-        for file_path_str in search_paths:
-            file_path = Path(file_path_str)
-            if not file_path.exists() or file_path.stat().st_size == 0:
-                continue
-            
-            with open(file_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-
-            header_indices = [i for i, line in enumerate(lines) if re.match(r"^(## (?:USER|AGENT|SYSTEM):.*)$", line.strip())]
-            if not header_indices:
-                continue
+        # ルームごとの転置インデックスで候補ページを絞り込み、該当ブロックだけを読み出す
+        # （log.txt / log_archives / log_import_source が対象。索引は差分更新される）
+        found_blocks = keyword_index.KeywordIndex.for_room(room_name).search_blocks(
+            search_keywords,
+            exclude_recent_count=final_exclude_count,
+            include_system_headers=True
+        )
 
-            search_end_line = len(lines)
-            
-            if file_path.name == "log.txt" and final_exclude_count > 0:
-                msg_count = len(header_indices)
-                if msg_count <= final_exclude_count:
-                    print(f"  - [Search Debug] log.txt をスキップ (Msg数 {msg_count} <= 除外数 {final_exclude_count})")
-                    continue
-                else:
-                    # 後ろから N 個目のヘッダーの位置を特定
-                    cutoff_header_index = header_indices[-final_exclude_count]
-                    search_end_line = cutoff_header_index
-                    print(f"  - [Search Debug] log.txt を部分検索 (Msg数 {msg_count}, 範囲: 行 0〜{search_end_line})")
-                    
-            processed_blocks_content = set()
-
-            for i, line in enumerate(lines[:search_end_line]):
-                if any(k in line.lower() for k in search_keywords):
-                    start_index = 0
-                    for h_idx in reversed(header_indices):
-                        if h_idx <= i:
-                            start_index = h_idx
-                            break
-                    
-                    end_index = len(lines)
-                    for h_idx in header_indices:
-                        if h_idx > start_index:
-                            end_index = h_idx
-                            break
-                    
-                    block_content = "".join(lines[start_index:end_index]).strip()
-                    if block_content not in processed_blocks_content:
-                        processed_blocks_content.add(block_content)
-                        
-                        block_date = None
-                        for pattern in date_patterns:
-                            matches = list(pattern.finditer(block_content))
-                            if matches:
-                                block_date = matches[-1].group(1)
-                                break
-                        
-                        found_blocks.append({
-                            "content": block_content,
-                            "date": block_date,
-                            "source": file_path.name
-                        })
-                        
         if not found_blocks:
             return f"【検索結果】過去の会話ログから「{query}」に関する情報は見つかりませんでした。"
 
@@ -370,7 +310,7 @@ def search_memory(query: str, room_name: str, api_key: str, intent: str = None)
     
     try:
         import rag_manager
-        rm = rag_manager.RAGManager(room_name, api_key)
+        rm = rag_manager.get_manager(room_name, api_key)
         results = rm.search(query, k=10, score_threshold=0.80, intent=intent)
         
         # 日記タイプのみをフィルタリング
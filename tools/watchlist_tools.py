@@ -7,71 +7,19 @@ from langchain_core.tools import tool
 from typing import List, Optional
 import traceback
 
-import config_manager
+import watchlist_fetcher
 from watchlist_manager import WatchlistManager, CHECK_INTERVAL_OPTIONS
 
-# Tavilyが利用可能かチェック
-try:
-    from langchain_tavily import TavilyExtract
-    TAVILY_AVAILABLE = True
-except ImportError:
-    TAVILY_AVAILABLE = False
-
 
 def _fetch_url_content(url: str) -> tuple[bool, str]:
     """
-    URLからコンテンツを取得する内部関数
+    URLからコンテンツを取得する内部関数（取得処理は watchlist_fetcher に集約）
     
     Returns:
         (success: bool, content_or_error: str)
     """
-    # Tavilyが利用可能な場合はTavily Extractを使用
-    if TAVILY_AVAILABLE and config_manager.TAVILY_API_KEY:
-        try:
-            extractor = TavilyExtract(
-                tavily_api_key=config_manager.TAVILY_API_KEY,
-                extract_depth="basic"
-            )
-            results = extractor.invoke({"urls": [url]})
-            
-            if results and isinstance(results, dict) and "results" in results:
-                for result in results["results"]:
-                    content = result.get("raw_content", result.get("content", ""))
-                    if content:
-                        return True, content[:10000]  # 10000文字に制限
-            elif results and isinstance(results, list):
-                for result in results:
-                    content = result.get("raw_content", result.get("content", ""))
-                    if content:
-                        return True, content[:10000]
-            
-            return False, "コンテンツを抽出できませんでした"
-            
-        except Exception as e:
-            print(f"  - Tavily Extractエラー: {e}")
-            # フォールバックへ
-    
-    # BeautifulSoupでフォールバック
-    try:
-        import requests
-        from bs4 import BeautifulSoup
-        
-        response = requests.get(url, timeout=15, headers={
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-        })
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # スクリプトとスタイルを除去
-        for script in soup(["script", "style"]):
-            script.decompose()
-        
-        text = soup.get_text(separator='\n', strip=True)
-        return True, text[:10000]
-        
-    except Exception as e:
-        return False, f"取得エラー: {e}"
+    result = watchlist_fetcher.fetch(url)
+    return result.success, result.content
 
 
 @tool
@@ -209,23 +157,15 @@ def check_watchlist(room_name: str, url_filter: str = None) -> str:
         results = []
         changes_found = 0
         
-        for entry in entries:
-            if not entry.get("enabled", True):
-                continue
-            
-            url = entry["url"]
+        # 有効なエントリをまとめて並行取得
+        entries = [e for e in entries if e.get("enabled", True)]
+        for entry, success, has_changes, diff_summary, _ in manager.check_entries(entries):
             name = entry["name"]
             
-            # コンテンツ取得
-            success, content = _fetch_url_content(url)
-            
             if not success:
-                results.append(f"❌ **{name}**: 取得失敗 - {content}")
+                results.append(f"❌ **{name}**: 取得失敗 - {diff_summary}")
                 continue
             
-            # 差分チェック
-            has_changes, diff_summary = manager.check_and_update(entry["id"], content)
-            
             if has_changes:
                 changes_found += 1
                 results.append(f"🔔 **{name}**: 更新あり！ ({diff_summary})")
@@ -1,11 +1,11 @@
 # tools/web_tools.py (v7.0 - Tavily Integration & URL Reading)
 
 from langchain_core.tools import tool
-import google.genai as genai
 from google.genai import types
 import traceback
 import config_manager
 import constants
+import client_pool
 from ddgs import DDGS
 
 # Tavilyのインポート（インストールされていない場合のフォールバック対応）
@@ -127,7 +127,7 @@ def _search_with_google(query: str) -> str:
         if not api_key or api_key.startswith("YOUR_API_KEY"):
             return f"[エラー: 有効なGoogle APIキー '{api_key_name}' が設定されていません]"
 
-        client = genai.Client(api_key=api_key)
+        client = client_pool.get_genai_client(api_key)
 
         # グラウンディングのための検索ツールを定義
         search_tool_for_api = types.Tool(
@@ -0,0 +1,108 @@
+# typewriter.py
+"""
+タイプライター表示のフレーム生成
+
+従来は1文字ごとにチャット履歴全体を yield していたため、返答の文字数 × 履歴の長さに比例して
+サーバーの後処理と送信が発生していた。ここでは表示単位（書記素クラスタ・HTMLタグ・英単語）を
+フレーム間隔（constants.TYPEWRITER_FRAME_INTERVAL）ごとにまとめ、1文字あたりの表示速度は
+streaming_speed のまま、yield の回数を「表示時間 × フレームレート」に抑える。
+"""
+
+import re
+import time
+import unicodedata
+from typing import Callable, Iterator, List
+
+# HTMLタグと文字参照は途中で切らずに1単位として扱う
+_MARKUP_RE = re.compile(r"<[^<>]*>|&(?:#\d+|#x[0-9a-fA-F]+|[a-zA-Z][a-zA-Z0-9]*);")
+
+# 英単語はフレームの途中で切らない（長すぎる単語はこの単位数で区切る）
+_MAX_WORD_EXTENSION = 16
+
+_ZWJ = "\u200d"
+
+
+def _joins_previous(ch: str) -> bool:
+    """直前の文字と同じ書記素クラスタに属する文字か（結合文字・異体字セレクタ・肌色修飾子など）"""
+    if unicodedata.combining(ch) or ch == _ZWJ:
+        return True
+    code = ord(ch)
+    return (0xFE00 <= code <= 0xFE0F or 0xE0100 <= code <= 0xE01EF  # 異体字セレクタ
+            or 0x1F3FB <= code <= 0x1F3FF  # 肌色修飾子
+            or 0xE0020 <= code <= 0xE007F  # タグ文字（旗）
+            or unicodedata.category(ch) == "Mc")
+
+
+def split_units(text: str) -> List[str]:
+    """テキストを表示単位（書記素クラスタ、またはHTMLタグ・文字参照）に分割する"""
+    units: List[str] = []
+    pos = 0
+    for match in _MARKUP_RE.finditer(text):
+        _split_graphemes(text[pos:match.start()], units)
+        units.append(match.group())
+        pos = match.end()
+    _split_graphemes(text[pos:], units)
+    return units
+
+
+def _split_graphemes(text: str, units: List[str]):
+    joining = False
+    for ch in text:
+        if units and not units[-1].startswith("<") and (joining or _joins_previous(ch)):
+            units[-1] += ch
+        else:
+            units.append(ch)
+        joining = ch == _ZWJ
+
+
+def _is_tag(unit: str) -> bool:
+    return unit.startswith("<") and unit.endswith(">")
+
+
+def _is_word_char(unit: str) -> bool:
+    return unit.isascii() and unit.isalnum()
+
+
+def iter_frames(text: str, char_interval: float, frame_interval: float,
+                clock: Callable[[], float] = time.monotonic,
+                sleep: Callable[[float], None] = time.sleep) -> Iterator[str]:
+    """
+    タイプライター表示の各フレームで表示する文字列（先頭からの累積）を返す。
+
+    Args:
+        text: 表示するテキスト（フォーマット済みのHTMLを含んでよい）
+        char_interval: 1文字あたりの表示間隔（秒、設定の streaming_speed）
+        frame_interval: フレームの最短間隔（秒）
+    """
+    units = split_units(text)
+    if not units:
+        return
+    frame_interval = max(frame_interval, char_interval)
+    start = clock()
+    next_frame = start
+    shown = ""
+    visible = 0
+    i = 0
+    while i < len(units):
+        # 経過時間から、ここまでに表示されているべき文字数を求める（最低1文字は進める）
+        due = max(visible + 1, int((clock() - start) / char_interval) + 1)
+        begin = i
+        while i < len(units) and (visible < due or _is_tag(units[i])):
+            if not _is_tag(units[i]):
+                visible += 1
+            i += 1
+        # 英単語の途中で止まった場合は単語の終わりまで進める
+        extension = 0
+        while (i < len(units) and extension < _MAX_WORD_EXTENSION
+               and _is_word_char(units[i - 1]) and _is_word_char(units[i])):
+            visible += 1
+            i += 1
+            extension += 1
+        shown += "".join(units[begin:i])
+        yield shown
+        if i >= len(units):
+            return
+        next_frame += frame_interval
+        delay = next_frame - clock()
+        if delay > 0:
+            sleep(delay)
@@ -45,6 +45,7 @@ from langchain_community.vectorstores import FAISS
 from langchain_community.docstore.document import Document
 
 import gemini_api, config_manager, alarm_manager, room_manager, utils, constants, chatgpt_importer, claude_importer, generic_importer
+import typewriter
 from utils import _overwrite_log_file
 from tools import timer_tools, memory_tools
 from agent.scenery_manager import generate_scenery_context
@@ -1766,13 +1767,14 @@ def _stream_and_handle_response(
                         if formatted_text:
                             # アニメーション用のカーソルを追加して開始
                             chatbot_history.append((None, "▌"))
-                            streamed_text = ""  # ★重要: 毎回初期化（前回の応答が引き継がれないように）
                             
-                            for char in formatted_text:
-                                streamed_text += char
+                            # 1文字ごとではなく、フレーム間隔ごとに文字（書記素・単語単位）をまとめて表示する。
+                            # yield のたびに履歴全体が後処理されるため、回数を表示時間 × フレームレートに抑える
+                            for streamed_text in typewriter.iter_frames(
+                                formatted_text, streaming_speed, constants.TYPEWRITER_FRAME_INTERVAL
+                            ):
                                 chatbot_history[-1] = (None, streamed_text + "▌")
                                 yield (chatbot_history, mapping_list, *([gr.update()] * 14))  # [v21] 16要素
-                                time.sleep(streaming_speed)
                             
                             # タイプライター完了後、フォーマット済みの最終形を表示
                             # （生テキストではなく、reload_chat_logから取得したフォーマット済みを使用）
@@ -2539,6 +2541,8 @@ def handle_delete_room(confirmed: str, folder_name_to_delete: str, api_key_name:
             return (gr.update(),) * expected_count
 
         send2trash(room_path_to_delete)
+        # 検索用に共有している RAGManager と読み込み済みインデックスを手放す
+        rag_manager.forget_managers(folder_name_to_delete)
         gr.Info(f"ルーム「{folder_name_to_delete}」をゴミ箱に移動しました。復元が必要な場合はPCのゴミ箱を確認してください。")
 
         new_room_list = room_manager.get_room_list_for_ui()
@@ -3050,6 +3054,195 @@ def handle_delete_button_click(
     )
     return history, mapping_list, None, gr.update(visible=False), "" # 最後にリセット用の "" を追加
 
+# 描画処理を変更したら上げる（古いキャッシュを使わないようにするため）
+HISTORY_RENDERER_VERSION = 1
+
+
+def _history_render_key(role: str, responder_id: str, content: str, speaker_name: str,
+                        add_timestamp: bool, display_thoughts: bool, screenshot_mode: bool,
+                        redaction_rules: Optional[List[Dict]]) -> str:
+    """描画済みメッセージのキャッシュキー（メッセージ内容・表示設定・描画処理のバージョンから決まる）"""
+    source = json.dumps(
+        [HISTORY_RENDERER_VERSION, role, responder_id, content, speaker_name, add_timestamp,
+         display_thoughts, screenshot_mode, redaction_rules if screenshot_mode else None],
+        ensure_ascii=False, sort_keys=True
+    )
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def _render_history_text(role: str, responder_id: str, content: str, speaker_name: str,
+                         display_thoughts: bool, screenshot_mode: bool, redaction_rules: Optional[List[Dict]]) -> str:
+    """1件分のテキストを Chatbot 表示用の Markdown/HTML に変換する"""
+    content_to_parse = content # まずデフォルトとして元のコンテンツを設定
+    if role == "SYSTEM":
+        if responder_id.startswith("tool_result"):
+            # RAW_RESULT部分を除去したものを、パース対象のコンテンツとして上書き
+            content_to_parse = re.sub(r"\[RAW_RESULT\][\s\S]*?\[/RAW_RESULT\]", "", content, flags=re.DOTALL).strip()
+            speaker_name = "tool_result" # 話者名として表示
+        else:
+            # tool_result以外のSYSTEMメッセージは話者名なし
+            speaker_name = ""
+
+    if screenshot_mode and redaction_rules:
+        for rule in redaction_rules:
+            find_str = rule.get("find")
+            if find_str:
+                replace_str = rule.get("replace", "")
+                color = rule.get("color")
+                escaped_find = html.escape(find_str)
+                escaped_replace = html.escape(replace_str)
+
+                if speaker_name:
+                    speaker_name = speaker_name.replace(find_str, replace_str)
+
+                if color:
+                    replacement_html = f'<span style="background-color: {color};">{escaped_replace}</span>'
+                    content_to_parse = content_to_parse.replace(escaped_find, replacement_html)
+                else:
+                    content_to_parse = content_to_parse.replace(escaped_find, escaped_replace)
+
+    # --- [新ロジック v3: [THOUGHT]タグ対応・最終版パーサー] ---
+    final_markdown = ""
+    speaker_prefix = f"**{speaker_name}:**\n\n" if speaker_name else (f"**{responder_id}:**\n\n" if role == "SYSTEM" else "")
+
+    # --- [新ロジック v4: 汎用コードブロック対応パーサー] ---
+
+    # display_thoughtsがFalseの場合、思考ログを物理的に除去する
+    content_for_parsing = content_to_parse
+    if not display_thoughts:
+        content_for_parsing = re.sub(r"(\[THOUGHT\][\s\S]*?\[/THOUGHT\])", "", content_for_parsing, flags=re.IGNORECASE)
+        content_for_parsing = re.sub(r"【Thoughts】[\s\S]*?【/Thoughts】", "", content_for_parsing, flags=re.IGNORECASE)
+        lines = content_for_parsing.split('\n')
+        content_for_parsing = "\n".join([line for line in lines if not line.strip().upper().startswith("THOUGHT:")])
+
+    # 思考ログのタグを、標準的なコードブロック記法に統一する
+    content_for_parsing = re.sub(r"\[/?THOUGHT\]", "```", content_for_parsing, flags=re.IGNORECASE)
+    content_for_parsing = re.sub(r"【/?Thoughts】", "```", content_for_parsing, flags=re.IGNORECASE)
+    
+    lines = content_for_parsing.split('\n')
+    processed_lines = []
+    in_thought_block = False
+    for line in lines:
+        if line.strip().upper().startswith("THOUGHT:"):
+            if not in_thought_block:
+                processed_lines.append("```")
+                in_thought_block = True
+            processed_lines.append(line.split(":", 1)[1].strip())
+        else:
+            if in_thought_block:
+                processed_lines.append("```")
+                in_thought_block = False
+            processed_lines.append(line)
+    if in_thought_block:
+        processed_lines.append("```")
+    content_for_parsing = "\n".join(processed_lines)
+
+    # 統一されたコードブロック記法 ``` でテキストを分割
+    code_block_pattern = re.compile(r"(```[\s\S]*?```)")
+    parts = code_block_pattern.split(content_for_parsing)
+    
+    final_html_parts = [speaker_prefix]
+
+    for part in parts:
+        if not part or not part.strip(): continue
+        if part.startswith("```"):
+            inner_content = part[3:-3].strip()
+            has_replacement_html = '<span style' in inner_content
+            if has_replacement_html:
+                # 文字置き換えのspanタグを含む場合：
+                # spanタグを保持しつつ、残りをHTMLエスケープしてMarkdown解釈を防ぐ
+                span_pattern = re.compile(r'(<span style="[^"]*">[^<]*</span>)')
+                spans = span_pattern.findall(inner_content)
+                placeholder_map = {}
+                for i, span in enumerate(spans):
+                    placeholder = f"__SPAN_PH_{i}__"
+                    placeholder_map[placeholder] = span
+                    inner_content = inner_content.replace(span, placeholder, 1)
+                # プレースホルダー以外をHTMLエスケープ
+                escaped_content = html.escape(inner_content)
+                # プレースホルダーを元のspanタグに戻す
+                for placeholder, span in placeholder_map.items():
+                    escaped_content = escaped_content.replace(placeholder, span)
+                # 改行を<br>に置換（\nは削除して二重改行を防ぐ）
+                escaped_content = escaped_content.replace('\n', '<br>')
+                formatted_block = f'<div class="code_wrap"><pre><code>{escaped_content}</code></pre></div>'
+            else:
+                formatted_block = f"```\n{html.escape(inner_content)}\n```"
+            final_html_parts.append(formatted_block)
+        else:
+            # ★レッスン24の適用★：通常テキストにHTMLが含まれる場合も同様の対処
+            if '<span style' in part:
+                # <span>タグを保持しつつ、他のテキストはHTMLエスケープ
+                span_pattern = re.compile(r'(<span style="[^"]*">[^<]*</span>)')
+                spans = span_pattern.findall(part)
+                temp_part = part
+                placeholder_map = {}
+                for i, span in enumerate(spans):
+                    placeholder = f"__SPAN_PLACEHOLDER_{i}__"
+                    placeholder_map[placeholder] = span
+                    temp_part = temp_part.replace(span, placeholder, 1)
+                # プレースホルダー以外をHTMLエスケープ
+                escaped_part = html.escape(temp_part)
+                # プレースホルダーを元のspanタグに戻す
+                for placeholder, span in placeholder_map.items():
+                    escaped_part = escaped_part.replace(placeholder, span)
+                # 改行を <br> に変換
+                escaped_part = escaped_part.replace('\n', '<br>\n')
+                final_html_parts.append(f'<div>{escaped_part}</div>')
+            else:
+                final_html_parts.append(part)
+
+    final_markdown = "\n\n".join(final_html_parts).strip()
+    return final_markdown
+
+
+def _render_history_message(role: str, responder_id: str, content: str, speaker_name: str,
+                            display_thoughts: bool, screenshot_mode: bool,
+                            redaction_rules: Optional[List[Dict]]) -> List[List[str]]:
+    """
+    1件のログメッセージを表示用の要素 [["text", Markdown] または ["media", パス], ...] に変換する。
+    （タイムスタンプは除去済みの content を渡す）
+    """
+    items = []
+    text_part = re.sub(r"\[(?:Generated Image|ファイル添付):.*?\]", "", content, flags=re.DOTALL).strip()
+    media_matches = list(re.finditer(r"\[(?:Generated Image|ファイル添付): ([^\]]+?)\]", content))
+
+    if text_part or (role == "SYSTEM" and not media_matches):
+        items.append(["text", _render_history_text(role, responder_id, text_part, speaker_name,
+                                                   display_thoughts, screenshot_mode, redaction_rules)])
+
+    for match in media_matches:
+        path_str = match.group(1).strip()
+        path_obj = Path(path_str)
+        is_allowed = False
+        try:
+            abs_path = path_obj.resolve()
+            cwd = Path.cwd().resolve()
+            temp_dir = Path(tempfile.gettempdir()).resolve()
+            if abs_path.is_relative_to(cwd) or abs_path.is_relative_to(temp_dir):
+                is_allowed = True
+        except (OSError, ValueError):
+            try:
+                abs_path_str = str(path_obj.resolve())
+                cwd_str = str(Path.cwd().resolve())
+                temp_dir_str = str(Path(tempfile.gettempdir()).resolve())
+                if abs_path_str.startswith(cwd_str) or abs_path_str.startswith(temp_dir_str):
+                    is_allowed = True
+            except Exception:
+                pass
+
+        if is_allowed:
+            # ファイルの有無は表示のたびに確認する（キャッシュには許可されたパスだけを残す）
+            items.append(["media", path_str])
+        else:
+            print(f"--- [警告] 無効または安全でない画像パスをスキップしました: {path_str} ---")
+
+    if not text_part and not media_matches and role != "SYSTEM":
+        items.append(["text", _render_history_text(role, responder_id, "", speaker_name,
+                                                   display_thoughts, screenshot_mode, redaction_rules)])
+    return items
+
+
 def format_history_for_gradio(
     messages: List[Dict[str, str]],
     current_room_folder: str,
@@ -3061,10 +3254,12 @@ def format_history_for_gradio(
 ) -> Tuple[List[Tuple], List[int]]:
 
     """
-    (v27: Stable Thought Log with Backward Compatibility)
+    (v28: Rendered Message Cache)
     ログ辞書のリストをGradioのChatbotコンポーネントが要求する形式に変換する。
     新しい 'THOUGHT:' プレフィックス形式と、古い '【Thoughts】' ブロック形式の両方を
     正しく解釈して、同じスタイルで表示する後方互換性を持つパーサーを実装。
+    描画結果はルームのHTMLキャッシュ（utils.load_html_cache）に保存し、
+    内容と表示設定が同じメッセージは再描画しない。
     """
     if not messages:
         return [], []
@@ -3077,8 +3272,9 @@ def format_history_for_gradio(
     current_room_config = room_manager.get_room_config(current_room_folder) or {}
     user_display_name = current_room_config.get("user_display_name", "ユーザー")
     agent_name_cache = {}
+    render_cache = utils.load_html_cache(current_room_folder)
+    cache_updated = False
 
-    proto_history = []
     for i, msg in enumerate(messages, start=absolute_start_index):
         role, content = msg.get("role"), msg.get("content", "").strip()
         responder_id = msg.get("responder")
@@ -3087,188 +3283,42 @@ def format_history_for_gradio(
         if not add_timestamp:
             content = timestamp_pattern.sub('', content)
 
-        text_part = re.sub(r"\[(?:Generated Image|ファイル添付):.*?\]", "", content, flags=re.DOTALL).strip()
-        media_matches = list(re.finditer(r"\[(?:Generated Image|ファイル添付): ([^\]]+?)\]", content))
-
-        if text_part or (role == "SYSTEM" and not media_matches):
-            proto_history.append({"type": "text", "role": role, "responder": responder_id, "content": text_part, "log_index": i})
-
-        for match in media_matches:
-            path_str = match.group(1).strip()
-            path_obj = Path(path_str)
-            is_allowed = False
-            try:
-                abs_path = path_obj.resolve()
-                cwd = Path.cwd().resolve()
-                temp_dir = Path(tempfile.gettempdir()).resolve()
-                if abs_path.is_relative_to(cwd) or abs_path.is_relative_to(temp_dir):
-                    is_allowed = True
-            except (OSError, ValueError):
-                try:
-                    abs_path_str = str(path_obj.resolve())
-                    cwd_str = str(Path.cwd().resolve())
-                    temp_dir_str = str(Path(tempfile.gettempdir()).resolve())
-                    if abs_path_str.startswith(cwd_str) or abs_path_str.startswith(temp_dir_str):
-                        is_allowed = True
-                except Exception:
-                    pass
-
-            if path_obj.exists() and is_allowed:
-                proto_history.append({"type": "media", "role": role, "responder": responder_id, "path": path_str, "log_index": i})
-            else:
-                print(f"--- [警告] 無効または安全でない画像パスをスキップしました: {path_str} ---")
-
-        if not text_part and not media_matches and role != "SYSTEM":
-             proto_history.append({"type": "text", "role": role, "responder": responder_id, "content": "", "log_index": i})
-
-
-
-    for item in proto_history:
-        mapping_list.append(item["log_index"])
-        role, responder_id = item["role"], item["responder"]
         is_user = (role == "USER")
-
-        if item["type"] == "text":
+        if is_user:
+            speaker_name = user_display_name
+        elif role == "AGENT":
+            if responder_id not in agent_name_cache:
+                agent_config = room_manager.get_room_config(responder_id) or {}
+                agent_name_cache[responder_id] = agent_config.get("agent_display_name") or agent_config.get("room_name", responder_id)
+            speaker_name = agent_name_cache[responder_id]
+        elif role == "SYSTEM":
             speaker_name = ""
-            content_to_parse = item['content'] # まずデフォルトとして元のコンテンツを設定
-
-            if is_user:
-                speaker_name = user_display_name
-            elif role == "AGENT":
-                if responder_id not in agent_name_cache:
-                    agent_config = room_manager.get_room_config(responder_id) or {}
-                    agent_name_cache[responder_id] = agent_config.get("agent_display_name") or agent_config.get("room_name", responder_id)
-                speaker_name = agent_name_cache[responder_id]
-            elif role == "SYSTEM":
-                if responder_id.startswith("tool_result"):
-                    # RAW_RESULT部分を除去したものを、パース対象のコンテンツとして上書き
-                    content_to_parse = re.sub(r"\[RAW_RESULT\][\s\S]*?\[/RAW_RESULT\]", "", item['content'], flags=re.DOTALL).strip()
-                    speaker_name = "tool_result" # 話者名として表示
-                else:
-                    # tool_result以外のSYSTEMメッセージは話者名なし
-                    speaker_name = ""
-            else: # 将来的な拡張のためのフォールバック
-                speaker_name = responder_id
-
-            if screenshot_mode and redaction_rules:
-                for rule in redaction_rules:
-                    find_str = rule.get("find")
-                    if find_str:
-                        replace_str = rule.get("replace", "")
-                        color = rule.get("color")
-                        escaped_find = html.escape(find_str)
-                        escaped_replace = html.escape(replace_str)
-
-                        if speaker_name:
-                            speaker_name = speaker_name.replace(find_str, replace_str)
-
-                        if color:
-                            replacement_html = f'<span style="background-color: {color};">{escaped_replace}</span>'
-                            content_to_parse = content_to_parse.replace(escaped_find, replacement_html)
-                        else:
-                            content_to_parse = content_to_parse.replace(escaped_find, escaped_replace)
-
-            # --- [新ロジック v3: [THOUGHT]タグ対応・最終版パーサー] ---
-            final_markdown = ""
-            speaker_prefix = f"**{speaker_name}:**\n\n" if speaker_name else (f"**{responder_id}:**\n\n" if role == "SYSTEM" else "")
-
-            # --- [新ロジック v4: 汎用コードブロック対応パーサー] ---
-
-            # display_thoughtsがFalseの場合、思考ログを物理的に除去する
-            content_for_parsing = content_to_parse
-            if not display_thoughts:
-                content_for_parsing = re.sub(r"(\[THOUGHT\][\s\S]*?\[/THOUGHT\])", "", content_for_parsing, flags=re.IGNORECASE)
-                content_for_parsing = re.sub(r"【Thoughts】[\s\S]*?【/Thoughts】", "", content_for_parsing, flags=re.IGNORECASE)
-                lines = content_for_parsing.split('\n')
-                content_for_parsing = "\n".join([line for line in lines if not line.strip().upper().startswith("THOUGHT:")])
-
-            # 思考ログのタグを、標準的なコードブロック記法に統一する
-            content_for_parsing = re.sub(r"\[/?THOUGHT\]", "```", content_for_parsing, flags=re.IGNORECASE)
-            content_for_parsing = re.sub(r"【/?Thoughts】", "```", content_for_parsing, flags=re.IGNORECASE)
-            
-            lines = content_for_parsing.split('\n')
-            processed_lines = []
-            in_thought_block = False
-            for line in lines:
-                if line.strip().upper().startswith("THOUGHT:"):
-                    if not in_thought_block:
-                        processed_lines.append("```")
-                        in_thought_block = True
-                    processed_lines.append(line.split(":", 1)[1].strip())
-                else:
-                    if in_thought_block:
-                        processed_lines.append("```")
-                        in_thought_block = False
-                    processed_lines.append(line)
-            if in_thought_block:
-                processed_lines.append("```")
-            content_for_parsing = "\n".join(processed_lines)
-
-            # 統一されたコードブロック記法 ``` でテキストを分割
-            code_block_pattern = re.compile(r"(```[\s\S]*?```)")
-            parts = code_block_pattern.split(content_for_parsing)
-            
-            final_html_parts = [speaker_prefix]
-
-            for part in parts:
-                if not part or not part.strip(): continue
-                if part.startswith("```"):
-                    inner_content = part[3:-3].strip()
-                    has_replacement_html = '<span style' in inner_content
-                    if has_replacement_html:
-                        # 文字置き換えのspanタグを含む場合：
-                        # spanタグを保持しつつ、残りをHTMLエスケープしてMarkdown解釈を防ぐ
-                        span_pattern = re.compile(r'(<span style="[^"]*">[^<]*</span>)')
-                        spans = span_pattern.findall(inner_content)
-                        placeholder_map = {}
-                        for i, span in enumerate(spans):
-                            placeholder = f"__SPAN_PH_{i}__"
-                            placeholder_map[placeholder] = span
-                            inner_content = inner_content.replace(span, placeholder, 1)
-                        # プレースホルダー以外をHTMLエスケープ
-                        escaped_content = html.escape(inner_content)
-                        # プレースホルダーを元のspanタグに戻す
-                        for placeholder, span in placeholder_map.items():
-                            escaped_content = escaped_content.replace(placeholder, span)
-                        # 改行を<br>に置換（\nは削除して二重改行を防ぐ）
-                        escaped_content = escaped_content.replace('\n', '<br>')
-                        formatted_block = f'<div class="code_wrap"><pre><code>{escaped_content}</code></pre></div>'
-                    else:
-                        formatted_block = f"```\n{html.escape(inner_content)}\n```"
-                    final_html_parts.append(formatted_block)
-                else:
-                    # ★レッスン24の適用★：通常テキストにHTMLが含まれる場合も同様の対処
-                    if '<span style' in part:
-                        # <span>タグを保持しつつ、他のテキストはHTMLエスケープ
-                        span_pattern = re.compile(r'(<span style="[^"]*">[^<]*</span>)')
-                        spans = span_pattern.findall(part)
-                        temp_part = part
-                        placeholder_map = {}
-                        for i, span in enumerate(spans):
-                            placeholder = f"__SPAN_PLACEHOLDER_{i}__"
-                            placeholder_map[placeholder] = span
-                            temp_part = temp_part.replace(span, placeholder, 1)
-                        # プレースホルダー以外をHTMLエスケープ
-                        escaped_part = html.escape(temp_part)
-                        # プレースホルダーを元のspanタグに戻す
-                        for placeholder, span in placeholder_map.items():
-                            escaped_part = escaped_part.replace(placeholder, span)
-                        # 改行を <br> に変換
-                        escaped_part = escaped_part.replace('\n', '<br>\n')
-                        final_html_parts.append(f'<div>{escaped_part}</div>')
-                    else:
-                        final_html_parts.append(part)
-
-            final_markdown = "\n\n".join(final_html_parts).strip()
-            if is_user:
-                gradio_history.append((final_markdown, None))
+        else: # 将来的な拡張のためのフォールバック
+            speaker_name = responder_id
+
+        key = _history_render_key(role, responder_id, content, speaker_name, add_timestamp,
+                                  display_thoughts, screenshot_mode, redaction_rules)
+        items = render_cache.pop(key, None)
+        if items is None:
+            items = _render_history_message(role, responder_id, content, speaker_name,
+                                            display_thoughts, screenshot_mode, redaction_rules)
+            cache_updated = True
+        # 使ったものを末尾に置き直す（古いものから削除されるように）
+        render_cache[key] = items
+
+        for kind, value in items:
+            if kind == "text":
+                gradio_history.append((value, None) if is_user else (None, value))
             else:
-                gradio_history.append((None, final_markdown))
-
-        elif item["type"] == "media":
-            media_tuple = (item["path"], os.path.basename(item["path"]))
-            gradio_history.append((media_tuple, None) if is_user else (None, media_tuple))
+                if not os.path.exists(value):
+                    print(f"--- [警告] 無効または安全でない画像パスをスキップしました: {value} ---")
+                    continue
+                media_tuple = (value, os.path.basename(value))
+                gradio_history.append((media_tuple, None) if is_user else (None, media_tuple))
+            mapping_list.append(i)
 
+    if cache_updated:
+        utils.save_html_cache(current_room_folder, render_cache)
 
     return gradio_history, mapping_list
 
@@ -4179,9 +4229,7 @@ def handle_save_entity_memory(room_name: str, entity_name: str, content: str):
     from entity_memory_manager import EntityMemoryManager
     em = EntityMemoryManager(room_name)
     # 手動保存時は上書きモード
-    path = em._get_entity_path(entity_name)
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(content)
+    em.write_entry(entity_name, content)
 
 def handle_delete_entity_memory(room_name: str, entity_name: str):
     """エンティティを削除する"""
@@ -11121,7 +11169,6 @@ def handle_watchlist_check_all(room_name: str, api_key_name: str):
     
     try:
         from watchlist_manager import WatchlistManager
-        from tools.watchlist_tools import _fetch_url_content
         from alarm_manager import _summarize_watchlist_content, trigger_research_analysis
         
         manager = WatchlistManager(room_name)
@@ -11133,23 +11180,16 @@ def handle_watchlist_check_all(room_name: str, api_key_name: str):
         results = []
         changes_found = []  # 詳細情報を含む辞書のリスト
         
-        for entry in entries:
-            if not entry.get("enabled", True):
-                continue
-            
+        # 有効なエントリをまとめて並行取得（未更新のページは差分計算を省略）
+        entries = [e for e in entries if e.get("enabled", True)]
+        for entry, success, has_changes, diff_summary, content in manager.check_entries(entries):
             url = entry["url"]
             name = entry["name"]
             
-            # コンテンツ取得
-            success, content = _fetch_url_content(url)
-            
             if not success:
                 results.append(f"❌ {name}: 取得失敗")
                 continue
             
-            # 差分チェック
-            has_changes, diff_summary = manager.check_and_update(entry["id"], content)
-            
             if has_changes:
                 # 【修正】軽量モデルでコンテンツを要約し、詳細情報を保存
                 content_summary = _summarize_watchlist_content(name, url, content, diff_summary)
@@ -2,17 +2,22 @@
 
 import datetime
 import os
+import stat
 import re
 import traceback
 import html
-from typing import List, Dict, Optional, Tuple, Union
+from typing import Any, List, Dict, Optional, Tuple, Union
 import constants
+import chat_log_index
+import keyword_index
+import log_archiver
 import sys
 import psutil
 from pathlib import Path
 import json
 import time
 import uuid
+import threading
 from bs4 import BeautifulSoup
 import io
 import contextlib
@@ -122,135 +127,40 @@ def release_lock():
 
 def load_chat_log(file_path: str) -> List[Dict[str, str]]:
     """
-    (Definitive Edition v3)
+    (Definitive Edition v4)
     Reads a log file and returns a unified list of dictionaries.
-    This version uses a robust finditer approach to prevent message content
-    from being misinterpreted as a new speaker header.
+    Parsing is delegated to chat_log_index, which caches the parsed messages
+    per file and only re-parses the appended tail when the log has grown.
     """
-    messages: List[Dict[str, str]] = []
     if not file_path or not os.path.exists(file_path):
-        return messages
+        return []
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
+        return chat_log_index.load_messages(file_path)
     except Exception as e:
         print(f"エラー: ログファイル '{file_path}' 読込エラー: {e}")
-        return messages
+        return []
 
-    if not content.strip():
-        return messages
 
-    # Regex to find all valid headers
-    header_pattern = re.compile(r'^## (USER|AGENT|SYSTEM):(.+?)$', re.MULTILINE)
-
-    matches = list(header_pattern.finditer(content))
-
-    for i, match in enumerate(matches):
-        # Extract header info
-        role = match.group(1).upper()
-        responder = match.group(2).strip()
-        if role == "USER":
-            responder = "user"
-
-        # Determine content span
-        start_of_content = match.end()
-        end_of_content = matches[i + 1].start() if i + 1 < len(matches) else len(content)
-
-        # Extract and clean content
-        message_content = content[start_of_content:end_of_content].strip()
-
-        messages.append({"role": role, "responder": responder, "content": message_content})
-
-    return messages
-
-
-def _perform_log_archiving(log_file_path: str, character_name: str, threshold_bytes: int, keep_bytes: int) -> Optional[str]:
-    # Import locally to avoid circular dependencies
-    import room_manager
-    try:
-        if os.path.getsize(log_file_path) <= threshold_bytes:
-            return None
-
-        print(f"--- [ログアーカイブ開始] {log_file_path} が {threshold_bytes / 1024 / 1024:.1f}MB を超えました ---")
-
-        # Create a backup before modifying the log file
-        room_manager.create_backup(character_name, 'log')
-
-        with open(log_file_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-
-        # メッセージの区切り（ヘッダー行）のインデックスを全て探す
-        header_indices = [i for i, line in enumerate(lines) if line.startswith("## ") and ":" in line]
-        
-        if not header_indices:
-            print("--- [ログアーカイブ警告] ヘッダーが見つかりませんでした。アーカイブを中止します。 ---")
-            return None
-
-        # 後ろからサイズを積み上げていき、keep_bytes を超える境界を探す
-        current_size = 0
-        split_line_index = 0
-        
-        # 最後の行から逆順にスキャン
-        for i in range(len(lines) - 1, -1, -1):
-            current_size += len(lines[i].encode('utf-8'))
-            
-            # keep_bytes を超えた時点で、その行より手前にある「直近のヘッダー」を探す
-            if current_size >= keep_bytes:
-                # 現在行(i)より前にあるヘッダーの中で、最も大きいインデックスを探す
-                valid_headers = [h for h in header_indices if h <= i]
-                if valid_headers:
-                    split_line_index = valid_headers[-1]
-                else:
-                    # ヘッダーが見つからない場合は安全のため半分で切る（フォールバック）
-                    split_line_index = header_indices[len(header_indices) // 2]
-                break
-        
-        # 分割点が先頭(0)になってしまった場合（全部残すことになってしまう場合）、強制的に古い方1/3をアーカイブする
-        if split_line_index == 0 and len(header_indices) > 10:
-             print("--- [ログアーカイブ] 適切な分割点が見つからなかったため、強制的に古いログの約1/3をアーカイブします ---")
-             split_line_index = header_indices[len(header_indices) // 3]
-
-        if split_line_index == 0:
-             print("--- [ログアーカイブ] 分割できませんでした ---")
-             return None
-
-        content_to_archive = "".join(lines[:split_line_index])
-        content_to_keep = "".join(lines[split_line_index:])
-
-        archive_dir = os.path.join(os.path.dirname(log_file_path), "log_archives")
-        os.makedirs(archive_dir, exist_ok=True)
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        archive_path = os.path.join(archive_dir, f"log_archive_{timestamp}.txt")
-
-        with open(archive_path, "w", encoding="utf-8") as f:
-            f.write(content_to_archive.strip())
-        
-        with open(log_file_path, "w", encoding="utf-8") as f:
-            f.write(content_to_keep.strip() + "\n\n")
-
-        archive_size_mb = os.path.getsize(archive_path) / 1024 / 1024
-        message = f"古いログをアーカイブしました ({archive_size_mb:.2f}MB)"
-        print(f"--- [ログアーカイブ完了] {message} -> {archive_path} ---")
-        return message
-
-    except Exception as e:
-        print(f"!!! [ログアーカイブエラー] {e}"); traceback.print_exc()
-        return None
-        
 def save_message_to_log(log_file_path: str, header: str, text_content: str) -> Optional[str]:
     import config_manager
     if not all([log_file_path, header, text_content, text_content.strip()]): return None
     try:
         content_to_append = f"{header.strip()}\n{text_content.strip()}\n\n"
-        if not os.path.exists(log_file_path) or os.path.getsize(log_file_path) == 0:
-             content_to_append = content_to_append.lstrip()
-        with open(log_file_path, "a", encoding="utf-8") as f: f.write(content_to_append)
+        # アーカイブによる log.txt の入れ替えと排他する
+        with log_archiver.log_lock(log_file_path):
+            if not os.path.exists(log_file_path) or os.path.getsize(log_file_path) == 0:
+                 content_to_append = content_to_append.lstrip()
+            with open(log_file_path, "a", encoding="utf-8") as f: f.write(content_to_append)
         character_name = os.path.basename(os.path.dirname(log_file_path))
         threshold_mb = config_manager.CONFIG_GLOBAL.get("log_archive_threshold_mb", 10)
         keep_mb = config_manager.CONFIG_GLOBAL.get("log_keep_size_mb", 5)
         threshold_bytes = threshold_mb * 1024 * 1024
         keep_bytes = keep_mb * 1024 * 1024
-        return _perform_log_archiving(log_file_path, character_name, threshold_bytes, keep_bytes)
+        # しきい値を超えていれば、古いログのアーカイブをバックグラウンドで行う（完了時に索引も更新される）
+        log_archiver.schedule(log_file_path, character_name, threshold_bytes, keep_bytes)
+        # 過去ログ検索用の転置インデックスを差分更新する（索引済みのルームのみ、バックグラウンド）
+        keyword_index.schedule_refresh(os.path.dirname(log_file_path))
+        return None
     except Exception as e:
         print(f"エラー: ログファイル '{log_file_path}' 書き込みエラー: {e}"); traceback.print_exc()
         return None
@@ -273,6 +183,7 @@ def delete_message_from_log(log_file_path: str, message_to_delete: Dict[str, str
         with open(log_file_path, "w", encoding="utf-8") as f: f.write(new_log_content)
         if new_log_content:
             with open(log_file_path, "a", encoding="utf-8") as f: f.write("\n\n")
+        chat_log_index.invalidate(log_file_path)
         print("--- Successfully deleted message from log ---"); return True
     except Exception as e:
         print(f"エラー: ログからのメッセージ削除中に予期せぬエラー: {e}"); traceback.print_exc()
@@ -496,13 +407,57 @@ def find_scenery_image(room_name: str, location_id: str, season_en: str = None,
     """
     if not room_name or not location_id: return None
     image_dir = os.path.join(constants.ROOMS_DIR, room_name, "spaces", "images")
-    if not os.path.isdir(image_dir): return None
+    catalog = _get_scenery_catalog(image_dir)
+    if catalog is None: return None
 
     # --- 適用すべき時間コンテキストを決定 ---
     now = datetime.datetime.now()
     effective_season = season_en or get_season(now.month)
     effective_time_of_day = time_of_day_en or get_time_of_day(now.hour)
-    
+
+    # 同じ条件の検索結果はフォルダが変わるまで再利用する
+    key = (location_id, effective_season, effective_time_of_day)
+    if key not in catalog["resolved"]:
+        catalog["resolved"][key] = _resolve_scenery_image(
+            image_dir, catalog["files"], catalog["names"], location_id, effective_season, effective_time_of_day
+        )
+    return catalog["resolved"][key]
+
+
+# 情景画像フォルダの目録 {フォルダのパス: {"mtime_ns", "files", "names", "resolved"}}
+_scenery_catalogs: Dict[str, dict] = {}
+
+def _get_scenery_catalog(image_dir: str) -> Optional[dict]:
+    """
+    情景画像フォルダのファイル一覧と検索結果のキャッシュを返す（フォルダが無ければ None）。
+    フォルダの更新時刻（画像の追加・削除・改名で変わる）が変わったら作り直す。
+    """
+    try:
+        st = os.stat(image_dir)
+    except OSError:
+        return None
+    if not stat.S_ISDIR(st.st_mode):
+        return None
+    catalog = _scenery_catalogs.get(image_dir)
+    if catalog is None or catalog["mtime_ns"] != st.st_mtime_ns:
+        try:
+            files = os.listdir(image_dir)
+        except OSError as e:
+            print(f"警告: 情景画像検索中にエラー: {e}")
+            return None
+        catalog = {
+            "mtime_ns": st.st_mtime_ns,
+            "files": files,
+            # os.path.exists と同じく、Windows では大文字小文字を区別しない
+            "names": {os.path.normcase(f) for f in files},
+            "resolved": {},
+        }
+        _scenery_catalogs[image_dir] = catalog
+    return catalog
+
+def _resolve_scenery_image(image_dir: str, files: List[str], names: set, location_id: str,
+                           effective_season: str, effective_time_of_day: str) -> Optional[str]:
+    """find_scenery_image の検索本体（ファイルシステムには触れず、目録のファイル一覧から探す）"""
     # --- 季節フォールバック順序を生成（現在季節から逆順に遡る）---
     SEASONS_ORDER = ["spring", "summer", "autumn", "winter"]
     def get_season_fallback_order(current_season: str) -> list:
@@ -565,13 +520,11 @@ def find_scenery_image(room_name: str, location_id: str, season_en: str = None,
 
     # 直接一致を確認
     for cand in candidates:
-        path = os.path.join(image_dir, cand)
-        if os.path.exists(path):
-            return path
+        if os.path.normcase(cand) in names:
+            return os.path.join(image_dir, cand)
 
     # ワイルドカード検索（接頭辞一致。例: '書斎_night_2.png' なども許容）
     try:
-        files = os.listdir(image_dir)
         search_prefixes = []
         
         # 季節 + 時間帯パターン（時間帯フォールバック対応）
@@ -672,6 +625,7 @@ def delete_and_get_previous_user_input(log_file_path: str, ai_message_to_delete:
         with open(log_file_path, "w", encoding="utf-8") as f: f.write(new_log_content)
         if new_log_content:
             with open(log_file_path, "a", encoding="utf-8") as f: f.write("\n\n")
+        chat_log_index.invalidate(log_file_path)
         content_without_timestamp = re.sub(r'\n\n\d{4}-\d{2}-\d{2} \(...\) \d{2}:\d{2}:\d{2}$', '', user_message_content, flags=re.MULTILINE)
         restored_input = content_without_timestamp.strip()
         print("--- Successfully reset conversation to the last user input for rerun ---")
@@ -708,6 +662,7 @@ def delete_user_message_and_after(log_file_path: str, user_message_to_delete: Di
         with open(log_file_path, "w", encoding="utf-8") as f: f.write(new_log_content)
         if new_log_content:
             with open(log_file_path, "a", encoding="utf-8") as f: f.write("\n\n")
+        chat_log_index.invalidate(log_file_path)
         content_without_timestamp = re.sub(r'\n\n\d{4}-\d{2}-\d{2} \(...\) \d{2}:\d{2}:\d{2}$', '', user_message_content, flags=re.MULTILINE)
         restored_input = content_without_timestamp.strip()
         print("--- Successfully reset conversation to before the selected user input for rerun ---")
@@ -787,38 +742,82 @@ def _overwrite_log_file(file_path: str, messages: List[Dict]):
     if new_log_content:
         with open(file_path, "a", encoding="utf-8") as f:
             f.write("\n\n")
+    chat_log_index.invalidate(file_path)
 
 # ▲▲▲【追加はここまで】▲▲▲
 
-def load_html_cache(room_name: str) -> Dict[str, str]:
-    """指定されたルームのHTMLキャッシュを読み込む。"""
+# ルームごとのHTMLキャッシュのメモリ上のコピー {room_name: ((更新時刻ns, サイズ), キャッシュ)}
+# 保持した辞書は変更しない（読み込み側には複製を渡し、保存時に差し替える）
+_html_cache_memory: Dict[str, Tuple[Optional[tuple], dict]] = {}
+# 同じルームの保存（一時ファイルへの書き出しと差し替え）を排他するロック
+_html_cache_locks: Dict[str, threading.Lock] = {}
+_html_cache_locks_lock = threading.Lock()
+
+def _html_cache_lock(room_name: str) -> threading.Lock:
+    with _html_cache_locks_lock:
+        lock = _html_cache_locks.get(room_name)
+        if lock is None:
+            lock = _html_cache_locks[room_name] = threading.Lock()
+        return lock
+
+def _html_cache_signature(cache_path: str) -> Optional[tuple]:
+    try:
+        st = os.stat(cache_path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def load_html_cache(room_name: str) -> Dict[str, Any]:
+    """
+    指定されたルームのHTMLキャッシュを読み込む。
+    ファイルが変わっていなければメモリ上の内容の複製を返す（呼び出し側で変更し、save_html_cache で保存する）。
+    同じルームを同時に描画しても、互いの変更が干渉しないように複製にしている。
+    """
     if not room_name:
         return {}
     cache_path = os.path.join(constants.ROOMS_DIR, room_name, "cache", "html_cache.json")
-    if os.path.exists(cache_path):
+    signature = _html_cache_signature(cache_path)
+    cached = _html_cache_memory.get(room_name)
+    if cached is not None and cached[0] == signature:
+        return dict(cached[1])
+
+    data = {}
+    if signature is not None:
         try:
             # パフォーマンスのため、ファイルサイズが0でないこともチェック
             if os.path.getsize(cache_path) > 0:
                 with open(cache_path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    return data if isinstance(data, dict) else {}
+                    loaded = json.load(f)
+                    data = loaded if isinstance(loaded, dict) else {}
         except (json.JSONDecodeError, IOError):
             pass # エラーの場合は新しいキャッシュを作成
-    return {}
+    _html_cache_memory[room_name] = (signature, data)
+    return dict(data)
 
-def save_html_cache(room_name: str, cache_data: Dict[str, str]):
-    """指定されたルームのHTMLキャッシュを保存する。"""
+def save_html_cache(room_name: str, cache_data: Dict[str, Any]):
+    """
+    指定されたルームのHTMLキャッシュを保存する。
+    constants.HTML_CACHE_MAX_ENTRIES を超えた分は、先頭（最も長く使われていないもの）から削除する。
+    """
     if not room_name:
         return
+    # 保存後に呼び出し側が変更しても影響しないよう、複製を書き出してメモリ上のものと差し替える
+    cache_data = dict(cache_data)
+    overflow = len(cache_data) - constants.HTML_CACHE_MAX_ENTRIES
+    if overflow > 0:
+        for key in list(cache_data)[:overflow]:
+            del cache_data[key]
     cache_dir = os.path.join(constants.ROOMS_DIR, room_name, "cache")
     os.makedirs(cache_dir, exist_ok=True)
     cache_path = os.path.join(cache_dir, "html_cache.json")
     try:
-        # 新しいキャッシュファイルを、一時ファイルに書き出してからリネームすることで、書き込み中のクラッシュによるファイル破損を防ぐ
-        temp_path = cache_path + ".tmp"
-        with open(temp_path, "w", encoding="utf-8") as f:
-            json.dump(cache_data, f) # パフォーマンスのため、インデントなしで保存
-        os.replace(temp_path, cache_path)
+        with _html_cache_lock(room_name):
+            # 新しいキャッシュファイルを、一時ファイルに書き出してからリネームすることで、書き込み中のクラッシュによるファイル破損を防ぐ
+            temp_path = cache_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(cache_data, f) # パフォーマンスのため、インデントなしで保存
+            os.replace(temp_path, cache_path)
+            _html_cache_memory[room_name] = (_html_cache_signature(cache_path), cache_data)
     except Exception as e:
         print(f"!! エラー: HTMLキャッシュの保存に失敗しました: {e}")
 
@@ -0,0 +1,103 @@
+# vector_search.py
+"""
+RAG検索の複合スコア計算（ベクトル化版）
+
+FAISSインデックスの各ベクトルについて Arousal と日付（序数）を配列として前計算しておき、
+検索時の α/β/γ 複合スコアと時間減衰を NumPy でまとめて計算する。
+配列は索引の保存時に vector_meta.npz として書き出し、ない場合（旧形式の索引）は読み込み時に作る。
+"""
+
+from datetime import datetime
+from pathlib import Path
+from typing import Tuple
+
+import numpy as np
+
+VECTOR_META_FILE = "vector_meta.npz"
+
+# 日付不明を表す序数（datetime.toordinal() は 1 以上なので衝突しない）
+UNKNOWN_DATE = 0
+
+DEFAULT_AROUSAL = 0.5
+
+
+def date_ordinal(metadata: dict) -> int:
+    """
+    メタデータの日付を序数に変換する（RAGManager.calculate_time_decay と同じ解釈）。
+    日付範囲（"2026-01-01~2026-01-07"）は最新日を使い、解釈できない場合は UNKNOWN_DATE を返す。
+    """
+    date_str = metadata.get("date") or metadata.get("created_at", "")
+    if not date_str:
+        return UNKNOWN_DATE
+    try:
+        date_part = str(date_str).split()[0]
+        if "~" in date_part:
+            date_part = date_part.split("~")[-1]
+        return datetime.strptime(date_part, "%Y-%m-%d").toordinal()
+    except (ValueError, IndexError):
+        return UNKNOWN_DATE
+
+
+def _arousal_of(metadata: dict) -> float:
+    try:
+        return float(metadata.get("arousal", DEFAULT_AROUSAL))
+    except (TypeError, ValueError):
+        return DEFAULT_AROUSAL
+
+
+def build_vector_metadata(db) -> Tuple[np.ndarray, np.ndarray]:
+    """インデックス内の位置順に (arousal, 日付序数) の配列を作る"""
+    total = db.index.ntotal
+    arousal = np.full(total, DEFAULT_AROUSAL, dtype=np.float64)
+    dates = np.full(total, UNKNOWN_DATE, dtype=np.int32)
+    for pos, doc_id in db.index_to_docstore_id.items():
+        if pos >= total:
+            continue
+        doc = db.docstore.search(doc_id)
+        metadata = getattr(doc, "metadata", None)
+        if not metadata:
+            continue
+        arousal[pos] = _arousal_of(metadata)
+        dates[pos] = date_ordinal(metadata)
+    return arousal, dates
+
+
+def write_vector_metadata(db, folder_path: Path):
+    """保存時に (arousal, 日付序数) の配列を folder_path/vector_meta.npz に書き出す"""
+    arousal, dates = build_vector_metadata(db)
+    with open(Path(folder_path) / VECTOR_META_FILE, "wb") as f:
+        np.savez(f, arousal=arousal, date_ordinal=dates)
+
+
+def load_vector_metadata(folder_path: Path, db) -> Tuple[np.ndarray, np.ndarray]:
+    """vector_meta.npz を読み込む（ない・件数が合わない場合はインデックスから作り直す）"""
+    meta_path = Path(folder_path) / VECTOR_META_FILE
+    if meta_path.exists():
+        try:
+            with np.load(meta_path) as data:
+                arousal, dates = data["arousal"], data["date_ordinal"]
+            if len(arousal) == db.index.ntotal and len(dates) == db.index.ntotal:
+                return arousal, dates
+        except Exception as e:
+            print(f"  - [RAG Warning] ベクトルメタデータの読み込みに失敗。再計算します: {e}")
+    return build_vector_metadata(db)
+
+
+def time_decay(dates: np.ndarray, today_ordinal: int, decay_rate: float) -> np.ndarray:
+    """日付序数の配列から時間減衰スコア（0.0～1.0、日付不明は0.5、未来は1.0）を計算する"""
+    decay = np.full(dates.shape, 0.5, dtype=np.float64)
+    known = dates != UNKNOWN_DATE
+    days_ago = np.maximum(today_ordinal - dates[known].astype(np.int64), 0)
+    decay[known] = np.exp(-decay_rate * days_ago)
+    return decay
+
+
+def composite_scores(similarity: np.ndarray, arousal: np.ndarray, decay: np.ndarray, weights: dict) -> np.ndarray:
+    """
+    3項式複合スコア（低いほど良い）:
+    Score = α × similarity + β × (1 - arousal) + γ × (1 - decay) × (1 - arousal)
+    """
+    inverse_arousal = 1.0 - arousal
+    return (weights["alpha"] * similarity
+            + weights["beta"] * inverse_arousal
+            + weights["gamma"] * (1.0 - decay) * inverse_arousal)
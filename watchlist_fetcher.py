@@ -0,0 +1,217 @@
+# watchlist_fetcher.py
+"""
+ウォッチリストのURL取得エンジン
+
+従来はウォッチリストのURLを1件ずつ順に取得し、更新が無いページでも毎回全体をダウンロード・解析していた。
+
+- 複数のURLを constants.WATCHLIST_FETCH_CONCURRENCY 件まで並行して取得する
+  （同じホストへは WATCHLIST_PER_HOST_CONCURRENCY 接続まで、WATCHLIST_PER_HOST_INTERVAL 秒以上の間隔を空ける）
+- HTTP セッション（接続プール）はプロセス内で使い回す
+- 前回の ETag / Last-Modified を送る条件付きリクエストで、更新の無いページは 304 だけで済ませる
+- 本文の抽出は従来どおり（Tavily Extract が使えればそれを、使えなければ BeautifulSoup）
+- content_hash で正規化した本文を比較し、同じなら差分計算を省略できるようにする
+"""
+
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import constants
+import config_manager
+
+# Tavilyが利用可能かチェック
+try:
+    from langchain_tavily import TavilyExtract
+    TAVILY_AVAILABLE = True
+except ImportError:
+    TAVILY_AVAILABLE = False
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+# 保存・比較する本文の最大文字数
+MAX_CONTENT_CHARS = 10000
+
+
+class FetchResult:
+    """1件のURLの取得結果"""
+
+    def __init__(self, url: str, success: bool, content: str = "", not_modified: bool = False,
+                 etag: Optional[str] = None, last_modified: Optional[str] = None):
+        self.url = url
+        self.success = success
+        # 成功時は本文、失敗時はエラーメッセージ（304 の場合は空）
+        self.content = content
+        self.not_modified = not_modified
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+class _HostLimiter:
+    """1ホストあたりの同時接続数とリクエスト間隔を制限する"""
+
+    def __init__(self):
+        self._semaphore = threading.BoundedSemaphore(constants.WATCHLIST_PER_HOST_CONCURRENCY)
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    def __enter__(self):
+        self._semaphore.acquire()
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + constants.WATCHLIST_PER_HOST_INTERVAL
+        if start > now:
+            time.sleep(start - now)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._semaphore.release()
+
+
+_hosts: Dict[str, _HostLimiter] = {}
+_hosts_lock = threading.Lock()
+_session = None
+_session_lock = threading.Lock()
+
+
+def _host_limiter(url: str) -> _HostLimiter:
+    host = urlparse(url).netloc.lower()
+    with _hosts_lock:
+        limiter = _hosts.get(host)
+        if limiter is None:
+            limiter = _hosts[host] = _HostLimiter()
+        return limiter
+
+
+def _get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=constants.WATCHLIST_FETCH_CONCURRENCY,
+                                  pool_maxsize=constants.WATCHLIST_FETCH_CONCURRENCY)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = USER_AGENT
+            _session = session
+        return _session
+
+
+def normalize_content(text: str) -> str:
+    """比較用に本文を正規化する（行ごとの前後の空白と空行を除く）"""
+    lines = (line.strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def content_hash(text: str) -> str:
+    """正規化した本文のハッシュ"""
+    return hashlib.sha256(normalize_content(text).encode("utf-8")).hexdigest()
+
+
+def _extract_text(html: str) -> str:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    # スクリプトとスタイルを除去
+    for script in soup(["script", "style"]):
+        script.decompose()
+    text = soup.get_text(separator='\n', strip=True)
+    return text[:MAX_CONTENT_CHARS]
+
+
+def _extract_with_tavily(url: str) -> Tuple[bool, str]:
+    """Tavily Extract で本文を取得する（例外はそのまま送出する）"""
+    extractor = TavilyExtract(
+        tavily_api_key=config_manager.TAVILY_API_KEY,
+        extract_depth="basic"
+    )
+    results = extractor.invoke({"urls": [url]})
+
+    if results and isinstance(results, dict) and "results" in results:
+        results = results["results"]
+    if results and isinstance(results, list):
+        for result in results:
+            content = result.get("raw_content", result.get("content", ""))
+            if content:
+                return True, content[:MAX_CONTENT_CHARS]
+    return False, "コンテンツを抽出できませんでした"
+
+
+def fetch(url: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> FetchResult:
+    """
+    URLを取得する。etag / last_modified を渡すと条件付きリクエストを行い、
+    更新が無ければ not_modified=True の結果を返す。
+    """
+    use_tavily = TAVILY_AVAILABLE and config_manager.TAVILY_API_KEY
+    response = None
+    error = None
+    new_etag = new_last_modified = None
+
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    try:
+        with _host_limiter(url):
+            response = _get_session().get(url, timeout=15, headers=headers)
+        if response.status_code == 304:
+            return FetchResult(url, True, not_modified=True,
+                               etag=response.headers.get("ETag", etag),
+                               last_modified=response.headers.get("Last-Modified", last_modified))
+        response.raise_for_status()
+        new_etag = response.headers.get("ETag")
+        new_last_modified = response.headers.get("Last-Modified")
+    except Exception as e:
+        response = None
+        error = e
+
+    # Tavilyが利用可能な場合は Tavily Extract で本文を抽出（直接取得できないページもこちらで試す）
+    if use_tavily:
+        try:
+            success, content = _extract_with_tavily(url)
+            return FetchResult(url, success, content, etag=new_etag, last_modified=new_last_modified)
+        except Exception as e:
+            print(f"  - Tavily Extractエラー: {e}")
+            # フォールバックへ
+
+    if response is None:
+        return FetchResult(url, False, f"取得エラー: {error}")
+    try:
+        return FetchResult(url, True, _extract_text(response.text), etag=new_etag, last_modified=new_last_modified)
+    except Exception as e:
+        return FetchResult(url, False, f"取得エラー: {e}")
+
+
+def fetch_many(targets: List[Tuple[str, Optional[str], Optional[str]]]) -> Dict[str, FetchResult]:
+    """
+    複数のURLを並行して取得する。
+
+    Args:
+        targets: (url, etag, last_modified) のリスト
+
+    Returns:
+        URL をキーとした取得結果
+    """
+    results: Dict[str, FetchResult] = {}
+    unique = {}
+    for url, etag, last_modified in targets:
+        unique.setdefault(url, (etag, last_modified))
+    if not unique:
+        return results
+
+    def _fetch(item):
+        url, (etag, last_modified) = item
+        try:
+            return fetch(url, etag, last_modified)
+        except Exception as e:
+            return FetchResult(url, False, f"取得エラー: {e}")
+
+    with ThreadPoolExecutor(max_workers=min(constants.WATCHLIST_FETCH_CONCURRENCY, len(unique))) as executor:
+        for result in executor.map(_fetch, unique.items()):
+            results[result.url] = result
+    return results
@@ -495,7 +495,57 @@ class WatchlistManager:
         self.update_entry(entry_id, last_checked=datetime.datetime.now().isoformat())
         
         return has_changes, diff_summary
-    
+
+    def check_entries(self, entries: List[dict]) -> List[Tuple[dict, bool, bool, str, str]]:
+        """
+        複数のエントリを並行して取得し、更新をチェックする（watchlist_fetcher を使用）
+
+        サーバーが 304 を返した場合や、正規化した本文のハッシュが前回と同じ場合は
+        差分計算とキャッシュの書き換えを行わない。
+
+        Returns:
+            [(entry, success, has_changes, diff_summary または エラーメッセージ, content), ...]
+        """
+        import watchlist_fetcher
+
+        fetched = watchlist_fetcher.fetch_many(
+            [(e["url"], e.get("etag"), e.get("last_modified")) for e in entries]
+        )
+        now = datetime.datetime.now().isoformat()
+        results = []
+        updates = {}
+
+        for entry in entries:
+            result = fetched[entry["url"]]
+            if not result.success:
+                results.append((entry, False, False, result.content, ""))
+                continue
+
+            update = {"last_checked": now, "etag": result.etag, "last_modified": result.last_modified}
+            if result.not_modified:
+                has_changes, diff_summary = False, "変更なし"
+            else:
+                content_hash = watchlist_fetcher.content_hash(result.content)
+                if content_hash == entry.get("content_hash"):
+                    has_changes, diff_summary = False, "変更なし"
+                else:
+                    has_changes, diff_summary = self.detect_changes(entry["url"], result.content)
+                    self._save_cache(entry["url"], result.content)
+                    update["content_hash"] = content_hash
+
+            updates[entry["id"]] = update
+            results.append((entry, True, has_changes, diff_summary, result.content))
+
+        # 確認結果はまとめて1回で保存
+        if updates:
+            data = self._load_watchlist()
+            for stored in data["entries"]:
+                if stored["id"] in updates:
+                    stored.update(updates[stored["id"]])
+            self._save_watchlist(data)
+
+        return results
+
     def _time_diff_minutes(self, time1: str, time2: str) -> int:
         """2つの時刻文字列（HH:MM形式）の差分を分で返す"""
         try: